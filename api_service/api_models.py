@@ -18,6 +18,9 @@ class Conversation(BaseModel):
     messages: List[Message] = []
     created_at: datetime.datetime = Field(default_factory=datetime.datetime.now)
     updated_at: datetime.datetime = Field(default_factory=datetime.datetime.now)
+    # Incremented by the server on every save. Clients send back the version they last saw so stale
+    # edits can be detected during sync; None means "no version known" (always accepted).
+    version: Optional[int] = None
 
     # Conversation-specific settings
     model_id: str = "openai/gpt-3.5-turbo"
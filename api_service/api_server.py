@@ -2,6 +2,7 @@ import os
 import json
 import sys
 import asyncio
+import datetime
 from typing import Dict, List, Optional, Any
 from fastapi import FastAPI, HTTPException, Depends, Header, Request, Response, status, Body
 from fastapi.middleware.cors import CORSMiddleware
@@ -12,7 +13,19 @@ from starlette.middleware.sessions import SessionMiddleware
 import aiohttp
 import asyncpg
 import discord
-from api_service.database import Database # Existing DB
+from api_service.database import Database, TOMBSTONE_RETENTION # Existing DB
+from api_service.auth_cache import DiscordTokenCache
+from api_service.discord_rest import DiscordRestClient, DiscordRestError
+from api_service.guild_metadata import GuildMetadataProvider
+from api_service.bot_rpc import BotRpcClient, RemoteBot, standalone_mode
+from api_service.http_performance import (
+    CompressionMiddleware, DefaultJSONResponse, RequestMetrics, RequestTimingMiddleware,
+    compression_info, maybe_stream_json, loads as json_loads
+)
+from metrics import (
+    REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricFamily, instrument_redis, pg_pool_families,
+    pg_query_logger_init, redis_pool_families, stats_counters
+)
 import logging
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import BaseModel, Field
@@ -69,6 +82,9 @@ class ApiSettings(BaseSettings):
     # Secret key for AI Moderation API endpoint
     MOD_LOG_API_SECRET: Optional[str] = None
 
+    # Bearer token for /internal/metrics (if unset, only local requests may read it)
+    INTERNAL_METRICS_SECRET: Optional[str] = None
+
     model_config = SettingsConfigDict(
         env_file=dotenv_path,
         env_file_encoding='utf-8',
@@ -112,7 +128,31 @@ DISCORD_REDIRECT_URI = settings.DISCORD_REDIRECT_URI  # Make it accessible direc
 DISCORD_AUTH_URL = DISCORD_AUTH_BASE_URL
 
 
+# --- Bot RPC ---
+# Operations that need the live bot (command sync, cog catalogue in standalone workers) go to the
+# bot process through Redis (cogs/bot_rpc_cog.py). Redis is attached in lifespan.
+bot_rpc = BotRpcClient(timeout=10.0)
+
+# --- Discord REST / Guild Metadata ---
+# One rate-limit-aware client for every bot-token REST call, and the guild metadata provider
+# (bot cache -> Redis mirror -> REST) the dashboard endpoints read from. Wired up in lifespan.
+discord_rest = DiscordRestClient(settings.DISCORD_BOT_TOKEN)
+guild_metadata = GuildMetadataProvider(discord_rest, settings.DISCORD_CLIENT_ID)
+
+def discord_rest_http_exception(e: DiscordRestError, what: str) -> HTTPException:
+    """Maps a failed Discord REST call to the HTTPException the dashboard endpoints raise."""
+    log.error(f"Dashboard: Discord API error fetching {what}: {e.status} {e.message}")
+    if e.status == 429:
+        return HTTPException(status_code=429, detail="Rate limited by Discord API. Please try again later.")
+    if e.status in (500, 503):
+        return HTTPException(status_code=e.status, detail=e.message)
+    return HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Error communicating with Discord API.")
+
+
 # --- Gurt Stats Storage (IPC) ---
+# Pushed stats are kept in Redis so every API worker serves the latest push (local copy as fallback)
+GURT_STATS_REDIS_KEY = "api:gurt_stats"
+GURT_STATS_TTL = 600
 latest_gurt_stats: Optional[Dict[str, Any]] = None
 # GURT_STATS_PUSH_SECRET is now loaded via ApiSettings
 if not settings.GURT_STATS_PUSH_SECRET:
@@ -121,42 +161,20 @@ if not settings.GURT_STATS_PUSH_SECRET:
 # --- Helper Functions ---
 async def get_guild_name_from_api(guild_id: int, timeout: float = 5.0) -> str:
     """
-    Get a guild's name from Discord API using the bot token.
+    Get a guild's name from the bot's cache, the Redis mirror, or the Discord API (in that order).
 
     Args:
         guild_id: The Discord guild ID to get the name for
-        timeout: Maximum time to wait for the API request (in seconds)
+        timeout: Maximum time to wait for the lookup (in seconds)
 
     Returns:
         The guild name if successful, otherwise a fallback string with the guild ID
     """
     fallback = f"Server {guild_id}"  # Default fallback
 
-    if not settings.DISCORD_BOT_TOKEN:
-        log.warning("DISCORD_BOT_TOKEN not set, using guild ID as fallback")
-        return fallback
-
     try:
-        # Use global http_session if available, otherwise create a new one
-        session = http_session if http_session else aiohttp.ClientSession()
-
-        # Headers for the request
-        headers = {'Authorization': f'Bot {settings.DISCORD_BOT_TOKEN}'}
-
-        # Send the request with a timeout
-        async with session.get(
-            f"https://discord.com/api/v10/guilds/{guild_id}",
-            headers=headers,
-            timeout=timeout
-        ) as response:
-            if response.status == 200:
-                guild_data = await response.json()
-                guild_name = guild_data.get('name', fallback)
-                log.info(f"Retrieved guild name '{guild_name}' for guild ID {guild_id}")
-                return guild_name
-            else:
-                log.warning(f"Failed to get guild name for guild ID {guild_id}: HTTP {response.status}")
-                return fallback
+        guild_name = await asyncio.wait_for(guild_metadata.get_guild_name(guild_id), timeout=timeout)
+        return guild_name or fallback
     except asyncio.TimeoutError:
         log.error(f"Timeout getting guild name for guild ID {guild_id}")
         return fallback
@@ -294,7 +312,8 @@ if discordbot_path not in sys.path:
 
 try:
     import settings_manager # type: ignore # type: ignore
-    from global_bot_accessor import get_bot_instance
+    from global_bot_accessor import get_bot_instance, set_bot_instance
+    from cog_catalogue import get_guild_cogs_listing, etag_matches
     log.info("Successfully imported settings_manager module and get_bot_instance")
 except ImportError as e:
     log.error(f"Could not import settings_manager or get_bot_instance: {e}")
@@ -312,15 +331,17 @@ async def lifespan(_: FastAPI):  # Underscore indicates unused but required para
     # Startup: Initialize resources
     log.info("Starting API server...")
 
-    # Initialize existing database
-    db.load_data()
-    log.info("Existing database loaded.")
+    # Open the conversations/settings/tokens store (imports legacy JSON files on first run)
+    await db.initialize()
+    log.info(f"API database opened at {db.db_path}.")
 
     # Start aiohttp session
     http_session = aiohttp.ClientSession()
     log.info("aiohttp session started.")
     dependencies.set_http_session(http_session) # Pass session to dependencies module
     log.info("aiohttp session passed to dependencies module.")
+    token_cache.set_http_session(http_session)
+    discord_rest.set_http_session(http_session)
 
     # Initialize settings_manager pools for the API server
     # This is necessary because the API server runs in a different thread/event loop
@@ -349,6 +370,7 @@ async def lifespan(_: FastAPI):  # Underscore indicates unused but required para
                 database=settings.POSTGRES_SETTINGS_DB,
                 min_size=1,
                 max_size=10,
+                init=pg_query_logger_init("api"), # Query latency metrics
             )
             log.info("PostgreSQL pool created and stored in app.state.pg_pool.")
 
@@ -357,7 +379,18 @@ async def lifespan(_: FastAPI):  # Underscore indicates unused but required para
                 redis_url,
                 decode_responses=True,
             )
+            instrument_redis(app.state.redis_pool, "api")
             log.info("Redis pool created and stored in app.state.redis_pool.")
+            token_cache.set_redis(app.state.redis_pool)
+            guild_metadata.set_redis(app.state.redis_pool)
+            bot_rpc.set_redis(app.state.redis_pool)
+            code_verifier_store.set_redis(app.state.redis_pool)
+
+            if standalone_mode():
+                # No bot in this process: settings_manager and the DB-backed endpoints use this
+                # worker's pools, bot-only operations are proxied to the bot over RPC
+                set_bot_instance(RemoteBot(app.state.pg_pool, app.state.redis_pool, bot_rpc))
+                log.info("Standalone mode: registered RemoteBot (bot operations go through Redis RPC).")
 
             # DO NOT call settings_manager.set_bot_pools from API server.
             # The bot (main.py) is responsible for setting the global pools in settings_manager.
@@ -377,9 +410,9 @@ async def lifespan(_: FastAPI):  # Underscore indicates unused but required para
         # Shutdown: Clean up resources
         log.info("Shutting down API server...")
 
-        # Save existing database data
-        db.save_data()
-        log.info("Existing database saved.")
+        # Flush pending writes and close the API database
+        await db.close()
+        log.info("API database closed.")
 
         # Close API server's database/cache pools
         if app.state.pg_pool:
@@ -387,17 +420,23 @@ async def lifespan(_: FastAPI):  # Underscore indicates unused but required para
             log.info("API Server's PostgreSQL pool closed.")
             app.state.pg_pool = None
         if app.state.redis_pool:
+            token_cache.set_redis(None)
+            guild_metadata.set_redis(None)
+            bot_rpc.set_redis(None)
+            code_verifier_store.set_redis(None)
             await app.state.redis_pool.close() # Assuming redis pool has a close method
             log.info("API Server's Redis pool closed.")
             app.state.redis_pool = None
 
         # Close aiohttp session
         if http_session:
+            token_cache.set_http_session(None)
+            discord_rest.set_http_session(None)
             await http_session.close()
             log.info("aiohttp session closed.")
 
 # Create the FastAPI app with lifespan
-app = FastAPI(title="Unified API Service", lifespan=lifespan, debug=True)
+app = FastAPI(title="Unified API Service", lifespan=lifespan, debug=True, default_response_class=DefaultJSONResponse)
 
 @app.exception_handler(StarletteHTTPException)
 async def teapot_override(request: Request, exc: StarletteHTTPException):
@@ -440,7 +479,8 @@ app.add_middleware(
 )
 
 # Create a sub-application for the API with /api prefix
-api_app = FastAPI(title="Unified API Service", docs_url="/docs", openapi_url="/openapi.json")
+api_app = FastAPI(title="Unified API Service", docs_url="/docs", openapi_url="/openapi.json",
+                  default_response_class=DefaultJSONResponse)
 
 # Create a sub-application for backward compatibility with /discordapi prefix
 # This will be deprecated in the future
@@ -448,14 +488,16 @@ discordapi_app = FastAPI(
     title="Discord Bot Sync API (DEPRECATED)",
     docs_url="/docs",
     openapi_url="/openapi.json",
-    description="This API is deprecated and will be removed in the future. Please use the /api endpoint instead."
+    description="This API is deprecated and will be removed in the future. Please use the /api endpoint instead.",
+    default_response_class=DefaultJSONResponse
 )
 
 # Create a sub-application for the new Dashboard API
 dashboard_api_app = FastAPI(
     title="Bot Dashboard API",
     docs_url="/docs", # Can have its own docs
-    openapi_url="/openapi.json"
+    openapi_url="/openapi.json",
+    default_response_class=DefaultJSONResponse
 )
 
 # Import dashboard API endpoints
@@ -577,6 +619,13 @@ for current_app in [app, api_app, discordapi_app]:
 # Add the deprecation middleware to the main app
 app.add_middleware(DeprecationRedirectMiddleware)
 
+# Compress large responses (mounted sub-apps included) and time every request.
+# Added last so timing is the outermost middleware and includes compression.
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+request_metrics = RequestMetrics()
+app.add_middleware(RequestTimingMiddleware, metrics=request_metrics)
+REGISTRY.add_collector("api_requests", request_metrics.collect_families)
+
 # Initialize database (existing)
 db = Database()
 
@@ -585,6 +634,10 @@ http_session = None
 
 # ============= Authentication =============
 
+# Token -> user ID resolution is cached (locally and in Redis) so authenticated requests
+# don't each need a round trip to Discord. Sessions/Redis are attached in lifespan.
+token_cache = DiscordTokenCache(ttl=300.0, negative_ttl=30.0)
+
 async def verify_discord_token(authorization: str = Header(None)) -> str:
     """Verify the Discord token and return the user ID"""
     if not authorization:
@@ -594,16 +647,7 @@ async def verify_discord_token(authorization: str = Header(None)) -> str:
         raise HTTPException(status_code=401, detail="Invalid authorization format")
 
     token = authorization.replace("Bearer ", "")
-
-    # Verify the token with Discord
-    async with aiohttp.ClientSession() as session:
-        headers = {"Authorization": f"Bearer {token}"}
-        async with session.get("https://discord.com/api/v10/users/@me", headers=headers) as resp:
-            if resp.status != 200:
-                raise HTTPException(status_code=401, detail="Invalid Discord token")
-
-            user_data = await resp.json()
-            return user_data["id"]
+    return await token_cache.resolve(token)
 
 # ============= API Endpoints =============
 
@@ -784,7 +828,8 @@ async def auth(code: str, state: str = None, code_verifier: str = None, request:
             # by the Discord bot before the user was redirected here
             stored_code_verifier = None
             if state:
-                stored_code_verifier = code_verifier_store.get_code_verifier(state)
+                # Consumed here (one-time use), whichever code verifier ends up being used
+                stored_code_verifier = await code_verifier_store.pop_code_verifier(state)
                 if stored_code_verifier:
                     print(f"Found code_verifier in store for state {state}: {stored_code_verifier[:10]}...")
                 else:
@@ -798,8 +843,6 @@ async def auth(code: str, state: str = None, code_verifier: str = None, request:
             elif stored_code_verifier:
                 data["code_verifier"] = stored_code_verifier
                 print(f"Using code_verifier from store: {stored_code_verifier[:10]}...")
-                # Remove the code verifier from the store after using it
-                code_verifier_store.remove_code_verifier(state)
             else:
                 # If we still don't have a code verifier, log a warning
                 print(f"WARNING: No code_verifier found for state {state} - OAuth will likely fail")
@@ -840,7 +883,7 @@ async def auth(code: str, state: str = None, code_verifier: str = None, request:
                         return {"message": "Authentication failed", "error": "No user ID in response"}
 
                     # Store the token in the database
-                    db.save_user_token(user_id, token_data)
+                    await db.save_user_token(user_id, token_data)
                     print(f"Successfully authenticated user {user_id} and saved token")
 
                     # Check if this is a programmatic request (from the bot) or a browser request
@@ -1005,19 +1048,17 @@ class CogInfo(BaseModel):
 @dashboard_api_app.get("/guilds/{guild_id}/cogs", response_model=List[CogInfo], tags=["Cog Management"])
 async def get_guild_cogs_direct(
     guild_id: int,
+    request: Request,
+    response: Response,
     _user: dict = Depends(dependencies.get_dashboard_user),
     _admin: bool = Depends(dependencies.verify_dashboard_guild_admin)
 ):
-    """Get all cogs and their commands for a guild."""
+    """
+    Get all cogs and their commands for a guild.
+    Combines the bot's precomputed cog catalogue with the guild's toggles (one DB query) and
+    supports If-None-Match: an unchanged listing returns 304 Not Modified.
+    """
     try:
-        # First try to get cogs from the bot instance
-        bot = None
-        try:
-            import discord_bot_sync_api # type: ignore
-            bot = discord_bot_sync_api.bot_instance
-        except (ImportError, AttributeError) as e:
-            log.warning(f"Could not import bot instance: {e}")
-
         # Check if settings_manager is available
         bot = get_bot_instance()
         if not settings_manager or not bot or not bot.pg_pool:
@@ -1026,132 +1067,17 @@ async def get_guild_cogs_direct(
                 detail="Settings manager or database connection not available"
             )
 
-        # Get cogs from the database directly if bot is not available
-        cogs_list = []
-
-        if bot:
-            # Get cogs from the bot instance
-            log.info(f"Getting cogs from bot instance for guild {guild_id}")
-            for cog_name, cog in bot.cogs.items():
-                # Get enabled status from settings_manager
-                is_enabled = await settings_manager.is_cog_enabled(guild_id, cog_name, default_enabled=True)
-
-                # Get commands for this cog
-                commands_list = []
-                for command in cog.get_commands():
-                    # Get command enabled status
-                    cmd_enabled = await settings_manager.is_command_enabled(guild_id, command.qualified_name, default_enabled=True)
-                    commands_list.append({
-                        "name": command.qualified_name,
-                        "description": command.help or "No description available",
-                        "enabled": cmd_enabled
-                    })
-
-                # Add slash commands if any
-                app_commands = [cmd for cmd in bot.tree.get_commands() if hasattr(cmd, 'cog') and cmd.cog and cmd.cog.qualified_name == cog_name]
-                for cmd in app_commands:
-                    # Get command enabled status
-                    cmd_enabled = await settings_manager.is_command_enabled(guild_id, cmd.name, default_enabled=True)
-                    if not any(c["name"] == cmd.name for c in commands_list):  # Avoid duplicates
-                        commands_list.append({
-                            "name": cmd.name,
-                            "description": cmd.description or "No description available",
-                            "enabled": cmd_enabled
-                        })
-
-                cogs_list.append(CogInfo(
-                    name=cog_name,
-                    description=cog.__doc__ or "No description available",
-                    enabled=is_enabled,
-                    commands=commands_list
-                ))
-        else:
-            # Fallback: Get cogs from the database directly
-            log.info(f"Getting cogs from database for guild {guild_id}")
-            try:
-                # Get all cog enabled statuses from the database
-                cog_statuses = await settings_manager.get_all_enabled_cogs(guild_id)
-
-                # Get all command enabled statuses from the database
-                command_statuses = await settings_manager.get_all_enabled_commands(guild_id)
-
-                # Add each cog to the list
-                for cog_name, is_enabled in cog_statuses.items():
-                    # Create a list of commands for this cog
-                    commands_list = []
-
-                    # Find commands that might belong to this cog
-                    # We'll use a naming convention where commands starting with the cog name
-                    # (minus "Cog" suffix) are assumed to belong to that cog
-                    cog_prefix = cog_name.lower().replace("cog", "")
-                    for cmd_name, cmd_enabled in command_statuses.items():
-                        if cmd_name.lower().startswith(cog_prefix):
-                            commands_list.append({
-                                "name": cmd_name,
-                                "description": "Description not available (bot instance not accessible)",
-                                "enabled": cmd_enabled
-                            })
-
-                    cogs_list.append(CogInfo(
-                        name=cog_name,
-                        description="Description not available (bot instance not accessible)",
-                        enabled=is_enabled,
-                        commands=commands_list
-                    ))
-
-                # If no cogs were found, add some default cogs
-                if not cogs_list:
-                    default_cogs = [
-                        "SettingsCog", "HelpCog", "ModerationCog", "WelcomeCog",
-                        "GurtCog", "EconomyCog", "UtilityCog"
-                    ]
-                    for cog_name in default_cogs:
-                        # Try to get the enabled status from the database
-                        try:
-                            is_enabled = await settings_manager.is_cog_enabled(guild_id, cog_name, default_enabled=True)
-                        except Exception:
-                            is_enabled = True
-
-                        # Add some default commands for this cog
-                        commands_list = []
-                        cog_prefix = cog_name.lower().replace("cog", "")
-                        default_commands = {
-                            "settings": ["set", "get", "reset"],
-                            "help": ["help", "commands"],
-                            "moderation": ["ban", "kick", "mute", "unmute", "warn"],
-                            "welcome": ["welcome", "goodbye", "setwelcome", "setgoodbye"],
-                            "gurt": ["gurt", "gurtset"],
-                            "economy": ["balance", "daily", "work", "gamble"],
-                            "utility": ["ping", "info", "serverinfo", "userinfo"]
-                        }
-
-                        if cog_prefix in default_commands:
-                            for cmd_suffix in default_commands[cog_prefix]:
-                                cmd_name = f"{cog_prefix}{cmd_suffix}"
-                                try:
-                                    cmd_enabled = await settings_manager.is_command_enabled(guild_id, cmd_name, default_enabled=True)
-                                except Exception:
-                                    cmd_enabled = True
-
-                                commands_list.append({
-                                    "name": cmd_name,
-                                    "description": "Default command (bot instance not accessible)",
-                                    "enabled": cmd_enabled
-                                })
-
-                        cogs_list.append(CogInfo(
-                            name=cog_name,
-                            description="Default cog (bot instance not accessible)",
-                            enabled=is_enabled,
-                            commands=commands_list
-                        ))
-            except Exception as e:
-                log.error(f"Error getting cogs from database: {e}")
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Error getting cogs from database: {str(e)}"
-                )
-
+        result = await get_guild_cogs_listing(bot, guild_id)
+        if result is None:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Error getting cog and command settings from database"
+            )
+        cogs_list, etag = result
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "private, no-cache"
         return cogs_list
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -1319,7 +1245,7 @@ async def dashboard_login():
     code_challenge = base64.urlsafe_b64encode(code_challenge_bytes).decode().rstrip("=")
 
     # Store the code verifier for later use
-    code_verifier_store.store_code_verifier(state, code_verifier)
+    await code_verifier_store.store_code_verifier(state, code_verifier)
 
     # Build the authorization URL with PKCE parameters using the dashboard-specific redirect URI
     auth_url = (
@@ -1357,17 +1283,14 @@ async def dashboard_auth_callback(request: Request, code: str | None = None, sta
          raise HTTPException(status_code=500, detail="Internal server error: HTTP session not ready.")
 
     try:
-        # Get the code verifier from the store
-        code_verifier = code_verifier_store.get_code_verifier(state)
+        # Get the code verifier from the store, removing it so it can only be used once
+        code_verifier = await code_verifier_store.pop_code_verifier(state)
         if not code_verifier:
             log.error(f"Dashboard: No code_verifier found for state {state}")
             return RedirectResponse(url="/dashboard?error=missing_code_verifier")
 
         log.info(f"Dashboard: Found code_verifier for state {state}: {code_verifier[:10]}...")
 
-        # Remove the code verifier from the store after retrieving it
-        code_verifier_store.remove_code_verifier(state)
-
         # 1. Exchange code for access token with PKCE
         token_data = {
             'client_id': settings.DISCORD_CLIENT_ID,
@@ -1399,7 +1322,9 @@ async def dashboard_auth_callback(request: Request, code: str | None = None, sta
         user_headers = {'Authorization': f'Bearer {access_token}'}
         log.debug(f"Dashboard: Fetching user data from {DISCORD_USER_URL}")
         async with http_session.get(DISCORD_USER_URL, headers=user_headers) as resp:
-            resp.raise_for_status()
+            if resp.status != 200:
+                log.error(f"Dashboard: Failed to fetch user data: {resp.status} {await resp.text()}")
+                raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Error communicating with Discord: could not fetch user data.")
             user_data = await resp.json()
             log.debug(f"Dashboard: User data fetched successfully for user ID: {user_data.get('id')}")
 
@@ -1413,14 +1338,8 @@ async def dashboard_auth_callback(request: Request, code: str | None = None, sta
         # Redirect user back to the main dashboard page (served by static files)
         return RedirectResponse(url="/dashboard", status_code=status.HTTP_307_TEMPORARY_REDIRECT)
 
-    except aiohttp.ClientResponseError as e:
-        log.exception(f"Dashboard: HTTP error during Discord OAuth callback: {e.status} {e.message}")
-        error_detail = "Unknown Discord API error"
-        try:
-            error_body = await e.response.json()
-            error_detail = error_body.get("error_description", error_detail)
-        except Exception: pass
-        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Error communicating with Discord: {error_detail}")
+    except HTTPException:
+        raise
     except Exception as e:
         log.exception(f"Dashboard: Generic error during Discord OAuth callback: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An internal error occurred during authentication.")
@@ -1429,6 +1348,9 @@ async def dashboard_auth_callback(request: Request, code: str | None = None, sta
 async def dashboard_logout(request: Request):
     """Clears the dashboard user session."""
     user_id = request.session.get('user_id')
+    access_token = request.session.get('access_token')
+    if access_token:
+        dependencies.user_guild_cache.invalidate(access_token)
     request.session.clear()
     log.info(f"Dashboard: User {user_id} logged out.")
     return
@@ -1508,26 +1430,16 @@ async def dashboard_get_auth_user(request: Request):
 
 @dashboard_api_app.get("/user/guilds", tags=["Dashboard User"])
 @dashboard_api_app.get("/guilds", tags=["Dashboard Guild Settings"])
-async def dashboard_get_user_guilds(current_user: dict = Depends(dependencies.get_dashboard_user)):
+async def dashboard_get_user_guilds(refresh: bool = False, current_user: dict = Depends(dependencies.get_dashboard_user)):
     """Returns a list of guilds the user is an administrator in AND the bot is also in."""
-    global http_session # Use the global aiohttp session
-    if not http_session:
-         log.error("Dashboard: aiohttp session not initialized.")
-         raise HTTPException(status_code=500, detail="Internal server error: HTTP session not ready.")
     if not settings_manager:
         log.error("Dashboard: settings_manager not available.")
         raise HTTPException(status_code=500, detail="Internal server error: Settings manager not available.")
 
-    access_token = current_user['access_token']
-    user_headers = {'Authorization': f'Bearer {access_token}'}
-
     try:
-        # 1. Fetch guilds user is in from Discord
-        log.debug(f"Dashboard: Fetching user guilds from {DISCORD_USER_GUILDS_URL}")
-        async with http_session.get(DISCORD_USER_GUILDS_URL, headers=user_headers) as resp:
-            resp.raise_for_status()
-            user_guilds = await resp.json()
-        log.debug(f"Dashboard: Fetched {len(user_guilds)} guilds for user {current_user['user_id']}")
+        # 1. Fetch guilds user is in from Discord (cached per session, shared with verify_dashboard_guild_admin)
+        user_guilds = (await dependencies.user_guild_cache.get_guilds(current_user['access_token'], refresh=refresh)).guilds
+        log.debug(f"Dashboard: Got {len(user_guilds)} guilds for user {current_user['user_id']}")
 
         # 2. Fetch guilds the bot is in from our DB
         try:
@@ -1575,11 +1487,8 @@ async def dashboard_get_user_guilds(current_user: dict = Depends(dependencies.ge
         log.info(f"Dashboard: Found {len(manageable_guilds)} manageable guilds for user {current_user['user_id']}")
         return manageable_guilds
 
-    except aiohttp.ClientResponseError as e:
-        log.exception(f"Dashboard: HTTP error fetching user guilds: {e.status} {e.message}")
-        if e.status == 401:
-             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Discord token invalid or expired. Please re-login.")
-        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Error communicating with Discord API.")
+    except HTTPException:
+        raise # Discord errors are already mapped by UserGuildCache (401, 429, 502)
     except Exception as e:
         log.exception(f"Dashboard: Generic error fetching user guilds: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An internal error occurred while fetching guilds.")
@@ -1592,106 +1501,12 @@ async def dashboard_get_guild_channels(
     _: bool = Depends(dependencies.verify_dashboard_guild_admin)  # Underscore indicates unused but required dependency
 ):
     """Fetches the channels for a specific guild for the dashboard."""
-    global http_session # Use the global aiohttp session
-    if not http_session:
-        raise HTTPException(status_code=500, detail="Internal server error: HTTP session not ready.")
-
     log.info(f"Dashboard: Fetching channels for guild {guild_id} requested by user {current_user['user_id']}")
 
     try:
-        # Use Discord Bot Token to fetch channels if available
-        if not settings.DISCORD_BOT_TOKEN:
-            log.error("Dashboard: DISCORD_BOT_TOKEN not set in environment variables")
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="Bot token not configured. Please set DISCORD_BOT_TOKEN in environment variables."
-            )
-
-        bot_headers = {'Authorization': f'Bot {settings.DISCORD_BOT_TOKEN}'}
-
-        # Add rate limit handling
-        max_retries = 3
-        retry_count = 0
-        retry_after = 0
-
-        while retry_count < max_retries:
-            if retry_after > 0:
-                log.warning(f"Dashboard: Rate limited by Discord API, waiting {retry_after} seconds before retry")
-                await asyncio.sleep(retry_after)
-
-            async with http_session.get(f"https://discord.com/api/v10/guilds/{guild_id}/channels", headers=bot_headers) as resp:
-                if resp.status == 429:  # Rate limited
-                    retry_count += 1
-
-                    # Get the most accurate retry time from headers
-                    retry_after = float(resp.headers.get('X-RateLimit-Reset-After',
-                                      resp.headers.get('Retry-After', 1)))
-
-                    # Check if this is a global rate limit
-                    is_global = resp.headers.get('X-RateLimit-Global') is not None
-
-                    # Get the rate limit scope if available
-                    scope = resp.headers.get('X-RateLimit-Scope', 'unknown')
-
-                    log.warning(
-                        f"Dashboard: Discord API rate limit hit. "
-                        f"Global: {is_global}, Scope: {scope}, "
-                        f"Reset after: {retry_after}s, "
-                        f"Retry: {retry_count}/{max_retries}"
-                    )
-
-                    # For global rate limits, we might want to wait longer
-                    if is_global:
-                        retry_after = max(retry_after, 5)  # At least 5 seconds for global limits
-
-                    continue
-
-                # Check rate limit headers and log them for monitoring
-                rate_limit = {
-                    'limit': resp.headers.get('X-RateLimit-Limit'),
-                    'remaining': resp.headers.get('X-RateLimit-Remaining'),
-                    'reset': resp.headers.get('X-RateLimit-Reset'),
-                    'reset_after': resp.headers.get('X-RateLimit-Reset-After'),
-                    'bucket': resp.headers.get('X-RateLimit-Bucket')
-                }
-
-                # If we're getting close to the rate limit, log a warning
-                if rate_limit['remaining'] and rate_limit['limit']:
-                    try:
-                        remaining = int(rate_limit['remaining'])
-                        limit = int(rate_limit['limit'])
-                        if remaining < 5:
-                            log.warning(
-                                f"Dashboard: Rate limit warning: {remaining}/{limit} "
-                                f"requests remaining in bucket {rate_limit['bucket'] or 'unknown'}. "
-                                f"Resets in {rate_limit['reset_after'] or 'unknown'}s"
-                            )
-                    except (ValueError, TypeError):
-                        # Handle case where headers might be present but not valid integers
-                        pass
-
-                resp.raise_for_status()
-                channels = await resp.json()
-
-                # Filter and format channels
-                formatted_channels = []
-                for channel in channels:
-                    formatted_channels.append({
-                        "id": channel["id"],
-                        "name": channel["name"],
-                        "type": channel["type"],
-                        "parent_id": channel.get("parent_id")
-                    })
-
-                return formatted_channels
-
-        # If we get here, we've exceeded our retry limit
-        raise HTTPException(status_code=429, detail="Rate limited by Discord API. Please try again later.")
-    except aiohttp.ClientResponseError as e:
-        log.exception(f"Dashboard: HTTP error fetching guild channels: {e.status} {e.message}")
-        if e.status == 429:
-            raise HTTPException(status_code=429, detail="Rate limited by Discord API. Please try again later.")
-        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Error communicating with Discord API.")
+        return await guild_metadata.get_channels(guild_id)
+    except DiscordRestError as e:
+        raise discord_rest_http_exception(e, "guild channels")
     except Exception as e:
         log.exception(f"Dashboard: Generic error fetching guild channels: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An internal error occurred while fetching channels.")
@@ -1703,94 +1518,21 @@ async def dashboard_get_guild_roles(
     _: bool = Depends(dependencies.verify_dashboard_guild_admin)  # Underscore indicates unused but required dependency
 ):
     """Fetches the roles for a specific guild for the dashboard."""
-    global http_session # Use the global aiohttp session
-    if not http_session:
-        raise HTTPException(status_code=500, detail="Internal server error: HTTP session not ready.")
-
     log.info(f"Dashboard: Fetching roles for guild {guild_id} requested by user {current_user['user_id']}")
 
     try:
-        # Use Discord Bot Token to fetch roles if available
-        if not settings.DISCORD_BOT_TOKEN:
-            log.error("Dashboard: DISCORD_BOT_TOKEN not set in environment variables")
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="Bot token not configured. Please set DISCORD_BOT_TOKEN in environment variables."
-            )
-
-        bot_headers = {'Authorization': f'Bot {settings.DISCORD_BOT_TOKEN}'}
-
-        # Add rate limit handling
-        max_retries = 3
-        retry_count = 0
-        retry_after = 0
-
-        while retry_count < max_retries:
-            if retry_after > 0:
-                log.warning(f"Dashboard: Rate limited by Discord API, waiting {retry_after} seconds before retry")
-                await asyncio.sleep(retry_after)
-
-            async with http_session.get(f"https://discord.com/api/v10/guilds/{guild_id}/roles", headers=bot_headers) as resp:
-                if resp.status == 429:  # Rate limited
-                    retry_count += 1
-
-                    # Get the most accurate retry time from headers
-                    retry_after = float(resp.headers.get('X-RateLimit-Reset-After',
-                                      resp.headers.get('Retry-After', 1)))
-
-                    # Check if this is a global rate limit
-                    is_global = resp.headers.get('X-RateLimit-Global') is not None
-
-                    # Get the rate limit scope if available
-                    scope = resp.headers.get('X-RateLimit-Scope', 'unknown')
-
-                    log.warning(
-                        f"Dashboard: Discord API rate limit hit. "
-                        f"Global: {is_global}, Scope: {scope}, "
-                        f"Reset after: {retry_after}s, "
-                        f"Retry: {retry_count}/{max_retries}"
-                    )
-
-                    # For global rate limits, we might want to wait longer
-                    if is_global:
-                        retry_after = max(retry_after, 5)  # At least 5 seconds for global limits
-
-                    continue
-
-                resp.raise_for_status()
-                roles = await resp.json()
-
-                # Filter and format roles
-                formatted_roles = []
-                for role in roles:
-                    # Skip @everyone role
-                    if role["name"] == "@everyone":
-                        continue
-
-                    formatted_roles.append({
-                        "id": role["id"],
-                        "name": role["name"],
-                        "color": role["color"],
-                        "position": role["position"],
-                        "permissions": role["permissions"]
-                    })
-
-                # Sort roles by position (highest first)
-                formatted_roles.sort(key=lambda r: r["position"], reverse=True)
-
-                return formatted_roles
-
-        # If we get here, we've exceeded our retry limit
-        raise HTTPException(status_code=429, detail="Rate limited by Discord API. Please try again later.")
-    except aiohttp.ClientResponseError as e:
-        log.exception(f"Dashboard: HTTP error fetching guild roles: {e.status} {e.message}")
-        if e.status == 429:
-            raise HTTPException(status_code=429, detail="Rate limited by Discord API. Please try again later.")
-        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Error communicating with Discord API.")
+        roles = await guild_metadata.get_roles(guild_id)
+    except DiscordRestError as e:
+        raise discord_rest_http_exception(e, "guild roles")
     except Exception as e:
         log.exception(f"Dashboard: Generic error fetching guild roles: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An internal error occurred while fetching roles.")
 
+    # Skip @everyone role and sort roles by position (highest first)
+    formatted_roles = [role for role in roles if role["name"] != "@everyone"]
+    formatted_roles.sort(key=lambda r: r["position"], reverse=True)
+    return formatted_roles
+
 @dashboard_api_app.get("/guilds/{guild_id}/commands", tags=["Dashboard Guild Settings"])
 async def dashboard_get_guild_commands(
     guild_id: int,
@@ -1798,91 +1540,12 @@ async def dashboard_get_guild_commands(
     _: bool = Depends(dependencies.verify_dashboard_guild_admin)  # Underscore indicates unused but required dependency
 ):
     """Fetches the commands for a specific guild for the dashboard."""
-    global http_session # Use the global aiohttp session
-    if not http_session:
-        raise HTTPException(status_code=500, detail="Internal server error: HTTP session not ready.")
-
     log.info(f"Dashboard: Fetching commands for guild {guild_id} requested by user {current_user['user_id']}")
 
     try:
-        # Use Discord Bot Token to fetch application commands if available
-        if not settings.DISCORD_BOT_TOKEN:
-            log.error("Dashboard: DISCORD_BOT_TOKEN not set in environment variables")
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="Bot token not configured. Please set DISCORD_BOT_TOKEN in environment variables."
-            )
-
-        bot_headers = {'Authorization': f'Bot {settings.DISCORD_BOT_TOKEN}'}
-        application_id = settings.DISCORD_CLIENT_ID  # This should be the same as your bot's application ID
-
-        # Add rate limit handling
-        max_retries = 3
-        retry_count = 0
-        retry_after = 0
-
-        while retry_count < max_retries:
-            if retry_after > 0:
-                log.warning(f"Dashboard: Rate limited by Discord API, waiting {retry_after} seconds before retry")
-                await asyncio.sleep(retry_after)
-
-            async with http_session.get(f"https://discord.com/api/v10/applications/{application_id}/guilds/{guild_id}/commands", headers=bot_headers) as resp:
-                if resp.status == 429:  # Rate limited
-                    retry_count += 1
-
-                    # Get the most accurate retry time from headers
-                    retry_after = float(resp.headers.get('X-RateLimit-Reset-After',
-                                      resp.headers.get('Retry-After', 1)))
-
-                    # Check if this is a global rate limit
-                    is_global = resp.headers.get('X-RateLimit-Global') is not None
-
-                    # Get the rate limit scope if available
-                    scope = resp.headers.get('X-RateLimit-Scope', 'unknown')
-
-                    log.warning(
-                        f"Dashboard: Discord API rate limit hit. "
-                        f"Global: {is_global}, Scope: {scope}, "
-                        f"Reset after: {retry_after}s, "
-                        f"Retry: {retry_count}/{max_retries}"
-                    )
-
-                    # For global rate limits, we might want to wait longer
-                    if is_global:
-                        retry_after = max(retry_after, 5)  # At least 5 seconds for global limits
-
-                    continue
-
-                # Handle 404 specially - it's not an error, just means no commands are registered
-                if resp.status == 404:
-                    return []
-
-                resp.raise_for_status()
-                commands = await resp.json()
-
-                # Format commands
-                formatted_commands = []
-                for cmd in commands:
-                    formatted_commands.append({
-                        "id": cmd["id"],
-                        "name": cmd["name"],
-                        "description": cmd.get("description", ""),
-                        "type": cmd.get("type", 1),  # Default to CHAT_INPUT type
-                        "options": cmd.get("options", [])
-                    })
-
-                return formatted_commands
-
-        # If we get here, we've exceeded our retry limit
-        raise HTTPException(status_code=429, detail="Rate limited by Discord API. Please try again later.")
-    except aiohttp.ClientResponseError as e:
-        log.exception(f"Dashboard: HTTP error fetching guild commands: {e.status} {e.message}")
-        if e.status == 404:
-            # If no commands are registered yet, return an empty list
-            return []
-        if e.status == 429:
-            raise HTTPException(status_code=429, detail="Rate limited by Discord API. Please try again later.")
-        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Error communicating with Discord API.")
+        return await guild_metadata.get_commands(guild_id)
+    except DiscordRestError as e:
+        raise discord_rest_http_exception(e, "guild commands")
     except Exception as e:
         log.exception(f"Dashboard: Generic error fetching guild commands: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An internal error occurred while fetching commands.")
@@ -1894,7 +1557,7 @@ async def dashboard_get_settings(current_user: dict = Depends(dependencies.get_d
 
     try:
         # Get settings from the database
-        settings_data = db.get_user_settings(current_user['user_id'])
+        settings_data = await db.get_user_settings(current_user['user_id'])
 
         if not settings_data:
             # Return default settings if none exist
@@ -1922,7 +1585,7 @@ async def dashboard_update_settings(request: Request, current_user: dict = Depen
     try:
         # Parse the request body
         body_text = await request.body()
-        body = json.loads(body_text.decode('utf-8'))
+        body = json_loads(body_text)
 
         log.debug(f"Dashboard: Received settings update: {body}")
 
@@ -1947,7 +1610,7 @@ async def dashboard_update_settings(request: Request, current_user: dict = Depen
             raise HTTPException(status_code=400, detail=f"Invalid settings data: {str(e)}")
 
         # Save the settings
-        result = db.save_user_settings(current_user['user_id'], settings)
+        result = await db.save_user_settings(current_user['user_id'], settings)
         log.info(f"Dashboard: Successfully updated settings for user {current_user['user_id']}")
 
         return result
@@ -2135,12 +1798,9 @@ async def dashboard_get_all_guild_command_permissions(
                 )
 
             # Get role information to include role names
-            bot_headers = {'Authorization': f'Bot {settings.DISCORD_BOT_TOKEN}'}
             roles = []
             try:
-                async with http_session.get(f"https://discord.com/api/v10/guilds/{guild_id}/roles", headers=bot_headers) as resp:
-                    if resp.status == 200:
-                        roles = await resp.json()
+                roles = await guild_metadata.get_roles(guild_id)
             except Exception as e:
                 log.warning(f"Failed to fetch role information: {e}")
 
@@ -2484,14 +2144,14 @@ async def dashboard_remove_guild_command_permission(
 @discordapi_app.get("/conversations", response_model=GetConversationsResponse)
 async def get_conversations(user_id: str = Depends(verify_discord_token)):
     """Get all conversations for a user"""
-    conversations = db.get_user_conversations(user_id)
-    return {"conversations": conversations}
+    conversations = await db.get_user_conversations(user_id)
+    return maybe_stream_json({"conversations": conversations}, "conversations")
 
 @api_app.get("/conversations/{conversation_id}")
 @discordapi_app.get("/conversations/{conversation_id}")
 async def get_conversation(conversation_id: str, user_id: str = Depends(verify_discord_token)):
     """Get a specific conversation for a user"""
-    conversation = db.get_conversation(user_id, conversation_id)
+    conversation = await db.get_conversation(user_id, conversation_id)
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
@@ -2505,7 +2165,7 @@ async def create_conversation(
 ):
     """Create or update a conversation for a user"""
     conversation = conversation_request.conversation
-    return db.save_conversation(user_id, conversation)
+    return await db.save_conversation(user_id, conversation)
 
 @api_app.put("/conversations/{conversation_id}", response_model=Conversation)
 @discordapi_app.put("/conversations/{conversation_id}", response_model=Conversation)
@@ -2522,11 +2182,11 @@ async def update_conversation(
         raise HTTPException(status_code=400, detail="Conversation ID mismatch")
 
     # Check if the conversation exists
-    existing_conversation = db.get_conversation(user_id, conversation_id)
+    existing_conversation = await db.get_conversation(user_id, conversation_id)
     if not existing_conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
-    return db.save_conversation(user_id, conversation)
+    return await db.save_conversation(user_id, conversation)
 
 @api_app.delete("/conversations/{conversation_id}", response_model=ApiResponse)
 @discordapi_app.delete("/conversations/{conversation_id}", response_model=ApiResponse)
@@ -2535,7 +2195,7 @@ async def delete_conversation(
     user_id: str = Depends(verify_discord_token)
 ):
     """Delete a specific conversation for a user"""
-    success = db.delete_conversation(user_id, conversation_id)
+    success = await db.delete_conversation(user_id, conversation_id)
     if not success:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
@@ -2547,7 +2207,7 @@ async def delete_conversation(
 @discordapi_app.get("/settings")
 async def get_settings(user_id: str = Depends(verify_discord_token)):
     """Get settings for a user"""
-    settings = db.get_user_settings(user_id)
+    settings = await db.get_user_settings(user_id)
     # Return both formats for compatibility
     return {"settings": settings, "user_settings": settings}
 
@@ -2559,7 +2219,7 @@ async def update_settings_put(
 ):
     """Update settings for a user using PUT method"""
     settings = settings_request.settings
-    return db.save_user_settings(user_id, settings)
+    return await db.save_user_settings(user_id, settings)
 
 @api_app.post("/settings", response_model=UserSettings)
 @discordapi_app.post("/settings", response_model=UserSettings)
@@ -2571,7 +2231,7 @@ async def update_settings_post(
     try:
         # Parse the request body with UTF-8 encoding
         body_text = await request.body()
-        body = json.loads(body_text.decode('utf-8'))
+        body = json_loads(body_text)
 
         # Log the received body for debugging
         print(f"Received settings POST request with body: {body}")
@@ -2582,7 +2242,7 @@ async def update_settings_post(
             try:
                 settings = UserSettings.model_validate(settings_data)
                 # Save the settings and return the result
-                result = db.save_user_settings(user_id, settings)
+                result = await db.save_user_settings(user_id, settings)
                 print(f"Saved settings for user {user_id} from 'user_settings' field")
                 return result
             except Exception as e:
@@ -2595,7 +2255,7 @@ async def update_settings_post(
             try:
                 settings = UserSettings.model_validate(settings_data)
                 # Save the settings and return the result
-                result = db.save_user_settings(user_id, settings)
+                result = await db.save_user_settings(user_id, settings)
                 print(f"Saved settings for user {user_id} from 'settings' field")
                 return result
             except Exception as e:
@@ -2606,7 +2266,7 @@ async def update_settings_post(
         try:
             settings = UserSettings.model_validate(body)
             # Save the settings and return the result
-            result = db.save_user_settings(user_id, settings)
+            result = await db.save_user_settings(user_id, settings)
             print(f"Saved settings for user {user_id} from direct body")
             return result
         except Exception as e:
@@ -2621,22 +2281,47 @@ async def update_settings_post(
 
 # ============= Backward Compatibility Endpoints =============
 
+# Changes committed while a sync reads are still picked up by the client's next sync: the returned
+# watermark is moved back by this many seconds (clients de-duplicate conversations by ID).
+SYNC_WATERMARK_OVERLAP = 2.0
+
+def _parse_sync_time(value: Any) -> Optional[float]:
+    """Parses a client's last_sync_time (ISO 8601 string or Unix timestamp in s/ms) to a Unix timestamp."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return value / 1000 if value > 1e11 else float(value)
+    return datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+
 # Define the sync function to be reused by both endpoints
 async def _sync_conversations(request: Request, user_id: str):
+    """
+    Incremental sync. The client sends the conversations it changed (with the version it last saw),
+    the IDs of conversations it deleted, and the sync_time of its previous sync as last_sync_time.
+    The response only contains conversations changed and IDs deleted since then, plus the versions
+    assigned to the client's own changes, conflicts (stale edits that weren't saved) and the
+    sync_time to send next time. Without a usable last_sync_time all conversations are returned
+    (full_sync is true).
+    """
     try:
         # Parse the request body with UTF-8 encoding
         body_text = await request.body()
-        body = json.loads(body_text.decode('utf-8'))
+        body = json_loads(body_text)
 
-        # Log the received body for debugging
-        print(f"Received sync request with body: {body}")
+        # Get conversations and deletions from the request
+        request_conversations = body.get("conversations") or []
+        deleted_conversation_ids = [str(conversation_id) for conversation_id in body.get("deleted_conversation_ids") or []]
 
-        # Get conversations from the request
-        request_conversations = body.get("conversations", [])
+        try:
+            last_sync_time = _parse_sync_time(body.get("last_sync_time"))
+        except (TypeError, ValueError):
+            print(f"Ignoring invalid last_sync_time from user {user_id}: {body.get('last_sync_time')!r}")
+            last_sync_time = None
+        # Deletions older than the tombstone retention are forgotten, so such clients need a full sync
+        full_sync = last_sync_time is None or last_sync_time < datetime.datetime.now().timestamp() - TOMBSTONE_RETENTION
 
-        # Get last sync time (for future use with incremental sync)
-        # Store the last sync time for future use
-        _ = body.get("last_sync_time")  # Currently unused, will be used for incremental sync in the future
+        print(f"Sync request from user {user_id}: {len(request_conversations)} conversations, "
+              f"{len(deleted_conversation_ids)} deletions, {'full' if full_sync else 'incremental'}")
 
         # Get user settings from the request if available
         user_settings_data = body.get("user_settings")
@@ -2644,33 +2329,50 @@ async def _sync_conversations(request: Request, user_id: str):
             # Save user settings
             try:
                 settings = UserSettings.model_validate(user_settings_data)
-                settings = db.save_user_settings(user_id, settings)
+                settings = await db.save_user_settings(user_id, settings)
                 print(f"Saved user settings for {user_id} during sync")
             except Exception as e:
                 print(f"Error saving user settings during sync: {e}")
 
-        # Get all conversations for the user
-        user_conversations = db.get_user_conversations(user_id)
-        print(f"Retrieved {len(user_conversations)} conversations for user {user_id}")
-
-        # Process incoming conversations
+        # Validate incoming conversations, then apply them and the deletions in one transaction
+        incoming_conversations = []
         for conv_data in request_conversations:
             try:
-                conversation = Conversation.model_validate(conv_data)
-                db.save_conversation(user_id, conversation)
-                print(f"Saved conversation {conversation.id} for user {user_id}")
+                incoming_conversations.append(Conversation.model_validate(conv_data))
             except Exception as e:
-                print(f"Error saving conversation: {e}")
+                print(f"Error validating conversation: {e}")
+        saved, conflicts = await db.sync_conversations(user_id, incoming_conversations, deleted_conversation_ids)
+        if saved or conflicts:
+            print(f"Saved {len(saved)} conversations for user {user_id} ({len(conflicts)} conflicts)")
+
+        # Read changes since the client's watermark (or everything for a full sync)
+        sync_time = datetime.datetime.now().timestamp() - SYNC_WATERMARK_OVERLAP
+        if full_sync:
+            user_conversations = await db.get_user_conversations(user_id)
+            deleted_since = []
+        else:
+            user_conversations = await db.get_conversations_changed_since(user_id, last_sync_time)
+            deleted_since = await db.get_deleted_conversation_ids_since(user_id, last_sync_time)
+            # The client already has what it just sent; it only needs the new versions (in "saved")
+            saved_versions = {(conversation.id, conversation.version) for conversation in saved}
+            user_conversations = [c for c in user_conversations if (c.id, c.version) not in saved_versions]
 
         # Get the user's settings
-        settings = db.get_user_settings(user_id)
-        print(f"Retrieved settings for user {user_id}")
+        settings = await db.get_user_settings(user_id)
 
-        # Return all conversations and settings
+        # Return the changed conversations and settings
         response = {
             "success": True,
             "message": "Sync successful",
+            "full_sync": full_sync,
+            "sync_time": datetime.datetime.fromtimestamp(sync_time).isoformat(),
             "conversations": user_conversations,
+            "deleted_conversation_ids": deleted_since,
+            "saved": [
+                {"id": conversation.id, "version": conversation.version, "updated_at": conversation.updated_at}
+                for conversation in saved
+            ],
+            "conflicts": conflicts,
         }
 
         # Add settings to the response if available
@@ -2691,7 +2393,7 @@ async def _sync_conversations(request: Request, user_id: str):
 @api_app.post("/sync")
 async def api_sync_conversations(request: Request, user_id: str = Depends(verify_discord_token)):
     """Sync conversations and settings"""
-    return await _sync_conversations(request, user_id)
+    return maybe_stream_json(await _sync_conversations(request, user_id), "conversations")
 
 @discordapi_app.post("/sync")
 async def discordapi_sync_conversations(request: Request, user_id: str = Depends(verify_discord_token)):
@@ -2701,7 +2403,7 @@ async def discordapi_sync_conversations(request: Request, user_id: str = Depends
     if isinstance(response, dict):
         response["deprecated"] = True
         response["deprecation_message"] = "This endpoint (/discordapi/sync) is deprecated. Please use /api/sync instead."
-    return response
+    return maybe_stream_json(response, "conversations")
 
 # Note: Server startup/shutdown events are now handled by the lifespan context manager above
 
@@ -2714,18 +2416,15 @@ async def store_code_verifier(request: Request):
     """Store a code verifier for a state"""
     try:
         body_text = await request.body()
-        data = json.loads(body_text.decode('utf-8'))
+        data = json_loads(body_text)
         state = data.get("state")
         code_verifier = data.get("code_verifier")
 
         if not state or not code_verifier:
             raise HTTPException(status_code=400, detail="Missing state or code_verifier")
 
-        # Store the code verifier
-        code_verifier_store.store_code_verifier(state, code_verifier)
-
-        # Clean up expired code verifiers
-        code_verifier_store.cleanup_expired()
+        # Store the code verifier (expires after 10 minutes)
+        await code_verifier_store.store_code_verifier(state, code_verifier)
 
         # Log success
         print(f"Successfully stored code verifier for state {state}")
@@ -2740,7 +2439,7 @@ async def store_code_verifier(request: Request):
 async def check_code_verifier(state: str):
     """Check if a code verifier exists for a state"""
     try:
-        code_verifier = code_verifier_store.get_code_verifier(state)
+        code_verifier = await code_verifier_store.get_code_verifier(state)
         if code_verifier:
             # Don't return the actual code verifier for security reasons
             # Just confirm it exists
@@ -2758,7 +2457,7 @@ async def check_code_verifier(state: str):
 @discordapi_app.get("/token")
 async def get_token(user_id: str = Depends(verify_discord_token)):
     """Get the token for a user"""
-    token_data = db.get_user_token(user_id)
+    token_data = await db.get_user_token(user_id)
     if not token_data:
         raise HTTPException(status_code=404, detail="No token found for this user")
 
@@ -2770,7 +2469,7 @@ async def get_token(user_id: str = Depends(verify_discord_token)):
 @discordapi_app.get("/token/{user_id}")
 async def get_token_by_user_id(user_id: str):
     """Get the token for a specific user by ID (for bot use)"""
-    token_data = db.get_user_token(user_id)
+    token_data = await db.get_user_token(user_id)
     if not token_data:
         raise HTTPException(status_code=404, detail="No token found for this user")
 
@@ -2781,7 +2480,7 @@ async def get_token_by_user_id(user_id: str):
 @discordapi_app.get("/check_auth/{user_id}")
 async def check_auth_status(user_id: str):
     """Check if a user is authenticated"""
-    token_data = db.get_user_token(user_id)
+    token_data = await db.get_user_token(user_id)
     if not token_data:
         return {"authenticated": False, "message": "User is not authenticated"}
 
@@ -2808,7 +2507,7 @@ async def check_auth_status(user_id: str):
 @discordapi_app.delete("/token")
 async def delete_token(user_id: str = Depends(verify_discord_token)):
     """Delete the token for a user"""
-    success = db.delete_user_token(user_id)
+    success = await db.delete_user_token(user_id)
     if not success:
         raise HTTPException(status_code=404, detail="No token found for this user")
 
@@ -2818,7 +2517,7 @@ async def delete_token(user_id: str = Depends(verify_discord_token)):
 @discordapi_app.delete("/token/{user_id}")
 async def delete_token_by_user_id(user_id: str):
     """Delete the token for a specific user by ID (for bot use)"""
-    success = db.delete_user_token(user_id)
+    success = await db.delete_user_token(user_id)
     if not success:
         raise HTTPException(status_code=404, detail="No token found for this user")
 
@@ -2841,8 +2540,15 @@ async def update_gurt_stats_internal(request: Request):
         raise HTTPException(status_code=403, detail="Forbidden")
 
     try:
-        stats_data = await request.json()
+        body = await request.body()
+        stats_data = json_loads(body)
         latest_gurt_stats = stats_data
+        redis_pool = getattr(app.state, "redis_pool", None)
+        if redis_pool is not None:
+            try:
+                await redis_pool.set(GURT_STATS_REDIS_KEY, body.decode("utf-8"), ex=GURT_STATS_TTL)
+            except Exception as e:
+                log.warning(f"Failed to store Gurt stats in Redis: {e}")
         # print(f"Received Gurt stats update at {datetime.datetime.now()}") # Optional: Log successful updates
         return {"success": True, "message": "Stats updated"}
     except json.JSONDecodeError:
@@ -2851,11 +2557,70 @@ async def update_gurt_stats_internal(request: Request):
         print(f"Error processing Gurt stats update: {e}")
         raise HTTPException(status_code=500, detail="Error processing stats update")
 
+# --- Internal Request Metrics ---
+def require_metrics_access(request: Request):
+    """Metrics need the INTERNAL_METRICS_SECRET bearer token, or, if it isn't set, a loopback client."""
+    if settings.INTERNAL_METRICS_SECRET:
+        if request.headers.get("Authorization") != f"Bearer {settings.INTERNAL_METRICS_SECRET}":
+            raise HTTPException(status_code=403, detail="Forbidden")
+    elif not request.client or request.client.host not in ("127.0.0.1", "::1", "localhost"):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+@app.get("/internal/metrics", include_in_schema=False) # Main app, like the Gurt stats push endpoint
+async def get_request_metrics(request: Request):
+    """Per-route request latency histograms recorded by RequestTimingMiddleware."""
+    require_metrics_access(request)
+    metrics = request_metrics.snapshot()
+    metrics["compression"] = list(compression_info())
+    return metrics
+
+def collect_api_metrics() -> List[MetricFamily]:
+    """Cache, upstream and pool metrics of this API process, read at scrape time."""
+    user_guild_cache = dependencies.user_guild_cache
+    caches = MetricFamily("api_cache_entries", "gauge", "Entries in the API's in-memory caches")
+    caches.add_sample({"cache": "discord_token"}, token_cache.get_stats()["cached_tokens"])
+    caches.add_sample({"cache": "user_guilds"}, user_guild_cache.get_stats()["cached_sessions"])
+    families = [
+        # Hit ratios: rate(..{event=~".*hits"}) / rate(..) per cache
+        stats_counters("api_cache_events_total", "API cache lookups by cache and outcome", "cache", {
+            "discord_token": token_cache.stats,
+            "user_guilds": user_guild_cache.stats,
+            "guild_metadata": guild_metadata.stats,
+        }),
+        stats_counters("api_upstream_events_total", "Discord REST and bot RPC calls by client and outcome", "client", {
+            "discord_rest": discord_rest.stats,
+            "bot_rpc": bot_rpc.stats,
+        }),
+        caches,
+    ]
+    families.extend(pg_pool_families({"api": getattr(app.state, "pg_pool", None)}))
+    families.extend(redis_pool_families({"api": getattr(app.state, "redis_pool", None)}))
+    return families
+
+REGISTRY.add_collector("api", collect_api_metrics)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_prometheus_metrics(request: Request):
+    """
+    This process's metrics registry in the Prometheus text format: request latency, caches, pools,
+    Postgres/Redis latency. The bot and Gurt serve theirs on METRICS_PORT / GURT_METRICS_PORT.
+    """
+    require_metrics_access(request)
+    return Response(content=REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
 # --- Public Endpoint to Get Stats ---
 @discordapi_app.get("/gurt/stats") # Add to the deprecated path for now
 @api_app.get("/gurt/stats") # Add to the new path as well
 async def get_gurt_stats_public():
     """Get latest internal statistics received from the Gurt bot."""
+    redis_pool = getattr(app.state, "redis_pool", None)
+    if redis_pool is not None:
+        try:
+            cached = await redis_pool.get(GURT_STATS_REDIS_KEY)
+            if cached is not None:
+                return Response(content=cached, media_type="application/json") # Already JSON; no re-encoding
+        except Exception as e:
+            log.warning(f"Failed to read Gurt stats from Redis: {e}")
     if latest_gurt_stats is None:
         raise HTTPException(status_code=503, detail="Gurt stats not available yet. Please wait for the Gurt bot to send an update.")
     return latest_gurt_stats
@@ -0,0 +1,288 @@
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+from fastapi import HTTPException
+
+# --- Logging ---
+log = logging.getLogger(__name__)
+
+DISCORD_USER_URL = "https://discord.com/api/v10/users/@me"
+DISCORD_USER_GUILDS_URL = f"{DISCORD_USER_URL}/guilds"
+REDIS_KEY_PREFIX = "api:discord_token:"
+INVALID_TOKEN_MARKER = "!" # Stored instead of a user ID for tokens Discord rejected
+
+
+class DiscordTokenCache:
+    """
+    Resolves Discord OAuth bearer tokens to user IDs, caching the result so authenticated requests
+    don't each cost a Discord round trip.
+
+    Results are kept in a small in-process cache and mirrored to Redis (when one is set) so every
+    API process shares them. Entries are keyed by a SHA-256 hash of the token; the raw token is never
+    stored. Valid tokens are cached for `ttl` seconds, rejected ones for `negative_ttl` seconds.
+    Concurrent lookups of the same uncached token share a single request to Discord.
+    """
+
+    def __init__(self, ttl: float = 300.0, negative_ttl: float = 30.0, max_entries: int = 10000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.http_session: Optional[aiohttp.ClientSession] = None
+        self.redis: Optional[Any] = None
+        self._entries: Dict[str, Tuple[str, float]] = {} # token hash -> (user ID or INVALID_TOKEN_MARKER, expires_at)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {"local_hits": 0, "redis_hits": 0, "negative_hits": 0, "upstream_calls": 0, "coalesced": 0, "upstream_errors": 0}
+
+    def set_http_session(self, session: Optional[aiohttp.ClientSession]):
+        self.http_session = session
+
+    def set_redis(self, redis: Optional[Any]):
+        self.redis = redis
+
+    @staticmethod
+    def token_key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    async def resolve(self, token: str) -> str:
+        """Returns the Discord user ID for the token, or raises HTTPException (401 for invalid tokens)."""
+        key = self.token_key(token)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[1] > time.monotonic():
+                self.stats["local_hits" if entry[0] != INVALID_TOKEN_MARKER else "negative_hits"] += 1
+                return self._result(entry[0])
+            del self._entries[key]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            task = asyncio.create_task(self._load(key, token))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded so one cancelled request doesn't cancel the lookup the others are waiting on
+        return self._result(await asyncio.shield(task))
+
+    def invalidate(self, token: str):
+        """Drops a token from the local cache (the Redis entry expires on its own)."""
+        self._entries.pop(self.token_key(token), None)
+
+    def _result(self, value: str) -> str:
+        if value == INVALID_TOKEN_MARKER:
+            raise HTTPException(status_code=401, detail="Invalid Discord token")
+        return value
+
+    def _store_local(self, key: str, value: str, ttl: float):
+        if len(self._entries) >= self.max_entries:
+            # Drop expired entries, then the oldest ones if that wasn't enough
+            now = time.monotonic()
+            for stale_key in [k for k, (_, expires_at) in self._entries.items() if expires_at <= now]:
+                del self._entries[stale_key]
+            while len(self._entries) >= self.max_entries:
+                del self._entries[next(iter(self._entries))]
+        self._entries[key] = (value, time.monotonic() + ttl)
+
+    async def _load(self, key: str, token: str) -> str:
+        """Checks Redis, then Discord. Returns the user ID or INVALID_TOKEN_MARKER."""
+        if self.redis is not None:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    value, remaining = await pipe.get(REDIS_KEY_PREFIX + key).ttl(REDIS_KEY_PREFIX + key).execute()
+                if value is not None:
+                    if isinstance(value, bytes):
+                        value = value.decode("utf-8")
+                    # Never keep it locally for longer than Redis still would
+                    ttl = self.negative_ttl if value == INVALID_TOKEN_MARKER else self.ttl
+                    self._store_local(key, value, min(ttl, remaining) if remaining and remaining > 0 else ttl)
+                    self.stats["redis_hits" if value != INVALID_TOKEN_MARKER else "negative_hits"] += 1
+                    return value
+            except Exception as e:
+                log.warning(f"Token cache: Redis lookup failed, falling back to Discord: {e}")
+
+        value, ttl = await self._fetch_user_id(token)
+        self._store_local(key, value, ttl)
+        if self.redis is not None:
+            try:
+                await self.redis.set(REDIS_KEY_PREFIX + key, value, ex=max(1, int(ttl)))
+            except Exception as e:
+                log.warning(f"Token cache: Failed to store token result in Redis: {e}")
+        return value
+
+    async def _fetch_user_id(self, token: str) -> Tuple[str, float]:
+        """Asks Discord who the token belongs to. Returns (user ID or INVALID_TOKEN_MARKER, cache TTL)."""
+        self.stats["upstream_calls"] += 1
+        session = self.http_session
+        owns_session = session is None or session.closed
+        if owns_session:
+            session = aiohttp.ClientSession()
+        try:
+            headers = {"Authorization": f"Bearer {token}"}
+            async with session.get(DISCORD_USER_URL, headers=headers) as resp:
+                if resp.status in (401, 403):
+                    return INVALID_TOKEN_MARKER, self.negative_ttl
+                if resp.status == 429:
+                    # Not the token's fault, so nothing is cached
+                    self.stats["upstream_errors"] += 1
+                    retry_after = resp.headers.get("Retry-After", "1")
+                    raise HTTPException(status_code=429, detail="Rate limited by Discord API. Please try again later.",
+                                        headers={"Retry-After": retry_after})
+                if resp.status != 200:
+                    self.stats["upstream_errors"] += 1
+                    log.warning(f"Token cache: Discord returned {resp.status} while verifying a token.")
+                    raise HTTPException(status_code=401, detail="Invalid Discord token")
+
+                user_data = await resp.json()
+                return str(user_data["id"]), self.ttl
+        except aiohttp.ClientError as e:
+            self.stats["upstream_errors"] += 1
+            log.error(f"Token cache: Error contacting Discord to verify a token: {e}")
+            raise HTTPException(status_code=502, detail="Error communicating with Discord API.")
+        finally:
+            if owns_session:
+                await session.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["cached_tokens"] = len(self._entries)
+        stats["inflight"] = len(self._inflight)
+        lookups = stats["local_hits"] + stats["redis_hits"] + stats["negative_hits"] + stats["upstream_calls"] + stats["coalesced"]
+        stats["hit_ratio"] = round((lookups - stats["upstream_calls"]) / lookups, 3) if lookups > 0 else 0
+        return stats
+
+
+class UserGuilds:
+    """A user's guild list from /users/@me/guilds plus a guild ID -> permission bits lookup."""
+    __slots__ = ("guilds", "permissions", "fetched_at")
+
+    def __init__(self, guilds: List[Dict[str, Any]]):
+        self.guilds = guilds
+        self.permissions: Dict[int, int] = {int(guild["id"]): int(guild.get("permissions", 0)) for guild in guilds}
+        self.fetched_at = time.monotonic()
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+
+class UserGuildCache:
+    """
+    Caches each dashboard session's guild list (keyed by a hash of its OAuth access token) so the
+    several guarded requests of one dashboard page share a single /users/@me/guilds call.
+
+    Entries younger than `ttl` are served as is. Entries up to `stale_ttl` old are served immediately
+    while a background refresh runs, and are also served if a refresh fails on a Discord rate limit or
+    outage. Concurrent fetches for the same session share one upstream request.
+    """
+
+    def __init__(self, ttl: float = 60.0, stale_ttl: float = 300.0, max_entries: int = 5000, max_retries: int = 3):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_retries = max_retries
+        self.http_session: Optional[aiohttp.ClientSession] = None
+        self._entries: Dict[str, UserGuilds] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "upstream_calls": 0, "coalesced": 0, "rate_limited": 0, "upstream_errors": 0}
+
+    def set_http_session(self, session: Optional[aiohttp.ClientSession]):
+        self.http_session = session
+
+    def invalidate(self, access_token: str):
+        self._entries.pop(DiscordTokenCache.token_key(access_token), None)
+
+    async def get_guilds(self, access_token: str, refresh: bool = False) -> UserGuilds:
+        """Returns the session's guilds, fetching them if missing, expired or refresh is set."""
+        key = DiscordTokenCache.token_key(access_token)
+        entry = self._entries.get(key)
+        if entry is not None and not refresh:
+            if entry.age < self.ttl:
+                self.stats["hits"] += 1
+                return entry
+            if entry.age < self.stale_ttl:
+                self.stats["stale_hits"] += 1
+                self._start_fetch(key, access_token, background=True)
+                return entry
+
+        if refresh:
+            self.stats["refreshes"] += 1
+        else:
+            self.stats["misses"] += 1
+        try:
+            return await asyncio.shield(self._start_fetch(key, access_token))
+        except HTTPException as e:
+            # Rather serve a recent list than fail a page load on a Discord rate limit or outage
+            if e.status_code in (429, 502) and entry is not None and entry.age < self.stale_ttl:
+                log.warning(f"Dashboard: Serving cached guild list ({entry.age:.0f}s old) after fetch failed with {e.status_code}.")
+                return entry
+            raise
+
+    def _start_fetch(self, key: str, access_token: str, background: bool = False) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is not None:
+            if not background:
+                self.stats["coalesced"] += 1
+            return task
+        task = asyncio.create_task(self._fetch(key, access_token))
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._fetch_done(key, done, background))
+        return task
+
+    def _fetch_done(self, key: str, task: asyncio.Task, background: bool):
+        self._inflight.pop(key, None)
+        if background and not task.cancelled() and task.exception() is not None:
+            log.warning(f"Dashboard: Background guild list refresh failed: {task.exception()}")
+
+    async def _fetch(self, key: str, access_token: str) -> UserGuilds:
+        session = self.http_session
+        if session is None or session.closed:
+            log.error("Dashboard: HTTP session not ready for guild list fetch.")
+            raise HTTPException(status_code=500, detail="Internal server error: HTTP session not ready.")
+
+        user_headers = {"Authorization": f"Bearer {access_token}"}
+        retry_after = 0.0
+        for attempt in range(1, self.max_retries + 1):
+            if retry_after > 0:
+                await asyncio.sleep(retry_after)
+            self.stats["upstream_calls"] += 1
+            try:
+                async with session.get(DISCORD_USER_GUILDS_URL, headers=user_headers) as resp:
+                    if resp.status == 429:
+                        self.stats["rate_limited"] += 1
+                        try:
+                            retry_after = float(resp.headers.get("X-RateLimit-Reset-After", resp.headers.get("Retry-After", 1)))
+                        except (ValueError, TypeError):
+                            retry_after = 1.0 # Default wait time if header is invalid
+                        is_global = resp.headers.get("X-RateLimit-Global") is not None
+                        if is_global: retry_after = max(retry_after, 5) # Wait longer for global limits
+                        log.warning(f"Dashboard: Discord API rate limit hit fetching user guilds. Global: {is_global}, "
+                                    f"Reset after: {retry_after}s, Retry: {attempt}/{self.max_retries}")
+                        continue
+
+                    if resp.status == 401:
+                        # The session's token is dead; drop anything cached for it
+                        self._entries.pop(key, None)
+                        raise HTTPException(status_code=401, detail="Discord token invalid or expired. Please re-login.")
+
+                    resp.raise_for_status()
+                    entry = UserGuilds(await resp.json())
+            except aiohttp.ClientError as e:
+                self.stats["upstream_errors"] += 1
+                log.error(f"Dashboard: HTTP error fetching user guilds: {e}")
+                raise HTTPException(status_code=502, detail="Error communicating with Discord API.")
+
+            if len(self._entries) >= self.max_entries and key not in self._entries:
+                del self._entries[next(iter(self._entries))] # Oldest session first
+            self._entries[key] = entry
+            return entry
+
+        raise HTTPException(status_code=429, detail="Rate limited by Discord API. Please try again later.")
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["cached_sessions"] = len(self._entries)
+        stats["inflight"] = len(self._inflight)
+        return stats
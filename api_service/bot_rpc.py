@@ -0,0 +1,130 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+# --- Logging ---
+log = logging.getLogger(__name__)
+
+# Redis keys shared with the bot side (cogs/bot_rpc_cog.py)
+RPC_REQUEST_QUEUE = "bot_rpc:requests" # List of JSON requests, consumed by the bot
+RPC_REPLY_PREFIX = "bot_rpc:reply:" # + request ID; list the bot pushes the JSON reply to
+RPC_HEARTBEAT_KEY = "bot_rpc:heartbeat" # Refreshed by the bot while it serves requests
+RPC_HEARTBEAT_TTL = 30
+RPC_REPLY_TTL = 60 # Unread replies (caller timed out) expire after this many seconds
+
+
+def standalone_mode() -> bool:
+    """Whether the API runs as its own worker processes (see run_unified_api.py) rather than inside the bot."""
+    return os.getenv("API_STANDALONE", "").lower() in ("1", "true", "yes")
+
+
+class BotRpcError(Exception):
+    """A bot RPC call that failed: bot not reachable, timed out, or the handler raised."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Bot RPC error {status}: {message}")
+        self.status = status
+        self.message = message
+
+
+class BotRpcClient:
+    """
+    Calls operations that need the live bot (its gateway connection, loaded cogs or command tree)
+    from API worker processes. Requests are pushed onto a Redis list served by the bot's BotRpc
+    cog; each caller waits on its own reply key, so any number of workers can share the queue.
+    """
+
+    def __init__(self, redis: Optional[Any] = None, timeout: float = 10.0):
+        self.redis = redis
+        self.timeout = timeout
+        self.stats = {"calls": 0, "errors": 0, "timeouts": 0}
+
+    def set_redis(self, redis: Optional[Any]):
+        self.redis = redis
+
+    async def is_bot_online(self) -> bool:
+        if self.redis is None:
+            return False
+        try:
+            return bool(await self.redis.exists(RPC_HEARTBEAT_KEY))
+        except Exception as e:
+            log.warning(f"Bot RPC: Heartbeat check failed: {e}")
+            return False
+
+    async def call(self, method: str, params: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> Any:
+        """Runs method on the bot and returns its result. Raises BotRpcError on failure."""
+        if self.redis is None:
+            raise BotRpcError(503, "Redis not available for bot RPC")
+        timeout = timeout or self.timeout
+        request_id = uuid.uuid4().hex
+        reply_key = RPC_REPLY_PREFIX + request_id
+        request = {
+            "id": request_id,
+            "method": method,
+            "params": params or {},
+            "reply_to": reply_key,
+            "deadline": time.time() + timeout, # The bot drops requests nobody waits for anymore
+        }
+        self.stats["calls"] += 1
+        try:
+            await self.redis.rpush(RPC_REQUEST_QUEUE, json.dumps(request))
+            # BLPOP takes whole seconds; the deadline above keeps the bot side exact
+            reply = await self.redis.blpop(reply_key, timeout=max(1, int(timeout + 0.999)))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats["errors"] += 1
+            raise BotRpcError(503, f"Bot RPC transport error: {e}")
+
+        if reply is None:
+            self.stats["timeouts"] += 1
+            raise BotRpcError(504, f"Bot did not answer '{method}' within {timeout}s")
+        response = json.loads(reply[1])
+        if not response.get("ok"):
+            self.stats["errors"] += 1
+            raise BotRpcError(response.get("status", 500), response.get("error", "Unknown error"))
+        return response.get("result")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats)
+
+
+class RemoteBot:
+    """
+    Stands in for the bot instance (global_bot_accessor) in standalone API workers.
+
+    Exposes the worker's own pg_pool and redis, which is all settings_manager and the
+    database-backed endpoints use, and reports itself as not ready so code that reads the
+    gateway cache falls back to Redis/REST. Operations that need the live bot go through rpc.
+    """
+
+    is_remote = True
+
+    def __init__(self, pg_pool: Optional[Any], redis: Optional[Any], rpc: BotRpcClient, catalogue_ttl: float = 10.0):
+        self.pg_pool = pg_pool
+        self.redis = redis
+        self.rpc = rpc
+        self.catalogue_ttl = catalogue_ttl
+        self._catalogue: Optional[Dict[str, Any]] = None
+        self._catalogue_fetched_at = 0.0
+        self._catalogue_lock = asyncio.Lock()
+
+    def is_ready(self) -> bool:
+        return False
+
+    def get_guild(self, guild_id: int):
+        return None
+
+    async def fetch_cog_catalogue(self) -> Dict[str, Any]:
+        """The bot's cog catalogue (see cog_catalogue.py), fetched over RPC and cached for catalogue_ttl seconds."""
+        if self._catalogue is not None and time.monotonic() - self._catalogue_fetched_at < self.catalogue_ttl:
+            return self._catalogue
+        async with self._catalogue_lock:
+            if self._catalogue is None or time.monotonic() - self._catalogue_fetched_at >= self.catalogue_ttl:
+                self._catalogue = await self.rpc.call("cog_catalogue")
+                self._catalogue_fetched_at = time.monotonic()
+        return self._catalogue
@@ -1,100 +1,109 @@
 """
 Code verifier store for the API service.
 
-This module provides a simple in-memory store for code verifiers used in the OAuth flow.
-It also includes a file-based backup to ensure code verifiers persist across restarts.
+Stores the PKCE code verifiers used in the OAuth flow in Redis, keyed by the OAuth state, with a
+native 10 minute expiry (SET ... EX). pop_code_verifier() reads and deletes a verifier in one
+GETDEL (or a MULTI'd GET+DEL on servers older than Redis 6.2), so each verifier can be used once
+even with several API workers. Until set_redis() is called (e.g. in tests), or if Redis fails, an
+in-process dict is used instead.
 """
 
-import os
-import json
 import time
-from typing import Dict, Optional, Any
+from typing import Any, Dict, Optional
 
-# In-memory storage for code verifiers
-code_verifiers: Dict[str, Dict[str, Any]] = {}
-
-# File path for persistent storage
-STORAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
-STORAGE_FILE = os.path.join(STORAGE_DIR, "code_verifiers.json")
-
-# Ensure the storage directory exists
-os.makedirs(STORAGE_DIR, exist_ok=True)
-
-def _load_from_file() -> None:
-    """Load code verifiers from file."""
-    try:
-        if os.path.exists(STORAGE_FILE):
-            with open(STORAGE_FILE, 'r') as f:
-                stored_data = json.load(f)
-
-                # Filter out expired entries (older than 10 minutes)
-                current_time = time.time()
-                for state, data in stored_data.items():
-                    if data.get("timestamp", 0) + 600 > current_time:  # 10 minutes = 600 seconds
-                        code_verifiers[state] = data
-
-                print(f"Loaded {len(code_verifiers)} valid code verifiers from file")
-    except Exception as e:
-        print(f"Error loading code verifiers from file: {e}")
-
-def _save_to_file() -> None:
-    """Save code verifiers to file."""
-    try:
-        with open(STORAGE_FILE, 'w') as f:
-            json.dump(code_verifiers, f)
-        print(f"Saved {len(code_verifiers)} code verifiers to file")
-    except Exception as e:
-        print(f"Error saving code verifiers to file: {e}")
+REDIS_KEY_PREFIX = "oauth:code_verifier:"
+CODE_VERIFIER_TTL = 600 # 10 minutes
 
-# Load existing code verifiers on module import
-_load_from_file()
+_redis: Optional[Any] = None
+_getdel_supported = True # Cleared once the server rejects GETDEL (Redis < 6.2)
 
-def store_code_verifier(state: str, code_verifier: str) -> None:
-    """Store a code verifier for a state."""
-    # Store with timestamp for expiration
-    code_verifiers[state] = {
-        "code_verifier": code_verifier,
-        "timestamp": time.time()
-    }
-    print(f"Stored code verifier for state {state}: {code_verifier[:10]}...")
-
-    # Save to file for persistence
-    _save_to_file()
-
-def get_code_verifier(state: str) -> Optional[str]:
-    """Get the code verifier for a state."""
-    # Check if state exists and is not expired
-    data = code_verifiers.get(state)
-    if data:
-        # Check if expired (older than 10 minutes)
-        if data.get("timestamp", 0) + 600 > time.time():
-            return data.get("code_verifier")
-        else:
-            # Remove expired entry
-            remove_code_verifier(state)
-            print(f"Code verifier for state {state} has expired")
-    return None
+# In-memory fallback: state -> {"code_verifier", "timestamp"}
+code_verifiers: Dict[str, Dict[str, Any]] = {}
 
-def remove_code_verifier(state: str) -> None:
+def set_redis(redis: Optional[Any]) -> None:
+    """Use this Redis client (redis.asyncio, decode_responses=True); None switches back to memory."""
+    global _redis
+    _redis = redis
+
+def _key(state: str) -> str:
+    return REDIS_KEY_PREFIX + state
+
+def _is_unknown_command(error: Exception) -> bool:
+    return "unknown command" in str(error).lower()
+
+async def _redis_getdel(key: str) -> Optional[str]:
+    global _getdel_supported
+    if _getdel_supported:
+        try:
+            return await _redis.getdel(key)
+        except Exception as e:
+            if not _is_unknown_command(e):
+                raise
+            _getdel_supported = False
+            print("Redis server does not support GETDEL, using GET+DEL in a transaction")
+    async with _redis.pipeline(transaction=True) as pipe:
+        pipe.get(key)
+        pipe.delete(key)
+        code_verifier, _ = await pipe.execute()
+    return code_verifier
+
+def _memory_get(state: str, remove: bool) -> Optional[str]:
+    data = code_verifiers.pop(state, None) if remove else code_verifiers.get(state)
+    if data is None:
+        return None
+    if data["timestamp"] + CODE_VERIFIER_TTL <= time.time():
+        code_verifiers.pop(state, None)
+        print(f"Code verifier for state {state} has expired")
+        return None
+    return data["code_verifier"]
+
+async def store_code_verifier(state: str, code_verifier: str) -> None:
+    """Store a code verifier for a state (expires after CODE_VERIFIER_TTL seconds)."""
+    if _redis is not None:
+        try:
+            await _redis.set(_key(state), code_verifier, ex=CODE_VERIFIER_TTL)
+            return
+        except Exception as e:
+            print(f"Error storing code verifier in Redis, keeping it in memory: {e}")
+    cleanup_expired()
+    code_verifiers[state] = {"code_verifier": code_verifier, "timestamp": time.time()}
+
+async def get_code_verifier(state: str) -> Optional[str]:
+    """Get the code verifier for a state without consuming it."""
+    if _redis is not None:
+        try:
+            code_verifier = await _redis.get(_key(state))
+            if code_verifier is not None:
+                return code_verifier
+        except Exception as e:
+            print(f"Error reading code verifier from Redis: {e}")
+    return _memory_get(state, remove=False)
+
+async def pop_code_verifier(state: str) -> Optional[str]:
+    """Get the code verifier for a state and remove it, atomically, so it is only used once."""
+    if _redis is not None:
+        try:
+            code_verifier = await _redis_getdel(_key(state))
+            if code_verifier is not None:
+                return code_verifier
+        except Exception as e:
+            print(f"Error consuming code verifier from Redis: {e}")
+    return _memory_get(state, remove=True)
+
+async def remove_code_verifier(state: str) -> None:
     """Remove a code verifier for a state."""
-    if state in code_verifiers:
-        del code_verifiers[state]
-        print(f"Removed code verifier for state {state}")
-        # Update the file
-        _save_to_file()
+    if _redis is not None:
+        try:
+            await _redis.delete(_key(state))
+        except Exception as e:
+            print(f"Error removing code verifier from Redis: {e}")
+    code_verifiers.pop(state, None)
 
 def cleanup_expired() -> None:
-    """Remove all expired code verifiers."""
+    """Remove expired code verifiers from the in-memory fallback (Redis expires them itself)."""
     current_time = time.time()
-    expired_states = []
-
-    for state, data in code_verifiers.items():
-        if data.get("timestamp", 0) + 600 <= current_time:  # 10 minutes = 600 seconds
-            expired_states.append(state)
-
+    expired_states = [state for state, data in code_verifiers.items() if data["timestamp"] + CODE_VERIFIER_TTL <= current_time]
     for state in expired_states:
         del code_verifiers[state]
-
     if expired_states:
         print(f"Cleaned up {len(expired_states)} expired code verifiers")
-        _save_to_file()
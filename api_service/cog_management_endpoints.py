@@ -5,7 +5,7 @@ These endpoints provide functionality for managing cogs and commands.
 
 import logging
 from typing import List, Dict, Optional, Any
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, Body
 from pydantic import BaseModel, Field
 
 # Import dependencies from the new dependencies module (use absolute path)
@@ -13,6 +13,9 @@ from api_service.dependencies import get_dashboard_user, verify_dashboard_guild_
 
 # Import settings_manager for database access (use absolute path)
 import settings_manager
+from cog_catalogue import get_guild_cogs_listing, etag_matches, resolve_cog_catalogue
+from global_bot_accessor import get_bot_instance
+from api_service.bot_rpc import BotRpcError
 
 # Set up logging
 log = logging.getLogger(__name__)
@@ -28,66 +31,42 @@ router = APIRouter(tags=["Cog Management"])
 @router.get("/guilds/{guild_id}/cogs", response_model=List[CogInfo])
 async def get_guild_cogs(
     guild_id: int,
+    request: Request,
+    response: Response,
     _user: dict = Depends(get_dashboard_user),
     _admin: bool = Depends(verify_dashboard_guild_admin)
 ):
-    """Get all cogs and their commands for a guild."""
+    """
+    Get all cogs and their commands for a guild.
+    Uses the precomputed cog catalogue plus one toggles query; an unchanged listing returns 304 for a matching If-None-Match.
+    """
     try:
-        # Check if bot instance is available via discord_bot_sync_api
-        try:
-            import discord_bot_sync_api
-            bot = discord_bot_sync_api.bot_instance
-            if not bot:
-                raise HTTPException(
-                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                    detail="Bot instance not available"
-                )
-        except ImportError:
+        # The bot, or in standalone API workers its RemoteBot stand-in (catalogue over RPC)
+        bot = get_bot_instance()
+        if not bot:
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="Bot sync API not available"
+                detail="Bot instance not available"
             )
 
-        # Get all cogs from the bot
-        cogs_list = []
-        for cog_name, cog in bot.cogs.items():
-            # Get enabled status from settings_manager
-            is_enabled = await settings_manager.is_cog_enabled(guild_id, cog_name, default_enabled=True)
-
-            # Get commands for this cog
-            commands_list = []
-            for command in cog.get_commands():
-                # Get command enabled status
-                cmd_enabled = await settings_manager.is_command_enabled(guild_id, command.qualified_name, default_enabled=True)
-                commands_list.append({
-                    "name": command.qualified_name,
-                    "description": command.help or "No description available",
-                    "enabled": cmd_enabled
-                })
-
-            # Add slash commands if any
-            app_commands = [cmd for cmd in bot.tree.get_commands() if hasattr(cmd, 'cog') and cmd.cog and cmd.cog.qualified_name == cog_name]
-            for cmd in app_commands:
-                # Get command enabled status
-                cmd_enabled = await settings_manager.is_command_enabled(guild_id, cmd.name, default_enabled=True)
-                if not any(c["name"] == cmd.name for c in commands_list):  # Avoid duplicates
-                    commands_list.append({
-                        "name": cmd.name,
-                        "description": cmd.description or "No description available",
-                        "enabled": cmd_enabled
-                    })
-
-            cogs_list.append(CogInfo(
-                name=cog_name,
-                description=cog.__doc__ or "No description available",
-                enabled=is_enabled,
-                commands=commands_list
-            ))
-
+        result = await get_guild_cogs_listing(bot, guild_id)
+        if result is None:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Error getting cog and command settings from database"
+            )
+        cogs_list, etag = result
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "private, no-cache"
         return cogs_list
     except HTTPException:
         # Re-raise HTTP exceptions
         raise
+    except BotRpcError as e:
+        log.error(f"Bot RPC failed for guild {guild_id}: {e}")
+        raise HTTPException(status_code=e.status if e.status in (503, 504) else 502, detail=f"Bot unavailable: {e.message}")
     except Exception as e:
         log.error(f"Error getting cogs for guild {guild_id}: {e}")
         raise HTTPException(
@@ -106,7 +85,6 @@ async def update_cog_status(
     """Enable or disable a cog for a guild."""
     try:
         # Check if settings_manager is available
-        from global_bot_accessor import get_bot_instance
         bot = get_bot_instance()
         if not settings_manager or not bot or not bot.pg_pool:
             raise HTTPException(
@@ -114,31 +92,20 @@ async def update_cog_status(
                 detail="Settings manager or database connection not available"
             )
 
-        # Check if the cog exists
-        try:
-            import discord_bot_sync_api
-            bot = discord_bot_sync_api.bot_instance
-            if not bot:
-                raise HTTPException(
-                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                    detail="Bot instance not available"
-                )
-
-            if cog_name not in bot.cogs:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Cog '{cog_name}' not found"
-                )
-
-            # Check if it's a core cog
-            if cog_name in bot.core_cogs:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Core cog '{cog_name}' cannot be disabled"
-                )
-        except ImportError:
-            # If we can't import the bot, we'll just assume the cog exists
-            log.warning("Bot sync API not available, skipping cog existence check")
+        # Check if the cog exists (the catalogue comes over RPC in standalone API workers)
+        catalogue = await resolve_cog_catalogue(bot)
+        if cog_name not in {cog["name"] for cog in catalogue["cogs"]}:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Cog '{cog_name}' not found"
+            )
+
+        # Check if it's a core cog
+        if cog_name in catalogue.get("core_cogs", []):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Core cog '{cog_name}' cannot be disabled"
+            )
 
         # Update the cog enabled status
         success = await settings_manager.set_cog_enabled(guild_id, cog_name, enabled)
@@ -152,6 +119,9 @@ async def update_cog_status(
     except HTTPException:
         # Re-raise HTTP exceptions
         raise
+    except BotRpcError as e:
+        log.error(f"Bot RPC failed for guild {guild_id}: {e}")
+        raise HTTPException(status_code=e.status if e.status in (503, 504) else 502, detail=f"Bot unavailable: {e.message}")
     except Exception as e:
         log.error(f"Error updating cog status for guild {guild_id}: {e}")
         raise HTTPException(
@@ -170,7 +140,6 @@ async def update_command_status(
     """Enable or disable a command for a guild."""
     try:
         # Check if settings_manager is available
-        from global_bot_accessor import get_bot_instance
         bot = get_bot_instance()
         if not settings_manager or not bot or not bot.pg_pool:
             raise HTTPException(
@@ -178,29 +147,19 @@ async def update_command_status(
                 detail="Settings manager or database connection not available"
             )
 
-        # Check if the command exists
-        try:
-            import discord_bot_sync_api
-            bot = discord_bot_sync_api.bot_instance
-            if not bot:
-                raise HTTPException(
-                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                    detail="Bot instance not available"
-                )
-
-            # Check if it's a prefix command
-            command = bot.get_command(command_name)
-            if not command:
-                # Check if it's an app command
-                app_commands = [cmd for cmd in bot.tree.get_commands() if cmd.name == command_name]
-                if not app_commands:
-                    raise HTTPException(
-                        status_code=status.HTTP_404_NOT_FOUND,
-                        detail=f"Command '{command_name}' not found"
-                    )
-        except ImportError:
-            # If we can't import the bot, we'll just assume the command exists
-            log.warning("Bot sync API not available, skipping command existence check")
+        # Check if the command exists (asked over RPC in standalone API workers)
+        if getattr(bot, "is_remote", False):
+            command_exists = await bot.rpc.call("command_exists", {"command_name": command_name})
+        else:
+            # Check if it's a prefix command, then if it's an app command
+            command_exists = bool(bot.get_command(command_name)) or any(
+                cmd.name == command_name for cmd in bot.tree.get_commands()
+            )
+        if not command_exists:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Command '{command_name}' not found"
+            )
 
         # Update the command enabled status
         success = await settings_manager.set_command_enabled(guild_id, command_name, enabled)
@@ -214,6 +173,9 @@ async def update_command_status(
     except HTTPException:
         # Re-raise HTTP exceptions
         raise
+    except BotRpcError as e:
+        log.error(f"Bot RPC failed for guild {guild_id}: {e}")
+        raise HTTPException(status_code=e.status if e.status in (503, 504) else 502, detail=f"Bot unavailable: {e.message}")
     except Exception as e:
         log.error(f"Error updating command status for guild {guild_id}: {e}")
         raise HTTPException(
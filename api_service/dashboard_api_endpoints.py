@@ -13,6 +13,7 @@ DEFAULT_PREFIX = "!"
 
 # Import dependencies using absolute paths
 from api_service.dependencies import get_dashboard_user, verify_dashboard_guild_admin
+from api_service.bot_rpc import BotRpcError
 
 # Import models using absolute paths
 from api_service.dashboard_models import (
@@ -677,11 +678,16 @@ async def sync_guild_commands(
 ):
     """Sync commands for a guild to apply customizations."""
     try:
-        # This endpoint would trigger a command sync for the guild
-        # In a real implementation, this would communicate with the bot to sync commands
-        # For now, we'll just return a success message
-        # TODO: Implement actual command syncing logic
-        return {"message": "Command sync requested. This may take a moment to complete."}
+        # The sync runs in the bot process (on its own event loop), reached over the bot RPC
+        from api_service.api_server import bot_rpc
+        result = await bot_rpc.call("sync_guild_commands", {"guild_id": guild_id}, timeout=30.0)
+        return {"message": f"Synced {result['synced']} commands for the guild.", "synced": result["synced"]}
+    except BotRpcError as e:
+        log.error(f"Error syncing commands for guild {guild_id}: {e}")
+        raise HTTPException(
+            status_code=e.status if e.status in (503, 504) else status.HTTP_502_BAD_GATEWAY,
+            detail=f"Error syncing commands: {e.message}"
+        )
     except Exception as e:
         log.error(f"Error syncing commands for guild {guild_id}: {e}")
         raise HTTPException(
@@ -773,7 +779,7 @@ async def get_global_settings(
                 detail="User ID not found in session"
             )
 
-        user_settings = db.get_user_settings(user_id)
+        user_settings = await db.get_user_settings(user_id)
         if not user_settings:
             # Return default settings if none exist
             return GlobalSettings(
@@ -874,7 +880,7 @@ async def update_global_settings(
             )
 
         # Save user settings to the database
-        updated_settings = db.save_user_settings(user_id, user_settings)
+        updated_settings = await db.save_user_settings(user_id, user_settings)
         if not updated_settings:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1,15 +1,81 @@
 import os
 import json
+import asyncio
 import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Iterable, Tuple
 # Use absolute import for api_models
 from api_service.api_models import Conversation, UserSettings, Message
+from db.sqlite_pool import SQLitePool
+
+# Tombstones of deleted conversations are kept this long (seconds). Clients whose last sync is older
+# than this can't be sent an incremental sync and get a full one instead.
+TOMBSTONE_RETENTION = 30 * 86400
+
+# ============= Schema =============
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    user_id TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    data TEXT NOT NULL,          -- Conversation as JSON
+    updated_at REAL NOT NULL,    -- Unix timestamp of Conversation.updated_at
+    version INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, conversation_id)
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_user_updated ON conversations (user_id, updated_at);
+
+CREATE TABLE IF NOT EXISTS conversation_tombstones (
+    user_id TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    version INTEGER NOT NULL,    -- Version the conversation was deleted at
+    deleted_at REAL NOT NULL,
+    PRIMARY KEY (user_id, conversation_id)
+);
+CREATE INDEX IF NOT EXISTS idx_tombstones_user_deleted ON conversation_tombstones (user_id, deleted_at);
+
+CREATE TABLE IF NOT EXISTS user_settings (
+    user_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,          -- UserSettings as JSON
+    updated_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS user_tokens (
+    user_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,          -- Token data as JSON
+    updated_at REAL NOT NULL
+);
+"""
+
+UPSERT_CONVERSATION = """
+    INSERT INTO conversations (user_id, conversation_id, data, updated_at, version) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, conversation_id) DO UPDATE SET
+        data = excluded.data, updated_at = excluded.updated_at, version = excluded.version
+"""
+UPSERT_SETTINGS = """
+    INSERT INTO user_settings (user_id, data, updated_at) VALUES (?, ?, ?)
+    ON CONFLICT (user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+"""
+UPSERT_TOKEN = """
+    INSERT INTO user_tokens (user_id, data, updated_at) VALUES (?, ?, ?)
+    ON CONFLICT (user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at
+"""
 
 # ============= Database Class =============
 
 class Database:
+    """
+    Conversations, settings and tokens for the API service, stored in SQLite (WAL mode) through
+    SQLitePool. Every write upserts only the rows it changes; settings and token writes are batched
+    into shared transactions by the pool's writer. Conversations are versioned and deletions leave
+    tombstones, so clients can sync incrementally (see sync_conversations). The JSON files used by
+    earlier versions are imported once by initialize() and then renamed to *.migrated.
+    """
+
     def __init__(self, data_dir="data"):
         self.data_dir = data_dir
+        self.db_path = os.path.join(data_dir, "api_data.db")
+
+        # Legacy JSON stores, only read by migrate_json_files()
         self.conversations_file = os.path.join(data_dir, "conversations.json")
         self.settings_file = os.path.join(data_dir, "user_settings.json")
         self.tokens_file = os.path.join(data_dir, "user_tokens.json")
@@ -17,189 +83,246 @@ class Database:
         # Create data directory if it doesn't exist
         os.makedirs(data_dir, exist_ok=True)
 
-        # In-memory storage
-        self.conversations: Dict[str, Dict[str, Conversation]] = {}  # user_id -> conversation_id -> Conversation
-        self.user_settings: Dict[str, UserSettings] = {}  # user_id -> UserSettings
-        self.user_tokens: Dict[str, Dict[str, Any]] = {}  # user_id -> token_data
-
-        # Load data from files
-        self.load_data()
-
-    def load_data(self):
-        """Load all data from files"""
-        self.load_conversations()
-        self.load_user_settings()
-        self.load_user_tokens()
-
-    def save_data(self):
-        """Save all data to files"""
-        self.save_conversations()
-        self.save_all_user_settings()
-        self.save_user_tokens()
-
-    def load_conversations(self):
-        """Load conversations from file"""
-        if os.path.exists(self.conversations_file):
+        self.pool = SQLitePool(self.db_path)
+
+    async def initialize(self):
+        """Creates the tables and imports the legacy JSON files if they are still present"""
+        async with self.pool.transaction() as conn:
+            await conn.executescript(SCHEMA)
+            # Databases created before conversations were versioned
+            async with conn.execute("PRAGMA table_info(conversations)") as cursor:
+                columns = {row[1] for row in await cursor.fetchall()}
+            if "version" not in columns:
+                await conn.execute("ALTER TABLE conversations ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            await conn.execute(
+                "DELETE FROM conversation_tombstones WHERE deleted_at < ?",
+                (datetime.datetime.now().timestamp() - TOMBSTONE_RETENTION,)
+            )
+        await self.migrate_json_files()
+
+    async def close(self):
+        """Flushes pending writes and closes the database"""
+        await self.pool.close()
+
+    # ============= Migration =============
+
+    @staticmethod
+    def _read_json_file(path: str) -> Any:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    async def migrate_json_files(self):
+        """
+        Imports conversations.json, user_settings.json and user_tokens.json into the database.
+        Rows that already exist are kept. Each file is renamed to <name>.migrated once imported.
+        """
+        migrations = [
+            (self.conversations_file, self._conversation_rows_from_json,
+             "INSERT OR IGNORE INTO conversations (user_id, conversation_id, data, updated_at) VALUES (?, ?, ?, ?)"),
+            (self.settings_file, self._settings_rows_from_json,
+             "INSERT OR IGNORE INTO user_settings (user_id, data, updated_at) VALUES (?, ?, ?)"),
+            (self.tokens_file, self._token_rows_from_json,
+             "INSERT OR IGNORE INTO user_tokens (user_id, data, updated_at) VALUES (?, ?, ?)"),
+        ]
+        for path, to_rows, insert_sql in migrations:
+            if not os.path.exists(path):
+                continue
             try:
-                with open(self.conversations_file, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    # Convert to Conversation objects
-                    self.conversations = {
-                        user_id: {
-                            conv_id: Conversation.model_validate(conv_data)
-                            for conv_id, conv_data in user_convs.items()
-                        }
-                        for user_id, user_convs in data.items()
-                    }
-                print(f"Loaded conversations for {len(self.conversations)} users")
+                data = await asyncio.to_thread(self._read_json_file, path)
+                rows = to_rows(data)
+                async with self.pool.transaction() as conn:
+                    await conn.executemany(insert_sql, rows)
+                os.replace(path, path + ".migrated")
+                print(f"Migrated {len(rows)} rows from {path} into {self.db_path}")
             except Exception as e:
-                print(f"Error loading conversations: {e}")
-                self.conversations = {}
-
-    def save_conversations(self):
-        """Save conversations to file"""
-        try:
-            # Convert to JSON-serializable format
-            serializable_data = {
-                user_id: {
-                    conv_id: conv.model_dump()
-                    for conv_id, conv in user_convs.items()
-                }
-                for user_id, user_convs in self.conversations.items()
-            }
-            with open(self.conversations_file, "w", encoding="utf-8") as f:
-                json.dump(serializable_data, f, indent=2, default=str, ensure_ascii=False)
-        except Exception as e:
-            print(f"Error saving conversations: {e}")
-
-    def load_user_settings(self):
-        """Load user settings from file"""
-        if os.path.exists(self.settings_file):
+                print(f"Error migrating {path}: {e}")
+
+    @staticmethod
+    def _conversation_rows_from_json(data: Dict[str, Dict[str, Any]]) -> List[tuple]:
+        rows = []
+        for user_id, user_convs in data.items():
+            for conv_data in user_convs.values():
+                try:
+                    conversation = Conversation.model_validate(conv_data)
+                except Exception as e:
+                    print(f"Skipping invalid conversation for user {user_id} during migration: {e}")
+                    continue
+                rows.append((user_id, conversation.id, conversation.model_dump_json(), conversation.updated_at.timestamp()))
+        return rows
+
+    @staticmethod
+    def _settings_rows_from_json(data: Dict[str, Any]) -> List[tuple]:
+        rows = []
+        for user_id, settings_data in data.items():
             try:
-                with open(self.settings_file, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    # Convert to UserSettings objects
-                    self.user_settings = {
-                        user_id: UserSettings.model_validate(settings_data)
-                        for user_id, settings_data in data.items()
-                    }
-                print(f"Loaded settings for {len(self.user_settings)} users")
+                settings = UserSettings.model_validate(settings_data)
             except Exception as e:
-                print(f"Error loading user settings: {e}")
-                self.user_settings = {}
-
-    def save_all_user_settings(self):
-        """Save all user settings to file"""
-        try:
-            # Convert to JSON-serializable format
-            serializable_data = {
-                user_id: settings.model_dump()
-                for user_id, settings in self.user_settings.items()
-            }
-            with open(self.settings_file, "w", encoding="utf-8") as f:
-                json.dump(serializable_data, f, indent=2, default=str, ensure_ascii=False)
-        except Exception as e:
-            print(f"Error saving user settings: {e}")
+                print(f"Skipping invalid settings for user {user_id} during migration: {e}")
+                continue
+            rows.append((user_id, settings.model_dump_json(), settings.last_updated.timestamp()))
+        return rows
+
+    @staticmethod
+    def _token_rows_from_json(data: Dict[str, Dict[str, Any]]) -> List[tuple]:
+        now = datetime.datetime.now().timestamp()
+        return [(user_id, json.dumps(token_data, default=str, ensure_ascii=False), now) for user_id, token_data in data.items()]
 
     # ============= Conversation Methods =============
 
-    def get_user_conversations(self, user_id: str) -> List[Conversation]:
-        """Get all conversations for a user"""
-        return list(self.conversations.get(user_id, {}).values())
+    @staticmethod
+    def _conversation_from_row(row: tuple) -> Conversation:
+        conversation = Conversation.model_validate_json(row[0])
+        conversation.version = row[1]
+        return conversation
 
-    def get_conversation(self, user_id: str, conversation_id: str) -> Optional[Conversation]:
+    async def get_user_conversations(self, user_id: str) -> List[Conversation]:
+        """Get all conversations for a user (least recently updated first)"""
+        rows = await self.pool.fetchall(
+            "SELECT data, version FROM conversations WHERE user_id = ? ORDER BY updated_at", (user_id,)
+        )
+        return [self._conversation_from_row(row) for row in rows]
+
+    async def get_conversations_changed_since(self, user_id: str, since: float) -> List[Conversation]:
+        """Get a user's conversations saved after the Unix timestamp since (least recently updated first)"""
+        rows = await self.pool.fetchall(
+            "SELECT data, version FROM conversations WHERE user_id = ? AND updated_at > ? ORDER BY updated_at",
+            (user_id, since)
+        )
+        return [self._conversation_from_row(row) for row in rows]
+
+    async def get_deleted_conversation_ids_since(self, user_id: str, since: float) -> List[str]:
+        """Get the IDs of a user's conversations deleted after the Unix timestamp since"""
+        rows = await self.pool.fetchall(
+            "SELECT conversation_id FROM conversation_tombstones WHERE user_id = ? AND deleted_at > ?", (user_id, since)
+        )
+        return [row[0] for row in rows]
+
+    async def get_conversation(self, user_id: str, conversation_id: str) -> Optional[Conversation]:
         """Get a specific conversation for a user"""
-        return self.conversations.get(user_id, {}).get(conversation_id)
-
-    def save_conversation(self, user_id: str, conversation: Conversation) -> Conversation:
-        """Save a conversation for a user"""
-        # Update the timestamp
-        conversation.updated_at = datetime.datetime.now()
-
-        # Initialize user's conversations dict if it doesn't exist
-        if user_id not in self.conversations:
-            self.conversations[user_id] = {}
-
-        # Save the conversation
-        self.conversations[user_id][conversation.id] = conversation
-
-        # Save to disk
-        self.save_conversations()
-
+        row = await self.pool.fetchone(
+            "SELECT data, version FROM conversations WHERE user_id = ? AND conversation_id = ?", (user_id, conversation_id)
+        )
+        return self._conversation_from_row(row) if row else None
+
+    async def save_conversation(self, user_id: str, conversation: Conversation) -> Conversation:
+        """Save a conversation for a user, regardless of its version"""
+        conversation.version = None
+        await self.sync_conversations(user_id, [conversation])
         return conversation
 
-    def delete_conversation(self, user_id: str, conversation_id: str) -> bool:
+    async def sync_conversations(
+        self, user_id: str, conversations: List[Conversation], deleted_ids: Iterable[str] = ()
+    ) -> Tuple[List[Conversation], List[Dict[str, Any]]]:
+        """
+        Saves and deletes a user's conversations in a single transaction.
+
+        A conversation whose version is older than the stored one (or than the version it was deleted
+        at) was edited from a stale copy: it is not saved and is reported as a conflict instead
+        ({"id", "server_version", "deleted"}). Saved conversations get the next version and a new
+        updated_at. Deletions always win and leave a tombstone so other clients learn about them.
+        Returns (saved conversations, conflicts).
+        """
+        deleted_ids = [conversation_id for conversation_id in deleted_ids if conversation_id]
+        ids = [conversation.id for conversation in conversations] + deleted_ids
+        if not ids:
+            return [], []
+
+        now = datetime.datetime.now()
+        saved: List[Conversation] = []
+        conflicts: List[Dict[str, Any]] = []
+        async with self.pool.transaction() as conn:
+            ids_json = json.dumps(ids)
+            current: Dict[str, Tuple[int, bool]] = {} # conversation_id -> (version, deleted)
+            async with conn.execute(
+                """SELECT conversation_id, version, 0 FROM conversations
+                       WHERE user_id = ? AND conversation_id IN (SELECT value FROM json_each(?))
+                   UNION ALL
+                   SELECT conversation_id, version, 1 FROM conversation_tombstones
+                       WHERE user_id = ? AND conversation_id IN (SELECT value FROM json_each(?))""",
+                (user_id, ids_json, user_id, ids_json)
+            ) as cursor:
+                for conversation_id, version, deleted in await cursor.fetchall():
+                    current[conversation_id] = (version, bool(deleted))
+
+            upserts, resurrected = [], []
+            for conversation in conversations:
+                stored_version, deleted = current.get(conversation.id, (0, False))
+                if conversation.version is not None and conversation.version < stored_version:
+                    conflicts.append({"id": conversation.id, "server_version": stored_version, "deleted": deleted})
+                    continue
+                conversation.version = stored_version + 1
+                conversation.updated_at = now
+                current[conversation.id] = (conversation.version, False)
+                if deleted:
+                    resurrected.append((user_id, conversation.id))
+                upserts.append((user_id, conversation.id, conversation.model_dump_json(), now.timestamp(), conversation.version))
+                saved.append(conversation)
+
+            tombstones = []
+            for conversation_id in deleted_ids:
+                stored_version, deleted = current.get(conversation_id, (0, True))
+                if not deleted:
+                    # Deleting bumps the version so edits made from older copies conflict
+                    tombstones.append((user_id, conversation_id, stored_version + 1, now.timestamp()))
+                    current[conversation_id] = (stored_version + 1, True)
+
+            if resurrected:
+                await conn.executemany(
+                    "DELETE FROM conversation_tombstones WHERE user_id = ? AND conversation_id = ?", resurrected
+                )
+            if upserts:
+                await conn.executemany(UPSERT_CONVERSATION, upserts)
+            if tombstones:
+                await conn.executemany(
+                    "DELETE FROM conversations WHERE user_id = ? AND conversation_id = ?",
+                    [(user_id, conversation_id) for _, conversation_id, _, _ in tombstones]
+                )
+                await conn.executemany(
+                    "INSERT OR REPLACE INTO conversation_tombstones (user_id, conversation_id, version, deleted_at) VALUES (?, ?, ?, ?)",
+                    tombstones
+                )
+        return saved, conflicts
+
+    async def delete_conversation(self, user_id: str, conversation_id: str) -> bool:
         """Delete a conversation for a user"""
-        if user_id in self.conversations and conversation_id in self.conversations[user_id]:
-            del self.conversations[user_id][conversation_id]
-            self.save_conversations()
-            return True
-        return False
+        exists = await self.pool.fetchone(
+            "SELECT 1 FROM conversations WHERE user_id = ? AND conversation_id = ?", (user_id, conversation_id)
+        )
+        if not exists:
+            return False
+        await self.sync_conversations(user_id, [], [conversation_id])
+        return True
 
     # ============= User Settings Methods =============
 
-    def get_user_settings(self, user_id: str) -> UserSettings:
-        """Get settings for a user, creating default settings if they don't exist"""
-        if user_id not in self.user_settings:
-            self.user_settings[user_id] = UserSettings()
+    async def get_user_settings(self, user_id: str) -> UserSettings:
+        """Get settings for a user, returning default settings if they don't exist"""
+        row = await self.pool.fetchone("SELECT data FROM user_settings WHERE user_id = ?", (user_id,))
+        return UserSettings.model_validate_json(row[0]) if row else UserSettings()
 
-        return self.user_settings[user_id]
-
-    def save_user_settings(self, user_id: str, settings: UserSettings) -> UserSettings:
+    async def save_user_settings(self, user_id: str, settings: UserSettings) -> UserSettings:
         """Save settings for a user"""
         # Update the timestamp
         settings.last_updated = datetime.datetime.now()
-
-        # Save the settings
-        self.user_settings[user_id] = settings
-
-        # Save to disk
-        self.save_all_user_settings()
-
+        await self.pool.execute(UPSERT_SETTINGS, (user_id, settings.model_dump_json(), settings.last_updated.timestamp()))
         return settings
 
     # ============= User Tokens Methods =============
 
-    def load_user_tokens(self):
-        """Load user tokens from file"""
-        if os.path.exists(self.tokens_file):
-            try:
-                with open(self.tokens_file, "r", encoding="utf-8") as f:
-                    self.user_tokens = json.load(f)
-                print(f"Loaded tokens for {len(self.user_tokens)} users")
-            except Exception as e:
-                print(f"Error loading user tokens: {e}")
-                self.user_tokens = {}
-
-    def save_user_tokens(self):
-        """Save user tokens to file"""
-        try:
-            with open(self.tokens_file, "w", encoding="utf-8") as f:
-                json.dump(self.user_tokens, f, indent=2, default=str, ensure_ascii=False)
-        except Exception as e:
-            print(f"Error saving user tokens: {e}")
-
-    def get_user_token(self, user_id: str) -> Optional[Dict[str, Any]]:
+    async def get_user_token(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get token data for a user"""
-        return self.user_tokens.get(user_id)
+        row = await self.pool.fetchone("SELECT data FROM user_tokens WHERE user_id = ?", (user_id,))
+        return json.loads(row[0]) if row else None
 
-    def save_user_token(self, user_id: str, token_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def save_user_token(self, user_id: str, token_data: Dict[str, Any]) -> Dict[str, Any]:
         """Save token data for a user"""
         # Add the time when the token was saved
-        token_data["saved_at"] = datetime.datetime.now().isoformat()
-
-        # Save the token data
-        self.user_tokens[user_id] = token_data
-
-        # Save to disk
-        self.save_user_tokens()
-
+        now = datetime.datetime.now()
+        token_data["saved_at"] = now.isoformat()
+        await self.pool.execute(UPSERT_TOKEN, (user_id, json.dumps(token_data, default=str, ensure_ascii=False), now.timestamp()))
         return token_data
 
-    def delete_user_token(self, user_id: str) -> bool:
+    async def delete_user_token(self, user_id: str) -> bool:
         """Delete token data for a user"""
-        if user_id in self.user_tokens:
-            del self.user_tokens[user_id]
-            self.save_user_tokens()
-            return True
-        return False
+        deleted = await self.pool.execute("DELETE FROM user_tokens WHERE user_id = ?", (user_id,))
+        return deleted > 0
@@ -1,5 +1,4 @@
 import logging
-import asyncio
 from fastapi import Depends, HTTPException, Request, status
 import aiohttp
 from functools import lru_cache
@@ -12,6 +11,7 @@ dotenv_path = os.path.join(os.path.dirname(__file__), '..', 'discordbot', '.env'
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import Optional
+from api_service.auth_cache import UserGuildCache
 
 class ApiSettings(BaseSettings):
     DISCORD_CLIENT_ID: str
@@ -60,10 +60,14 @@ log = logging.getLogger(__name__) # Use specific logger
 # A simple way is to have api_server.py set it after creation.
 http_session: Optional[aiohttp.ClientSession] = None
 
+# Per-session cache of /users/@me/guilds, shared by every guarded dashboard endpoint
+user_guild_cache = UserGuildCache(ttl=60.0, stale_ttl=300.0)
+
 def set_http_session(session: aiohttp.ClientSession):
     """Sets the global aiohttp session for dependencies."""
     global http_session
     http_session = session
+    user_guild_cache.set_http_session(session)
 
 # --- Authentication Dependency (Dashboard Specific) ---
 async def get_dashboard_user(request: Request) -> dict:
@@ -88,77 +92,33 @@ async def get_dashboard_user(request: Request) -> dict:
         }
 
 # --- Guild Admin Verification Dependency (Dashboard Specific) ---
-async def verify_dashboard_guild_admin(guild_id: int, current_user: dict = Depends(get_dashboard_user)) -> bool:
-    """Dependency to verify the dashboard session user is an admin of the specified guild."""
-    global http_session # Use the global aiohttp session
-    if not http_session:
-         log.error("verify_dashboard_guild_admin: HTTP session not ready.")
-         raise HTTPException(status_code=500, detail="Internal server error: HTTP session not ready.")
-
-    user_headers = {'Authorization': f'Bearer {current_user["access_token"]}'}
+ADMINISTRATOR_PERMISSION = 0x8
+# A guild missing from (or not admin in) a cached list older than this triggers one refresh,
+# so newly joined guilds or granted permissions don't wait out the TTL
+GUILD_LIST_RECHECK_AFTER = 10.0
+
+async def verify_dashboard_guild_admin(request: Request, guild_id: int, current_user: dict = Depends(get_dashboard_user)) -> bool:
+    """
+    Dependency to verify the dashboard session user is an admin of the specified guild.
+    Uses the session's cached guild list (see auth_cache.UserGuildCache); pass ?refresh_guilds=true to force a refetch.
+    """
+    refresh = request.query_params.get("refresh_guilds", "").lower() in ("1", "true", "yes")
     try:
         log.debug(f"Dashboard: Verifying admin status for user {current_user['user_id']} in guild {guild_id}")
-
-        # Add rate limit handling
-        max_retries = 3
-        retry_count = 0
-        retry_after = 0
-
-        while retry_count < max_retries:
-            if retry_after > 0:
-                log.warning(f"Dashboard: Rate limited by Discord API, waiting {retry_after} seconds before retry")
-                await asyncio.sleep(retry_after)
-
-            async with http_session.get(DISCORD_USER_GUILDS_URL, headers=user_headers) as resp:
-                if resp.status == 429:  # Rate limited
-                    retry_count += 1
-                    try:
-                        retry_after = float(resp.headers.get('X-RateLimit-Reset-After', resp.headers.get('Retry-After', 1)))
-                    except (ValueError, TypeError):
-                        retry_after = 1.0 # Default wait time if header is invalid
-                    is_global = resp.headers.get('X-RateLimit-Global') is not None
-                    scope = resp.headers.get('X-RateLimit-Scope', 'unknown')
-                    log.warning(
-                        f"Dashboard: Discord API rate limit hit. "
-                        f"Global: {is_global}, Scope: {scope}, "
-                        f"Reset after: {retry_after}s, "
-                        f"Retry: {retry_count}/{max_retries}"
-                    )
-                    if is_global: retry_after = max(retry_after, 5) # Wait longer for global limits
-                    continue # Retry the request
-
-                if resp.status == 401:
-                    # Session token might be invalid, but we can't clear session here easily.
-                    # Let the frontend handle re-authentication based on the 401.
-                    raise HTTPException(status_code=401, detail="Discord token invalid or expired. Please re-login.")
-
-                resp.raise_for_status() # Raise for other errors (4xx, 5xx)
-                user_guilds = await resp.json()
-
-                ADMINISTRATOR_PERMISSION = 0x8
-                is_admin = False
-                for guild in user_guilds:
-                    if int(guild['id']) == guild_id:
-                        permissions = int(guild['permissions'])
-                        if (permissions & ADMINISTRATOR_PERMISSION) == ADMINISTRATOR_PERMISSION:
-                            is_admin = True
-                            break # Found the guild and user is admin
-
-                if not is_admin:
-                    log.warning(f"Dashboard: User {current_user['user_id']} is not admin or not in guild {guild_id}.")
-                    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is not an administrator of this guild.")
-
-                log.debug(f"Dashboard: User {current_user['user_id']} verified as admin for guild {guild_id}.")
-                return True # Indicate verification success
-
-        # If loop finishes without returning True, it means retries were exhausted
-        raise HTTPException(status_code=429, detail="Rate limited by Discord API. Please try again later.")
-
-    except aiohttp.ClientResponseError as e:
-        log.exception(f"Dashboard: HTTP error verifying guild admin status: {e.status} {e.message}")
-        if e.status == 429: # Should be caught by the loop, but safeguard
-            raise HTTPException(status_code=429, detail="Rate limited by Discord API. Please try again later.")
-        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Error communicating with Discord API.")
+        user_guilds = await user_guild_cache.get_guilds(current_user["access_token"], refresh=refresh)
+        permissions = user_guilds.permissions.get(guild_id, 0)
+        if (permissions & ADMINISTRATOR_PERMISSION) != ADMINISTRATOR_PERMISSION and not refresh and user_guilds.age > GUILD_LIST_RECHECK_AFTER:
+            user_guilds = await user_guild_cache.get_guilds(current_user["access_token"], refresh=True)
+            permissions = user_guilds.permissions.get(guild_id, 0)
+    except HTTPException:
+        raise
     except Exception as e:
         log.exception(f"Dashboard: Generic error verifying guild admin status: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An internal error occurred during permission verification.")
+
+    if (permissions & ADMINISTRATOR_PERMISSION) != ADMINISTRATOR_PERMISSION:
+        log.warning(f"Dashboard: User {current_user['user_id']} is not admin or not in guild {guild_id}.")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is not an administrator of this guild.")
+
+    log.debug(f"Dashboard: User {current_user['user_id']} verified as admin for guild {guild_id}.")
+    return True # Indicate verification success
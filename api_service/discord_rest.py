@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import aiohttp
+
+# --- Logging ---
+log = logging.getLogger(__name__)
+
+DISCORD_API_BASE_URL = "https://discord.com/api/v10"
+
+# Rate limits are tracked per bucket *and* per major parameter (guild/channel/webhook ID)
+_MAJOR_PARAM_RE = re.compile(r"^/(guilds|channels|webhooks)/(\d+)")
+_SNOWFLAKE_RE = re.compile(r"/\d{15,21}")
+MAX_TRACKED_BUCKETS = 10000
+
+
+class DiscordRestError(Exception):
+    """A Discord REST call that failed (non-2xx status, rate limit retries exhausted or network error)."""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[float] = None):
+        super().__init__(f"Discord API error {status}: {message}")
+        self.status = status
+        self.message = message
+        self.retry_after = retry_after
+
+
+class _Bucket:
+    __slots__ = ("remaining", "reset_at", "lock")
+
+    def __init__(self):
+        self.remaining: Optional[int] = None # Unknown until the first response
+        self.reset_at = 0.0 # time.monotonic() when the bucket refills
+        self.lock = asyncio.Lock()
+
+
+class DiscordRestClient:
+    """
+    Shared client for Discord REST calls made with the bot token.
+
+    Follows Discord's rate limit headers: each route is mapped to the bucket Discord reports for it,
+    requests wait (instead of failing) when their bucket is exhausted, and a global rate limit pauses
+    every request. 429s are retried up to max_retries times before DiscordRestError(429) is raised.
+    """
+
+    def __init__(self, token: Optional[str], max_retries: int = 3, timeout: float = 10.0):
+        self.token = token
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.http_session: Optional[aiohttp.ClientSession] = None
+        self._route_buckets: Dict[str, str] = {} # "METHOD /route" -> bucket hash from X-RateLimit-Bucket
+        self._buckets: Dict[Tuple[str, str], _Bucket] = {} # (bucket hash or route, major param) -> state
+        self._global_reset_at = 0.0
+        self.stats = {"requests": 0, "rate_limited": 0, "global_rate_limited": 0, "waits": 0, "total_wait_time": 0.0, "errors": 0}
+
+    def set_http_session(self, session: Optional[aiohttp.ClientSession]):
+        self.http_session = session
+
+    @staticmethod
+    def _route(method: str, path: str) -> Tuple[str, str]:
+        """Returns (route key with IDs replaced, major parameter) for a request path."""
+        match = _MAJOR_PARAM_RE.match(path)
+        major = match.group(2) if match else ""
+        rest = path[match.end():] if match else path
+        prefix = f"/{match.group(1)}/{{major}}" if match else ""
+        return f"{method} {prefix}{_SNOWFLAKE_RE.sub('/{id}', rest)}", major
+
+    def _get_bucket(self, route: str, major: str) -> _Bucket:
+        key = (self._route_buckets.get(route, route), major)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= MAX_TRACKED_BUCKETS:
+                self._prune_buckets()
+            bucket = self._buckets[key] = _Bucket()
+        return bucket
+
+    def _prune_buckets(self):
+        """Forgets buckets that have refilled and aren't in use (one exists per bucket and guild/channel)."""
+        now = time.monotonic()
+        for key in [key for key, bucket in self._buckets.items() if bucket.reset_at <= now and not bucket.lock.locked()]:
+            del self._buckets[key]
+
+    async def _sleep(self, delay: float):
+        self.stats["waits"] += 1
+        self.stats["total_wait_time"] += delay
+        await asyncio.sleep(delay)
+
+    def _update_bucket(self, route: str, major: str, bucket: _Bucket, headers) -> _Bucket:
+        bucket_hash = headers.get("X-RateLimit-Bucket")
+        if bucket_hash and self._route_buckets.get(route) != bucket_hash:
+            # First time we learn this route's bucket: share state with other routes in it
+            self._route_buckets[route] = bucket_hash
+            self._buckets.pop((route, major), None)
+            bucket = self._buckets.setdefault((bucket_hash, major), bucket)
+        try:
+            if headers.get("X-RateLimit-Remaining") is not None:
+                bucket.remaining = int(headers["X-RateLimit-Remaining"])
+            if headers.get("X-RateLimit-Reset-After") is not None:
+                bucket.reset_at = time.monotonic() + float(headers["X-RateLimit-Reset-After"])
+        except (ValueError, TypeError):
+            pass # Headers present but not valid numbers
+        return bucket
+
+    async def _acquire(self, bucket: _Bucket):
+        """Waits until the global limit and the bucket allow another request, then reserves it."""
+        async with bucket.lock:
+            while True:
+                now = time.monotonic()
+                if self._global_reset_at > now:
+                    await self._sleep(self._global_reset_at - now)
+                    continue
+                if bucket.remaining is not None and bucket.remaining <= 0:
+                    if bucket.reset_at > now:
+                        await self._sleep(bucket.reset_at - now)
+                    bucket.remaining = None # Refilled; the next response tells us the new count
+                    continue
+                break
+            if bucket.remaining is not None:
+                bucket.remaining -= 1
+
+    async def request(self, method: str, path: str, *, json: Any = None, params: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        Makes a bot-authenticated request to path (e.g. "/guilds/123/channels") and returns the
+        decoded JSON body (None for empty responses). Raises DiscordRestError on failure.
+        """
+        if not self.token:
+            raise DiscordRestError(503, "Bot token not configured. Please set DISCORD_BOT_TOKEN in environment variables.")
+        session = self.http_session
+        if session is None or session.closed:
+            raise DiscordRestError(500, "HTTP session not ready.")
+
+        route, major = self._route(method, path)
+        headers = {"Authorization": f"Bot {self.token}"}
+        for attempt in range(self.max_retries + 1):
+            bucket = self._get_bucket(route, major)
+            await self._acquire(bucket)
+            self.stats["requests"] += 1
+            try:
+                async with session.request(method, DISCORD_API_BASE_URL + path, headers=headers, json=json, params=params,
+                                           timeout=aiohttp.ClientTimeout(total=self.timeout)) as resp:
+                    bucket = self._update_bucket(route, major, bucket, resp.headers)
+                    if resp.status == 429:
+                        self.stats["rate_limited"] += 1
+                        try:
+                            data = await resp.json(content_type=None)
+                        except Exception:
+                            data = {}
+                        retry_after = float(data.get("retry_after") or resp.headers.get("Retry-After") or 1)
+                        is_global = bool(data.get("global")) or resp.headers.get("X-RateLimit-Global") is not None
+                        if is_global:
+                            self.stats["global_rate_limited"] += 1
+                            self._global_reset_at = time.monotonic() + retry_after
+                        else:
+                            bucket.remaining = 0
+                            bucket.reset_at = time.monotonic() + retry_after
+                        log.warning(f"Discord REST: Rate limited on {route} (global: {is_global}), "
+                                    f"retry after {retry_after}s ({attempt + 1}/{self.max_retries + 1})")
+                        if attempt < self.max_retries:
+                            continue
+                        raise DiscordRestError(429, "Rate limited by Discord API. Please try again later.", retry_after)
+
+                    if resp.status >= 400:
+                        self.stats["errors"] += 1
+                        raise DiscordRestError(resp.status, await resp.text())
+                    if resp.status == 204:
+                        return None
+                    return await resp.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.stats["errors"] += 1
+                raise DiscordRestError(502, f"Error communicating with Discord API: {e}")
+        raise DiscordRestError(429, "Rate limited by Discord API. Please try again later.")
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["known_buckets"] = len(self._buckets)
+        return stats
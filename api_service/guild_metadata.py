@@ -0,0 +1,166 @@
+import asyncio
+import json
+import logging
+import sys
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from api_service.discord_rest import DiscordRestClient, DiscordRestError
+
+# --- Logging ---
+log = logging.getLogger(__name__)
+
+# Redis mirror maintained by the bot (cogs/guild_metadata_cog.py) and filled on REST fallbacks.
+# Values are JSON in the same formats the dashboard endpoints return.
+REDIS_KEY_TEMPLATE = "guild_meta:{guild_id}:{kind}" # kind: info, channels, roles, commands
+MIRROR_TTL = 86400 # Bot-written entries; refreshed on every gateway update and on ready
+REST_CACHE_TTL = 300 # Entries written after a REST fallback
+
+
+def redis_key(guild_id: int, kind: str) -> str:
+    return REDIS_KEY_TEMPLATE.format(guild_id=guild_id, kind=kind)
+
+# --- Formatting (shared by the bot cache, the Redis mirror and REST responses) ---
+
+def format_guild_info(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {"id": str(data["id"]), "name": data.get("name"), "icon": data.get("icon")}
+
+def format_channel(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {"id": str(data["id"]), "name": data["name"], "type": data["type"],
+            "parent_id": str(data["parent_id"]) if data.get("parent_id") else None}
+
+def format_role(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {"id": str(data["id"]), "name": data["name"], "color": data["color"],
+            "position": data["position"], "permissions": str(data["permissions"])}
+
+def format_command(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {"id": str(data["id"]), "name": data["name"], "description": data.get("description", ""),
+            "type": data.get("type", 1), # Default to CHAT_INPUT type
+            "options": data.get("options", [])}
+
+def guild_info_from_guild(guild) -> Dict[str, Any]:
+    """Formats a discord.Guild from the bot's cache."""
+    return format_guild_info({"id": guild.id, "name": guild.name, "icon": guild.icon.key if guild.icon else None})
+
+def channels_from_guild(guild) -> List[Dict[str, Any]]:
+    return [format_channel({"id": channel.id, "name": channel.name, "type": channel.type.value,
+                            "parent_id": getattr(channel, "category_id", None)})
+            for channel in list(guild.channels)]
+
+def roles_from_guild(guild) -> List[Dict[str, Any]]:
+    return [format_role({"id": role.id, "name": role.name, "color": role.color.value,
+                         "position": role.position, "permissions": role.permissions.value})
+            for role in list(guild.roles)]
+
+
+def find_bot_instance():
+    """The running bot if it lives in this process (global_bot_accessor, or the sync API hook)."""
+    try:
+        from global_bot_accessor import get_bot_instance
+        bot = get_bot_instance()
+    except ImportError:
+        bot = None
+    if bot is None:
+        sync_api = sys.modules.get("discord_bot_sync_api") # Only if something already imported it
+        bot = getattr(sync_api, "bot_instance", None)
+    return bot
+
+
+class GuildMetadataProvider:
+    """
+    Guild name, channels, roles and application commands for the dashboard.
+
+    Lookups try, in order: the live bot's gateway cache (when the bot runs in this process), the
+    Redis mirror the bot keeps up to date from gateway events, and finally Discord REST through the
+    shared DiscordRestClient (the result is then cached in Redis for REST_CACHE_TTL seconds).
+    Application commands aren't in the gateway cache, so they only come from Redis or REST.
+    Concurrent REST fallbacks for the same guild and kind share one request.
+    """
+
+    def __init__(self, rest: DiscordRestClient, application_id: Optional[str],
+                 bot_getter: Callable[[], Any] = find_bot_instance):
+        self.rest = rest
+        self.application_id = application_id
+        self.bot_getter = bot_getter
+        self.redis: Optional[Any] = None
+        self._inflight: Dict[Tuple[int, str], asyncio.Task] = {}
+        self.stats = {"bot_hits": 0, "redis_hits": 0, "rest_fetches": 0, "coalesced": 0}
+
+    def set_redis(self, redis: Optional[Any]):
+        self.redis = redis
+
+    def _live_guild(self, guild_id: int):
+        bot = self.bot_getter()
+        if bot is None or not bot.is_ready():
+            return None
+        return bot.get_guild(guild_id)
+
+    async def _lookup(self, guild_id: int, kind: str, from_guild: Optional[Callable[[Any], Any]],
+                      rest_path: str, from_rest: Callable[[Any], Any]) -> Any:
+        if from_guild is not None:
+            guild = self._live_guild(guild_id)
+            if guild is not None:
+                try:
+                    value = from_guild(guild)
+                    self.stats["bot_hits"] += 1
+                    return value
+                except RuntimeError as e:
+                    # The bot's loop may be mutating the cache from its own thread; fall through
+                    log.debug(f"Guild metadata: Bot cache read for guild {guild_id} failed: {e}")
+
+        if self.redis is not None:
+            try:
+                cached = await self.redis.get(redis_key(guild_id, kind))
+                if cached is not None:
+                    self.stats["redis_hits"] += 1
+                    return json.loads(cached)
+            except Exception as e:
+                log.warning(f"Guild metadata: Redis lookup for {kind} of guild {guild_id} failed: {e}")
+
+        key = (guild_id, kind)
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            task = asyncio.create_task(self._fetch_rest(guild_id, kind, rest_path, from_rest))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fetch_rest(self, guild_id: int, kind: str, rest_path: str, from_rest: Callable[[Any], Any]) -> Any:
+        self.stats["rest_fetches"] += 1
+        value = from_rest(await self.rest.request("GET", rest_path))
+        if self.redis is not None:
+            try:
+                await self.redis.set(redis_key(guild_id, kind), json.dumps(value), ex=REST_CACHE_TTL)
+            except Exception as e:
+                log.warning(f"Guild metadata: Failed to cache {kind} of guild {guild_id} in Redis: {e}")
+        return value
+
+    async def get_guild_info(self, guild_id: int) -> Dict[str, Any]:
+        return await self._lookup(guild_id, "info", guild_info_from_guild, f"/guilds/{guild_id}", format_guild_info)
+
+    async def get_guild_name(self, guild_id: int) -> Optional[str]:
+        return (await self.get_guild_info(guild_id)).get("name")
+
+    async def get_channels(self, guild_id: int) -> List[Dict[str, Any]]:
+        return await self._lookup(guild_id, "channels", channels_from_guild, f"/guilds/{guild_id}/channels",
+                                  lambda data: [format_channel(channel) for channel in data])
+
+    async def get_roles(self, guild_id: int) -> List[Dict[str, Any]]:
+        return await self._lookup(guild_id, "roles", roles_from_guild, f"/guilds/{guild_id}/roles",
+                                  lambda data: [format_role(role) for role in data])
+
+    async def get_commands(self, guild_id: int) -> List[Dict[str, Any]]:
+        try:
+            return await self._lookup(guild_id, "commands", None,
+                                      f"/applications/{self.application_id}/guilds/{guild_id}/commands",
+                                      lambda data: [format_command(command) for command in data])
+        except DiscordRestError as e:
+            if e.status == 404: # No commands registered for the guild yet
+                return []
+            raise
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["rest"] = self.rest.get_stats()
+        return stats
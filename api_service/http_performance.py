@@ -0,0 +1,358 @@
+"""
+Response compression, fast JSON and request timing for the unified API (api_server.py).
+
+- CompressionMiddleware: Brotli (if the brotli package is installed) or gzip for responses above
+  a size threshold, including streamed responses.
+- DefaultJSONResponse / loads() / dumps(): orjson when installed, the standard library otherwise.
+- maybe_stream_json(): streams very large lists instead of building the whole document in memory.
+- RequestTimingMiddleware + RequestMetrics: per-route latency histograms for the metrics endpoints
+  (JSON at /internal/metrics, Prometheus text at /metrics via collect_families()).
+"""
+import json
+import logging
+import re
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+from metrics import MetricFamily
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# --- Logging ---
+log = logging.getLogger(__name__)
+
+# ============= JSON =============
+
+if orjson is not None:
+    from fastapi.responses import ORJSONResponse as DefaultJSONResponse
+else:
+    DefaultJSONResponse = JSONResponse
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Parses a JSON request body (bytes are decoded as UTF-8)."""
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+def dumps(obj: Any) -> bytes:
+    """Serializes already JSON-compatible data (see jsonable_encoder) to UTF-8 bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _encode_item(item: Any) -> bytes:
+    model_dump_json = getattr(item, "model_dump_json", None)
+    if model_dump_json is not None: # Pydantic models serialize themselves (fast path)
+        return model_dump_json().encode("utf-8")
+    return dumps(jsonable_encoder(item))
+
+# Lists with at least this many items are streamed by maybe_stream_json()
+STREAM_LIST_THRESHOLD = 100
+
+def maybe_stream_json(content: Dict[str, Any], list_key: str, threshold: int = STREAM_LIST_THRESHOLD,
+                      chunk_size: int = 25) -> Union[Dict[str, Any], StreamingResponse]:
+    """
+    Returns content unchanged, or, if content[list_key] has at least threshold items, a response
+    that streams the same JSON document: the other keys first, then the list chunk_size items at
+    a time. Items are only serialized as they are sent.
+    """
+    items = content.get(list_key)
+    if not isinstance(items, list) or len(items) < threshold:
+        return content
+
+    rest = dumps(jsonable_encoder({key: value for key, value in content.items() if key != list_key}))
+    prefix = rest[:-1] + (b"," if len(rest) > 2 else b"") + dumps(list_key) + b":["
+
+    async def body():
+        yield prefix
+        for start in range(0, len(items), chunk_size):
+            chunk = b",".join(_encode_item(item) for item in items[start:start + chunk_size])
+            yield (b"," + chunk) if start else chunk
+        yield b"]}"
+
+    return StreamingResponse(body(), media_type="application/json")
+
+# ============= Compression =============
+
+class _GzipCompressor:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31) # wbits 31: gzip container
+
+    def process(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+class _BrotliCompressor:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def process(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+class _CompressionResponder:
+    """Wraps one request's send(), compressing the body if it is large enough."""
+
+    def __init__(self, app, encoding: str, compressor_factory: Callable[[], Any], minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.compressor_factory = compressor_factory
+        self.minimum_size = minimum_size
+        self.send = None
+        self.start_message: Optional[Dict[str, Any]] = None
+        self.passthrough = False
+        self.compressor = None
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            # Held back until the first body chunk shows whether compressing is worth it
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            self.passthrough = ("content-encoding" in headers
+                                or headers.get("content-type", "").startswith("text/event-stream"))
+            return
+
+        if message_type != "http.response.body":
+            if self.start_message is not None:
+                start, self.start_message = self.start_message, None
+                await self.send(start)
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            if self.passthrough or (not more_body and len(body) < self.minimum_size):
+                await self.send(start)
+                await self.send(message)
+                return
+
+            self.compressor = self.compressor_factory()
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            data = self.compressor.process(body) + (self.compressor.flush() if more_body else self.compressor.finish())
+            if more_body:
+                if "content-length" in headers:
+                    del headers["content-length"]
+            else:
+                headers["Content-Length"] = str(len(data))
+            await self.send(start)
+            await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+            return
+
+        if self.compressor is None:
+            await self.send(message)
+            return
+        data = self.compressor.process(body) + (self.compressor.flush() if more_body else self.compressor.finish())
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+class CompressionMiddleware:
+    """
+    Compresses responses of at least minimum_size bytes with Brotli, when the brotli package is
+    installed and the client accepts "br", or else with gzip. Streamed responses are compressed
+    chunk by chunk and flushed after each chunk. Responses that already have a Content-Encoding,
+    and server-sent events, are passed through unchanged.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    @staticmethod
+    def _accepts(accept_encoding: str, encoding: str) -> bool:
+        for part in accept_encoding.split(","):
+            name, _, params = part.strip().partition(";")
+            if name.strip().lower() == encoding:
+                return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        if brotli is not None and self._accepts(accept_encoding, "br"):
+            responder = _CompressionResponder(self.app, "br", lambda: _BrotliCompressor(self.brotli_quality), self.minimum_size)
+        elif self._accepts(accept_encoding, "gzip"):
+            responder = _CompressionResponder(self.app, "gzip", lambda: _GzipCompressor(self.gzip_level), self.minimum_size)
+        else:
+            await self.app(scope, receive, send)
+            return
+        await responder(scope, receive, send)
+
+# ============= Request Timing =============
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is unbounded
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class LatencyHistogram:
+    __slots__ = ("bucket_counts", "count", "total", "max", "status_counts")
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.status_counts: Dict[str, int] = {} # "2xx" -> count
+
+    def observe(self, seconds: float, status: int):
+        index = 0
+        while index < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[index]:
+            index += 1
+        self.bucket_counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        status_class = f"{status // 100}xx"
+        self.status_counts[status_class] = self.status_counts.get(status_class, 0) + 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket containing the q-quantile (None for the unbounded bucket)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.bucket_counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else None
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        cumulative = 0
+        buckets = {}
+        for bound, bucket_count in zip(list(LATENCY_BUCKETS) + ["+Inf"], self.bucket_counts):
+            cumulative += bucket_count
+            buckets[str(bound)] = cumulative
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "avg": round(self.total / self.count, 6) if self.count else 0.0,
+            "max": round(self.max, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": buckets,
+            "status": dict(self.status_counts),
+        }
+
+_ID_SEGMENT_RE = re.compile(r"/(\d+|[0-9a-fA-F-]{32,36})(?=/|$)")
+
+def route_label(scope) -> str:
+    """
+    "METHOD /mount/route/{template}" for the route that handled a request. Falls back to the path
+    with numeric and UUID segments replaced, so labels stay bounded when no route was recorded.
+    """
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path is not None:
+        path = scope.get("root_path", "") + path
+    else:
+        path = _ID_SEGMENT_RE.sub("/{id}", scope.get("path", ""))
+    return f"{scope.get('method', '')} {path}"
+
+class RequestMetrics:
+    """Latency histograms per route, filled by RequestTimingMiddleware."""
+
+    def __init__(self, max_routes: int = 1000):
+        self.max_routes = max_routes
+        self.routes: Dict[str, LatencyHistogram] = {}
+        self.started_at = time.time()
+
+    def observe(self, route: str, status: int, seconds: float):
+        histogram = self.routes.get(route)
+        if histogram is None:
+            if len(self.routes) >= self.max_routes:
+                route = "other"
+                histogram = self.routes.get(route)
+            if histogram is None:
+                histogram = self.routes[route] = LatencyHistogram()
+        histogram.observe(seconds, status)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "latency_buckets": list(LATENCY_BUCKETS),
+            "routes": {route: histogram.to_dict() for route, histogram in sorted(self.routes.items())},
+        }
+
+    def collect_families(self) -> List[MetricFamily]:
+        """The route histograms as metrics registry families (see metrics.MetricsRegistry.add_collector)."""
+        duration = MetricFamily("api_request_duration_seconds", "histogram", "API request duration, until the last body chunk is sent")
+        requests = MetricFamily("api_requests_total", "counter", "API requests by route and status class")
+        for route, histogram in sorted(self.routes.items()):
+            method, _, path = route.partition(" ")
+            labels = {"method": method, "route": path}
+            cumulative, buckets = 0, []
+            for bound, bucket_count in zip(LATENCY_BUCKETS, histogram.bucket_counts):
+                cumulative += bucket_count
+                buckets.append((bound, cumulative))
+            duration.add_histogram(labels, buckets, histogram.count, histogram.total)
+            for status_class, count in sorted(histogram.status_counts.items()):
+                requests.add_sample({**labels, "status": status_class}, count)
+        return [duration, requests]
+
+class RequestTimingMiddleware:
+    """
+    Records how long each HTTP request takes, until its last body chunk is sent, in
+    metrics.routes, keyed by route_label().
+    """
+
+    def __init__(self, app, metrics: RequestMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500 # Reported if the app fails before starting a response
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.metrics.observe(route_label(scope), status, time.perf_counter() - start)
+
+def compression_info() -> Tuple[str, ...]:
+    """The content encodings CompressionMiddleware can produce in this environment."""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
@@ -0,0 +1,132 @@
+"""
+Load test for the unified API in standalone multi-worker mode.
+
+For each worker count, starts `uvicorn api_service.api_server:app --workers N` on a local port with
+API_STANDALONE=1 (so no bot is needed, but the API's usual .env - Postgres, Redis and Discord
+client settings - must be configured), drives it with concurrent keep-alive clients for a fixed
+duration and prints requests/s and latency percentiles, so throughput can be compared across
+worker counts. If GURT_STATS_PUSH_SECRET is set, a sample stats payload is pushed first so the
+default path (/api/gurt/stats, served from Redis by every worker) answers 200.
+
+Usage: python benchmark_api_workers.py [--workers 1,2,4] [--path /api/gurt/stats] [--concurrency 64]
+                                       [--duration 10] [--port 8765]
+       python benchmark_api_workers.py --url http://127.0.0.1:443/api/gurt/stats  # An already running server
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+
+import aiohttp
+
+SAMPLE_STATS = {
+    "runtime": {"uptime_seconds": 12345, "active_conversations": 42},
+    "api_stats": {f"model_{i}": {"success": i * 10, "failure": i, "avg_time": 0.5 + i / 10} for i in range(20)},
+    "tool_stats": {f"tool_{i}": {"success": i * 3, "failure": 0, "avg_time": 0.1} for i in range(30)},
+}
+
+async def wait_until_up(base_url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(f"{base_url}/robots.txt") as resp:
+                    if resp.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"API at {base_url} did not come up within {timeout}s")
+
+async def push_sample_stats(base_url: str):
+    secret = os.getenv("GURT_STATS_PUSH_SECRET")
+    if not secret:
+        return
+    async with aiohttp.ClientSession() as session:
+        async with session.post(f"{base_url}/internal/gurt/update_stats", json=SAMPLE_STATS,
+                                headers={"Authorization": f"Bearer {secret}"}) as resp:
+            print(f"  pushed sample Gurt stats: HTTP {resp.status}")
+
+async def run_load(url: str, concurrency: int, duration: float):
+    latencies, statuses = [], Counter()
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        deadline = time.monotonic() + duration
+
+        async def client():
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    async with session.get(url) as resp:
+                        await resp.read()
+                        statuses[resp.status] += 1
+                except aiohttp.ClientError as e:
+                    statuses[type(e).__name__] += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+        started = time.monotonic()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.monotonic() - started
+    return latencies, statuses, elapsed
+
+def report(label: str, latencies, statuses, elapsed: float):
+    latencies.sort()
+    def pct(q):
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else float("nan")
+    print(f"{label:>12}: {len(latencies) / elapsed:9.1f} req/s   p50 {pct(0.5):7.2f} ms   p95 {pct(0.95):7.2f} ms   "
+          f"p99 {pct(0.99):7.2f} ms   status {dict(statuses)}")
+    return len(latencies) / elapsed
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    env = dict(os.environ, API_STANDALONE="1")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api_service.api_server:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+    )
+
+def stop_server(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="Comma separated worker counts to compare")
+    parser.add_argument("--path", default="/api/gurt/stats", help="Path to request")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per run")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", help="Benchmark this URL of a running server instead of starting one")
+    args = parser.parse_args()
+
+    if args.url:
+        report("existing", *await run_load(args.url, args.concurrency, args.duration))
+        return
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    results = {}
+    for workers in [int(w) for w in args.workers.split(",")]:
+        print(f"Starting API with {workers} worker(s)...")
+        process = start_server(workers, args.port)
+        try:
+            await wait_until_up(base_url)
+            await push_sample_stats(base_url)
+            await run_load(base_url + args.path, args.concurrency, min(2.0, args.duration)) # Warm-up
+            results[workers] = report(f"{workers} workers", *await run_load(base_url + args.path, args.concurrency, args.duration))
+        finally:
+            stop_server(process)
+
+    baseline = results.get(min(results)) if results else None
+    if baseline:
+        print("\nScaling vs. {} worker(s): ".format(min(results)) +
+              ", ".join(f"{workers}w x{rate / baseline:.2f}" for workers, rate in results.items()))
+
+if __name__ == "__main__":
+    asyncio.run(main())
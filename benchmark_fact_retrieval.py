@@ -0,0 +1,105 @@
+"""
+Recall/latency benchmark for MemoryManager fact retrieval on a synthetic fact corpus.
+
+Compares vector-only (ChromaDB), keyword-only (FTS5/BM25) and hybrid retrieve() (reciprocal rank
+fusion of both). Each query paraphrases exactly one stored fact, so recall@k is the share of
+queries whose target fact is among the top k results.
+
+Usage: python benchmark_fact_retrieval.py [--facts 2000] [--queries 200] [--k 5]
+Uses a temporary database/Chroma directory and loads the real embedding model.
+"""
+import argparse
+import asyncio
+import random
+import shutil
+import tempfile
+import time
+import os
+
+from gurt_memory import MemoryManager
+
+PETS = ["dog", "cat", "parrot", "hamster", "iguana", "rabbit", "ferret", "goldfish"]
+JOBS = ["nurse", "carpenter", "software engineer", "chef", "pilot", "teacher", "electrician", "lawyer"]
+CITIES = ["Lisbon", "Osaka", "Denver", "Nairobi", "Oslo", "Lima", "Hanoi", "Glasgow", "Perth", "Quebec"]
+FOODS = ["ramen", "tacos", "lasagna", "pho", "paella", "dumplings", "curry", "pierogi"]
+INSTRUMENTS = ["cello", "banjo", "trumpet", "violin", "drums", "harp", "saxophone", "ukulele"]
+GAMES = ["chess", "Minecraft", "Tetris", "Elden Ring", "Stardew Valley", "Dota 2", "Celeste", "Factorio"]
+
+# (fact template, query template). Some queries share keywords with the fact, some only meaning.
+TEMPLATES = [
+    ("has a {pet} named {name}", "what is the name of their pet {pet} {name}?"),
+    ("works as a {job} in {city}, friends call them {name}", "{name} job in {city}"),
+    ("{name}'s favorite food is {food}", "what does {name} love to eat"),
+    ("{name} is learning to play the {instrument}", "which instrument is {name} practicing"),
+    ("{name} grew up in {city} and misses it", "where is {name} originally from"),
+    ("{name} has over 500 hours in {game}", "what video game is {name} obsessed with"),
+]
+
+def build_corpus(count: int, seed: int = 42):
+    """Returns [(fact, query)], with a unique made-up name per fact so each query has one answer."""
+    rng = random.Random(seed)
+    syllables = ["ka", "lo", "mi", "ren", "tu", "sa", "vor", "eli", "dan", "qui", "zo", "bex"]
+    names, corpus = set(), []
+    while len(corpus) < count:
+        name = "".join(rng.choice(syllables) for _ in range(3)).capitalize()
+        if name in names:
+            continue
+        names.add(name)
+        fact_template, query_template = rng.choice(TEMPLATES)
+        values = {
+            "name": name, "pet": rng.choice(PETS), "job": rng.choice(JOBS), "city": rng.choice(CITIES),
+            "food": rng.choice(FOODS), "instrument": rng.choice(INSTRUMENTS), "game": rng.choice(GAMES),
+        }
+        corpus.append((fact_template.format(**values), query_template.format(**values)))
+    return corpus
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    return ordered[len(ordered) // 2] * 1000, ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000
+
+async def main(args):
+    work_dir = tempfile.mkdtemp(prefix="fact_retrieval_bench_")
+    memory = MemoryManager(
+        db_path=os.path.join(work_dir, "memory.db"), max_general_facts=args.facts + 1,
+        chroma_path=os.path.join(work_dir, "chroma")
+    )
+    try:
+        await memory.initialize_sqlite_database()
+        print("Loading semantic memory...")
+        await memory.initialize_semantic_memory()
+        if memory.semantic_state != "ready":
+            print("Semantic memory failed to load; vector results will be empty.")
+
+        corpus = build_corpus(args.facts)
+        print(f"Storing {len(corpus)} synthetic general facts...")
+        start_time = time.monotonic()
+        await asyncio.gather(*[memory.add_general_fact(fact) for fact, _ in corpus])
+        print(f"Stored in {time.monotonic() - start_time:.1f}s")
+
+        queries = random.Random(7).sample(corpus, min(args.queries, len(corpus)))
+        modes = {
+            "vector": lambda query: memory._vector_fact_candidates(query, "general", args.k),
+            "keyword": lambda query: memory._keyword_fact_candidates(query, "general", args.k),
+            "hybrid": lambda query: memory.retrieve(query, scope="general", k=args.k),
+        }
+        print(f"\n{'mode':<8} {'recall@' + str(args.k):>10} {'p50 ms':>8} {'p95 ms':>8}")
+        for mode, run_query in modes.items():
+            hits, latencies = 0, []
+            for target_fact, query in queries:
+                start_time = time.monotonic()
+                results = await run_query(query)
+                latencies.append(time.monotonic() - start_time)
+                facts = [result["fact"] if isinstance(result, dict) else result[0] for result in results]
+                hits += target_fact in facts
+            p50, p95 = summarize(latencies)
+            print(f"{mode:<8} {hits / len(queries):>10.3f} {p50:>8.2f} {p95:>8.2f}")
+    finally:
+        await memory.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark hybrid fact retrieval on a synthetic corpus.")
+    parser.add_argument("--facts", type=int, default=2000, help="Number of synthetic facts to store")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries to run")
+    parser.add_argument("--k", type=int, default=5, help="Results per query")
+    asyncio.run(main(parser.parse_args()))
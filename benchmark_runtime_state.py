@@ -0,0 +1,119 @@
+"""
+Memory-footprint benchmark for GurtCog's relationship/sentiment/conversation tracking.
+
+Simulates activity from N users across a set of channels and measures (with tracemalloc) the
+memory held by the previous layout (nested defaultdicts of str-keyed dicts and sets) versus the
+compact layout in gurt/state.py (int keys, __slots__ records, packed relationship pairs, tuples of
+recent channel IDs per user).
+The LRU limits are raised above the simulated sizes so both layouts hold the same data.
+
+Usage: python benchmark_runtime_state.py [--users 100000] [--channels 2000] [--seed 42]
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from collections import defaultdict
+
+from gurt.state import LRUDict, RelationshipStore, ChannelSentiment, ActiveConversation, ReactionRecord, UserSentiment
+
+BOT_ID = 1000000000000000001
+SENTIMENTS = ["positive", "negative", "neutral"]
+EMOTIONS = ["joy", "anger", "sadness", "surprise", "fear"]
+
+def simulate_activity(users: int, channels: int, seed: int):
+    """Returns a list of (user_id, channel_id, mentioned_user_id or None, sentiment, intensity, emotions) events."""
+    rng = random.Random(seed)
+    user_ids = [rng.getrandbits(62) + (1 << 62) for _ in range(users)]
+    channel_ids = [rng.getrandbits(62) + (1 << 62) for _ in range(channels)]
+    events = []
+    for user_id in user_ids:
+        for _ in range(rng.randint(1, 3)): # Each user talks in 1-3 channels
+            mentioned = rng.choice(user_ids) if rng.random() < 0.3 else None
+            emotions = tuple(rng.sample(EMOTIONS, rng.randint(0, 2)))
+            events.append((user_id, rng.choice(channel_ids), mentioned, rng.choice(SENTIMENTS), rng.random(), emotions))
+    reacted_messages = [rng.getrandbits(62) + (1 << 62) for _ in range(min(5000, users))]
+    return events, reacted_messages
+
+def build_legacy(events, reacted_messages):
+    """The previous GurtCog layout: str-keyed nested dicts and sets."""
+    user_conversation_mapping = defaultdict(set)
+    user_relationships = defaultdict(dict)
+    active_conversations = {}
+    conversation_sentiment = defaultdict(lambda: {
+        "overall": "neutral", "intensity": 0.5, "recent_trend": "stable",
+        "user_sentiments": {}, "last_update": time.time()
+    })
+    gurt_message_reactions = defaultdict(lambda: {"positive": 0, "negative": 0, "topic": None, "timestamp": 0.0})
+
+    def update_relationship(user_id_1: str, user_id_2: str, change: float):
+        if user_id_1 > user_id_2: user_id_1, user_id_2 = user_id_2, user_id_1
+        current_score = user_relationships[user_id_1].get(user_id_2, 0.0)
+        user_relationships[user_id_1][user_id_2] = max(0.0, min(current_score + change, 100.0))
+
+    for user_id, channel_id, mentioned, sentiment, intensity, emotions in events:
+        user_conversation_mapping[user_id].add(channel_id)
+        if channel_id not in active_conversations:
+            active_conversations[channel_id] = {'participants': set(), 'start_time': time.time(), 'last_activity': time.time(), 'topic': None}
+        active_conversations[channel_id]['participants'].add(user_id)
+        active_conversations[channel_id]['last_activity'] = time.time()
+        update_relationship(str(user_id), str(BOT_ID), 1.0)
+        if mentioned:
+            update_relationship(str(user_id), str(mentioned), 1.2)
+        conversation_sentiment[channel_id]["user_sentiments"][str(user_id)] = {"sentiment": sentiment, "intensity": intensity, "emotions": list(emotions)}
+    for message_id in reacted_messages:
+        gurt_message_reactions[str(message_id)]["positive"] += 1
+        gurt_message_reactions[str(message_id)]["timestamp"] = time.time()
+    return user_conversation_mapping, user_relationships, active_conversations, conversation_sentiment, gurt_message_reactions
+
+def build_compact(events, reacted_messages, users: int, channels: int):
+    """The gurt/state.py layout, with limits large enough to hold everything."""
+    user_conversation_mapping = LRUDict(users * 2)
+    user_relationships = RelationshipStore(users * 4)
+    active_conversations = LRUDict(channels * 2, ActiveConversation)
+    conversation_sentiment = LRUDict(channels * 2, lambda: ChannelSentiment(users))
+    gurt_message_reactions = LRUDict(len(reacted_messages) * 2, ReactionRecord)
+
+    for user_id, channel_id, mentioned, sentiment, intensity, emotions in events:
+        user_channels = tuple(c for c in user_conversation_mapping.get(user_id, ()) if c != channel_id)
+        user_conversation_mapping[user_id] = (user_channels + (channel_id,))[-10:]
+        conversation = active_conversations[channel_id]
+        conversation.participants.add(user_id)
+        conversation.last_activity = time.time()
+        user_relationships.update(user_id, BOT_ID, 1.0)
+        if mentioned:
+            user_relationships.update(user_id, mentioned, 1.2)
+        conversation_sentiment[channel_id].user_sentiments[user_id] = UserSentiment(sentiment, intensity, emotions)
+    for message_id in reacted_messages:
+        record = gurt_message_reactions[message_id]
+        record.positive += 1
+        record.timestamp = time.time()
+    user_relationships.pop_dirty() # A snapshot would have cleared the dirty set
+    return user_conversation_mapping, user_relationships, active_conversations, conversation_sentiment, gurt_message_reactions
+
+def measure(label: str, build):
+    tracemalloc.start()
+    start_time = time.monotonic()
+    state = build()
+    duration = time.monotonic() - start_time
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<8} {current / 1024 / 1024:>10.1f} {peak / 1024 / 1024:>10.1f} {duration:>8.2f}")
+    del state
+    return current
+
+def main(args):
+    print(f"Simulating {args.users} users across {args.channels} channels...")
+    events, reacted_messages = simulate_activity(args.users, args.channels, args.seed)
+    print(f"{len(events)} messages, {len(reacted_messages)} reacted Gurt messages\n")
+    print(f"{'layout':<8} {'held MiB':>10} {'peak MiB':>10} {'build s':>8}")
+    legacy = measure("legacy", lambda: build_legacy(events, reacted_messages))
+    compact = measure("compact", lambda: build_compact(events, reacted_messages, args.users, args.channels))
+    print(f"\nCompact layout holds {compact / legacy:.0%} of the legacy layout's memory.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the memory footprint of GurtCog runtime state.")
+    parser.add_argument("--users", type=int, default=100000, help="Number of simulated users")
+    parser.add_argument("--channels", type=int, default=2000, help="Number of simulated channels")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    main(parser.parse_args())
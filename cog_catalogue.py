@@ -0,0 +1,105 @@
+"""
+Precomputed cog -> commands catalogue for the dashboard.
+Built once after the cogs are loaded (and again after reloads) instead of walking bot.cogs and
+bot.tree on every request. get_cog_catalogue() also rebuilds it by itself if the set of loaded
+cogs or app commands changed since it was built, so extensions loaded elsewhere are picked up.
+"""
+import hashlib
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import settings_manager
+
+log = logging.getLogger(__name__)
+
+def _catalogue_signature(bot) -> Tuple:
+    """Changes whenever a cog is added, removed or reloaded (new instance) or app commands change."""
+    return (tuple(id(cog) for cog in bot.cogs.values()), tuple(id(cmd) for cmd in bot.tree.get_commands()))
+
+def build_cog_catalogue(bot) -> Dict[str, Any]:
+    """
+    Builds {"cogs": [{"name", "description", "commands": [{"name", "description"}]}], "core_cogs", "version"} from the
+    loaded cogs, stores it on bot.cog_catalogue and returns it. Prefix commands are listed by their
+    qualified name, app commands by name (skipped if a prefix command already has that name).
+    """
+    app_commands_by_cog: Dict[str, List[Any]] = {}
+    for cmd in bot.tree.get_commands():
+        cog = getattr(cmd, "cog", None)
+        if cog:
+            app_commands_by_cog.setdefault(cog.qualified_name, []).append(cmd)
+
+    cogs: List[Dict[str, Any]] = []
+    for cog_name, cog in bot.cogs.items():
+        commands_list = [
+            {"name": command.qualified_name, "description": command.help or "No description available"}
+            for command in cog.get_commands()
+        ]
+        names = {command["name"] for command in commands_list}
+        for cmd in app_commands_by_cog.get(cog_name, []):
+            if cmd.name not in names: # Avoid duplicates
+                names.add(cmd.name)
+                commands_list.append({"name": cmd.name, "description": cmd.description or "No description available"})
+        cogs.append({
+            "name": cog_name,
+            "description": cog.__doc__ or "No description available",
+            "commands": commands_list,
+        })
+
+    catalogue = {
+        "cogs": cogs,
+        "core_cogs": sorted(getattr(bot, "core_cogs", None) or []),
+        "version": hashlib.sha1(json.dumps(cogs, sort_keys=True).encode("utf-8")).hexdigest()[:16],
+        "signature": _catalogue_signature(bot),
+    }
+    bot.cog_catalogue = catalogue
+    log.info(f"Built cog catalogue: {len(cogs)} cogs, {sum(len(cog['commands']) for cog in cogs)} commands (version {catalogue['version']})")
+    return catalogue
+
+def get_cog_catalogue(bot) -> Dict[str, Any]:
+    """Returns the bot's cog catalogue, (re)building it if missing or out of date."""
+    catalogue = getattr(bot, "cog_catalogue", None)
+    if catalogue is None or catalogue["signature"] != _catalogue_signature(bot):
+        catalogue = build_cog_catalogue(bot)
+    return catalogue
+
+async def resolve_cog_catalogue(bot) -> Dict[str, Any]:
+    """
+    Like get_cog_catalogue(), but bot may also be the RemoteBot stand-in of a standalone API
+    worker (api_service/bot_rpc.py), in which case the catalogue is fetched from the bot over RPC.
+    """
+    fetch_cog_catalogue = getattr(bot, "fetch_cog_catalogue", None)
+    if fetch_cog_catalogue is not None:
+        return await fetch_cog_catalogue()
+    return get_cog_catalogue(bot)
+
+async def get_guild_cogs_listing(bot, guild_id: int) -> Optional[Tuple[List[Dict[str, Any]], str]]:
+    """
+    Returns (cogs with their commands and enabled flags, ETag) for a guild, using the catalogue and a
+    single toggles query. The ETag only changes when the catalogue or the guild's toggles do.
+    Returns None if the toggles couldn't be loaded.
+    """
+    catalogue = await resolve_cog_catalogue(bot)
+    toggles = await settings_manager.get_guild_toggles(guild_id)
+    if toggles is None:
+        return None
+
+    toggles_digest = hashlib.sha1(json.dumps(toggles, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    etag = f'W/"{catalogue["version"]}-{toggles_digest}"'
+    cog_toggles, command_toggles = toggles["cogs"], toggles["commands"]
+    listing = [
+        {
+            "name": cog["name"],
+            "description": cog["description"],
+            "enabled": cog_toggles.get(cog["name"], True),
+            "commands": [{**command, "enabled": command_toggles.get(command["name"], True)} for command in cog["commands"]],
+        }
+        for cog in catalogue["cogs"]
+    ]
+    return listing, etag
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value matches etag."""
+    if not if_none_match:
+        return False
+    return any(tag.strip() in (etag, "*") for tag in if_none_match.split(","))
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import logging
+import time
+
+import discord
+import redis.asyncio as aioredis
+from discord.ext import commands
+
+import settings_manager
+
+from api_service.bot_rpc import RPC_REQUEST_QUEUE, RPC_HEARTBEAT_KEY, RPC_HEARTBEAT_TTL, RPC_REPLY_TTL
+from cog_catalogue import get_cog_catalogue
+
+log = logging.getLogger(__name__)
+
+class BotRpcCog(commands.Cog, name="BotRpc"):
+    """
+    Serves RPC requests from standalone API workers (api_service/bot_rpc.py) for operations that
+    need the live bot: its loaded cogs and its command tree. Requests arrive on a Redis list and
+    each one is handled in its own task, so a slow handler doesn't hold up the queue. The consumer
+    blocks in BLPOP on its own Redis connection, so it never holds one of bot.redis's pooled ones.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self._consumer_task = None
+        self._heartbeat_task = None
+        self._consumer_redis = None # Dedicated client for the blocking BLPOP
+        self._handler_tasks = set() # Strong references to running handlers
+        self.handlers = {
+            "ping": self.rpc_ping,
+            "cog_catalogue": self.rpc_cog_catalogue,
+            "command_exists": self.rpc_command_exists,
+            "sync_guild_commands": self.rpc_sync_guild_commands,
+        }
+
+    async def cog_load(self):
+        self._consumer_task = asyncio.create_task(self._consume_requests())
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def cog_unload(self):
+        for task in (self._consumer_task, self._heartbeat_task):
+            if task:
+                task.cancel()
+        redis = getattr(self.bot, "redis", None)
+        if redis is not None:
+            try:
+                await redis.delete(RPC_HEARTBEAT_KEY)
+            except Exception:
+                pass
+        if self._consumer_redis is not None:
+            try:
+                await self._consumer_redis.aclose()
+            except Exception:
+                pass
+            self._consumer_redis = None
+
+    # --- Handlers (params come from the JSON request; results must be JSON serializable) ---
+
+    async def rpc_ping(self):
+        return {"bot_id": self.bot.user.id if self.bot.user else None, "guilds": len(self.bot.guilds)}
+
+    async def rpc_cog_catalogue(self):
+        catalogue = get_cog_catalogue(self.bot)
+        return {key: value for key, value in catalogue.items() if key != "signature"}
+
+    async def rpc_command_exists(self, command_name: str):
+        # Prefix command, or else app command
+        return bool(self.bot.get_command(command_name)) or any(cmd.name == command_name for cmd in self.bot.tree.get_commands())
+
+    async def rpc_sync_guild_commands(self, guild_id: int):
+        guild = discord.Object(id=int(guild_id))
+        synced = await self.bot.tree.sync(guild=guild)
+        return {"synced": len(synced)}
+
+    # --- Transport ---
+
+    async def _heartbeat(self):
+        await self.bot.wait_until_ready()
+        while True:
+            redis = getattr(self.bot, "redis", None)
+            if redis is not None:
+                try:
+                    await redis.set(RPC_HEARTBEAT_KEY, str(time.time()), ex=RPC_HEARTBEAT_TTL)
+                except Exception as e:
+                    log.warning(f"Bot RPC: Failed to refresh heartbeat: {e}")
+            await asyncio.sleep(RPC_HEARTBEAT_TTL / 3)
+
+    async def _consume_requests(self):
+        await self.bot.wait_until_ready()
+        while True:
+            redis = getattr(self.bot, "redis", None)
+            if redis is None:
+                await asyncio.sleep(5)
+                continue
+            try:
+                if self._consumer_redis is None:
+                    self._consumer_redis = await aioredis.from_url(settings_manager.REDIS_URL, max_connections=1, decode_responses=True)
+                item = await self._consumer_redis.blpop(RPC_REQUEST_QUEUE, timeout=5)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning(f"Bot RPC: Failed to read requests: {e}")
+                await asyncio.sleep(1)
+                continue
+            if item is not None:
+                task = asyncio.create_task(self._handle(redis, item[1]))
+                self._handler_tasks.add(task)
+                task.add_done_callback(self._handler_tasks.discard)
+
+    async def _handle(self, redis, raw_request: str):
+        try:
+            request = json.loads(raw_request)
+        except ValueError:
+            log.warning("Bot RPC: Dropping malformed request")
+            return
+        if request.get("deadline", 0) < time.time():
+            return # The caller has already given up
+
+        handler = self.handlers.get(request.get("method"))
+        if handler is None:
+            response = {"ok": False, "status": 404, "error": f"Unknown method '{request.get('method')}'"}
+        else:
+            try:
+                response = {"ok": True, "result": await handler(**request.get("params", {}))}
+            except discord.HTTPException as e:
+                response = {"ok": False, "status": e.status, "error": str(e)}
+            except Exception as e:
+                log.exception(f"Bot RPC: Handler for '{request.get('method')}' failed: {e}")
+                response = {"ok": False, "status": 500, "error": str(e)}
+
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.rpush(request["reply_to"], json.dumps(response))
+                pipe.expire(request["reply_to"], RPC_REPLY_TTL)
+                await pipe.execute()
+        except Exception as e:
+            log.warning(f"Bot RPC: Failed to send reply for '{request.get('method')}': {e}")
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(BotRpcCog(bot))
@@ -0,0 +1,117 @@
+import json
+import logging
+
+import discord
+from discord.ext import commands, tasks
+
+from api_service.guild_metadata import (
+    MIRROR_TTL, redis_key, guild_info_from_guild, channels_from_guild, roles_from_guild
+)
+
+log = logging.getLogger(__name__)
+
+class GuildMetadataCog(commands.Cog, name="GuildMetadata"):
+    """
+    Mirrors guild info, channels and roles from the gateway cache into Redis so the API service
+    (see api_service/guild_metadata.py) can serve dashboard requests without calling Discord REST.
+    Gateway events only mark guilds dirty; a short loop writes each dirty guild once, so bursts
+    such as channel reorders become a single write.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self._dirty_guilds = set()
+
+    async def cog_load(self):
+        self.flush_dirty_guilds.start()
+        if self.bot.is_ready(): # Reloaded while running
+            self._dirty_guilds.update(guild.id for guild in self.bot.guilds)
+
+    async def cog_unload(self):
+        self.flush_dirty_guilds.cancel()
+
+    def _mark(self, guild: discord.Guild):
+        if guild is not None:
+            self._dirty_guilds.add(guild.id)
+
+    async def _write_guilds(self, guild_ids):
+        redis = getattr(self.bot, "redis", None)
+        if redis is None:
+            return
+        async with redis.pipeline(transaction=False) as pipe:
+            for guild_id in guild_ids:
+                guild = self.bot.get_guild(guild_id)
+                if guild is None:
+                    continue
+                pipe.set(redis_key(guild_id, "info"), json.dumps(guild_info_from_guild(guild)), ex=MIRROR_TTL)
+                pipe.set(redis_key(guild_id, "channels"), json.dumps(channels_from_guild(guild)), ex=MIRROR_TTL)
+                pipe.set(redis_key(guild_id, "roles"), json.dumps(roles_from_guild(guild)), ex=MIRROR_TTL)
+            await pipe.execute()
+
+    @tasks.loop(seconds=2)
+    async def flush_dirty_guilds(self):
+        if not self._dirty_guilds:
+            return
+        guild_ids, self._dirty_guilds = self._dirty_guilds, set()
+        try:
+            await self._write_guilds(guild_ids)
+        except Exception as e:
+            log.warning(f"Failed to mirror metadata of {len(guild_ids)} guilds to Redis: {e}")
+            self._dirty_guilds.update(guild_ids) # Retry on the next tick
+
+    @flush_dirty_guilds.before_loop
+    async def before_flush_dirty_guilds(self):
+        await self.bot.wait_until_ready()
+
+    # --- Gateway events ---
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # Full refresh after (re)connecting, which also renews the mirror's TTL
+        self._dirty_guilds.update(guild.id for guild in self.bot.guilds)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild: discord.Guild):
+        self._mark(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_update(self, before: discord.Guild, after: discord.Guild):
+        self._mark(after)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        self._dirty_guilds.discard(guild.id)
+        redis = getattr(self.bot, "redis", None)
+        if redis is None:
+            return
+        try:
+            await redis.delete(*(redis_key(guild.id, kind) for kind in ("info", "channels", "roles", "commands")))
+        except Exception as e:
+            log.warning(f"Failed to remove mirrored metadata of guild {guild.id}: {e}")
+
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel: discord.abc.GuildChannel):
+        self._mark(channel.guild)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        self._mark(channel.guild)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before: discord.abc.GuildChannel, after: discord.abc.GuildChannel):
+        self._mark(after.guild)
+
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role: discord.Role):
+        self._mark(role.guild)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        self._mark(role.guild)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        self._mark(after.guild)
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(GuildMetadataCog(bot))
@@ -3,6 +3,7 @@ import asyncio
 import discord
 from discord.ext import commands
 from typing import List, Optional
+from cog_catalogue import build_cog_catalogue
 
 async def load_all_cogs(bot: commands.Bot, skip_cogs: Optional[List[str]] = None):
     """Loads all cogs from the 'cogs' directory, optionally skipping specified ones."""
@@ -53,6 +54,7 @@ async def load_all_cogs(bot: commands.Bot, skip_cogs: Optional[List[str]] = None
     if failed_cogs:
         print(f"Failed to load {len(failed_cogs)} cogs: {', '.join(failed_cogs)}")
     print("-" * 20)
+    build_cog_catalogue(bot) # Precompute the dashboard's cog -> commands listing
 
 # You might want a similar function for unloading or reloading
 async def unload_all_cogs(bot: commands.Bot):
@@ -108,4 +110,5 @@ async def reload_all_cogs(bot: commands.Bot, skip_cogs: Optional[List[str]] = No
                 print(f"Failed to reload cog {extension}: {e}")
                 # Attempt to unload if reload fails badly? Maybe too complex here.
                 failed_reload.append(extension)
+    build_cog_catalogue(bot)
     return reloaded_cogs, failed_reload
@@ -0,0 +1,185 @@
+import aiosqlite
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Optional, List, Tuple, Any, AsyncIterator
+
+log = logging.getLogger(__name__)
+
+# Applied to every connection when it is opened
+DEFAULT_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",     # Readers don't block the writer (and vice versa)
+    "PRAGMA synchronous=NORMAL;",   # Safe with WAL, avoids an fsync per commit
+    "PRAGMA cache_size=-16000;",    # ~16MB page cache per connection
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA busy_timeout=5000;",    # Wait up to 5s on a locked database instead of failing
+)
+
+class SQLitePool:
+    """
+    Long-lived aiosqlite connections for a single SQLite database file.
+
+    Holds a small pool of reader connections plus one writer connection, all opened lazily on
+    first use and tuned with DEFAULT_PRAGMAS. Each connection keeps its own prepared statement
+    cache, so repeated queries are not re-parsed. Single-statement writes submitted through
+    execute() are queued and committed together in one transaction by a background writer task;
+    multi-statement work (read-modify-write, lastrowid) should use transaction().
+    """
+
+    def __init__(self, db_path: str, readers: int = 2, write_batch_size: int = 50, cached_statements: int = 256):
+        self.db_path = db_path
+        self.reader_count = max(1, readers)
+        self.write_batch_size = max(1, write_batch_size)
+        self.cached_statements = cached_statements
+
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._readers: List[aiosqlite.Connection] = []
+        self._reader_queue: Optional[asyncio.Queue] = None
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._open_lock = asyncio.Lock()
+        self.write_lock = asyncio.Lock() # Serializes all use of the writer connection
+
+        # Simple counters, useful for checking that batching is actually happening
+        self.stats = {"writes": 0, "write_batches": 0, "reads": 0}
+
+    async def _connect(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.db_path, cached_statements=self.cached_statements)
+        for pragma in DEFAULT_PRAGMAS:
+            await conn.execute(pragma)
+        return conn
+
+    async def open(self):
+        """Opens the writer and reader connections if they aren't open yet."""
+        if self._writer is not None:
+            return
+        async with self._open_lock:
+            if self._writer is not None:
+                return
+            writer = await self._connect()
+            readers = [await self._connect() for _ in range(self.reader_count)]
+            self._reader_queue = asyncio.Queue()
+            for reader in readers:
+                self._reader_queue.put_nowait(reader)
+            self._readers = readers
+            self._write_queue = asyncio.Queue()
+            self._writer = writer
+            self._writer_task = asyncio.create_task(self._writer_loop())
+            log.info(f"SQLitePool opened for {self.db_path} (1 writer, {self.reader_count} readers)")
+
+    async def close(self):
+        """Flushes queued writes and closes all connections."""
+        if self._writer is None:
+            return
+        if self._write_queue is not None:
+            await self._write_queue.join() # Let pending writes commit
+        if self._writer_task and not self._writer_task.done():
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+        for conn in [self._writer] + self._readers:
+            try:
+                await conn.close()
+            except Exception as e:
+                log.error(f"Error closing SQLite connection for {self.db_path}: {e}")
+        self._writer = None
+        self._readers = []
+        self._reader_queue = None
+        self._write_queue = None
+        self._writer_task = None
+        log.info(f"SQLitePool closed for {self.db_path}")
+
+    # --- Reads ---
+
+    @asynccontextmanager
+    async def _reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        await self.open()
+        conn = await self._reader_queue.get()
+        try:
+            yield conn
+        finally:
+            self._reader_queue.put_nowait(conn)
+
+    async def fetchone(self, sql: str, params: tuple = ()) -> Optional[tuple]:
+        self.stats["reads"] += 1
+        async with self._reader() as conn:
+            async with conn.execute(sql, params) as cursor:
+                return await cursor.fetchone()
+
+    async def fetchall(self, sql: str, params: tuple = ()) -> List[tuple]:
+        self.stats["reads"] += 1
+        async with self._reader() as conn:
+            async with conn.execute(sql, params) as cursor:
+                return await cursor.fetchall()
+
+    # --- Writes ---
+
+    async def execute(self, sql: str, params: tuple = ()) -> int:
+        """
+        Queues a single write statement and waits until it has been committed.
+        Returns the statement's rowcount. Raises the statement's exception if it failed.
+        """
+        await self.open()
+        future = asyncio.get_running_loop().create_future()
+        self._write_queue.put_nowait((sql, params, future))
+        return await future
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Yields the writer connection for a multi-statement transaction.
+        Commits on normal exit and rolls back if the block raises.
+        """
+        await self.open()
+        async with self.write_lock:
+            try:
+                yield self._writer
+                await self._writer.commit()
+            except BaseException:
+                await self._writer.rollback()
+                raise
+
+    async def _writer_loop(self):
+        """Drains the write queue, committing up to write_batch_size statements per transaction."""
+        while True:
+            batch: List[Tuple[str, tuple, asyncio.Future]] = [await self._write_queue.get()]
+            while len(batch) < self.write_batch_size:
+                try:
+                    batch.append(self._write_queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+
+            results: List[Any] = []
+            try:
+                async with self.write_lock:
+                    for sql, params, _ in batch:
+                        try:
+                            cursor = await self._writer.execute(sql, params)
+                            results.append(cursor.rowcount)
+                        except Exception as e:
+                            results.append(e) # A failed statement doesn't abort the others
+                    await self._writer.commit()
+                self.stats["writes"] += len(batch)
+                self.stats["write_batches"] += 1
+            except asyncio.CancelledError:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.cancel()
+                raise
+            except Exception as e:
+                log.error(f"SQLitePool commit failed for {self.db_path} ({len(batch)} statements): {e}", exc_info=True)
+                try:
+                    await self._writer.rollback()
+                except Exception:
+                    pass
+                results = [e] * len(batch)
+
+            for (_, _, future), result in zip(batch, results):
+                if not future.done():
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+                self._write_queue.task_done()
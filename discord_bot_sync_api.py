@@ -12,6 +12,7 @@ import discord
 from discord.ext import commands
 import aiohttp
 import threading
+from api_service.auth_cache import DiscordTokenCache
 from typing import Optional # Added for GurtCog type hint
 
 # This file contains the API endpoints for syncing conversations between
@@ -172,6 +173,10 @@ def save_all_user_settings():
 
 # ============= Discord OAuth Verification =============
 
+# Shared with api_server's cache through Redis (same key scheme), see api_service/auth_cache.py
+token_cache = DiscordTokenCache(ttl=300.0, negative_ttl=30.0)
+http_session: Optional[aiohttp.ClientSession] = None
+
 async def verify_discord_token(authorization: str = Header(None)) -> str:
     """Verify the Discord token and return the user ID"""
     if not authorization:
@@ -181,16 +186,7 @@ async def verify_discord_token(authorization: str = Header(None)) -> str:
         raise HTTPException(status_code=401, detail="Invalid authorization format")
 
     token = authorization.replace("Bearer ", "")
-
-    # Verify the token with Discord
-    async with aiohttp.ClientSession() as session:
-        headers = {"Authorization": f"Bearer {token}"}
-        async with session.get("https://discord.com/api/v10/users/@me", headers=headers) as resp:
-            if resp.status != 200:
-                raise HTTPException(status_code=401, detail="Invalid Discord token")
-
-            user_data = await resp.json()
-            return user_data["id"]
+    return await token_cache.resolve(token)
 
 # ============= API Setup =============
 
@@ -229,9 +225,21 @@ api_app.add_middleware(
 # Initialize by loading saved data
 @app.on_event("startup")
 async def startup_event():
+    global http_session
     load_conversations()
     load_user_settings()
 
+    # Reuse one aiohttp session (and the shared Redis, if configured) for token verification
+    http_session = aiohttp.ClientSession()
+    token_cache.set_http_session(http_session)
+    try:
+        import settings_manager
+        if settings_manager.REDIS_HOST:
+            import redis.asyncio as redis
+            token_cache.set_redis(redis.from_url(settings_manager.REDIS_URL, decode_responses=True))
+    except Exception as e:
+        print(f"Token cache will not use Redis: {e}")
+
     # Try to load local settings from AI cog and merge them with synced settings
     try:
         from cogs.ai_cog import user_settings as local_user_settings, get_user_settings as get_local_settings
@@ -296,6 +304,15 @@ async def startup_event():
     except Exception as e:
         print(f"Error merging local settings with synced settings: {e}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if token_cache.redis is not None:
+        await token_cache.redis.close()
+        token_cache.set_redis(None)
+    if http_session:
+        token_cache.set_http_session(None)
+        await http_session.close()
+
 # ============= API Endpoints =============
 
 @app.get(API_BASE_PATH + "/")
@@ -0,0 +1,304 @@
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# Loaded SentenceTransformer models, keyed by model name. Shared by every MemoryManager in the
+# process (Gurt and Wheatley), so each model is only held in memory once.
+_models: Dict[str, Any] = {}
+_load_lock = threading.Lock()
+
+def get_sentence_transformer(model_name: str) -> Any:
+    """
+    Returns the process-wide SentenceTransformer for model_name, loading it on first use.
+    This blocks while the model loads, so call it from a worker thread (asyncio.to_thread).
+    """
+    model = _models.get(model_name)
+    if model is not None:
+        return model
+    with _load_lock:
+        model = _models.get(model_name)
+        if model is None:
+            # Imported here rather than at module level: pulling in torch alone takes seconds
+            from sentence_transformers import SentenceTransformer
+            start_time = time.monotonic()
+            model = SentenceTransformer(model_name)
+            _models[model_name] = model
+            log.info(f"Loaded Sentence Transformer model '{model_name}' in {time.monotonic() - start_time:.2f}s")
+    return model
+
+def loaded_models() -> List[str]:
+    """Returns the names of the models currently loaded in this process."""
+    return list(_models)
+
+# --- Out-of-process embedding service ---
+# Encoding is CPU heavy and holds the GIL for long stretches. When several bots share one process
+# (run_additional_bots.py), in-process encoding delays Discord gateway handling on every bot's loop.
+# EmbeddingService moves the model into a separate worker process instead.
+
+def _embedding_worker_main(model_name: str, requests, responses):
+    """Entry point of the worker process: loads the model once, then encodes batches until told to stop."""
+    try:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(model_name)
+    except Exception as e:
+        responses.put(("ready", None, None, f"{type(e).__name__}: {e}"))
+        return
+    responses.put(("ready", None, None, None))
+
+    while True:
+        item = requests.get()
+        if item is None: # Shutdown signal
+            break
+        batch_id, texts = item
+        try:
+            embeddings = np.asarray(model.encode(texts, show_progress_bar=False), dtype=np.float32)
+            # Hand the result back through shared memory rather than pickling it through the queue
+            shm = shared_memory.SharedMemory(create=True, size=max(embeddings.nbytes, 1))
+            np.ndarray(embeddings.shape, dtype=np.float32, buffer=shm.buf)[:] = embeddings
+            responses.put((batch_id, shm.name, embeddings.shape, None))
+            shm.close() # The client unlinks it after copying
+        except Exception as e:
+            responses.put((batch_id, None, None, f"{type(e).__name__}: {e}"))
+
+class EmbeddingService:
+    """
+    Runs a SentenceTransformer in a separate worker process and encodes text for any caller in this
+    process (any thread or event loop).
+
+    Concurrent requests are coalesced into batches of up to max_batch_size texts, waiting at most
+    batch_window seconds for more to arrive. Embeddings come back as float32 arrays through shared
+    memory. encode() matches SentenceTransformer.encode closely enough to be used in its place.
+
+    Callers keep the service they were given, so if the worker dies, encode() hands requests to a
+    restarted service (get_embedding_service) or, while that fails, to the in-process model.
+    """
+
+    RESTART_RETRY_INTERVAL = 60.0 # Seconds to use the in-process model after a failed restart
+
+    def __init__(self, model_name: str, max_batch_size: int = 64, batch_window: float = 0.005, request_timeout: float = 60.0):
+        self.model_name = model_name
+        self.max_batch_size = max(1, max_batch_size)
+        self.batch_window = batch_window
+        self.request_timeout = request_timeout
+
+        self._process = None
+        self._requests = None # multiprocessing.Queue -> worker: (batch_id, texts) or None
+        self._responses = None # multiprocessing.Queue <- worker: (batch_id, shm_name, shape, error)
+        self._pending: queue.Queue = None # (texts, concurrent.futures.Future) from callers
+        self._in_flight: Dict[int, Tuple[float, List[Tuple[concurrent.futures.Future, int]]]] = {} # batch_id -> (sent at, [(future, text count), ...])
+        self._in_flight_lock = threading.Lock()
+        self._batch_ids = 0
+        self._stopping = False
+        self._stopped = False # stop() was called, as opposed to the worker dying
+        self._restart_failed_at = None
+        self.stats = {"requests": 0, "texts": 0, "batches": 0, "errors": 0, "total_time": 0.0, "max_batch_size": 0}
+
+    def start(self, startup_timeout: float = 300.0):
+        """Starts the worker process and waits for it to load the model. Blocking."""
+        # spawn, not fork: forking a process that runs several event loops and threads isn't safe
+        ctx = multiprocessing.get_context("spawn")
+        self._requests = ctx.Queue()
+        self._responses = ctx.Queue()
+        self._pending = queue.Queue()
+        self._process = ctx.Process(
+            target=_embedding_worker_main, args=(self.model_name, self._requests, self._responses),
+            name=f"embedding-worker-{self.model_name}", daemon=True
+        )
+        start_time = time.monotonic()
+        self._process.start()
+        _, _, _, error = self._responses.get(timeout=startup_timeout)
+        if error:
+            self._process.join(timeout=5)
+            raise RuntimeError(f"Embedding worker failed to load '{self.model_name}': {error}")
+        threading.Thread(target=self._dispatch_loop, name="embedding-dispatch", daemon=True).start()
+        threading.Thread(target=self._result_loop, name="embedding-results", daemon=True).start()
+        log.info(f"Embedding worker (pid {self._process.pid}) ready with '{self.model_name}' in {time.monotonic() - start_time:.2f}s")
+
+    def stop(self):
+        """Stops the worker process. Pending requests fail."""
+        self._stopped = True
+        self._stopping = True
+        if self._process and self._process.is_alive():
+            self._requests.put(None)
+            self._process.join(timeout=5)
+            if self._process.is_alive():
+                self._process.terminate()
+        self._fail_in_flight("Embedding service stopped")
+
+    @property
+    def alive(self) -> bool:
+        return bool(self._process and self._process.is_alive() and not self._stopping)
+
+    def submit(self, texts: List[str]):
+        """Queues texts for encoding. Returns a concurrent.futures.Future resolving to a float32 array."""
+        future = concurrent.futures.Future()
+        if not self.alive:
+            future.set_exception(RuntimeError("Embedding service is not running"))
+        elif not texts:
+            future.set_result(np.zeros((0, 0), dtype=np.float32))
+        else:
+            self._pending.put((list(texts), future))
+        return future
+
+    def _replacement(self) -> Any:
+        """
+        After the worker died: the restarted service for this model, or the in-process model if the
+        restart fails (retried after RESTART_RETRY_INTERVAL). Blocking.
+        """
+        if self._restart_failed_at is None or time.monotonic() - self._restart_failed_at >= self.RESTART_RETRY_INTERVAL:
+            try:
+                service = get_embedding_service(self.model_name)
+                self._restart_failed_at = None
+                return service
+            except Exception as e:
+                self._restart_failed_at = time.monotonic()
+                log.error(f"Could not restart embedding service for '{self.model_name}', using in-process model: {e}", exc_info=True)
+        return get_sentence_transformer(self.model_name)
+
+    def encode(self, sentences, show_progress_bar: bool = False, **kwargs):
+        """Blocking encode, for callers in worker threads (e.g. ChromaDB embedding functions)."""
+        if not self.alive and not self._stopped:
+            replacement = self._replacement()
+            if replacement is not self:
+                return replacement.encode(sentences, show_progress_bar=show_progress_bar, **kwargs)
+        if isinstance(sentences, str):
+            return self.submit([sentences]).result(timeout=self.request_timeout)[0]
+        return self.submit(sentences).result(timeout=self.request_timeout)
+
+    async def encode_async(self, sentences: List[str]):
+        """Awaitable encode that doesn't occupy a thread pool worker while waiting."""
+        if not self.alive and not self._stopped:
+            # Restarting (or loading the fallback model) blocks, so do it in a thread
+            return await asyncio.to_thread(self.encode, sentences)
+        return await asyncio.wait_for(asyncio.wrap_future(self.submit(sentences)), timeout=self.request_timeout)
+
+    def _dispatch_loop(self):
+        """Coalesces pending requests into batches and sends them to the worker."""
+        while not self._stopping:
+            try:
+                first = self._pending.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            requests = [first]
+            text_count = len(first[0])
+            deadline = time.monotonic() + self.batch_window
+            while text_count < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                requests.append(request)
+                text_count += len(request[0])
+
+            with self._in_flight_lock:
+                self._batch_ids += 1
+                batch_id = self._batch_ids
+                self._in_flight[batch_id] = (time.monotonic(), [(future, len(texts)) for texts, future in requests])
+            self._requests.put((batch_id, [text for texts, _ in requests for text in texts]))
+            self.stats["requests"] += len(requests)
+            self.stats["texts"] += text_count
+            self.stats["batches"] += 1
+            self.stats["max_batch_size"] = max(self.stats["max_batch_size"], text_count)
+
+    def _result_loop(self):
+        """Reads results from the worker and resolves the futures of the requests in each batch."""
+        while not self._stopping:
+            try:
+                batch_id, shm_name, shape, error = self._responses.get(timeout=1.0)
+            except queue.Empty:
+                if self._process and not self._process.is_alive():
+                    log.error(f"Embedding worker for '{self.model_name}' exited (code {self._process.exitcode})")
+                    self._stopping = True
+                    self._fail_in_flight("Embedding worker exited")
+                continue
+            with self._in_flight_lock:
+                in_flight = self._in_flight.pop(batch_id, None)
+            if in_flight is None:
+                if shm_name:
+                    self._unlink_shared_memory(shm_name) # Late result of a failed batch; nobody reads it
+                continue
+            sent_at, batch = in_flight
+            self.stats["total_time"] += time.monotonic() - sent_at
+
+            if error:
+                self.stats["errors"] += 1
+                for future, _ in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError(error))
+                continue
+            shm = shared_memory.SharedMemory(name=shm_name)
+            try:
+                embeddings = np.ndarray(shape, dtype=np.float32, buffer=shm.buf).copy()
+            finally:
+                shm.close()
+                shm.unlink()
+            offset = 0
+            for future, count in batch:
+                if not future.done(): # The caller may have given up (timeout/cancel)
+                    future.set_result(embeddings[offset:offset + count])
+                offset += count
+
+    @staticmethod
+    def _unlink_shared_memory(shm_name: str):
+        try:
+            shm = shared_memory.SharedMemory(name=shm_name)
+        except FileNotFoundError:
+            return
+        shm.close()
+        shm.unlink()
+
+    def _fail_in_flight(self, reason: str):
+        with self._in_flight_lock:
+            batches = list(self._in_flight.values())
+            self._in_flight.clear()
+        for _, batch in batches:
+            for future, _ in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError(reason))
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["alive"] = self.alive
+        stats["average_batch_ms"] = round((stats["total_time"] / stats["batches"]) * 1000, 2) if stats["batches"] > 0 else 0
+        return stats
+
+_services: Dict[str, EmbeddingService] = {}
+
+def get_embedding_service(model_name: str) -> EmbeddingService:
+    """Returns the process-wide EmbeddingService for model_name, starting its worker on first use. Blocking."""
+    service = _services.get(model_name)
+    if service is not None and service.alive:
+        return service
+    with _load_lock:
+        service = _services.get(model_name)
+        if service is None or not service.alive:
+            service = EmbeddingService(model_name)
+            service.start()
+            _services[model_name] = service
+    return service
+
+def get_embedding_model(model_name: str, use_service: bool = False) -> Any:
+    """
+    Returns something with a SentenceTransformer-compatible encode(): the out-of-process service when
+    use_service is set (falling back to the in-process model if the worker can't start), otherwise the
+    shared in-process model. Blocking; call from a worker thread.
+    """
+    if use_service:
+        try:
+            return get_embedding_service(model_name)
+        except Exception as e:
+            log.error(f"Could not start embedding service for '{model_name}', using in-process model: {e}", exc_info=True)
+    return get_sentence_transformer(model_name)
@@ -13,6 +13,7 @@ from .config import (
     TOPIC_RELEVANCE_DECAY, MAX_ACTIVE_TOPICS, SENTIMENT_DECAY_RATE,
     EMOTION_KEYWORDS, EMOJI_SENTIMENT # Import necessary configs
 )
+from .state import UserSentiment
 
 if TYPE_CHECKING:
     from .cog import GurtCog # For type hinting
@@ -359,8 +360,8 @@ async def evolve_personality(cog: 'GurtCog'):
         positive_sentiment_score = 0; negative_sentiment_score = 0; sentiment_channels_count = 0
         for channel_id, sentiment_data in cog.conversation_sentiment.items():
             if time.time() - cog.channel_activity.get(channel_id, 0) < 3600:
-                if sentiment_data["overall"] == "positive": positive_sentiment_score += sentiment_data["intensity"]
-                elif sentiment_data["overall"] == "negative": negative_sentiment_score += sentiment_data["intensity"]
+                if sentiment_data.overall == "positive": positive_sentiment_score += sentiment_data.intensity
+                elif sentiment_data.overall == "negative": negative_sentiment_score += sentiment_data.intensity
                 sentiment_channels_count += 1
         avg_pos_intensity = positive_sentiment_score / sentiment_channels_count if sentiment_channels_count > 0 else 0
         avg_neg_intensity = negative_sentiment_score / sentiment_channels_count if sentiment_channels_count > 0 else 0
@@ -387,8 +388,8 @@ async def evolve_personality(cog: 'GurtCog'):
         negative_reactions = 0
         total_reacted_messages = len(cog.gurt_message_reactions)
         for msg_id, reaction_data in cog.gurt_message_reactions.items():
-            positive_reactions += reaction_data.get("positive", 0)
-            negative_reactions += reaction_data.get("negative", 0)
+            positive_reactions += reaction_data.positive
+            negative_reactions += reaction_data.negative
         reaction_ratio = positive_reactions / (positive_reactions + negative_reactions) if (positive_reactions + negative_reactions) > 0 else 0.5 # Default neutral
         print(f"Evolution Analysis: Reaction Ratio (Pos/Total)={reaction_ratio:.2f} ({positive_reactions}/{positive_reactions + negative_reactions})")
 
@@ -637,52 +638,53 @@ def analyze_message_sentiment(cog: 'GurtCog', message_content: str) -> Dict[str,
 
     return result
 
-def update_conversation_sentiment(cog: 'GurtCog', channel_id: int, user_id: str, message_sentiment: Dict[str, Any]):
+def update_conversation_sentiment(cog: 'GurtCog', channel_id: int, user_id: int, message_sentiment: Dict[str, Any]):
     """Updates the conversation sentiment tracking based on a new message's sentiment."""
-    channel_sentiment = cog.conversation_sentiment[channel_id]
+    channel_sentiment = cog.conversation_sentiment[channel_id] # ChannelSentiment, see state.py
     now = time.time()
 
-    if now - channel_sentiment["last_update"] > cog.sentiment_update_interval: # Access interval via cog
-        if channel_sentiment["overall"] == "positive": channel_sentiment["intensity"] = max(0.5, channel_sentiment["intensity"] - SENTIMENT_DECAY_RATE)
-        elif channel_sentiment["overall"] == "negative": channel_sentiment["intensity"] = max(0.5, channel_sentiment["intensity"] - SENTIMENT_DECAY_RATE)
-        channel_sentiment["recent_trend"] = "stable"
-        channel_sentiment["last_update"] = now
-
-    user_sentiment = channel_sentiment["user_sentiments"].get(user_id, {"sentiment": "neutral", "intensity": 0.5})
-    confidence_weight = message_sentiment["confidence"]
-    if user_sentiment["sentiment"] == message_sentiment["sentiment"]:
-        new_intensity = user_sentiment["intensity"] * 0.7 + message_sentiment["intensity"] * 0.3
-        user_sentiment["intensity"] = min(0.95, new_intensity)
+    if now - channel_sentiment.last_update > cog.sentiment_update_interval: # Access interval via cog
+        if channel_sentiment.overall == "positive": channel_sentiment.intensity = max(0.5, channel_sentiment.intensity - SENTIMENT_DECAY_RATE)
+        elif channel_sentiment.overall == "negative": channel_sentiment.intensity = max(0.5, channel_sentiment.intensity - SENTIMENT_DECAY_RATE)
+        channel_sentiment.recent_trend = "stable"
+        channel_sentiment.last_update = now
+
+    user_sentiment = channel_sentiment.user_sentiments.get(user_id) or UserSentiment()
+    if user_sentiment.sentiment == message_sentiment["sentiment"]:
+        new_intensity = user_sentiment.intensity * 0.7 + message_sentiment["intensity"] * 0.3
+        user_sentiment.intensity = min(0.95, new_intensity)
     else:
         if message_sentiment["confidence"] > 0.7:
-            user_sentiment["sentiment"] = message_sentiment["sentiment"]
-            user_sentiment["intensity"] = message_sentiment["intensity"] * 0.7 + user_sentiment["intensity"] * 0.3
+            user_sentiment.sentiment = message_sentiment["sentiment"]
+            user_sentiment.intensity = message_sentiment["intensity"] * 0.7 + user_sentiment.intensity * 0.3
         else:
-            if message_sentiment["intensity"] > user_sentiment["intensity"]:
-                user_sentiment["sentiment"] = message_sentiment["sentiment"]
-                user_sentiment["intensity"] = user_sentiment["intensity"] * 0.6 + message_sentiment["intensity"] * 0.4
+            if message_sentiment["intensity"] > user_sentiment.intensity:
+                user_sentiment.sentiment = message_sentiment["sentiment"]
+                user_sentiment.intensity = user_sentiment.intensity * 0.6 + message_sentiment["intensity"] * 0.4
 
-    user_sentiment["emotions"] = message_sentiment.get("emotions", [])
-    channel_sentiment["user_sentiments"][user_id] = user_sentiment
+    user_sentiment.emotions = tuple(message_sentiment.get("emotions", ()))
+    channel_sentiment.user_sentiments[user_id] = user_sentiment
 
-    # Update overall based on active users (simplified access to active_conversations)
-    active_user_sentiments = [s for uid, s in channel_sentiment["user_sentiments"].items() if uid in cog.active_conversations.get(channel_id, {}).get('participants', set())]
+    # Update overall based on active users
+    active_conversation = cog.active_conversations.get(channel_id)
+    participants = active_conversation.participants if active_conversation else set()
+    active_user_sentiments = [s for uid, s in channel_sentiment.user_sentiments.items() if uid in participants]
     if active_user_sentiments:
         sentiment_counts = defaultdict(int)
-        for s in active_user_sentiments: sentiment_counts[s["sentiment"]] += 1
+        for s in active_user_sentiments: sentiment_counts[s.sentiment] += 1
         dominant_sentiment = max(sentiment_counts.items(), key=lambda x: x[1])[0]
-        avg_intensity = sum(s["intensity"] for s in active_user_sentiments if s["sentiment"] == dominant_sentiment) / sentiment_counts[dominant_sentiment]
+        avg_intensity = sum(s.intensity for s in active_user_sentiments if s.sentiment == dominant_sentiment) / sentiment_counts[dominant_sentiment]
 
-        prev_sentiment = channel_sentiment["overall"]; prev_intensity = channel_sentiment["intensity"]
+        prev_sentiment = channel_sentiment.overall; prev_intensity = channel_sentiment.intensity
         if dominant_sentiment == prev_sentiment:
-            if avg_intensity > prev_intensity + 0.1: channel_sentiment["recent_trend"] = "intensifying"
-            elif avg_intensity < prev_intensity - 0.1: channel_sentiment["recent_trend"] = "diminishing"
-            else: channel_sentiment["recent_trend"] = "stable"
-        else: channel_sentiment["recent_trend"] = "changing"
-        channel_sentiment["overall"] = dominant_sentiment
-        channel_sentiment["intensity"] = avg_intensity
-
-    channel_sentiment["last_update"] = now
+            if avg_intensity > prev_intensity + 0.1: channel_sentiment.recent_trend = "intensifying"
+            elif avg_intensity < prev_intensity - 0.1: channel_sentiment.recent_trend = "diminishing"
+            else: channel_sentiment.recent_trend = "stable"
+        else: channel_sentiment.recent_trend = "changing"
+        channel_sentiment.overall = dominant_sentiment
+        channel_sentiment.intensity = avg_intensity
+
+    channel_sentiment.last_update = now
     # No need to reassign cog.conversation_sentiment[channel_id] as it's modified in place
 
 # --- Proactive Goal Creation ---
@@ -24,7 +24,8 @@ import base64
 import re
 import time
 import datetime
-from typing import TYPE_CHECKING, Optional, List, Dict, Any, Union, AsyncIterable, Tuple # Import Tuple
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Optional, List, Dict, Any, Union, AsyncIterable, Tuple, Callable, Awaitable # Import Tuple
 import jsonschema # For manual JSON validation
 from .tools import get_conversation_summary
 
@@ -154,18 +155,40 @@ from .config import (
     PROJECT_ID, LOCATION, DEFAULT_MODEL, FALLBACK_MODEL, CUSTOM_TUNED_MODEL_ENDPOINT, # Import the new endpoint
     API_TIMEOUT, API_RETRY_ATTEMPTS, API_RETRY_DELAY, TOOLS, RESPONSE_SCHEMA,
     PROACTIVE_PLAN_SCHEMA, # Import the new schema
-    TAVILY_API_KEY, PISTON_API_URL, PISTON_API_KEY, BASELINE_PERSONALITY # Import other needed configs
+    TAVILY_API_KEY, PISTON_API_URL, PISTON_API_KEY, BASELINE_PERSONALITY, # Import other needed configs
+    TOOL_MAX_PARALLELISM, TOOL_CACHE_ENABLED
 )
 from .prompt import build_dynamic_system_prompt
 from .context import gather_conversation_context, get_memory_context # Renamed functions
-from .tools import TOOL_MAPPING # Import tool mapping
+from .tools import ( # Import tool mapping, execution metadata and result cache helpers
+    TOOL_MAPPING, get_tool_metadata, get_tool_cache_key, get_cached_tool_result,
+    store_tool_result, invalidate_tool_results
+)
 from .utils import format_message, log_internal_api_call # Import utilities
+from metrics import REGISTRY, SLOW_BUCKETS # Process-wide metrics registry (top-level module)
 import copy # Needed for deep copying schemas
 
 if TYPE_CHECKING:
     from .cog import GurtCog # Import GurtCog for type hinting only
 
 
+# --- Metrics (exported by the process's /metrics endpoint, see metrics.py) ---
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "gurt_llm_request_duration_seconds", "Gurt LLM request duration including retries", ("model", "mode", "outcome"), buckets=SLOW_BUCKETS)
+LLM_TOKENS = REGISTRY.counter("gurt_llm_tokens_total", "Tokens used by Gurt LLM requests", ("model", "kind"))
+TOOL_SECONDS = REGISTRY.histogram("gurt_tool_duration_seconds", "Gurt tool execution duration", ("tool", "outcome"))
+
+def record_llm_usage(model_name: str, usage_metadata: Any):
+    """Adds a response's usage_metadata token counts to LLM_TOKENS."""
+    if usage_metadata is None:
+        return
+    for kind, attribute in (("prompt", "prompt_token_count"), ("completion", "candidates_token_count"),
+                            ("cached", "cached_content_token_count"), ("thoughts", "thoughts_token_count")):
+        count = getattr(usage_metadata, attribute, None)
+        if count:
+            LLM_TOKENS.labels(model_name, kind).inc(count)
+
+
 # --- Schema Preprocessing Helper ---
 def _preprocess_schema_for_vertex(schema: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -347,6 +370,32 @@ STANDARD_SAFETY_SETTINGS = [
 ]
 
 # --- API Call Helper ---
+@asynccontextmanager
+async def llm_concurrency_slot(cog: 'GurtCog', request_desc: str):
+    """
+    Holds one of the cog's LLM_MAX_CONCURRENCY model call slots for the duration of the block,
+    recording how long the call queued for it. Held per attempt, so retry backoff doesn't hold a slot.
+    """
+    stats = cog.llm_queue_stats
+    queued_at = time.monotonic()
+    stats["waiting"] += 1
+    try:
+        await cog.llm_semaphore.acquire()
+    finally:
+        stats["waiting"] -= 1
+    wait_time = time.monotonic() - queued_at
+    stats["acquired"] += 1
+    stats["total_wait"] += wait_time
+    stats["max_wait"] = max(stats["max_wait"], wait_time)
+    if wait_time > 1.0:
+        print(f"{request_desc} waited {wait_time:.2f}s for an LLM call slot.")
+    stats["in_flight"] += 1
+    try:
+        yield
+    finally:
+        stats["in_flight"] -= 1
+        cog.llm_semaphore.release()
+
 async def call_google_genai_api_with_retry(
     cog: 'GurtCog',
     model_name: str, # Pass model name string instead of model object
@@ -395,12 +444,13 @@ async def call_google_genai_api_with_retry(
 
             # Use the non-streaming async call - config now contains all settings
             # The 'model' parameter here should be the actual model name string
-            response = await genai_client.aio.models.generate_content(
-                model=model_name, # Use the model_name string directly
-                contents=contents,
-                config=generation_config, # Pass the combined config object
-                # stream=False is implicit for generate_content
-            )
+            async with llm_concurrency_slot(cog, request_desc):
+                response = await genai_client.aio.models.generate_content(
+                    model=model_name, # Use the model_name string directly
+                    contents=contents,
+                    config=generation_config, # Pass the combined config object
+                    # stream=False is implicit for generate_content
+                )
 
             # --- Check Finish Reason (Safety) ---
             # Access finish reason and safety ratings from the response object
@@ -426,6 +476,8 @@ async def call_google_genai_api_with_retry(
             cog.api_stats[model_name]['success'] += 1
             cog.api_stats[model_name]['total_time'] += elapsed_time
             cog.api_stats[model_name]['count'] += 1
+            LLM_REQUEST_SECONDS.labels(model_name, "single", "success").observe(elapsed_time)
+            record_llm_usage(model_name, getattr(response, 'usage_metadata', None))
             print(f"API request successful for {request_desc} ({model_name}) in {elapsed_time:.2f}s.")
             return response # Success
 
@@ -499,12 +551,139 @@ async def call_google_genai_api_with_retry(
     cog.api_stats[model_name]['failure'] += 1
     cog.api_stats[model_name]['total_time'] += elapsed_time
     cog.api_stats[model_name]['count'] += 1
+    LLM_REQUEST_SECONDS.labels(model_name, "single", "failure").observe(elapsed_time)
     print(f"API request failed for {request_desc} ({model_name}) after {attempt + 1} attempts in {elapsed_time:.2f}s.")
 
     # Raise the last encountered exception or a generic one
     raise last_exception or Exception(f"API request failed for {request_desc} after {API_RETRY_ATTEMPTS + 1} attempts.")
 
 
+async def call_google_genai_api_stream_with_retry(
+    cog: 'GurtCog',
+    model_name: str,
+    contents: List[types.Content],
+    generation_config: types.GenerateContentConfig,
+    request_desc: str,
+    on_text: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> str:
+    """
+    Streaming counterpart of call_google_genai_api_with_retry.
+
+    Calls on_text with the accumulated response text after every received chunk and returns the
+    full text once the stream ends. Attempts are only retried if they fail before the first chunk
+    arrives; once text has been handed to on_text a failure is raised instead of starting over.
+    """
+    if not genai_client:
+        raise Exception("Google GenAI Client (genai_client) is not initialized.")
+
+    last_exception = None
+    start_time = time.monotonic()
+    if model_name not in cog.api_stats:
+        cog.api_stats[model_name] = {'success': 0, 'failure': 0, 'retries': 0, 'total_time': 0.0, 'count': 0}
+
+    for attempt in range(API_RETRY_ATTEMPTS + 1):
+        accumulated_text = ""
+        first_chunk_time = None
+        usage_metadata = None
+        try:
+            print(f"Sending streaming API request for {request_desc} using {model_name} (Attempt {attempt + 1}/{API_RETRY_ATTEMPTS + 1})...")
+            async with llm_concurrency_slot(cog, request_desc):
+                stream = await genai_client.aio.models.generate_content_stream(
+                    model=model_name,
+                    contents=contents,
+                    config=generation_config,
+                )
+                async for chunk in stream:
+                    usage_metadata = getattr(chunk, 'usage_metadata', None) or usage_metadata # Totals arrive with the last chunk
+                    chunk_text = getattr(chunk, 'text', None)
+                    if not chunk_text:
+                        continue
+                    if first_chunk_time is None:
+                        first_chunk_time = time.monotonic() - start_time
+                        print(f"First stream chunk for {request_desc} after {first_chunk_time:.2f}s.")
+                    accumulated_text += chunk_text
+                    if on_text:
+                        try:
+                            await on_text(accumulated_text)
+                        except Exception as handler_e:
+                            print(f"Error in stream handler for {request_desc}: {handler_e}")
+
+            elapsed_time = time.monotonic() - start_time
+            cog.api_stats[model_name]['success'] += 1
+            cog.api_stats[model_name]['total_time'] += elapsed_time
+            cog.api_stats[model_name]['count'] += 1
+            LLM_REQUEST_SECONDS.labels(model_name, "stream", "success").observe(elapsed_time)
+            record_llm_usage(model_name, usage_metadata)
+            print(f"Streaming API request successful for {request_desc} ({model_name}) in {elapsed_time:.2f}s.")
+            return accumulated_text
+
+        except Exception as e:
+            last_exception = e
+            print(f"Error during streaming API call for {request_desc} ({model_name}) (Attempt {attempt + 1}): {type(e).__name__}: {e}")
+            retryable = isinstance(e, (google_exceptions.ResourceExhausted, google_exceptions.InternalServerError,
+                                       google_exceptions.ServiceUnavailable, asyncio.TimeoutError))
+            # Text already delivered can't be taken back, so only retry failures before the first chunk
+            if retryable and first_chunk_time is None and attempt < API_RETRY_ATTEMPTS:
+                cog.api_stats[model_name]['retries'] += 1
+                wait_time = API_RETRY_DELAY * (2 ** attempt)
+                print(f"Waiting {wait_time:.2f} seconds before retrying...")
+                await asyncio.sleep(wait_time)
+                continue
+            break
+
+    elapsed_time = time.monotonic() - start_time
+    cog.api_stats[model_name]['failure'] += 1
+    cog.api_stats[model_name]['total_time'] += elapsed_time
+    cog.api_stats[model_name]['count'] += 1
+    LLM_REQUEST_SECONDS.labels(model_name, "stream", "failure").observe(elapsed_time)
+    print(f"Streaming API request failed for {request_desc} ({model_name}) after {attempt + 1} attempts in {elapsed_time:.2f}s.")
+    raise last_exception or Exception(f"Streaming API request failed for {request_desc} after {API_RETRY_ATTEMPTS + 1} attempts.")
+
+
+def parse_partial_response_json(partial_text: str) -> Dict[str, Any]:
+    """
+    Extracts whatever fields of a (possibly incomplete) RESPONSE_SCHEMA JSON object can already be read.
+
+    Returns a dict with "should_respond" (bool or None if not seen yet), "reply_to_message_id"
+    (present only once its value is complete), "content" (the decoded content string so far, or None)
+    and "content_complete" (whether the closing quote of content has been received).
+    """
+    fields: Dict[str, Any] = {"should_respond": None, "content": None, "content_complete": False}
+
+    should_respond_match = re.search(r'"should_respond"\s*:\s*(true|false)', partial_text)
+    if should_respond_match:
+        fields["should_respond"] = should_respond_match.group(1) == "true"
+
+    reply_match = re.search(r'"reply_to_message_id"\s*:\s*(null|"(\d*)")', partial_text)
+    if reply_match:
+        fields["reply_to_message_id"] = reply_match.group(2) or None
+
+    content_match = re.search(r'"content"\s*:\s*"', partial_text)
+    if content_match:
+        raw_chars = []
+        index = content_match.end()
+        while index < len(partial_text):
+            char = partial_text[index]
+            if char == '"':
+                fields["content_complete"] = True
+                break
+            if char == '\\':
+                escape_len = 6 if partial_text[index + 1:index + 2] == 'u' else 2
+                if index + escape_len > len(partial_text):
+                    break # Escape sequence not fully received yet
+                raw_chars.append(partial_text[index:index + escape_len])
+                index += escape_len
+                continue
+            raw_chars.append(char)
+            index += 1
+        try:
+            fields["content"] = json.loads('"' + "".join(raw_chars) + '"', strict=False) # Models sometimes emit raw newlines
+        except json.JSONDecodeError:
+            fields["content"] = None # e.g. half of a surrogate pair; the next chunk will fix it
+
+    return fields
+
+
 # --- JSON Parsing and Validation Helper ---
 def parse_and_validate_json_response(
     response_text: Optional[str],
@@ -595,11 +774,28 @@ async def process_requested_tools(cog: 'GurtCog', function_call: types.FunctionC
     print(f"Processing tool request: {function_name} with args: {function_args}")
     tool_start_time = time.monotonic()
 
-    if function_name in TOOL_MAPPING:
+    tool_metadata = get_tool_metadata(function_name)
+    cache_policy = tool_metadata["cache"] if TOOL_CACHE_ENABLED else None
+    cache_key = get_tool_cache_key(cog, function_name, function_args, cache_policy) if cache_policy else None
+    cached_result = get_cached_tool_result(cog, cache_key) if cache_key else None
+
+    if cached_result is not None:
+        # --- Tool Cache Hit ---
+        cog.tool_stats[function_name]['cache_hits'] = cog.tool_stats[function_name].get('cache_hits', 0) + 1
+        print(f"Tool '{function_name}' served from cache.")
+        tool_result_content = cached_result
+
+    elif function_name in TOOL_MAPPING:
+        if cache_key:
+            cog.tool_stats[function_name]['cache_misses'] = cog.tool_stats[function_name].get('cache_misses', 0) + 1
         try:
             tool_func = TOOL_MAPPING[function_name]
-            # Execute the mapped function
-            result_dict = await tool_func(cog, **function_args)
+            tool_timeout = tool_metadata["timeout"]
+            # Execute the mapped function, bounded by its per-tool timeout (None = tool handles its own)
+            if tool_timeout:
+                result_dict = await asyncio.wait_for(tool_func(cog, **function_args), timeout=tool_timeout)
+            else:
+                result_dict = await tool_func(cog, **function_args)
 
             # --- Tool Success Logging ---
             tool_elapsed_time = time.monotonic() - tool_start_time
@@ -608,6 +804,7 @@ async def process_requested_tools(cog: 'GurtCog', function_call: types.FunctionC
             cog.tool_stats[function_name]['success'] += 1
             cog.tool_stats[function_name]['total_time'] += tool_elapsed_time
             cog.tool_stats[function_name]['count'] += 1
+            TOOL_SECONDS.labels(function_name, "success").observe(tool_elapsed_time)
             print(f"Tool '{function_name}' executed successfully in {tool_elapsed_time:.2f}s.")
 
             # Ensure result is a dict, converting if necessary
@@ -620,6 +817,25 @@ async def process_requested_tools(cog: 'GurtCog', function_call: types.FunctionC
 
             tool_result_content = result_dict # Now guaranteed to be a dict
 
+            # --- Tool Result Cache ---
+            if cache_key and "error" not in result_dict:
+                store_tool_result(cog, cache_key, result_dict, cache_policy["ttl"])
+            if tool_metadata["invalidates"] and "error" not in result_dict:
+                invalidate_tool_results(cog, tool_metadata["invalidates"])
+
+        except asyncio.TimeoutError:
+            # --- Tool Timeout Logging ---
+            tool_elapsed_time = time.monotonic() - tool_start_time
+            if function_name not in cog.tool_stats:
+                 cog.tool_stats[function_name] = {'success': 0, 'failure': 0, 'total_time': 0.0, 'count': 0}
+            cog.tool_stats[function_name]['failure'] += 1
+            cog.tool_stats[function_name]['total_time'] += tool_elapsed_time
+            cog.tool_stats[function_name]['count'] += 1
+            TOOL_SECONDS.labels(function_name, "timeout").observe(tool_elapsed_time)
+            error_message = f"Tool {function_name} timed out after {tool_elapsed_time:.1f}s."
+            print(error_message)
+            tool_result_content = {"error": error_message}
+
         except Exception as e:
             # --- Tool Failure Logging ---
             tool_elapsed_time = time.monotonic() - tool_start_time # Recalculate time even on failure
@@ -628,6 +844,7 @@ async def process_requested_tools(cog: 'GurtCog', function_call: types.FunctionC
             cog.tool_stats[function_name]['failure'] += 1
             cog.tool_stats[function_name]['total_time'] += tool_elapsed_time
             cog.tool_stats[function_name]['count'] += 1
+            TOOL_SECONDS.labels(function_name, "failure").observe(tool_elapsed_time)
             error_message = f"Error executing tool {function_name}: {type(e).__name__}: {str(e)}"
             print(f"{error_message} (Took {tool_elapsed_time:.2f}s)")
             import traceback
@@ -719,6 +936,37 @@ async def process_requested_tools(cog: 'GurtCog', function_call: types.FunctionC
     return parts_to_return # Return the list of parts (will contain 1 or 2+ parts)
 
 
+async def execute_tool_calls(cog: 'GurtCog', function_calls: List[types.FunctionCall]) -> List[List[types.Part]]:
+    """
+    Executes all tool calls requested in a single model turn.
+    Consecutive read-only tools (per TOOL_METADATA) run concurrently, at most TOOL_MAX_PARALLELISM at a time.
+    A side-effecting tool acts as a barrier: it waits for earlier calls to finish and runs alone.
+    Returns one list of parts per call, in the same order as function_calls.
+    """
+    results: List[Optional[List[types.Part]]] = [None] * len(function_calls)
+    semaphore = asyncio.Semaphore(max(1, TOOL_MAX_PARALLELISM))
+    pending_indices: List[int] = []
+
+    async def _run_limited(index: int):
+        async with semaphore:
+            results[index] = await process_requested_tools(cog, function_calls[index])
+
+    async def _flush_pending():
+        if pending_indices:
+            await asyncio.gather(*[_run_limited(i) for i in pending_indices])
+            pending_indices.clear()
+
+    for index, func_call in enumerate(function_calls):
+        if get_tool_metadata(func_call.name)["side_effects"]:
+            await _flush_pending()
+            results[index] = await process_requested_tools(cog, func_call)
+        else:
+            pending_indices.append(index)
+    await _flush_pending()
+
+    return results
+
+
 # --- Helper to find function call in parts ---
 # Updated to use google.generativeai types
 def find_function_call_in_parts(parts: Optional[List[types.Part]]) -> Optional[types.FunctionCall]:
@@ -739,7 +987,12 @@ def find_function_call_in_parts(parts: Optional[List[types.Part]]) -> Optional[t
 
 
 # --- Main AI Response Function ---
-async def get_ai_response(cog: 'GurtCog', message: discord.Message, model_name: Optional[str] = None) -> Dict[str, Any]:
+async def get_ai_response(
+    cog: 'GurtCog',
+    message: discord.Message,
+    model_name: Optional[str] = None,
+    stream_handler: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+) -> Dict[str, Any]:
     """
     Gets responses from the Vertex AI Gemini API, handling potential tool usage and returning
     the final parsed response.
@@ -748,6 +1001,8 @@ async def get_ai_response(cog: 'GurtCog', message: discord.Message, model_name:
         cog: The GurtCog instance.
         message: The triggering discord.Message.
         model_name: Optional override for the AI model name (e.g., "gemini-1.5-pro-preview-0409").
+        stream_handler: Optional callback. If given, the final JSON generation is streamed and the handler
+            receives the fields parsed so far (see parse_partial_response_json) after every chunk.
 
     Returns:
         A dictionary containing:
@@ -780,9 +1035,12 @@ async def get_ai_response(cog: 'GurtCog', message: discord.Message, model_name:
 
     try:
         # --- Build Prompt Components ---
-        final_system_prompt = await build_dynamic_system_prompt(cog, message)
+        # System prompt and memory context are independent, so fetch them concurrently
+        final_system_prompt, memory_context = await asyncio.gather(
+            build_dynamic_system_prompt(cog, message),
+            get_memory_context(cog, message) # Pass cog
+        )
         conversation_context_messages = gather_conversation_context(cog, channel_id, message.id) # Pass cog
-        memory_context = await get_memory_context(cog, message) # Pass cog
 
         # --- Prepare Message History (Contents) ---
         # Contents will be built progressively within the loop
@@ -1087,9 +1345,9 @@ async def get_ai_response(cog: 'GurtCog', message: discord.Message, model_name:
                 # function_response_parts = [] # <-- REMOVE THIS INITIALIZATION
                 all_function_response_parts: List[types.Part] = [] # New list to collect all parts
                 function_results_for_cache = [] # Store results for caching
-                for func_call in function_calls_found:
-                    # Execute the tool using the updated helper, now returns a LIST of parts
-                    returned_parts = await process_requested_tools(cog, func_call) # returns List[types.Part]
+                # Independent read-only tools run concurrently; results come back in request order
+                tool_call_results = await execute_tool_calls(cog, function_calls_found)
+                for returned_parts in tool_call_results:
                     all_function_response_parts.extend(returned_parts) # <-- EXTEND the list
 
                     # --- Update caching logic ---
@@ -1200,31 +1458,54 @@ async def get_ai_response(cog: 'GurtCog', message: discord.Message, model_name:
                     if not final_gen_config_dict.get("system_instruction"):
                         final_gen_config_dict.pop("system_instruction", None)
 
-                    generation_config_final_json = types.GenerateContentConfig(**final_gen_config_dict)
+                    if stream_handler:
+                        # Emit the small routing fields before content so a streamed message can be sent early
+                        processed_response_schema["property_ordering"] = ["should_respond", "reply_to_message_id", "react_with_emoji", "content"]
 
+                    generation_config_final_json = types.GenerateContentConfig(**final_gen_config_dict)
 
-                    # Make the final call *without* tools enabled (handled by config)
-                    final_json_response_obj = await call_google_genai_api_with_retry(
-                        cog=cog,
-                        model_name=final_response_model, # Use the CUSTOM_TUNED_MODEL for final response
-                        contents=contents, # Pass the accumulated history
-                        generation_config=generation_config_final_json, # Use combined JSON config
-                        request_desc=f"Final JSON Generation (dedicated call) for message {message.id}",
-                        # No separate safety, tools, tool_config args needed
-                    )
+                    final_json_response_obj = None
+                    streamed_response_text = None
+                    if stream_handler:
+                        async def _on_stream_text(accumulated_text: str):
+                            await stream_handler(parse_partial_response_json(accumulated_text))
+
+                        streamed_response_text = await call_google_genai_api_stream_with_retry(
+                            cog=cog,
+                            model_name=final_response_model,
+                            contents=contents,
+                            generation_config=generation_config_final_json,
+                            request_desc=f"Final JSON Generation (streamed) for message {message.id}",
+                            on_text=_on_stream_text,
+                        )
+                    else:
+                        # Make the final call *without* tools enabled (handled by config)
+                        final_json_response_obj = await call_google_genai_api_with_retry(
+                            cog=cog,
+                            model_name=final_response_model, # Use the CUSTOM_TUNED_MODEL for final response
+                            contents=contents, # Pass the accumulated history
+                            generation_config=generation_config_final_json, # Use combined JSON config
+                            request_desc=f"Final JSON Generation (dedicated call) for message {message.id}",
+                            # No separate safety, tools, tool_config args needed
+                        )
 
-                    if not final_json_response_obj:
+                    if stream_handler and not streamed_response_text:
+                        error_msg_suffix = "Final streamed API call returned no text."
+                        print(error_msg_suffix)
+                        if error_message: error_message += f" | {error_msg_suffix}"
+                        else: error_message = error_msg_suffix
+                    elif not stream_handler and not final_json_response_obj:
                         error_msg_suffix = "Final dedicated API call returned no response object."
                         print(error_msg_suffix)
                         if error_message: error_message += f" | {error_msg_suffix}"
                         else: error_message = error_msg_suffix
-                    elif not final_json_response_obj.candidates:
+                    elif not stream_handler and not final_json_response_obj.candidates:
                          error_msg_suffix = "Final dedicated API call returned no candidates."
                          print(error_msg_suffix)
                          if error_message: error_message += f" | {error_msg_suffix}"
                          else: error_message = error_msg_suffix
                     else:
-                        final_response_text = _get_response_text(final_json_response_obj)
+                        final_response_text = streamed_response_text if stream_handler else _get_response_text(final_json_response_obj)
 
                         # --- Log Raw Unparsed JSON (from dedicated call) ---
                         print(f"--- RAW UNPARSED JSON (dedicated call) ---")
@@ -1306,7 +1587,7 @@ async def get_proactive_ai_response(cog: 'GurtCog', message: discord.Message, tr
         # Add sentiment
         sentiment_data = cog.conversation_sentiment.get(channel_id)
         if sentiment_data:
-            planning_context_parts.append(f"Conversation Sentiment: {sentiment_data.get('overall', 'N/A')} (Intensity: {sentiment_data.get('intensity', 0):.1f})")
+            planning_context_parts.append(f"Conversation Sentiment: {sentiment_data.overall} (Intensity: {sentiment_data.intensity:.1f})")
         # Add Gurt's interests
         try:
             interests = await cog.memory_manager.get_interests(limit=5)
@@ -21,7 +21,10 @@ from .config import (
     INTEREST_FACT_BOOST, PROACTIVE_GOAL_CHECK_INTERVAL, STATS_PUSH_INTERVAL, # Added stats interval
     MOOD_OPTIONS, MOOD_CATEGORIES, MOOD_CHANGE_INTERVAL_MIN, MOOD_CHANGE_INTERVAL_MAX, # Mood change imports
     BASELINE_PERSONALITY, # For default traits
-    REFLECTION_INTERVAL_SECONDS # Import reflection interval
+    REFLECTION_INTERVAL_SECONDS, # Import reflection interval
+    SEMANTIC_COMPACTION_INTERVAL, MESSAGE_EMBEDDING_RETENTION_DAYS, IMPORTANT_MESSAGE_RETENTION_DAYS,
+    MESSAGE_EMBEDDING_KEEP_IMPORTANCE, FACT_DEDUP_SIMILARITY, STATE_SNAPSHOT_INTERVAL,
+    MESSAGE_INDEX_ENABLED, MESSAGE_INDEX_RETENTION_DAYS, MESSAGE_INDEX_MAX_ROWS, MESSAGE_INDEX_PRUNE_INTERVAL
 )
 # Assuming analysis functions are moved
 from .analysis import (
@@ -43,6 +46,9 @@ from .api import (
 if TYPE_CHECKING:
     from .cog import GurtCog # For type hinting
 
+from job_scheduler import JobScheduler # Shared deadline scheduler (top-level module)
+from .state import snapshot_runtime_state
+
 # --- Tool Mapping Import ---
 # Import the mapping to execute tools by name
 from .tools import TOOL_MAPPING, send_discord_message # Also import send_discord_message directly for goal execution reporting
@@ -51,7 +57,16 @@ from .config import TOOLS  # Import FunctionDeclaration list for tool metadata
 # --- Background Task ---
 
 async def background_processing_task(cog: 'GurtCog'):
-    """Background task that periodically analyzes conversations, evolves personality, updates interests, changes mood, reflects on memory, and pushes stats."""
+    """Background task that runs Gurt's periodic jobs (stats push, learning, personality evolution, interests, reflection, goals) on a shared scheduler."""
+    scheduler = create_background_scheduler(cog)
+    cog.background_scheduler = scheduler # Exposes per-job metrics to get_gurt_stats
+    try:
+        await scheduler.run()
+    except asyncio.CancelledError:
+        print("Background processing task cancelled")
+
+def create_background_scheduler(cog: 'GurtCog') -> JobScheduler:
+    """Registers Gurt's background jobs. Each runs in its own task, so a slow LLM call in one job doesn't hold up the others."""
     # Get API details from environment for stats pushing
     api_internal_url = os.getenv("API_INTERNAL_URL")
     gurt_stats_push_secret = os.getenv("GURT_STATS_PUSH_SECRET")
@@ -61,289 +76,333 @@ async def background_processing_task(cog: 'GurtCog'):
     if not gurt_stats_push_secret:
         print("WARNING: GURT_STATS_PUSH_SECRET not set. Gurt stats push endpoint is insecure and likely won't work.")
 
+    scheduler = JobScheduler("GurtBackground")
+    if api_internal_url and gurt_stats_push_secret:
+        scheduler.add_job("stats_push", lambda: push_stats(cog, api_internal_url, gurt_stats_push_secret), STATS_PUSH_INTERVAL, timeout=30)
+    scheduler.add_job("learning_analysis", lambda: run_learning_analysis(cog), LEARNING_UPDATE_INTERVAL)
+    scheduler.add_job("personality_evolution", lambda: run_personality_evolution(cog), EVOLUTION_UPDATE_INTERVAL)
+    scheduler.add_job("interest_update", lambda: run_interest_update(cog), INTEREST_UPDATE_INTERVAL)
+    scheduler.add_job("memory_reflection", lambda: run_memory_reflection(cog), REFLECTION_INTERVAL_SECONDS)
+    scheduler.add_job("goal_decomposition", lambda: run_goal_decomposition(cog), GOAL_CHECK_INTERVAL)
+    scheduler.add_job("goal_execution", lambda: run_goal_execution(cog), GOAL_EXECUTION_INTERVAL)
+    scheduler.add_job("proactive_goal_check", lambda: run_proactive_goal_check(cog), PROACTIVE_GOAL_CHECK_INTERVAL)
+    scheduler.add_job("semantic_compaction", lambda: run_semantic_compaction(cog), SEMANTIC_COMPACTION_INTERVAL)
+    scheduler.add_job("state_snapshot", lambda: run_state_snapshot(cog), STATE_SNAPSHOT_INTERVAL, timeout=120)
+    if MESSAGE_INDEX_ENABLED:
+        scheduler.add_job("message_index_prune", lambda: run_message_index_prune(cog), MESSAGE_INDEX_PRUNE_INTERVAL, timeout=300)
+    # await maybe_change_mood(cog) # Automatic mood change would be registered here as well
+    return scheduler
+
+# --- Background Jobs ---
+
+async def push_stats(cog: 'GurtCog', api_internal_url: str, gurt_stats_push_secret: str):
+    """Pushes Gurt's stats to the API server."""
+    now = time.time()
+    print("Pushing Gurt stats to API server...")
     try:
-        while True:
-            await asyncio.sleep(15) # Check more frequently for stats push
-            now = time.time()
-
-            # --- Push Stats (Runs frequently) ---
-            if api_internal_url and gurt_stats_push_secret and (now - cog.last_stats_push > STATS_PUSH_INTERVAL):
-                print("Pushing Gurt stats to API server...")
-                try:
-                    stats_data = await cog.get_gurt_stats()
-                    headers = {
-                        "Authorization": f"Bearer {gurt_stats_push_secret}",
-                        "Content-Type": "application/json"
-                    }
-                    # Use the cog's session, ensure it's created
-                    if cog.session:
-                        # Set a reasonable timeout for the stats push
-                        push_timeout = aiohttp.ClientTimeout(total=10) # 10 seconds total timeout
-                        async with cog.session.post(api_internal_url, json=stats_data, headers=headers, timeout=push_timeout, ssl=True) as response: # Explicitly enable SSL verification
-                            if response.status == 200:
-                                print(f"Successfully pushed Gurt stats (Status: {response.status})")
-                            else:
-                                error_text = await response.text()
-                                print(f"Failed to push Gurt stats (Status: {response.status}): {error_text[:200]}") # Log only first 200 chars
-                    else:
-                        print("Error pushing stats: GurtCog session not initialized.")
-                    cog.last_stats_push = now # Update timestamp even on failure to avoid spamming logs
-                except aiohttp.ClientConnectorSSLError as ssl_err:
-                     print(f"SSL Error pushing Gurt stats: {ssl_err}. Ensure the API server's certificate is valid and trusted, or check network configuration.")
-                     print("If using a self-signed certificate for development, the bot process might need to trust it.")
-                     cog.last_stats_push = now # Update timestamp to avoid spamming logs
-                except aiohttp.ClientError as client_err:
-                    print(f"HTTP Client Error pushing Gurt stats: {client_err}")
-                    cog.last_stats_push = now # Update timestamp to avoid spamming logs
-                except asyncio.TimeoutError:
-                    print("Timeout error pushing Gurt stats.")
-                    cog.last_stats_push = now # Update timestamp to avoid spamming logs
-                except Exception as e:
-                    print(f"Unexpected error pushing Gurt stats: {e}")
-                    traceback.print_exc()
-                    cog.last_stats_push = now # Update timestamp even on error
-
-            # --- Learning Analysis (Runs less frequently) ---
-            if now - cog.last_learning_update > LEARNING_UPDATE_INTERVAL:
-                if cog.message_cache['global_recent']:
-                    print("Running conversation pattern analysis...")
-                    # This function now likely resides in analysis.py
-                    await analyze_conversation_patterns(cog) # Pass cog instance
-                    cog.last_learning_update = now
-                    print("Learning analysis cycle complete.")
+        stats_data = await cog.get_gurt_stats()
+        headers = {
+            "Authorization": f"Bearer {gurt_stats_push_secret}",
+            "Content-Type": "application/json"
+        }
+        # Use the cog's session, ensure it's created
+        if cog.session:
+            # Set a reasonable timeout for the stats push
+            push_timeout = aiohttp.ClientTimeout(total=10) # 10 seconds total timeout
+            async with cog.session.post(api_internal_url, json=stats_data, headers=headers, timeout=push_timeout, ssl=True) as response: # Explicitly enable SSL verification
+                if response.status == 200:
+                    print(f"Successfully pushed Gurt stats (Status: {response.status})")
                 else:
-                    print("Skipping learning analysis: No recent messages.")
-
-            # --- Evolve Personality (Runs moderately frequently) ---
-            if now - cog.last_evolution_update > EVOLUTION_UPDATE_INTERVAL:
-                print("Running personality evolution...")
-                # This function now likely resides in analysis.py
-                await evolve_personality(cog) # Pass cog instance
-                cog.last_evolution_update = now
-                print("Personality evolution complete.")
-
-            # --- Update Interests (Runs moderately frequently) ---
-            if now - cog.last_interest_update > INTEREST_UPDATE_INTERVAL:
-                print("Running interest update...")
-                await update_interests(cog) # Call the local helper function below
-                print("Running interest decay check...")
-                await cog.memory_manager.decay_interests(
-                    decay_interval_hours=INTEREST_DECAY_INTERVAL_HOURS
-                )
-                cog.last_interest_update = now # Reset timer after update and decay check
-                print("Interest update and decay check complete.")
-
-            # --- Memory Reflection (Runs less frequently) ---
-            if now - cog.last_reflection_time > REFLECTION_INTERVAL_SECONDS:
-                print("Running memory reflection...")
-                await reflect_on_memories(cog) # Call the reflection function from analysis.py
-                cog.last_reflection_time = now # Update timestamp
-                print("Memory reflection cycle complete.")
-
-            # --- Goal Decomposition (Runs periodically) ---
-            # Check less frequently than other tasks, e.g., every few minutes
-            if now - cog.last_goal_check_time > GOAL_CHECK_INTERVAL: # Need to add these to cog and config
-                print("Checking for pending goals to decompose...")
-                try:
-                    pending_goals = await cog.memory_manager.get_goals(status='pending', limit=3) # Limit decomposition attempts per cycle
-                    for goal in pending_goals:
-                        goal_id = goal.get('goal_id')
-                        description = goal.get('description')
-                        if not goal_id or not description: continue
-
-                        print(f"  - Decomposing goal ID {goal_id}: '{description}'")
-                        plan = await decompose_goal_into_steps(cog, description)
-
-                        if plan and plan.get('goal_achievable') and plan.get('steps'):
-                            # Goal is achievable and has steps, update status to active and store plan
-                            await cog.memory_manager.update_goal(goal_id, status='active', details=plan)
-                            print(f"  - Goal ID {goal_id} decomposed and set to active.")
-                        elif plan:
-                            # Goal deemed not achievable by planner
-                            await cog.memory_manager.update_goal(goal_id, status='failed', details={"reason": plan.get('reasoning', 'Deemed unachievable by planner.')})
-                            print(f"  - Goal ID {goal_id} marked as failed (unachievable). Reason: {plan.get('reasoning')}")
-                        else:
-                            # Decomposition failed entirely
-                            await cog.memory_manager.update_goal(goal_id, status='failed', details={"reason": "Goal decomposition process failed."})
-                            print(f"  - Goal ID {goal_id} marked as failed (decomposition error).")
-                        await asyncio.sleep(1) # Small delay between decomposing goals
-
-                    cog.last_goal_check_time = now # Update timestamp after checking
-                except Exception as goal_e:
-                    print(f"Error during goal decomposition check: {goal_e}")
-                    traceback.print_exc()
-                    cog.last_goal_check_time = now # Update timestamp even on error
-
-            # --- Goal Execution (Runs periodically) ---
-            if now - cog.last_goal_execution_time > GOAL_EXECUTION_INTERVAL:
-                print("Checking for active goals to execute...")
-                try:
-                    active_goals = await cog.memory_manager.get_goals(status='active', limit=1) # Process one active goal per cycle for now
-                    if active_goals:
-                        goal = active_goals[0] # Get the highest priority active goal
-                        goal_id = goal.get('goal_id')
-                        description = goal.get('description')
-                        plan = goal.get('details') # The decomposition plan is stored here
-                        # Retrieve context saved with the goal
-                        goal_context_guild_id = goal.get('guild_id')
-                        goal_context_channel_id = goal.get('channel_id')
-                        goal_context_user_id = goal.get('user_id')
-
-                        if goal_id and description and plan and isinstance(plan.get('steps'), list):
-                            print(f"--- Executing Goal ID {goal_id}: '{description}' (Context: G={goal_context_guild_id}, C={goal_context_channel_id}, U={goal_context_user_id}) ---")
-                            steps = plan['steps']
-                            current_step_index = plan.get('current_step_index', 0) # Track progress
-                            goal_failed = False
-                            goal_completed = False
-
-                            if current_step_index < len(steps):
-                                step = steps[current_step_index]
-                                step_desc = step.get('step_description')
-                                tool_name = step.get('tool_name')
-                                tool_args = step.get('tool_arguments')
-
-                                print(f"  - Step {current_step_index + 1}/{len(steps)}: {step_desc}")
-
-                                if tool_name:
-                                    print(f"    - Attempting tool: {tool_name} with args: {tool_args}")
-                                    tool_func = TOOL_MAPPING.get(tool_name)
-                                    tool_result = None
-                                    tool_error = None
-                                    tool_success = False
-
-                                    if tool_func:
-                                        try:
-                                            # Ensure args are a dictionary, default to empty if None/missing
-                                            args_to_pass = tool_args if isinstance(tool_args, dict) else {}
-                                            print(f"    - Executing: {tool_name}(cog, **{args_to_pass})")
-                                            start_time = time.monotonic()
-                                            tool_result = await tool_func(cog, **args_to_pass)
-                                            end_time = time.monotonic()
-                                            print(f"    - Tool '{tool_name}' returned: {str(tool_result)[:200]}...") # Log truncated result
-
-                                            # Check result for success/error
-                                            if isinstance(tool_result, dict) and "error" in tool_result:
-                                                tool_error = tool_result["error"]
-                                                print(f"    - Tool '{tool_name}' reported error: {tool_error}")
-                                                cog.tool_stats[tool_name]["failure"] += 1
-                                            else:
-                                                tool_success = True
-                                                print(f"    - Tool '{tool_name}' executed successfully.")
-                                                cog.tool_stats[tool_name]["success"] += 1
-                                            # Record stats
-                                            cog.tool_stats[tool_name]["count"] += 1
-                                            cog.tool_stats[tool_name]["total_time"] += (end_time - start_time)
-
-                                        except Exception as exec_e:
-                                            tool_error = f"Exception during execution: {str(exec_e)}"
-                                            print(f"    - Tool '{tool_name}' raised exception: {exec_e}")
-                                            traceback.print_exc()
-                                            cog.tool_stats[tool_name]["failure"] += 1
-                                            cog.tool_stats[tool_name]["count"] += 1 # Count failures too
-                                    else:
-                                        tool_error = f"Tool '{tool_name}' not found in TOOL_MAPPING."
-                                        print(f"    - Error: {tool_error}")
-
-                                    # --- Send Update Message (if channel context exists) --- ### MODIFICATION START ###
-                                    if goal_context_channel_id:
-                                        step_number_display = current_step_index + 1 # Human-readable step number for display
-                                        status_emoji = "✅" if tool_success else "❌"
-                                        # Use the helper function to create a summary
-                                        step_result_summary = _create_result_summary(tool_result if tool_success else {"error": tool_error})
-
-                                        update_message = (
-                                            f"**Goal Update (ID: {goal_id}, Step {step_number_display}/{len(steps)})** {status_emoji}\n"
-                                            f"> **Goal:** {description}\n"
-                                            f"> **Step:** {step_desc}\n"
-                                            f"> **Tool:** `{tool_name}`\n"
-                                            # f"> **Args:** `{json.dumps(tool_args)}`\n" # Args might be too verbose
-                                            f"> **Result:** `{step_result_summary}`"
-                                        )
-                                        # Limit message length
-                                        if len(update_message) > 1900:
-                                            update_message = update_message[:1900] + "...`"
-
-                                        try:
-                                            # Use the imported send_discord_message function
-                                            await send_discord_message(cog, channel_id=goal_context_channel_id, message_content=update_message)
-                                            print(f"    - Sent goal update to channel {goal_context_channel_id}")
-                                        except Exception as msg_err:
-                                            print(f"    - Failed to send goal update message to channel {goal_context_channel_id}: {msg_err}")
-                                    ### MODIFICATION END ###
-
-                                    # --- Handle Tool Outcome ---
-                                    if tool_success:
-                                        # Store result if needed (optional, requires plan structure modification)
-                                        # plan['step_results'][current_step_index] = tool_result
-                                        current_step_index += 1
-                                    else:
-                                        goal_failed = True
-                                        plan['error_message'] = f"Failed at step {current_step_index + 1} ({tool_name}): {tool_error}"
-                                else:
-                                    # Step doesn't require a tool (e.g., internal reasoning/check)
-                                    print("    - No tool required for this step (internal check/reasoning).")
-                                    # Send update message for non-tool steps too? Optional. For now, only for tool steps.
-                                    current_step_index += 1 # Assume non-tool steps succeed for now
-
-                                # Check if goal completed
-                                if not goal_failed and current_step_index >= len(steps):
-                                    goal_completed = True
-
-                                # --- Update Goal Status ---
-                                plan['current_step_index'] = current_step_index # Update progress
-                                if goal_completed:
-                                    await cog.memory_manager.update_goal(goal_id, status='completed', details=plan)
-                                    print(f"--- Goal ID {goal_id} completed successfully. ---")
-                                elif goal_failed:
-                                    await cog.memory_manager.update_goal(goal_id, status='failed', details=plan)
-                                    print(f"--- Goal ID {goal_id} failed. ---")
-                                else:
-                                    # Update details with current step index if still in progress
-                                    await cog.memory_manager.update_goal(goal_id, details=plan)
-                                    print(f"  - Goal ID {goal_id} progress updated to step {current_step_index}.")
-
-                            else:
-                                # Should not happen if status is 'active', but handle defensively
-                                print(f"  - Goal ID {goal_id} is active but has no steps or index out of bounds. Marking as failed.")
-                                await cog.memory_manager.update_goal(goal_id, status='failed', details={"reason": "Active goal has invalid step data."})
+                    error_text = await response.text()
+                    print(f"Failed to push Gurt stats (Status: {response.status}): {error_text[:200]}") # Log only first 200 chars
+        else:
+            print("Error pushing stats: GurtCog session not initialized.")
+        cog.last_stats_push = now # Update timestamp even on failure to avoid spamming logs
+    except aiohttp.ClientConnectorSSLError as ssl_err:
+         print(f"SSL Error pushing Gurt stats: {ssl_err}. Ensure the API server's certificate is valid and trusted, or check network configuration.")
+         print("If using a self-signed certificate for development, the bot process might need to trust it.")
+         cog.last_stats_push = now # Update timestamp to avoid spamming logs
+    except aiohttp.ClientError as client_err:
+        print(f"HTTP Client Error pushing Gurt stats: {client_err}")
+        cog.last_stats_push = now # Update timestamp to avoid spamming logs
+    except asyncio.TimeoutError:
+        print("Timeout error pushing Gurt stats.")
+        cog.last_stats_push = now # Update timestamp to avoid spamming logs
+    except Exception as e:
+        print(f"Unexpected error pushing Gurt stats: {e}")
+        traceback.print_exc()
+        cog.last_stats_push = now # Update timestamp even on error
+
+async def run_learning_analysis(cog: 'GurtCog'):
+    """Analyzes recent conversation patterns."""
+    now = time.time()
+    if cog.message_cache['global_recent']:
+        print("Running conversation pattern analysis...")
+        # This function now likely resides in analysis.py
+        await analyze_conversation_patterns(cog) # Pass cog instance
+        cog.last_learning_update = now
+        print("Learning analysis cycle complete.")
+    else:
+        print("Skipping learning analysis: No recent messages.")
+
+async def run_personality_evolution(cog: 'GurtCog'):
+    """Evolves personality traits based on recent interactions."""
+    now = time.time()
+    print("Running personality evolution...")
+    # This function now likely resides in analysis.py
+    await evolve_personality(cog) # Pass cog instance
+    cog.last_evolution_update = now
+    print("Personality evolution complete.")
+
+async def run_interest_update(cog: 'GurtCog'):
+    """Updates interest levels from recent activity, then applies interest decay."""
+    now = time.time()
+    print("Running interest update...")
+    await update_interests(cog) # Call the local helper function below
+    print("Running interest decay check...")
+    await cog.memory_manager.decay_interests(
+        decay_interval_hours=INTEREST_DECAY_INTERVAL_HOURS
+    )
+    cog.last_interest_update = now # Reset timer after update and decay check
+    print("Interest update and decay check complete.")
+
+async def run_memory_reflection(cog: 'GurtCog'):
+    """Reflects on stored memories."""
+    now = time.time()
+    print("Running memory reflection...")
+    await reflect_on_memories(cog) # Call the reflection function from analysis.py
+    cog.last_reflection_time = now # Update timestamp
+    print("Memory reflection cycle complete.")
+
+async def run_goal_decomposition(cog: 'GurtCog'):
+    """Decomposes pending goals into plans."""
+    now = time.time()
+    print("Checking for pending goals to decompose...")
+    try:
+        pending_goals = await cog.memory_manager.get_goals(status='pending', limit=3) # Limit decomposition attempts per cycle
+        for goal in pending_goals:
+            goal_id = goal.get('goal_id')
+            description = goal.get('description')
+            if not goal_id or not description: continue
+
+            print(f"  - Decomposing goal ID {goal_id}: '{description}'")
+            plan = await decompose_goal_into_steps(cog, description)
+
+            if plan and plan.get('goal_achievable') and plan.get('steps'):
+                # Goal is achievable and has steps, update status to active and store plan
+                await cog.memory_manager.update_goal(goal_id, status='active', details=plan)
+                print(f"  - Goal ID {goal_id} decomposed and set to active.")
+            elif plan:
+                # Goal deemed not achievable by planner
+                await cog.memory_manager.update_goal(goal_id, status='failed', details={"reason": plan.get('reasoning', 'Deemed unachievable by planner.')})
+                print(f"  - Goal ID {goal_id} marked as failed (unachievable). Reason: {plan.get('reasoning')}")
+            else:
+                # Decomposition failed entirely
+                await cog.memory_manager.update_goal(goal_id, status='failed', details={"reason": "Goal decomposition process failed."})
+                print(f"  - Goal ID {goal_id} marked as failed (decomposition error).")
+            await asyncio.sleep(1) # Small delay between decomposing goals
+
+        cog.last_goal_check_time = now # Update timestamp after checking
+    except Exception as goal_e:
+        print(f"Error during goal decomposition check: {goal_e}")
+        traceback.print_exc()
+        cog.last_goal_check_time = now # Update timestamp even on error
 
+async def run_goal_execution(cog: 'GurtCog'):
+    """Executes the next step of the highest priority active goal."""
+    now = time.time()
+    print("Checking for active goals to execute...")
+    try:
+        active_goals = await cog.memory_manager.get_goals(status='active', limit=1) # Process one active goal per cycle for now
+        if active_goals:
+            goal = active_goals[0] # Get the highest priority active goal
+            goal_id = goal.get('goal_id')
+            description = goal.get('description')
+            plan = goal.get('details') # The decomposition plan is stored here
+            # Retrieve context saved with the goal
+            goal_context_guild_id = goal.get('guild_id')
+            goal_context_channel_id = goal.get('channel_id')
+            goal_context_user_id = goal.get('user_id')
+
+            if goal_id and description and plan and isinstance(plan.get('steps'), list):
+                print(f"--- Executing Goal ID {goal_id}: '{description}' (Context: G={goal_context_guild_id}, C={goal_context_channel_id}, U={goal_context_user_id}) ---")
+                steps = plan['steps']
+                current_step_index = plan.get('current_step_index', 0) # Track progress
+                goal_failed = False
+                goal_completed = False
+
+                if current_step_index < len(steps):
+                    step = steps[current_step_index]
+                    step_desc = step.get('step_description')
+                    tool_name = step.get('tool_name')
+                    tool_args = step.get('tool_arguments')
+
+                    print(f"  - Step {current_step_index + 1}/{len(steps)}: {step_desc}")
+
+                    if tool_name:
+                        print(f"    - Attempting tool: {tool_name} with args: {tool_args}")
+                        tool_func = TOOL_MAPPING.get(tool_name)
+                        tool_result = None
+                        tool_error = None
+                        tool_success = False
+
+                        if tool_func:
+                            try:
+                                # Ensure args are a dictionary, default to empty if None/missing
+                                args_to_pass = tool_args if isinstance(tool_args, dict) else {}
+                                print(f"    - Executing: {tool_name}(cog, **{args_to_pass})")
+                                start_time = time.monotonic()
+                                tool_result = await tool_func(cog, **args_to_pass)
+                                end_time = time.monotonic()
+                                print(f"    - Tool '{tool_name}' returned: {str(tool_result)[:200]}...") # Log truncated result
+
+                                # Check result for success/error
+                                if isinstance(tool_result, dict) and "error" in tool_result:
+                                    tool_error = tool_result["error"]
+                                    print(f"    - Tool '{tool_name}' reported error: {tool_error}")
+                                    cog.tool_stats[tool_name]["failure"] += 1
+                                else:
+                                    tool_success = True
+                                    print(f"    - Tool '{tool_name}' executed successfully.")
+                                    cog.tool_stats[tool_name]["success"] += 1
+                                # Record stats
+                                cog.tool_stats[tool_name]["count"] += 1
+                                cog.tool_stats[tool_name]["total_time"] += (end_time - start_time)
+
+                            except Exception as exec_e:
+                                tool_error = f"Exception during execution: {str(exec_e)}"
+                                print(f"    - Tool '{tool_name}' raised exception: {exec_e}")
+                                traceback.print_exc()
+                                cog.tool_stats[tool_name]["failure"] += 1
+                                cog.tool_stats[tool_name]["count"] += 1 # Count failures too
                         else:
-                             print(f"  - Skipping active goal ID {goal_id}: Missing description or valid plan/steps.")
-                             # Optionally mark as failed if plan is invalid
-                             if goal_id:
-                                 await cog.memory_manager.update_goal(goal_id, status='failed', details={"reason": "Invalid plan structure found during execution."})
-
+                            tool_error = f"Tool '{tool_name}' not found in TOOL_MAPPING."
+                            print(f"    - Error: {tool_error}")
+
+                        # --- Send Update Message (if channel context exists) --- ### MODIFICATION START ###
+                        if goal_context_channel_id:
+                            step_number_display = current_step_index + 1 # Human-readable step number for display
+                            status_emoji = "✅" if tool_success else "❌"
+                            # Use the helper function to create a summary
+                            step_result_summary = _create_result_summary(tool_result if tool_success else {"error": tool_error})
+
+                            update_message = (
+                                f"**Goal Update (ID: {goal_id}, Step {step_number_display}/{len(steps)})** {status_emoji}\n"
+                                f"> **Goal:** {description}\n"
+                                f"> **Step:** {step_desc}\n"
+                                f"> **Tool:** `{tool_name}`\n"
+                                # f"> **Args:** `{json.dumps(tool_args)}`\n" # Args might be too verbose
+                                f"> **Result:** `{step_result_summary}`"
+                            )
+                            # Limit message length
+                            if len(update_message) > 1900:
+                                update_message = update_message[:1900] + "...`"
+
+                            try:
+                                # Use the imported send_discord_message function
+                                await send_discord_message(cog, channel_id=goal_context_channel_id, message_content=update_message)
+                                print(f"    - Sent goal update to channel {goal_context_channel_id}")
+                            except Exception as msg_err:
+                                print(f"    - Failed to send goal update message to channel {goal_context_channel_id}: {msg_err}")
+                        ### MODIFICATION END ###
+
+                        # --- Handle Tool Outcome ---
+                        if tool_success:
+                            # Store result if needed (optional, requires plan structure modification)
+                            # plan['step_results'][current_step_index] = tool_result
+                            current_step_index += 1
+                        else:
+                            goal_failed = True
+                            plan['error_message'] = f"Failed at step {current_step_index + 1} ({tool_name}): {tool_error}"
+                    else:
+                        # Step doesn't require a tool (e.g., internal reasoning/check)
+                        print("    - No tool required for this step (internal check/reasoning).")
+                        # Send update message for non-tool steps too? Optional. For now, only for tool steps.
+                        current_step_index += 1 # Assume non-tool steps succeed for now
+
+                    # Check if goal completed
+                    if not goal_failed and current_step_index >= len(steps):
+                        goal_completed = True
+
+                    # --- Update Goal Status ---
+                    plan['current_step_index'] = current_step_index # Update progress
+                    if goal_completed:
+                        await cog.memory_manager.update_goal(goal_id, status='completed', details=plan)
+                        print(f"--- Goal ID {goal_id} completed successfully. ---")
+                    elif goal_failed:
+                        await cog.memory_manager.update_goal(goal_id, status='failed', details=plan)
+                        print(f"--- Goal ID {goal_id} failed. ---")
                     else:
-                        print("No active goals found to execute.")
+                        # Update details with current step index if still in progress
+                        await cog.memory_manager.update_goal(goal_id, details=plan)
+                        print(f"  - Goal ID {goal_id} progress updated to step {current_step_index}.")
 
-                    cog.last_goal_execution_time = now # Update timestamp after checking/executing
-                except Exception as goal_exec_e:
-                    print(f"Error during goal execution check: {goal_exec_e}")
-                    traceback.print_exc()
-                    cog.last_goal_execution_time = now # Update timestamp even on error
+                else:
+                    # Should not happen if status is 'active', but handle defensively
+                    print(f"  - Goal ID {goal_id} is active but has no steps or index out of bounds. Marking as failed.")
+                    await cog.memory_manager.update_goal(goal_id, status='failed', details={"reason": "Active goal has invalid step data."})
 
-            # --- Automatic Mood Change (Runs based on its own interval check) ---
-            # await maybe_change_mood(cog) # Call the mood change logic
+            else:
+                 print(f"  - Skipping active goal ID {goal_id}: Missing description or valid plan/steps.")
+                 # Optionally mark as failed if plan is invalid
+                 if goal_id:
+                     await cog.memory_manager.update_goal(goal_id, status='failed', details={"reason": "Invalid plan structure found during execution."})
 
-            # --- Proactive Goal Creation Check (Runs periodically) ---
-            if now - cog.last_proactive_goal_check > PROACTIVE_GOAL_CHECK_INTERVAL: # Use imported config
-                print("Checking if Gurt should proactively create goals...")
-                try:
-                    await proactively_create_goals(cog) # Call the function from analysis.py
-                    cog.last_proactive_goal_check = now # Update timestamp
-                    print("Proactive goal check complete.")
-                except Exception as proactive_e:
-                    print(f"Error during proactive goal check: {proactive_e}")
-                    traceback.print_exc()
-                    cog.last_proactive_goal_check = now # Update timestamp even on error
-
-    # Ensure these except blocks match the initial 'try' at the function start
-    except asyncio.CancelledError:
-        print("Background processing task cancelled")
-    except Exception as e:
-        print(f"Error in background processing task: {e}")
+        else:
+            print("No active goals found to execute.")
+
+        cog.last_goal_execution_time = now # Update timestamp after checking/executing
+    except Exception as goal_exec_e:
+        print(f"Error during goal execution check: {goal_exec_e}")
         traceback.print_exc()
-        await asyncio.sleep(300) # Wait 5 minutes before retrying after an error
+        cog.last_goal_execution_time = now # Update timestamp even on error
+
+async def run_proactive_goal_check(cog: 'GurtCog'):
+    """Checks whether Gurt should proactively create goals."""
+    now = time.time()
+    print("Checking if Gurt should proactively create goals...")
+    try:
+        await proactively_create_goals(cog) # Call the function from analysis.py
+        cog.last_proactive_goal_check = now # Update timestamp
+        print("Proactive goal check complete.")
+    except Exception as proactive_e:
+        print(f"Error during proactive goal check: {proactive_e}")
+        traceback.print_exc()
+        cog.last_proactive_goal_check = now # Update timestamp even on error
+
+async def run_semantic_compaction(cog: 'GurtCog'):
+    """Prunes, dedupes and compacts the semantic memory collections."""
+    print("Running semantic memory compaction...")
+    report = await cog.memory_manager.compact_semantic_memory(
+        message_retention_days=MESSAGE_EMBEDDING_RETENTION_DAYS,
+        important_message_retention_days=IMPORTANT_MESSAGE_RETENTION_DAYS,
+        keep_importance=MESSAGE_EMBEDDING_KEEP_IMPORTANCE,
+        fact_similarity_threshold=FACT_DEDUP_SIMILARITY
+    )
+    cog.last_compaction_report = report
+    if "before" in report:
+        print(f"Semantic memory compaction complete in {report['duration_s']}s: pruned {report.get('messages_pruned', 0)} messages, "
+              f"deleted {report.get('orphaned_facts_deleted', 0)} orphaned facts, merged {report.get('duplicate_facts_merged', 0)} duplicate facts. "
+              f"Before: {report['before']} After: {report['after']}")
+    else:
+        print(f"Skipping semantic memory compaction: {report.get('error')}")
+
+async def run_message_index_prune(cog: 'GurtCog'):
+    """Applies the message index's age and row limits."""
+    start_time = time.monotonic()
+    deleted, pruned_before = await cog.memory_manager.prune_message_index(MESSAGE_INDEX_RETENTION_DAYS, MESSAGE_INDEX_MAX_ROWS)
+    if pruned_before is not None:
+        # The index no longer covers anything before pruned_before; the search tools fetch that range from Discord
+        for channel_id, covered_since in cog.message_index_coverage.items():
+            cog.message_index_coverage[channel_id] = max(covered_since, pruned_before)
+    if deleted:
+        print(f"Pruned {deleted} messages from the message index in {time.monotonic() - start_time:.2f}s.")
+
+async def run_state_snapshot(cog: 'GurtCog'):
+    """Snapshots relationship/sentiment/conversation tracking to the memory DB so restarts are warm."""
+    start_time = time.monotonic()
+    counts = await snapshot_runtime_state(cog)
+    print(f"Runtime state snapshot saved in {time.monotonic() - start_time:.2f}s: {counts}")
 
 # --- Helper for Summarizing Tool Results ---
 def _create_result_summary(tool_result: Any, max_len: int = 200) -> str:
@@ -403,10 +462,10 @@ async def update_interests(cog: 'GurtCog'):
 
         for message_id, reaction_data in reactions_to_process:
             if message_id in processed_reaction_messages: continue
-            topic = reaction_data.get("topic")
+            topic = reaction_data.topic
             if not topic:
                 try:
-                    gurt_msg_data = next((msg for msg in cog.message_cache['global_recent'] if msg['id'] == message_id), None)
+                    gurt_msg_data = next((msg for msg in cog.message_cache['global_recent'] if msg['id'] == str(message_id)), None)
                     if gurt_msg_data and gurt_msg_data['content']:
                          # Use identify_conversation_topics from analysis.py
                          identified_topics = identify_conversation_topics(cog, [gurt_msg_data]) # Pass cog
@@ -419,8 +478,8 @@ async def update_interests(cog: 'GurtCog'):
 
             if topic:
                 topic = topic.lower().strip()
-                pos_reactions = reaction_data.get("positive", 0)
-                neg_reactions = reaction_data.get("negative", 0)
+                pos_reactions = reaction_data.positive
+                neg_reactions = reaction_data.negative
                 change = 0
                 if pos_reactions > neg_reactions: change = INTEREST_POSITIVE_REACTION_BOOST * (pos_reactions - neg_reactions)
                 elif neg_reactions > pos_reactions: change = INTEREST_NEGATIVE_REACTION_PENALTY * (neg_reactions - pos_reactions)
@@ -452,11 +511,12 @@ async def update_interests(cog: 'GurtCog'):
         # Clear temporary tracking data
         cog.gurt_participation_topics.clear()
         now = time.time()
-        reactions_to_keep = {
-            msg_id: data for msg_id, data in cog.gurt_message_reactions.items()
-            if data.get("timestamp", 0) > (now - INTEREST_UPDATE_INTERVAL * 1.1)
-        }
-        cog.gurt_message_reactions = defaultdict(lambda: {"positive": 0, "negative": 0, "topic": None}, reactions_to_keep)
+        stale_reactions = [
+            msg_id for msg_id, data in cog.gurt_message_reactions.items()
+            if data.timestamp <= (now - INTEREST_UPDATE_INTERVAL * 1.1)
+        ]
+        for msg_id in stale_reactions:
+            del cog.gurt_message_reactions[msg_id]
 
         print("Interest update cycle finished.")
 
@@ -0,0 +1,86 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+class _ChannelState:
+    __slots__ = ("pending", "last_trigger_at")
+
+    def __init__(self):
+        self.pending: Optional[Any] = None # Merged trigger waiting for the follow-up generation
+        self.last_trigger_at = 0.0
+
+
+class ChannelRequestCoalescer:
+    """
+    Ensures only one response generation runs per channel at a time.
+
+    The first trigger in an idle channel runs immediately. Triggers arriving while that generation
+    is in flight (or while waiting for a follow-up) are merged with merge(pending, new) into a single
+    pending trigger. When the generation finishes, the pending trigger (if any) runs as one follow-up
+    generation once the channel has been quiet for `debounce` seconds, or after `max_delay` seconds
+    at most. The follow-up runs in the task that submitted the first trigger.
+    """
+
+    def __init__(self, merge: Callable[[Any, Any], Any], debounce: float = 2.0, max_delay: float = 8.0):
+        self.merge = merge
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._channels: Dict[int, _ChannelState] = {}
+        self.stats = {"triggers": 0, "generations": 0, "coalesced": 0, "followups": 0, "failures": 0, "total_debounce_time": 0.0}
+
+    def is_busy(self, channel_id: int) -> bool:
+        return channel_id in self._channels
+
+    async def submit(self, channel_id: int, trigger: Any, run: Callable[[Any], Awaitable[None]]) -> bool:
+        """
+        Runs run(trigger) now if the channel is idle, then any follow-up. Returns False if the
+        trigger was merged into a pending follow-up instead (it returns immediately in that case).
+        """
+        self.stats["triggers"] += 1
+        state = self._channels.get(channel_id)
+        if state is not None:
+            state.pending = trigger if state.pending is None else self.merge(state.pending, trigger)
+            state.last_trigger_at = time.monotonic()
+            self.stats["coalesced"] += 1
+            print(f"Coalesced response trigger for channel {channel_id} into the pending follow-up.")
+            return False
+
+        state = self._channels[channel_id] = _ChannelState()
+        try:
+            next_trigger = trigger
+            while next_trigger is not None:
+                self.stats["generations"] += 1
+                try:
+                    await run(next_trigger)
+                except Exception as e:
+                    self.stats["failures"] += 1
+                    print(f"Error generating response for channel {channel_id}: {e}")
+                next_trigger = await self._wait_for_followup(state)
+        finally:
+            self._channels.pop(channel_id, None)
+        return True
+
+    async def _wait_for_followup(self, state: _ChannelState) -> Optional[Any]:
+        """Waits out the debounce window if a trigger is pending and returns it (or None)."""
+        if state.pending is None:
+            return None
+        start_time = time.monotonic()
+        deadline = start_time + self.max_delay
+        while True:
+            now = time.monotonic()
+            quiet_at = state.last_trigger_at + self.debounce
+            if now >= quiet_at or now >= deadline:
+                break
+            await asyncio.sleep(min(quiet_at, deadline) - now)
+        self.stats["followups"] += 1
+        self.stats["total_debounce_time"] += time.monotonic() - start_time
+        pending, state.pending = state.pending, None
+        return pending
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["busy_channels"] = len(self._channels)
+        # Share of triggers that didn't cost a generation of their own
+        stats["coalesce_ratio"] = round(stats["coalesced"] / stats["triggers"], 3) if stats["triggers"] > 0 else 0
+        stats["average_debounce_ms"] = round((stats["total_debounce_time"] / stats["followups"]) * 1000, 1) if stats["followups"] > 0 else 0
+        return stats
@@ -17,7 +17,7 @@ from tavily import TavilyClient # Needed for tavily_client init
 # --- Relative Imports from Gurt Package ---
 from .config import (
     PROJECT_ID, LOCATION, TAVILY_API_KEY, DEFAULT_MODEL, FALLBACK_MODEL, # Use GCP config
-    DB_PATH, CHROMA_PATH, SEMANTIC_MODEL_NAME, MAX_USER_FACTS, MAX_GENERAL_FACTS,
+    DB_PATH, CHROMA_PATH, SEMANTIC_MODEL_NAME, EMBEDDING_SERVICE_ENABLED, MAX_USER_FACTS, MAX_GENERAL_FACTS,
     MOOD_OPTIONS, BASELINE_PERSONALITY, BASELINE_INTERESTS, MOOD_CHANGE_INTERVAL_MIN,
     MOOD_CHANGE_INTERVAL_MAX, CHANNEL_TOPIC_CACHE_TTL, CONTEXT_WINDOW_SIZE,
     API_TIMEOUT, SUMMARY_API_TIMEOUT, API_RETRY_ATTEMPTS, API_RETRY_DELAY,
@@ -26,13 +26,27 @@ from .config import (
     PROACTIVE_RELATIONSHIP_SCORE_THRESHOLD, PROACTIVE_RELATIONSHIP_CHANCE,
     INTEREST_UPDATE_INTERVAL, INTEREST_DECAY_INTERVAL_HOURS,
     LEARNING_UPDATE_INTERVAL, TOPIC_UPDATE_INTERVAL, SENTIMENT_UPDATE_INTERVAL,
-    EVOLUTION_UPDATE_INTERVAL, RESPONSE_SCHEMA, TOOLS # Import necessary configs
+    EVOLUTION_UPDATE_INTERVAL, RESPONSE_SCHEMA, TOOLS, # Import necessary configs
+    RELATIONSHIP_MAX_PAIRS, STATE_MAX_CHANNELS, STATE_MAX_USERS, SENTIMENT_MAX_USERS_PER_CHANNEL, REACTION_TRACKING_MAX,
+    LLM_MAX_CONCURRENCY, RESPONSE_COALESCE_DEBOUNCE, RESPONSE_COALESCE_MAX_DELAY
 )
 # Import functions/classes from other modules
 from .memory import MemoryManager # Import from local memory.py
 from .background import background_processing_task
+from .coalescer import ChannelRequestCoalescer
+from .state import (
+    LRUDict, RelationshipStore, ChannelSentiment, ActiveConversation, ReactionRecord,
+    snapshot_runtime_state, restore_runtime_state
+)
+from job_scheduler import EventLoopLagMonitor
+from metrics import REGISTRY, MetricFamily, stats_counters
+from embedding_models import EmbeddingService
 from .commands import setup_commands # Import the setup helper
-from .listeners import on_ready_listener, on_message_listener, on_reaction_add_listener, on_reaction_remove_listener # Import listener functions
+from .listeners import ( # Import listener functions
+    on_ready_listener, on_message_listener, on_reaction_add_listener, on_reaction_remove_listener,
+    on_raw_message_edit_listener, on_raw_message_delete_listener, on_raw_bulk_message_delete_listener,
+    merge_response_triggers
+)
 from . import config as GurtConfig # Import config module for get_gurt_stats
 # Tool mapping is used internally by api.py/process_requested_tools, no need to import here directly unless cog methods call tools directly (they shouldn't)
 # Analysis, context, prompt, api, utils functions are called by listeners/commands/background task, not directly by cog methods here usually.
@@ -44,7 +58,9 @@ class GurtCog(commands.Cog, name="Gurt"): # Added explicit Cog name
     """A special cog for the Gurt bot that uses Google Vertex AI API"""
 
     def __init__(self, bot):
+        init_start = time.monotonic()
         self.bot = bot
+        self.startup_timings: Dict[str, float] = {} # Startup phase -> seconds, see report_startup_timings()
         # GCP Project/Location are used by vertexai.init() in api.py
         self.tavily_api_key = TAVILY_API_KEY # Use imported config
         self.session: Optional[aiohttp.ClientSession] = None # Keep for other potential HTTP requests (e.g., Piston)
@@ -60,7 +76,8 @@ class GurtCog(commands.Cog, name="Gurt"): # Added explicit Cog name
             max_user_facts=MAX_USER_FACTS,
             max_general_facts=MAX_GENERAL_FACTS,
             chroma_path=CHROMA_PATH,
-            semantic_model_name=SEMANTIC_MODEL_NAME
+            semantic_model_name=SEMANTIC_MODEL_NAME,
+            use_embedding_service=EMBEDDING_SERVICE_ENABLED
         )
 
         # --- State Variables ---
@@ -86,12 +103,14 @@ class GurtCog(commands.Cog, name="Gurt"): # Added explicit Cog name
         # Conversation tracking / Caches
         self.conversation_history = defaultdict(lambda: deque(maxlen=100))
         self.thread_history = defaultdict(lambda: deque(maxlen=50))
-        self.user_conversation_mapping = defaultdict(set)
+        self.user_conversation_mapping = LRUDict(STATE_MAX_USERS) # User ID -> tuple of recent channel IDs
         self.channel_activity = defaultdict(lambda: 0.0) # Use float for timestamp
         self.conversation_topics = defaultdict(str)
-        self.user_relationships = defaultdict(dict)
+        self.user_relationships = RelationshipStore(RELATIONSHIP_MAX_PAIRS)
         self.conversation_summaries: Dict[int, Dict[str, Any]] = {} # Store dict with summary and timestamp
         self.channel_topics_cache: Dict[int, Dict[str, Any]] = {} # Store dict with topic and timestamp
+        self.message_index_coverage: Dict[int, float] = {} # Channel ID -> timestamp since which every message there has been indexed
+        self.rendered_message_cache: Dict[str, Dict[str, Any]] = {} # Message ID -> rendered context entry (see context.render_cached_message)
         # self.channel_topic_cache_ttl = CHANNEL_TOPIC_CACHE_TTL # Used in prompt building
 
         self.message_cache = {
@@ -103,24 +122,25 @@ class GurtCog(commands.Cog, name="Gurt"): # Added explicit Cog name
             'replied_to': defaultdict(lambda: deque(maxlen=20))
         }
 
-        self.active_conversations = {}
+        self.active_conversations = LRUDict(STATE_MAX_CHANNELS, ActiveConversation) # Channel ID -> ActiveConversation
         self.bot_last_spoke = defaultdict(float)
         self.message_reply_map = {}
 
         # Enhanced sentiment tracking
-        self.conversation_sentiment = defaultdict(lambda: {
-            "overall": "neutral", "intensity": 0.5, "recent_trend": "stable",
-            "user_sentiments": {}, "last_update": time.time()
-        })
+        self.conversation_sentiment = LRUDict(STATE_MAX_CHANNELS, lambda: ChannelSentiment(SENTIMENT_MAX_USERS_PER_CHANNEL)) # Channel ID -> ChannelSentiment
         self.sentiment_update_interval = SENTIMENT_UPDATE_INTERVAL # Used in analysis
 
         # Interest Tracking State
         self.gurt_participation_topics = defaultdict(int)
         self.last_interest_update = time.time()
-        self.gurt_message_reactions = defaultdict(lambda: {"positive": 0, "negative": 0, "topic": None, "timestamp": 0.0}) # Added timestamp
+        self.gurt_message_reactions = LRUDict(REACTION_TRACKING_MAX, ReactionRecord) # Message ID -> ReactionRecord
 
         # Background task handle
         self.background_task: Optional[asyncio.Task] = None
+        self.background_scheduler = None # JobScheduler created by background_processing_task
+        self.semantic_init_task: Optional[asyncio.Task] = None
+        self.last_compaction_report: Optional[Dict[str, Any]] = None # Set by the semantic_compaction background job
+        self.loop_lag_monitor = EventLoopLagMonitor() # Samples event loop lag for stats (e.g. to compare in-process vs. worker embeddings)
         self.last_evolution_update = time.time() # Used in background task
         self.last_stats_push = time.time() # Timestamp for last stats push
         self.last_reflection_time = time.time() # Timestamp for last memory reflection
@@ -131,7 +151,15 @@ class GurtCog(commands.Cog, name="Gurt"): # Added explicit Cog name
 
         # --- Stats Tracking ---
         self.api_stats = defaultdict(lambda: {"success": 0, "failure": 0, "retries": 0, "total_time": 0.0, "count": 0}) # Keyed by model name
-        self.tool_stats = defaultdict(lambda: {"success": 0, "failure": 0, "total_time": 0.0, "count": 0}) # Keyed by tool name
+        self.llm_semaphore = asyncio.Semaphore(max(1, LLM_MAX_CONCURRENCY)) # Shared by every model API call, see api.llm_concurrency_slot
+        self.llm_queue_stats = {"acquired": 0, "waiting": 0, "in_flight": 0, "total_wait": 0.0, "max_wait": 0.0}
+        self.response_coalescer = ChannelRequestCoalescer(merge_response_triggers, RESPONSE_COALESCE_DEBOUNCE, RESPONSE_COALESCE_MAX_DELAY)
+        self.tool_stats = defaultdict(lambda: {"success": 0, "failure": 0, "total_time": 0.0, "count": 0, "cache_hits": 0, "cache_misses": 0}) # Keyed by tool name
+        self.response_latency_stats = defaultdict(lambda: {"count": 0, "total_time": 0.0, "max_time": 0.0}) # Time to first message, keyed by "streamed"/"buffered"
+        self.tool_result_cache: Dict[tuple, Tuple[float, Dict[str, Any]]] = {} # (tool, scope, scope_id, args) -> (expires_at, result)
+        self.prompt_provider_stats = defaultdict(lambda: {"success": 0, "failure": 0, "timeout": 0, "total_time": 0.0, "last_time": 0.0, "count": 0}) # Keyed by prompt context provider name
+        self.static_prompt_cache: Optional[Dict[str, Any]] = None # Static system prompt prefix, see prompt.get_static_prompt_prefix
+        self.prompt_section_stats = defaultdict(lambda: {"included": 0, "dropped": 0, "total_tokens": 0}) # Keyed by dynamic system prompt section
 
         # --- Setup Commands and Listeners ---
         # Add commands defined in commands.py
@@ -153,17 +181,31 @@ class GurtCog(commands.Cog, name="Gurt"): # Added explicit Cog name
         # Note: Listeners need to be added to the bot instance, not the cog directly in this pattern.
         # We'll add them in cog_load or the main setup function.
 
+        self.startup_timings["init"] = time.monotonic() - init_start
         print(f"GurtCog initialized with commands: {self.registered_commands}")
 
     async def cog_load(self):
         """Create aiohttp session, initialize DB, load baselines, start background task"""
+        phase_start = time.monotonic()
         self.session = aiohttp.ClientSession()
         print("GurtCog: aiohttp session created")
+        self.startup_timings["session"] = time.monotonic() - phase_start
 
+        phase_start = time.monotonic()
         # Initialize DB via MemoryManager
         await self.memory_manager.initialize_sqlite_database()
+        self.startup_timings["sqlite_init"] = time.monotonic() - phase_start
+        phase_start = time.monotonic()
         await self.memory_manager.load_baseline_personality(BASELINE_PERSONALITY)
         await self.memory_manager.load_baseline_interests(BASELINE_INTERESTS)
+        self.startup_timings["baselines"] = time.monotonic() - phase_start
+        phase_start = time.monotonic()
+        try:
+            restored = await restore_runtime_state(self)
+            print(f"GurtCog: Restored runtime state snapshot: {restored}")
+        except Exception as e:
+            print(f"GurtCog: Error restoring runtime state snapshot: {e}")
+        self.startup_timings["state_restore"] = time.monotonic() - phase_start
 
         # Vertex AI initialization happens in api.py using PROJECT_ID and LOCATION from config
         print(f"GurtCog: Using default model: {self.default_model}")
@@ -196,6 +238,18 @@ class GurtCog(commands.Cog, name="Gurt"): # Added explicit Cog name
         async def on_reaction_remove(reaction, user):
             await on_reaction_remove_listener(self, reaction, user)
 
+        @self.bot.event
+        async def on_raw_message_edit(payload):
+            await on_raw_message_edit_listener(self, payload)
+
+        @self.bot.event
+        async def on_raw_message_delete(payload):
+            await on_raw_message_delete_listener(self, payload)
+
+        @self.bot.event
+        async def on_raw_bulk_message_delete(payload):
+            await on_raw_bulk_message_delete_listener(self, payload)
+
         print("GurtCog: Listeners added.")
 
         # We'll sync commands in the on_ready event instead of here
@@ -209,6 +263,14 @@ class GurtCog(commands.Cog, name="Gurt"): # Added explicit Cog name
         else:
              print("GurtCog: Background processing task already running.")
 
+        self.loop_lag_monitor.start()
+        REGISTRY.add_collector("gurt", self.collect_metrics)
+
+        # Semantic memory (ChromaDB + embedding model) loads in a worker thread once the bot is ready,
+        # so it doesn't hold up startup. Until then memory lookups use the SQLite paths.
+        if self.semantic_init_task is None or self.semantic_init_task.done():
+            self.semantic_init_task = asyncio.create_task(self._load_semantic_memory())
+
     async def cog_unload(self):
         """Close session and cancel background task"""
         if self.session and not self.session.closed:
@@ -217,6 +279,20 @@ class GurtCog(commands.Cog, name="Gurt"): # Added explicit Cog name
         if self.background_task and not self.background_task.done():
             self.background_task.cancel()
             print("GurtCog: Cancelled background processing task.")
+        if self.semantic_init_task and not self.semantic_init_task.done():
+            self.semantic_init_task.cancel()
+        self.loop_lag_monitor.stop()
+        REGISTRY.remove_collector("gurt")
+        try:
+            await snapshot_runtime_state(self)
+            print("GurtCog: Runtime state snapshot saved.")
+        except Exception as e:
+            print(f"GurtCog: Error saving runtime state snapshot: {e}")
+        try:
+            await self.memory_manager.close()
+            print("GurtCog: Memory database connections closed.")
+        except Exception as e:
+            print(f"GurtCog: Error closing memory database connections: {e}")
         # Note: When using @bot.event, we can't easily remove the listeners
         # The bot will handle this automatically when it's closed
         print("GurtCog: Listeners will be removed when bot is closed.")
@@ -224,23 +300,58 @@ class GurtCog(commands.Cog, name="Gurt"): # Added explicit Cog name
         print("GurtCog unloaded.")
 
     # --- Helper methods that might remain in the cog ---
-    # (Example: _update_relationship needs access to self.user_relationships)
-    # Moved to utils.py, but needs access to cog state. Pass cog instance.
-    def _update_relationship(self, user_id_1: str, user_id_2: str, change: float):
-        """Updates the relationship score between two users."""
-        # This method accesses self.user_relationships, so it stays here or utils needs cog passed.
-        # Let's keep it here for simplicity for now.
-        if user_id_1 > user_id_2: user_id_1, user_id_2 = user_id_2, user_id_1
-        if user_id_1 not in self.user_relationships: self.user_relationships[user_id_1] = {}
-
-        current_score = self.user_relationships[user_id_1].get(user_id_2, 0.0)
-        new_score = max(0.0, min(current_score + change, 100.0)) # Clamp 0-100
-        self.user_relationships[user_id_1][user_id_2] = new_score
-        # print(f"Updated relationship {user_id_1}-{user_id_2}: {current_score:.1f} -> {new_score:.1f} ({change:+.1f})") # Debug log
+    def _update_relationship(self, user_id_1: Union[int, str], user_id_2: Union[int, str], change: float):
+        """Updates the relationship score between two users (clamped 0-100)."""
+        self.user_relationships.update(user_id_1, user_id_2, change)
+
+    async def _load_semantic_memory(self):
+        """Waits for the bot to be ready, then loads semantic memory in the background."""
+        phase_start = time.monotonic()
+        await self.bot.wait_until_ready()
+        self.startup_timings["wait_until_ready"] = time.monotonic() - phase_start
+        try:
+            timings = await self.memory_manager.initialize_semantic_memory()
+            for phase, duration in timings.items():
+                self.startup_timings[f"semantic_{phase}"] = duration
+        except Exception as e:
+            print(f"GurtCog: Error loading semantic memory: {e}")
+        self.report_startup_timings()
+
+    def report_startup_timings(self):
+        """Prints how long each startup phase took."""
+        phases = ", ".join(f"{phase}={duration * 1000:.0f}ms" for phase, duration in self.startup_timings.items())
+        print(f"GurtCog: Startup timings: {phases} (semantic memory: {self.memory_manager.semantic_state})")
+
+    def collect_metrics(self) -> List[MetricFamily]:
+        """Exposes the counters Gurt already keeps (see get_gurt_stats) to the metrics registry at scrape time."""
+        families = [
+            stats_counters("gurt_llm_request_events_total", "Gurt LLM requests by model and event (success, failure, retries)",
+                           "model", self.api_stats, keys=("success", "failure", "retries")),
+            stats_counters("gurt_tool_events_total", "Gurt tool calls by tool and event (success, failure, cache_hits, cache_misses)",
+                           "tool", self.tool_stats, keys=("success", "failure", "cache_hits", "cache_misses")),
+        ]
+        queue = MetricFamily("gurt_llm_queue", "gauge", "Gurt LLM call slots: waiting, in_flight and max_concurrency")
+        queue.add_sample({"state": "waiting"}, self.llm_queue_stats["waiting"])
+        queue.add_sample({"state": "in_flight"}, self.llm_queue_stats["in_flight"])
+        queue.add_sample({"state": "max_concurrency"}, LLM_MAX_CONCURRENCY)
+        queue_wait = MetricFamily("gurt_llm_queue_wait_seconds_total", "counter", "Total time Gurt LLM calls waited for a slot")
+        queue_wait.add_sample({}, self.llm_queue_stats["total_wait"])
+        caches = MetricFamily("gurt_cache_entries", "gauge", "Entries in Gurt's in-memory caches")
+        caches.add_sample({"cache": "tool_results"}, len(self.tool_result_cache))
+        caches.add_sample({"cache": "conversation_summaries"}, len(self.conversation_summaries))
+        caches.add_sample({"cache": "user_relationships"}, len(self.user_relationships))
+        families.extend([queue, queue_wait, caches])
+        lag = self.loop_lag_monitor.get_stats()
+        if lag.get("samples"):
+            lag_family = MetricFamily("event_loop_lag_seconds", "gauge", "Event loop lag over the monitor's sample window")
+            for quantile, key in (("0.5", "p50_ms"), ("0.99", "p99_ms")):
+                lag_family.add_sample({"quantile": quantile}, lag[key] / 1000)
+            families.append(lag_family)
+        return families
 
     async def get_gurt_stats(self) -> Dict[str, Any]:
         """Collects various internal stats for Gurt."""
-        stats = {"config": {}, "runtime": {}, "memory": {}, "api_stats": {}, "tool_stats": {}}
+        stats = {"config": {}, "runtime": {}, "memory": {}, "api_stats": {}, "tool_stats": {}, "prompt_provider_stats": {}, "response_latency_stats": {}}
 
         # --- Config ---
         # Selectively pull relevant config values, avoid exposing secrets
@@ -250,6 +361,7 @@ class GurtCog(commands.Cog, name="Gurt"): # Added explicit Cog name
         stats["config"]["db_path"] = GurtConfig.DB_PATH
         stats["config"]["chroma_path"] = GurtConfig.CHROMA_PATH
         stats["config"]["semantic_model_name"] = GurtConfig.SEMANTIC_MODEL_NAME
+        stats["config"]["embedding_service_enabled"] = GurtConfig.EMBEDDING_SERVICE_ENABLED
         stats["config"]["max_user_facts"] = GurtConfig.MAX_USER_FACTS
         stats["config"]["max_general_facts"] = GurtConfig.MAX_GENERAL_FACTS
         stats["config"]["mood_change_interval_min"] = GurtConfig.MOOD_CHANGE_INTERVAL_MIN
@@ -279,15 +391,29 @@ class GurtCog(commands.Cog, name="Gurt"): # Added explicit Cog name
         stats["runtime"]["last_interest_update_timestamp"] = self.last_interest_update
         stats["runtime"]["last_evolution_update_timestamp"] = self.last_evolution_update
         stats["runtime"]["background_task_running"] = bool(self.background_task and not self.background_task.done())
+        stats["runtime"]["background_jobs"] = self.background_scheduler.get_stats() if self.background_scheduler else {}
+        stats["runtime"]["semantic_memory_state"] = self.memory_manager.semantic_state
+        stats["runtime"]["event_loop_lag"] = self.loop_lag_monitor.get_stats()
+        transformer_model = self.memory_manager.transformer_model
+        stats["runtime"]["embedding_service"] = transformer_model.get_stats() if isinstance(transformer_model, EmbeddingService) else None
+        stats["runtime"]["startup_timings_ms"] = {phase: round(duration * 1000, 1) for phase, duration in self.startup_timings.items()}
         stats["runtime"]["active_topics_channels"] = len(self.active_topics)
         stats["runtime"]["conversation_history_channels"] = len(self.conversation_history)
         stats["runtime"]["thread_history_threads"] = len(self.thread_history)
         stats["runtime"]["user_conversation_mappings"] = len(self.user_conversation_mapping)
         stats["runtime"]["channel_activity_tracked"] = len(self.channel_activity)
         stats["runtime"]["conversation_topics_tracked"] = len(self.conversation_topics)
-        stats["runtime"]["user_relationships_pairs"] = sum(len(v) for v in self.user_relationships.values())
+        stats["runtime"]["user_relationships_pairs"] = len(self.user_relationships)
+        stats["runtime"]["state_evictions"] = {
+            "user_relationships": self.user_relationships.evictions,
+            "user_conversation_mapping": self.user_conversation_mapping.evictions,
+            "active_conversations": self.active_conversations.evictions,
+            "conversation_sentiment": self.conversation_sentiment.evictions,
+            "gurt_message_reactions": self.gurt_message_reactions.evictions,
+        }
         stats["runtime"]["conversation_summaries_cached"] = len(self.conversation_summaries)
         stats["runtime"]["channel_topics_cached"] = len(self.channel_topics_cache)
+        stats["runtime"]["tool_results_cached"] = len(self.tool_result_cache)
         stats["runtime"]["message_cache_global_count"] = len(self.message_cache['global_recent'])
         stats["runtime"]["message_cache_mentioned_count"] = len(self.message_cache['mentioned'])
         stats["runtime"]["active_conversations_count"] = len(self.active_conversations)
@@ -317,6 +443,7 @@ class GurtCog(commands.Cog, name="Gurt"): # Added explicit Cog name
             # ChromaDB Stats (Placeholder - ChromaDB client API might offer this)
             stats["memory"]["chromadb_message_collection_count"] = await asyncio.to_thread(self.memory_manager.semantic_collection.count) if self.memory_manager.semantic_collection else "N/A"
             stats["memory"]["chromadb_fact_collection_count"] = await asyncio.to_thread(self.memory_manager.fact_collection.count) if self.memory_manager.fact_collection else "N/A"
+            stats["memory"]["last_compaction"] = self.last_compaction_report
 
         except Exception as e:
             stats["memory"]["error"] = f"Failed to retrieve memory stats: {e}"
@@ -324,7 +451,17 @@ class GurtCog(commands.Cog, name="Gurt"): # Added explicit Cog name
         # --- API & Tool Stats ---
         # Convert defaultdicts to regular dicts for JSON serialization
         stats["api_stats"] = dict(self.api_stats)
+        llm_queue = dict(self.llm_queue_stats)
+        llm_queue["max_concurrency"] = LLM_MAX_CONCURRENCY
+        llm_queue["average_wait_ms"] = round((llm_queue["total_wait"] / llm_queue["acquired"]) * 1000, 1) if llm_queue["acquired"] > 0 else 0
+        stats["runtime"]["llm_queue"] = llm_queue
+        stats["runtime"]["response_coalescer"] = self.response_coalescer.get_stats()
         stats["tool_stats"] = dict(self.tool_stats)
+        stats["prompt_provider_stats"] = dict(self.prompt_provider_stats)
+        stats["prompt_section_stats"] = {name: dict(data) for name, data in self.prompt_section_stats.items()}
+        stats["runtime"]["static_prompt_hash"] = self.static_prompt_cache["hash"] if self.static_prompt_cache else None
+        stats["runtime"]["static_prompt_tokens"] = self.static_prompt_cache["tokens"] if self.static_prompt_cache else None
+        stats["response_latency_stats"] = {mode: dict(data) for mode, data in self.response_latency_stats.items()}
 
         # Calculate average times where count > 0
         for model, data in stats["api_stats"].items():
@@ -337,6 +474,15 @@ class GurtCog(commands.Cog, name="Gurt"): # Added explicit Cog name
                 data["average_time_ms"] = round((data["total_time"] / data["count"]) * 1000, 2)
             else:
                 data["average_time_ms"] = 0
+            cache_lookups = data.get("cache_hits", 0) + data.get("cache_misses", 0)
+            data["cache_hit_rate"] = round(data.get("cache_hits", 0) / cache_lookups, 3) if cache_lookups > 0 else 0
+        for mode, data in stats["response_latency_stats"].items():
+            data["average_time_ms"] = round((data["total_time"] / data["count"]) * 1000, 2) if data["count"] > 0 else 0
+        for provider, data in stats["prompt_provider_stats"].items():
+            if data["count"] > 0:
+                data["average_time_ms"] = round((data["total_time"] / data["count"]) * 1000, 2)
+            else:
+                data["average_time_ms"] = 0
 
         return stats
 
@@ -36,6 +36,11 @@ def format_stats_embeds(stats: Dict[str, Any]) -> List[discord.Embed]:
     runtime = stats.get("runtime", {})
     main_embed.add_field(name="Current Mood", value=f"{runtime.get('current_mood', 'N/A')} (Changed {ts_format.format(ts=int(runtime.get('last_mood_change_timestamp', 0)))})", inline=False)
     main_embed.add_field(name="Background Task", value="Running" if runtime.get('background_task_running') else "Stopped", inline=True)
+    background_jobs = runtime.get('background_jobs', {})
+    if background_jobs:
+        job_failures = sum(job.get('failures', 0) for job in background_jobs.values())
+        job_overruns = sum(job.get('overruns', 0) for job in background_jobs.values())
+        main_embed.add_field(name="Background Jobs", value=f"{len(background_jobs)} jobs, {job_failures} failures, {job_overruns} overruns", inline=True)
     main_embed.add_field(name="Needs JSON Reminder", value=str(runtime.get('needs_json_reminder', 'N/A')), inline=True)
     main_embed.add_field(name="Last Evolution", value=ts_format.format(ts=int(runtime.get('last_evolution_update_timestamp', 0))), inline=True)
     main_embed.add_field(name="Active Topics Channels", value=str(runtime.get('active_topics_channels', 'N/A')), inline=True)
@@ -98,6 +103,8 @@ def format_stats_embeds(stats: Dict[str, Any]) -> List[discord.Embed]:
                      f"❌ Failure: {data.get('failure', 0)}\n"
                      f"⏱️ Avg Time: {avg_time} ms\n"
                      f"📊 Count: {data.get('count', 0)}")
+            if data.get('cache_hits', 0) or data.get('cache_misses', 0):
+                value += f"\n🗄️ Cache Hits: {data.get('cache_hits', 0)} ({data.get('cache_hit_rate', 0):.0%})"
             tool_embed.add_field(name=f"Tool: `{tool}`", value=value, inline=True)
         embeds.append(tool_embed)
 
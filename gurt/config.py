@@ -30,6 +30,12 @@ SAFETY_CHECK_MODEL = os.getenv("GURT_SAFETY_CHECK_MODEL", "gemini-2.5-flash-prev
 DB_PATH = os.getenv("GURT_DB_PATH", "data/gurt_memory.db")
 CHROMA_PATH = os.getenv("GURT_CHROMA_PATH", "data/chroma_db")
 SEMANTIC_MODEL_NAME = os.getenv("GURT_SEMANTIC_MODEL", 'all-MiniLM-L6-v2')
+EMBEDDING_SERVICE_ENABLED = os.getenv("GURT_EMBEDDING_SERVICE", "false").lower() == "true" # Encode embeddings in a separate worker process (shared by every bot in this process) instead of on the bot's own threads
+SEMANTIC_COMPACTION_INTERVAL = int(os.getenv("GURT_SEMANTIC_COMPACTION_INTERVAL", 86400)) # Daily pruning/dedup of the ChromaDB collections
+MESSAGE_EMBEDDING_RETENTION_DAYS = float(os.getenv("GURT_MESSAGE_EMBEDDING_RETENTION_DAYS", 90)) # Message embeddings older than this are pruned unless important
+IMPORTANT_MESSAGE_RETENTION_DAYS = float(os.getenv("GURT_IMPORTANT_MESSAGE_RETENTION_DAYS", 365)) # Hard age limit, even for important messages
+MESSAGE_EMBEDDING_KEEP_IMPORTANCE = float(os.getenv("GURT_MESSAGE_EMBEDDING_KEEP_IMPORTANCE", 0.6)) # Importance (0-1) needed to outlive the normal retention
+FACT_DEDUP_SIMILARITY = float(os.getenv("GURT_FACT_DEDUP_SIMILARITY", 0.92)) # Cosine similarity at which two facts count as duplicates
 
 # --- Memory Manager Config ---
 MAX_USER_FACTS = 20 # TODO: Load from env?
@@ -70,14 +76,29 @@ STATS_PUSH_INTERVAL = 30 # Push every 30 seconds
 CHANNEL_TOPIC_CACHE_TTL = 600 # seconds (10 minutes)
 CONTEXT_WINDOW_SIZE = 150  # Number of messages to include in context
 CONTEXT_EXPIRY_TIME = 3600  # Time in seconds before context is considered stale (1 hour)
-MAX_CONTEXT_TOKENS = 8000  # Maximum number of tokens to include in context (Note: Not actively enforced yet)
+MAX_CONTEXT_TOKENS = 8000  # Approximate token budget for conversation history; oldest messages are dropped first
+RENDERED_MESSAGE_CACHE_SIZE = 5000 # Max memoized renderings of cached messages kept for context building
+MESSAGE_INDEX_ENABLED = os.getenv("GURT_MESSAGE_INDEX_ENABLED", "true").lower() == "true" # Keep a local full-text index of observed messages for the search tools
+MESSAGE_INDEX_RETENTION_DAYS = float(os.getenv("GURT_MESSAGE_INDEX_RETENTION_DAYS", 30)) # Indexed messages older than this are pruned
+MESSAGE_INDEX_MAX_ROWS = int(os.getenv("GURT_MESSAGE_INDEX_MAX_ROWS", 200000)) # Beyond this the oldest indexed messages are pruned
+MESSAGE_INDEX_PRUNE_INTERVAL = int(os.getenv("GURT_MESSAGE_INDEX_PRUNE_INTERVAL", 21600)) # Every 6 hours
 SUMMARY_CACHE_TTL = 900 # seconds (15 minutes) for conversation summary cache
+PROMPT_PROVIDER_TIMEOUT = float(os.getenv("GURT_PROMPT_PROVIDER_TIMEOUT", 5.0)) # Max seconds a single system prompt context provider may take before it's skipped
+PROMPT_DYNAMIC_TOKEN_BUDGET = int(os.getenv("GURT_PROMPT_DYNAMIC_TOKEN_BUDGET", 1500)) # Approximate token budget for the per-request part of the system prompt; lowest priority sections are dropped first
 
 # --- API Call Settings ---
 API_TIMEOUT = 60 # seconds
 SUMMARY_API_TIMEOUT = 45 # seconds
 API_RETRY_ATTEMPTS = 1
 API_RETRY_DELAY = 1 # seconds
+LLM_MAX_CONCURRENCY = int(os.getenv("GURT_LLM_MAX_CONCURRENCY", 4)) # Max concurrent model API calls (all callers share this)
+RESPONSE_COALESCE_DEBOUNCE = float(os.getenv("GURT_RESPONSE_COALESCE_DEBOUNCE", 2.0)) # Quiet period before a coalesced follow-up response is generated
+RESPONSE_COALESCE_MAX_DELAY = float(os.getenv("GURT_RESPONSE_COALESCE_MAX_DELAY", 8.0)) # Max wait for the quiet period before generating the follow-up anyway
+
+# --- Response Streaming Config ---
+STREAM_RESPONSES = os.getenv("GURT_STREAM_RESPONSES", "true").lower() == "true" # Stream the final response and deliver it progressively
+STREAM_FIRST_CHUNK_CHARS = int(os.getenv("GURT_STREAM_FIRST_CHUNK_CHARS", 120)) # Send early once this much content arrived, even without a full sentence
+STREAM_EDIT_INTERVAL = float(os.getenv("GURT_STREAM_EDIT_INTERVAL", 1.0)) # Min seconds between edits of a streamed message (Discord rate limits edits)
 
 # --- Proactive Engagement Config ---
 PROACTIVE_LULL_THRESHOLD = int(os.getenv("PROACTIVE_LULL_THRESHOLD", 180)) # 3 mins
@@ -128,6 +149,16 @@ MAX_ACTIVE_TOPICS = 5
 SENTIMENT_UPDATE_INTERVAL = 300 # Update sentiment every 5 minutes
 SENTIMENT_DECAY_RATE = 0.1
 
+# --- Runtime State Limits & Snapshots ---
+# Relationship/sentiment/conversation tracking is bounded with LRU eviction and snapshotted to the memory DB
+RELATIONSHIP_MAX_PAIRS = int(os.getenv("GURT_RELATIONSHIP_MAX_PAIRS", 200000)) # Relationship pairs kept in memory (all pairs stay in the DB)
+STATE_MAX_CHANNELS = int(os.getenv("GURT_STATE_MAX_CHANNELS", 5000)) # Channels tracked for sentiment and active conversations
+STATE_MAX_USERS = int(os.getenv("GURT_STATE_MAX_USERS", 50000)) # Users tracked in user_conversation_mapping
+USER_CHANNELS_TRACKED = 10 # Most recent channels remembered per user in user_conversation_mapping
+SENTIMENT_MAX_USERS_PER_CHANNEL = 200 # Per-channel user sentiments kept
+REACTION_TRACKING_MAX = 5000 # Gurt messages whose reactions are tracked between interest updates
+STATE_SNAPSHOT_INTERVAL = int(os.getenv("GURT_STATE_SNAPSHOT_INTERVAL", 300)) # Seconds between runtime state snapshots
+
 # --- Emotion Detection ---
 EMOTION_KEYWORDS = {
     "joy": ["happy", "glad", "excited", "yay", "awesome", "love", "great", "amazing", "lol", "lmao", "haha"],
@@ -150,6 +181,12 @@ DOCKER_COMMAND_TIMEOUT = int(os.getenv("DOCKER_COMMAND_TIMEOUT", 10))
 DOCKER_CPU_LIMIT = os.getenv("DOCKER_CPU_LIMIT", "0.5")
 DOCKER_MEM_LIMIT = os.getenv("DOCKER_MEM_LIMIT", "64m")
 
+# --- Tool Execution Config ---
+TOOL_MAX_PARALLELISM = int(os.getenv("GURT_TOOL_MAX_PARALLELISM", 4)) # Max read-only tool calls from one model turn run at once
+TOOL_DEFAULT_TIMEOUT = float(os.getenv("GURT_TOOL_DEFAULT_TIMEOUT", 30)) # Seconds, for read-only tools without their own timeout in TOOL_METADATA (side-effecting ones default to none)
+TOOL_CACHE_ENABLED = os.getenv("GURT_TOOL_CACHE_ENABLED", "true").lower() == "true" # Memoize results of tools with a cache policy
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("GURT_TOOL_CACHE_MAX_ENTRIES", 500)) # Oldest entries are evicted past this
+
 # --- Response Schema ---
 RESPONSE_SCHEMA = {
     "name": "gurt_response",
@@ -3,10 +3,11 @@ import discord
 import time
 import datetime
 import re
+from itertools import islice
 from typing import TYPE_CHECKING, Optional, List, Dict, Any
 
 # Relative imports
-from .config import CONTEXT_WINDOW_SIZE # Import necessary config
+from .config import CONTEXT_WINDOW_SIZE, MAX_CONTEXT_TOKENS, RENDERED_MESSAGE_CACHE_SIZE # Import necessary config
 
 if TYPE_CHECKING:
     from .cog import GurtCog # For type hinting
@@ -14,80 +15,118 @@ if TYPE_CHECKING:
 # --- Context Gathering Functions ---
 # Note: These functions need the 'cog' instance passed to access state like caches, etc.
 
-def gather_conversation_context(cog: 'GurtCog', channel_id: int, current_message_id: int) -> List[Dict[str, str]]:
-    """Gathers and formats conversation history from cache for API context."""
-    context_api_messages = []
-    if channel_id in cog.message_cache['by_channel']:
-        cached = list(cog.message_cache['by_channel'][channel_id])
-        # The current message is now included when selecting the context window below
-        context_messages_data = cached[-CONTEXT_WINDOW_SIZE:] # Use config value
-
-        for msg_data in context_messages_data:
-            role = "assistant" if msg_data['author']['id'] == str(cog.bot.user.id) else "user"
-
-            # Build the content string, including reply and attachment info
-            content_parts = []
-            # FIX: Use the pre-formatted author_string which includes '(BOT)' tag if applicable.
-            # Fall back to display_name or '' if author_string is missing for some reason.
-            author_name = msg_data.get('author_string', msg_data.get('author', {}).get('display_name', ''))
-
-            message_id = msg_data['id'] # Get the message ID
-
-            # Add reply prefix if applicable
-            if msg_data.get("is_reply"):
-                reply_author = msg_data.get('replied_to_author_name', '')
-                reply_snippet = msg_data.get('replied_to_content_snippet') # Get value, could be None
-                # Keep snippet very short for context, handle None case
-                reply_snippet_short = '...' # Default if snippet is None or not a string
-                if isinstance(reply_snippet, str):
-                    reply_snippet_short = (reply_snippet[:25] + '...') if len(reply_snippet) > 28 else reply_snippet
-                content_parts.append(f"{author_name} (Message ID: {message_id}) (replying to {reply_author} '{reply_snippet_short}'):") # Clarify ID
-            else:
-                content_parts.append(f"{author_name} (Message ID: {message_id}):") # Clarify ID
-
-            # Add main message content
-            if msg_data.get('content'):
-                content_parts.append(msg_data['content'])
-
-            # Add attachment descriptions
-            attachments = msg_data.get("attachment_descriptions", [])
-            if attachments:
-                # Join descriptions into a single string
-                attachment_str = " ".join([att['description'] for att in attachments])
-                content_parts.append(attachment_str)
-
-            # Join all parts with spaces
-            # --- New Handling for Tool Request/Response Turns ---
-            author_id = msg_data['author'].get('id')
-            is_tool_request = author_id == str(cog.bot.user.id) and msg_data.get('tool_calls') is not None
-            is_tool_response = author_id == "FUNCTION" and msg_data.get('function_results') is not None
-
-            if is_tool_request:
-                # Format tool request turn
-                tool_names = ", ".join([tc['name'] for tc in msg_data['tool_calls']])
-                content = f"[System Note: Gurt requested tool(s): {tool_names}]" # Simple summary
-                role = "assistant" # Represent as part of the assistant's turn/thought process
-            elif is_tool_response:
-                # Format tool response turn
-                result_summary_parts = []
-                for res in msg_data['function_results']:
-                    res_str = json.dumps(res.get("response", {}))
-                    truncated_res = (res_str[:150] + '...') if len(res_str) > 153 else res_str
-                    result_summary_parts.append(f"Tool: {res.get('name', 'N/A')}, Result: {truncated_res}")
-                result_summary = "; ".join(result_summary_parts)
-                content = f"[System Note: Tool Execution Result: {result_summary}]"
-                role = "function" # Keep role as 'function' for API compatibility if needed, or maybe 'system'? Let's try 'function'.
-            else:
-                # --- Original Handling for User/Assistant messages ---
-                content = " ".join(content_parts).strip()
-                # Role is already determined above
-
-            # Append if content is not empty
-            if content:
-                context_api_messages.append({"role": role, "content": content})
-            # --- End Modified Handling ---
-
-    return context_api_messages
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token), good enough for budgeting context."""
+    return len(text) // 4 + 1
+
+def _render_message_content(cog: 'GurtCog', msg_data: Dict[str, Any]) -> Optional[Dict[str, str]]:
+    """Renders a cached message dict into its API context entry ({"role", "content"}), or None if it has no content."""
+    role = "assistant" if msg_data['author']['id'] == str(cog.bot.user.id) else "user"
+
+    # --- Handling for Tool Request/Response Turns ---
+    author_id = msg_data['author'].get('id')
+    is_tool_request = author_id == str(cog.bot.user.id) and msg_data.get('tool_calls') is not None
+    is_tool_response = author_id == "FUNCTION" and msg_data.get('function_results') is not None
+
+    if is_tool_request:
+        # Format tool request turn
+        tool_names = ", ".join([tc['name'] for tc in msg_data['tool_calls']])
+        content = f"[System Note: Gurt requested tool(s): {tool_names}]" # Simple summary
+        role = "assistant" # Represent as part of the assistant's turn/thought process
+    elif is_tool_response:
+        # Format tool response turn
+        result_summary_parts = []
+        for res in msg_data['function_results']:
+            res_str = json.dumps(res.get("response", {}))
+            truncated_res = (res_str[:150] + '...') if len(res_str) > 153 else res_str
+            result_summary_parts.append(f"Tool: {res.get('name', 'N/A')}, Result: {truncated_res}")
+        result_summary = "; ".join(result_summary_parts)
+        content = f"[System Note: Tool Execution Result: {result_summary}]"
+        role = "function" # Keep role as 'function' for API compatibility if needed, or maybe 'system'? Let's try 'function'.
+    else:
+        # --- Handling for User/Assistant messages ---
+        # Build the content string, including reply and attachment info
+        content_parts = []
+        # FIX: Use the pre-formatted author_string which includes '(BOT)' tag if applicable.
+        # Fall back to display_name or '' if author_string is missing for some reason.
+        author_name = msg_data.get('author_string', msg_data.get('author', {}).get('display_name', ''))
+
+        message_id = msg_data['id'] # Get the message ID
+
+        # Add reply prefix if applicable
+        if msg_data.get("is_reply"):
+            reply_author = msg_data.get('replied_to_author_name', '')
+            reply_snippet = msg_data.get('replied_to_content_snippet') # Get value, could be None
+            # Keep snippet very short for context, handle None case
+            reply_snippet_short = '...' # Default if snippet is None or not a string
+            if isinstance(reply_snippet, str):
+                reply_snippet_short = (reply_snippet[:25] + '...') if len(reply_snippet) > 28 else reply_snippet
+            content_parts.append(f"{author_name} (Message ID: {message_id}) (replying to {reply_author} '{reply_snippet_short}'):") # Clarify ID
+        else:
+            content_parts.append(f"{author_name} (Message ID: {message_id}):") # Clarify ID
+
+        # Add main message content
+        if msg_data.get('content'):
+            content_parts.append(msg_data['content'])
+
+        # Add attachment descriptions
+        attachments = msg_data.get("attachment_descriptions", [])
+        if attachments:
+            # Join descriptions into a single string
+            attachment_str = " ".join([att['description'] for att in attachments])
+            content_parts.append(attachment_str)
+
+        # Join all parts with spaces
+        content = " ".join(content_parts).strip()
+
+    if not content:
+        return None
+    return {"role": role, "content": content}
+
+def render_cached_message(cog: 'GurtCog', msg_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Returns the memoized API context entry for a cached message, rendering it on first use.
+    The entry has "role", "content" and an approximate "tokens" count. Entries are shared
+    between calls, so callers must not modify them.
+    """
+    cache = cog.rendered_message_cache
+    message_id = msg_data['id']
+    if message_id in cache:
+        return cache[message_id]["entry"]
+
+    entry = _render_message_content(cog, msg_data)
+    if entry:
+        entry["tokens"] = estimate_tokens(entry["content"])
+    cache[message_id] = {"entry": entry}
+    if len(cache) > RENDERED_MESSAGE_CACHE_SIZE:
+        # Oldest renderings belong to messages that have long left the context windows
+        for stale_id in list(islice(cache, len(cache) - RENDERED_MESSAGE_CACHE_SIZE)):
+            del cache[stale_id]
+    return entry
+
+def gather_conversation_context(cog: 'GurtCog', channel_id: int, current_message_id: int, max_tokens: Optional[int] = MAX_CONTEXT_TOKENS) -> List[Dict[str, Any]]:
+    """
+    Gathers conversation history from cache for API context.
+    Takes the newest messages (up to CONTEXT_WINDOW_SIZE) that fit within max_tokens, oldest first.
+    Pass max_tokens=None to only limit by message count.
+    """
+    channel_messages = cog.message_cache['by_channel'].get(channel_id)
+    if not channel_messages:
+        return []
+
+    # Walk back from the newest message (the current message is included) until the window or budget is full
+    selected = []
+    total_tokens = 0
+    for msg_data in islice(reversed(channel_messages), CONTEXT_WINDOW_SIZE):
+        entry = render_cached_message(cog, msg_data)
+        if not entry:
+            continue
+        if max_tokens is not None and selected and total_tokens + entry["tokens"] > max_tokens:
+            break
+        selected.append(entry)
+        total_tokens += entry["tokens"]
+    selected.reverse()
+    return selected
 
 
 async def get_memory_context(cog: 'GurtCog', message: discord.Message) -> Optional[str]:
@@ -99,7 +138,10 @@ async def get_memory_context(cog: 'GurtCog', message: discord.Message) -> Option
 
     # 1. Retrieve Relevant User Facts
     try:
-        user_facts = await cog.memory_manager.get_user_facts(user_id, context=current_message_content)
+        if current_message_content:
+            user_facts = [entry["fact"] for entry in await cog.memory_manager.retrieve(current_message_content, scope=user_id, k=5)]
+        else:
+            user_facts = await cog.memory_manager.get_user_facts(user_id)
         if user_facts:
             facts_str = "; ".join(user_facts)
             memory_parts.append(f"Relevant facts about {message.author.display_name}: {facts_str}")
@@ -107,7 +149,10 @@ async def get_memory_context(cog: 'GurtCog', message: discord.Message) -> Option
 
     # 1b. Retrieve Relevant General Facts
     try:
-        general_facts = await cog.memory_manager.get_general_facts(context=current_message_content, limit=5)
+        if current_message_content:
+            general_facts = [entry["fact"] for entry in await cog.memory_manager.retrieve(current_message_content, scope="general", k=5)]
+        else:
+            general_facts = await cog.memory_manager.get_general_facts(limit=5)
         if general_facts:
             facts_str = "; ".join(general_facts)
             memory_parts.append(f"Relevant general knowledge: {facts_str}")
@@ -180,24 +225,21 @@ async def get_memory_context(cog: 'GurtCog', message: discord.Message) -> Option
 
     # 7. Add sentiment analysis of user's recent messages
     try:
-        channel_sentiment = cog.conversation_sentiment[channel_id]
-        user_sentiment = channel_sentiment["user_sentiments"].get(user_id)
+        channel_sentiment = cog.conversation_sentiment.get(channel_id)
+        user_sentiment = channel_sentiment.user_sentiments.get(message.author.id) if channel_sentiment else None
         if user_sentiment:
-            sentiment_desc = f"{user_sentiment['sentiment']} tone"
-            if user_sentiment["intensity"] > 0.7: sentiment_desc += " (strongly so)"
-            elif user_sentiment["intensity"] < 0.4: sentiment_desc += " (mildly so)"
+            sentiment_desc = f"{user_sentiment.sentiment} tone"
+            if user_sentiment.intensity > 0.7: sentiment_desc += " (strongly so)"
+            elif user_sentiment.intensity < 0.4: sentiment_desc += " (mildly so)"
             memory_parts.append(f"Recent message sentiment: {sentiment_desc}")
-            if user_sentiment.get("emotions"):
-                emotions_str = ", ".join(user_sentiment["emotions"])
+            if user_sentiment.emotions:
+                emotions_str = ", ".join(user_sentiment.emotions)
                 memory_parts.append(f"Detected emotions from user: {emotions_str}")
     except Exception as e: print(f"Error retrieving user sentiment/emotions for memory context: {e}")
 
     # 8. Add Relationship Score with User
     try:
-        user_id_str = str(user_id)
-        bot_id_str = str(cog.bot.user.id)
-        key_1, key_2 = (user_id_str, bot_id_str) if user_id_str < bot_id_str else (bot_id_str, user_id_str)
-        relationship_score = cog.user_relationships.get(key_1, {}).get(key_2, 0.0)
+        relationship_score = cog.user_relationships.get_score(user_id, cog.bot.user.id)
         memory_parts.append(f"Relationship score with {message.author.display_name}: {relationship_score:.1f}/100")
     except Exception as e: print(f"Error retrieving relationship score for memory context: {e}")
 
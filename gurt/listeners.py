@@ -9,7 +9,7 @@ from typing import TYPE_CHECKING, Union, Dict, Any, Optional
 
 # Relative imports
 from .utils import format_message # Import format_message
-from .config import CONTEXT_WINDOW_SIZE # Import context window size
+from .config import CONTEXT_WINDOW_SIZE, STREAM_RESPONSES, MESSAGE_INDEX_ENABLED, USER_CHANNELS_TRACKED # Import context window size and feature toggles
 # Assuming api, utils, analysis functions are defined and imported correctly later
 # We might need to adjust these imports based on final structure
 # from .api import get_ai_response, get_proactive_ai_response
@@ -45,12 +45,20 @@ async def on_ready_listener(cog: 'GurtCog'):
     # --- Message history pre-loading removed ---
 
 
+def index_observed_message(cog: 'GurtCog', message: discord.Message, formatted_message: Dict[str, Any]):
+    """Queues a message for the local full-text index and extends the channel's indexed range."""
+    cog.message_index_coverage.setdefault(message.channel.id, message.created_at.timestamp())
+    asyncio.create_task(
+        cog.memory_manager.index_message(
+            formatted_message, channel_id=str(message.channel.id), guild_id=str(message.guild.id) if message.guild else None
+        )
+    )
+
 async def on_message_listener(cog: 'GurtCog', message: discord.Message):
     """Listener function for on_message."""
     # Import necessary functions dynamically or ensure they are passed/accessible via cog
-    from .api import get_ai_response, get_proactive_ai_response
-    from .utils import format_message, simulate_human_typing
-    from .analysis import analyze_message_sentiment, update_conversation_sentiment, identify_conversation_topics
+    from .utils import format_message
+    from .analysis import analyze_message_sentiment, update_conversation_sentiment
     from .config import GURT_RESPONSES # Import simple responses
 
     # Don't respond to our own messages
@@ -87,12 +95,13 @@ async def on_message_listener(cog: 'GurtCog', message: discord.Message):
             cog.thread_history[thread_id].append(formatted_message)
 
         cog.channel_activity[channel_id] = time.time()
-        cog.user_conversation_mapping[user_id].add(channel_id)
+        # Tuple of the user's most recent channels; reassigning also marks the user as recently active
+        user_channels = tuple(c for c in cog.user_conversation_mapping.get(user_id, ()) if c != channel_id)
+        cog.user_conversation_mapping[user_id] = (user_channels + (channel_id,))[-USER_CHANNELS_TRACKED:]
 
-        if channel_id not in cog.active_conversations:
-            cog.active_conversations[channel_id] = {'participants': set(), 'start_time': time.time(), 'last_activity': time.time(), 'topic': None}
-        cog.active_conversations[channel_id]['participants'].add(user_id)
-        cog.active_conversations[channel_id]['last_activity'] = time.time()
+        active_conversation = cog.active_conversations[channel_id] # Created on first message
+        active_conversation.participants.add(user_id)
+        active_conversation.last_activity = time.time()
 
         # --- Update Relationship Strengths ---
         if user_id != cog.bot.user.id:
@@ -101,7 +110,7 @@ async def on_message_listener(cog: 'GurtCog', message: discord.Message):
             if message_sentiment_data["sentiment"] == "positive": sentiment_score = message_sentiment_data["intensity"] * 0.5
             elif message_sentiment_data["sentiment"] == "negative": sentiment_score = -message_sentiment_data["intensity"] * 0.3
 
-            cog._update_relationship(str(user_id), str(cog.bot.user.id), 1.0 + sentiment_score) # Access cog method
+            cog._update_relationship(user_id, cog.bot.user.id, 1.0 + sentiment_score) # Access cog method
 
             if formatted_message.get("is_reply") and formatted_message.get("replied_to_author_id"):
                 replied_to_id = formatted_message["replied_to_author_id"]
@@ -116,7 +125,11 @@ async def on_message_listener(cog: 'GurtCog', message: discord.Message):
         # Analyze message sentiment and update conversation sentiment tracking
         if message.content:
             message_sentiment = analyze_message_sentiment(cog, message.content) # Use analysis function
-            update_conversation_sentiment(cog, channel_id, str(user_id), message_sentiment) # Use analysis function
+            update_conversation_sentiment(cog, channel_id, user_id, message_sentiment) # Use analysis function
+
+        # --- Add message to the local full-text index ---
+        if MESSAGE_INDEX_ENABLED:
+            index_observed_message(cog, message, formatted_message)
 
         # --- Add message to semantic memory ---
         if message.content and cog.memory_manager.semantic_collection:
@@ -124,7 +137,9 @@ async def on_message_listener(cog: 'GurtCog', message: discord.Message):
                 "user_id": str(user_id), "user_name": message.author.name, "display_name": message.author.display_name,
                 "channel_id": str(channel_id), "channel_name": getattr(message.channel, 'name', 'DM'),
                 "guild_id": str(message.guild.id) if message.guild else None,
-                "timestamp": message.created_at.timestamp()
+                "timestamp": message.created_at.timestamp(),
+                # Retention signals for semantic memory compaction
+                "mentions_bot": cog.bot.user.mentioned_in(message), "has_attachments": bool(message.attachments)
             }
             # Pass the entire formatted_message dictionary now
             asyncio.create_task(
@@ -201,8 +216,7 @@ async def on_message_listener(cog: 'GurtCog', message: discord.Message):
             try:
                 user_id_str = str(message.author.id)
                 bot_id_str = str(cog.bot.user.id)
-                key_1, key_2 = (user_id_str, bot_id_str) if user_id_str < bot_id_str else (bot_id_str, user_id_str)
-                relationship_score = cog.user_relationships.get(key_1, {}).get(key_2, 0.0)
+                relationship_score = cog.user_relationships.get_score(user_id_str, bot_id_str)
                 if relationship_score >= PROACTIVE_RELATIONSHIP_SCORE_THRESHOLD and time_since_bot_spoke > 60:
                     if random.random() < PROACTIVE_RELATIONSHIP_CHANCE:
                         should_consider_responding = True
@@ -216,10 +230,10 @@ async def on_message_listener(cog: 'GurtCog', message: discord.Message):
 
         # 4. Sentiment Shift Trigger
         if not proactive_trigger_met:
-            channel_sentiment_data = cog.conversation_sentiment.get(channel_id, {})
-            overall_sentiment = channel_sentiment_data.get("overall", "neutral")
-            sentiment_intensity = channel_sentiment_data.get("intensity", 0.5)
-            sentiment_last_update = channel_sentiment_data.get("last_update", 0) # Need last update time
+            channel_sentiment_data = cog.conversation_sentiment.get(channel_id)
+            overall_sentiment = channel_sentiment_data.overall if channel_sentiment_data else "neutral"
+            sentiment_intensity = channel_sentiment_data.intensity if channel_sentiment_data else 0.5
+            sentiment_last_update = channel_sentiment_data.last_update if channel_sentiment_data else 0 # Need last update time
             sentiment_duration = now - sentiment_last_update # How long has this sentiment been dominant?
 
             if overall_sentiment != "neutral" and \
@@ -307,9 +321,9 @@ async def on_message_listener(cog: 'GurtCog', message: discord.Message):
                 message_words = set(re.findall(r'\b\w+\b', message.content.lower()))
                 if topic_keywords.intersection(message_words): topic_bonus += 0.15
             sentiment_modifier = 0
-            channel_sentiment_data = cog.conversation_sentiment.get(channel_id, {})
-            overall_sentiment = channel_sentiment_data.get("overall", "neutral")
-            sentiment_intensity = channel_sentiment_data.get("intensity", 0.5)
+            channel_sentiment_data = cog.conversation_sentiment.get(channel_id)
+            overall_sentiment = channel_sentiment_data.overall if channel_sentiment_data else "neutral"
+            sentiment_intensity = channel_sentiment_data.intensity if channel_sentiment_data else 0.5
             if overall_sentiment == "negative" and sentiment_intensity > 0.6: sentiment_modifier = -0.1
 
             final_chance = min(max(base_chance + activity_bonus + topic_bonus + sentiment_modifier, 0.05), 0.8)
@@ -325,7 +339,34 @@ async def on_message_listener(cog: 'GurtCog', message: discord.Message):
         return
 
     # --- Call AI and Handle Response ---
+    # Coalesced per channel: triggers arriving while a response is being generated are merged into one follow-up
+    trigger = {
+        "message": message, "proactive": proactive_trigger_met, "reason": consideration_reason,
+        "direct": bool(bot_mentioned or replied_to_bot),
+    }
+    await cog.response_coalescer.submit(
+        channel_id, trigger,
+        lambda t: respond_to_message(cog, t["message"], t["proactive"], t["reason"], t["direct"])
+    )
+
+
+def merge_response_triggers(pending: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Picks which of two coalesced triggers to respond to: the newest, unless only the older one addressed Gurt directly."""
+    if new["direct"] or not pending["direct"]:
+        return new
+    return pending
+
+
+async def respond_to_message(cog: 'GurtCog', message: discord.Message, proactive_trigger_met: bool, consideration_reason: str, direct: bool):
+    """Generates a response to message (proactive or regular) and sends it."""
+    from .api import get_ai_response, get_proactive_ai_response
+    from .utils import format_message, simulate_human_typing, resolve_ping_placeholders, StreamingMessageSender
+    from .analysis import identify_conversation_topics
+
+    channel_id = message.channel.id
     cog.current_channel = message.channel # Ensure current channel is set for API calls/tools
+    ai_call_start_time = time.monotonic() # For time-to-first-message stats
+    stream_sender = None
 
     try:
         response_bundle = None
@@ -334,7 +375,9 @@ async def on_message_listener(cog: 'GurtCog', message: discord.Message):
             response_bundle = await get_proactive_ai_response(cog, message, consideration_reason)
         else:
             print(f"Calling get_ai_response for message {message.id}")
-            response_bundle = await get_ai_response(cog, message)
+            # Stream the final response so the first sentence can be sent while the rest is generated
+            stream_sender = StreamingMessageSender(cog, message) if STREAM_RESPONSES else None
+            response_bundle = await get_ai_response(cog, message, stream_handler=stream_sender.update if stream_sender else None)
 
         # --- Handle AI Response Bundle ---
         initial_response = response_bundle.get("initial_response")
@@ -344,6 +387,8 @@ async def on_message_listener(cog: 'GurtCog', message: discord.Message):
 
         if error_msg:
             print(f"Critical Error from AI response function: {error_msg}")
+            if stream_sender:
+                await stream_sender.abort() # Don't leave a partial streamed message behind
             # NEW LOGIC: Always send a notification if an error occurred here
             error_notification = f"Oops! Something went wrong while processing that. (`{error_msg[:100]}`)" # Include part of the error
             try:
@@ -356,6 +401,26 @@ async def on_message_listener(cog: 'GurtCog', message: discord.Message):
         # --- Process and Send Responses ---
         sent_any_message = False
         reacted = False
+        first_message_sent_at = None
+
+        def record_sent_message(sent_msg: discord.Message, response_label: str):
+            """Caches a sent bot response and tracks participation."""
+            nonlocal sent_any_message, first_message_sent_at
+            sent_any_message = True
+            if first_message_sent_at is None:
+                first_message_sent_at = time.monotonic()
+            bot_response_cache_entry = format_message(cog, sent_msg) # Pass cog
+            cog.message_cache['by_channel'][channel_id].append(bot_response_cache_entry)
+            cog.message_cache['global_recent'].append(bot_response_cache_entry)
+            cog.bot_last_spoke[channel_id] = time.time()
+            if MESSAGE_INDEX_ENABLED:
+                index_observed_message(cog, sent_msg, bot_response_cache_entry)
+            # Track participation topic
+            identified_topics = identify_conversation_topics(cog, [bot_response_cache_entry]) # Pass cog
+            if identified_topics:
+                topic = identified_topics[0]['topic'].lower().strip()
+                cog.gurt_participation_topics[topic] += 1
+                print(f"Tracked Gurt participation ({response_label}) in topic: '{topic}'")
 
         # Helper function to handle sending a single response text and caching
         async def send_response_content(
@@ -363,7 +428,7 @@ async def on_message_listener(cog: 'GurtCog', message: discord.Message):
             response_label: str,
             original_message: discord.Message # Add original message for context
         ) -> bool:
-            nonlocal sent_any_message # Allow modification of the outer scope variable
+            nonlocal sent_any_message, first_message_sent_at # Allow modification of the outer scope variables
             if not response_data or not isinstance(response_data, dict) or \
                not response_data.get("should_respond") or not response_data.get("content"):
                 return False # Nothing to send
@@ -374,6 +439,15 @@ async def on_message_listener(cog: 'GurtCog', message: discord.Message):
 
             print(f"Preparing to send {response_label} content...")
 
+            # --- Finish Streamed Message ---
+            if response_label == "final" and stream_sender and stream_sender.sent_message:
+                streamed_msg = await stream_sender.finalize(response_text)
+                if streamed_msg:
+                    record_sent_message(streamed_msg, response_label)
+                    print(f"Finalized streamed {response_label} content.")
+                    return True
+                print(f"Streamed {response_label} content could not be finalized, sending normally.")
+
             # --- Handle Reply ---
             if reply_to_id and isinstance(reply_to_id, str) and reply_to_id.isdigit(): # Check if it's a valid ID string
                 try:
@@ -392,24 +466,7 @@ async def on_message_listener(cog: 'GurtCog', message: discord.Message):
 
 
             # --- Handle Pings ---
-            ping_matches = re.findall(r'\[PING:\s*([^\]]+)\s*\]', response_text)
-            if ping_matches:
-                print(f"Found ping placeholders: {ping_matches}")
-                # Import get_user_id tool function dynamically or ensure it's accessible
-                from .tools import get_user_id
-                for user_name_to_ping in ping_matches:
-                    user_id_result = await get_user_id(cog, user_name_to_ping.strip())
-                    if user_id_result and user_id_result.get("status") == "success":
-                        user_id_to_ping = user_id_result.get("user_id")
-                        if user_id_to_ping:
-                            response_text = response_text.replace(f'[PING: {user_name_to_ping}]', f'<@{user_id_to_ping}>', 1)
-                            print(f"Replaced ping placeholder for '{user_name_to_ping}' with <@{user_id_to_ping}>")
-                        else:
-                             print(f"Warning: get_user_id succeeded for '{user_name_to_ping}' but returned no ID.")
-                             response_text = response_text.replace(f'[PING: {user_name_to_ping}]', user_name_to_ping, 1) # Replace with name as fallback
-                    else:
-                        print(f"Warning: Could not find user ID for ping placeholder '{user_name_to_ping}'. Error: {user_id_result.get('error')}")
-                        response_text = response_text.replace(f'[PING: {user_name_to_ping}]', user_name_to_ping, 1) # Replace with name as fallback
+            response_text = await resolve_ping_placeholders(cog, response_text)
 
             # --- Send Message ---
             if len(response_text) > 1900:
@@ -419,6 +476,8 @@ async def on_message_listener(cog: 'GurtCog', message: discord.Message):
                     # Send file with reference if applicable
                     await original_message.channel.send(f"{response_label.capitalize()} response too long:", file=discord.File(filepath), reference=message_reference, mention_author=True) # Also mention when sending as file
                     sent_any_message = True
+                    if first_message_sent_at is None:
+                        first_message_sent_at = time.monotonic()
                     print(f"Sent {response_label} content as file (Reply: {bool(message_reference)}).")
                     return True
                 except Exception as file_e: print(f"Error writing/sending long {response_label} response file: {file_e}")
@@ -431,18 +490,8 @@ async def on_message_listener(cog: 'GurtCog', message: discord.Message):
                         await simulate_human_typing(cog, original_message.channel, response_text) # Use simulation
                     # Send message with reference if applicable
                     sent_msg = await original_message.channel.send(response_text, reference=message_reference, mention_author=True) # mention_author=True to ping the user being replied to
-                    sent_any_message = True
                     # Cache this bot response
-                    bot_response_cache_entry = format_message(cog, sent_msg) # Pass cog
-                    cog.message_cache['by_channel'][channel_id].append(bot_response_cache_entry)
-                    cog.message_cache['global_recent'].append(bot_response_cache_entry)
-                    cog.bot_last_spoke[channel_id] = time.time()
-                    # Track participation topic
-                    identified_topics = identify_conversation_topics(cog, [bot_response_cache_entry]) # Pass cog
-                    if identified_topics:
-                        topic = identified_topics[0]['topic'].lower().strip()
-                        cog.gurt_participation_topics[topic] += 1
-                        print(f"Tracked Gurt participation ({response_label}) in topic: '{topic}'")
+                    record_sent_message(sent_msg, response_label)
                     print(f"Sent {response_label} content (Reply: {bool(message_reference)}).")
                     return True
                 except Exception as send_e:
@@ -459,6 +508,21 @@ async def on_message_listener(cog: 'GurtCog', message: discord.Message):
         if final_response and (not sent_initial_message or initial_content != final_response.get("content")):
              # Pass the original message object 'message' here too
              sent_final_message = await send_response_content(final_response, "final", message)
+        if stream_sender and stream_sender.sent_message and not sent_final_message:
+            await stream_sender.abort() # Final response didn't confirm what was streamed
+
+        # --- Time-To-First-Message Stats ---
+        streamed = bool(stream_sender and stream_sender.sent_message)
+        if streamed:
+            first_message_sent_at = stream_sender.first_sent_at
+        if first_message_sent_at:
+            delivery_mode = "streamed" if streamed else "buffered"
+            latency = first_message_sent_at - ai_call_start_time
+            stats = cog.response_latency_stats[delivery_mode]
+            stats["count"] += 1
+            stats["total_time"] += latency
+            stats["max_time"] = max(stats["max_time"], latency)
+            print(f"Time to first message for {message.id}: {latency:.2f}s ({delivery_mode}).")
 
         # Handle Reaction (prefer final response for reaction if it exists)
         reaction_source = final_response if final_response else initial_response
@@ -494,7 +558,9 @@ async def on_message_listener(cog: 'GurtCog', message: discord.Message):
         print(f"Exception in on_message listener main block: {str(e)}")
         import traceback
         traceback.print_exc()
-        if bot_mentioned or replied_to_bot: # Check again in case error happened before response handling
+        if stream_sender:
+            await stream_sender.abort()
+        if direct: # Check again in case error happened before response handling
             await message.channel.send(random.choice(["...", "*confused gurting*", "brain broke sorry"]))
 
 
@@ -508,29 +574,30 @@ async def on_reaction_add_listener(cog: 'GurtCog', reaction: discord.Reaction, u
     if user.bot or reaction.message.author.id != cog.bot.user.id:
         return
 
-    message_id = str(reaction.message.id)
+    message_id = reaction.message.id
     emoji_str = str(reaction.emoji)
     sentiment = "neutral"
     if emoji_str in EMOJI_SENTIMENT["positive"]: sentiment = "positive"
     elif emoji_str in EMOJI_SENTIMENT["negative"]: sentiment = "negative"
 
-    if sentiment == "positive": cog.gurt_message_reactions[message_id]["positive"] += 1
-    elif sentiment == "negative": cog.gurt_message_reactions[message_id]["negative"] += 1
-    cog.gurt_message_reactions[message_id]["timestamp"] = time.time()
+    reaction_record = cog.gurt_message_reactions[message_id]
+    if sentiment == "positive": reaction_record.positive += 1
+    elif sentiment == "negative": reaction_record.negative += 1
+    reaction_record.timestamp = time.time()
 
-    if not cog.gurt_message_reactions[message_id].get("topic"):
+    if not reaction_record.topic:
         try:
-            gurt_msg_data = next((msg for msg in cog.message_cache['global_recent'] if msg['id'] == message_id), None)
+            gurt_msg_data = next((msg for msg in cog.message_cache['global_recent'] if msg['id'] == str(message_id)), None)
             if gurt_msg_data and gurt_msg_data['content']:
                 identified_topics = identify_conversation_topics(cog, [gurt_msg_data]) # Pass cog
                 if identified_topics:
                     topic = identified_topics[0]['topic'].lower().strip()
-                    cog.gurt_message_reactions[message_id]["topic"] = topic
+                    reaction_record.topic = topic
                     print(f"Reaction added to Gurt msg ({message_id}) on topic '{topic}'. Sentiment: {sentiment}")
                 else: print(f"Reaction added to Gurt msg ({message_id}), topic unknown.")
             else: print(f"Reaction added, but Gurt msg {message_id} not in cache.")
         except Exception as e: print(f"Error determining topic for reaction on msg {message_id}: {e}")
-    else: print(f"Reaction added to Gurt msg ({message_id}) on known topic '{cog.gurt_message_reactions[message_id]['topic']}'. Sentiment: {sentiment}")
+    else: print(f"Reaction added to Gurt msg ({message_id}) on known topic '{reaction_record.topic}'. Sentiment: {sentiment}")
 
 
 @commands.Cog.listener()
@@ -541,13 +608,38 @@ async def on_reaction_remove_listener(cog: 'GurtCog', reaction: discord.Reaction
     if user.bot or reaction.message.author.id != cog.bot.user.id:
         return
 
-    message_id = str(reaction.message.id)
+    message_id = reaction.message.id
     emoji_str = str(reaction.emoji)
     sentiment = "neutral"
     if emoji_str in EMOJI_SENTIMENT["positive"]: sentiment = "positive"
     elif emoji_str in EMOJI_SENTIMENT["negative"]: sentiment = "negative"
 
-    if message_id in cog.gurt_message_reactions:
-        if sentiment == "positive": cog.gurt_message_reactions[message_id]["positive"] = max(0, cog.gurt_message_reactions[message_id]["positive"] - 1)
-        elif sentiment == "negative": cog.gurt_message_reactions[message_id]["negative"] = max(0, cog.gurt_message_reactions[message_id]["negative"] - 1)
+    reaction_record = cog.gurt_message_reactions.get(message_id)
+    if reaction_record:
+        if sentiment == "positive": reaction_record.positive = max(0, reaction_record.positive - 1)
+        elif sentiment == "negative": reaction_record.negative = max(0, reaction_record.negative - 1)
         print(f"Reaction removed from Gurt msg ({message_id}). Sentiment: {sentiment}")
+
+
+async def on_raw_message_edit_listener(cog: 'GurtCog', payload: discord.RawMessageUpdateEvent):
+    """Keeps the local message index in sync with edits."""
+    if not MESSAGE_INDEX_ENABLED:
+        return
+    new_content = payload.data.get("content")
+    if new_content is None: # Embed-only updates (e.g. link previews) don't change the text
+        return
+    await cog.memory_manager.update_indexed_message_content(str(payload.message_id), new_content)
+
+
+async def on_raw_message_delete_listener(cog: 'GurtCog', payload: discord.RawMessageDeleteEvent):
+    """Removes deleted messages from the local message index."""
+    if not MESSAGE_INDEX_ENABLED:
+        return
+    await cog.memory_manager.remove_indexed_message(str(payload.message_id))
+
+
+async def on_raw_bulk_message_delete_listener(cog: 'GurtCog', payload: discord.RawBulkMessageDeleteEvent):
+    """Removes bulk-deleted messages (purges, including Gurt's own purge_messages tool) from the local message index."""
+    if not MESSAGE_INDEX_ENABLED:
+        return
+    await cog.memory_manager.remove_indexed_messages([str(message_id) for message_id in payload.message_ids])
@@ -1,20 +1,26 @@
 import discord
+import asyncio
 import datetime
 import time
 import re
 import json
-from typing import TYPE_CHECKING, Optional, List, Dict, Any
+import hashlib
+import logging
+from typing import TYPE_CHECKING, Optional, List, Dict, Any, Awaitable, Tuple
 
 # Import config and MemoryManager - use relative imports
 from .config import (
     BASELINE_PERSONALITY, MOOD_OPTIONS, CHANNEL_TOPIC_CACHE_TTL,
-    INTEREST_MAX_FOR_PROMPT, INTEREST_MIN_LEVEL_FOR_PROMPT
+    INTEREST_MAX_FOR_PROMPT, INTEREST_MIN_LEVEL_FOR_PROMPT, PROMPT_PROVIDER_TIMEOUT, PROMPT_DYNAMIC_TOKEN_BUDGET
 )
 from .memory import MemoryManager # Import from local memory.py
+from .context import estimate_tokens
 
 if TYPE_CHECKING:
     from .cog import GurtCog # Import GurtCog for type hinting only
 
+logger = logging.getLogger(__name__)
+
 # --- Base System Prompt Parts ---
 
 # Define the MINIMAL static part for fine-tuned models
@@ -164,13 +170,180 @@ OS: Linux 6.13.8-zen1-1-zen; Distro: Artix Linux (OpenRC); Hostname: Prometheus;
 **Final Check:** Does this sound like something a real person would say in this chat? Is it coherent? Does it fit the vibe? Does it follow the rules? Keep it natural.
 """
 
+# --- Context Providers ---
+# Each provider is an independent SQLite/ChromaDB/Discord lookup. They are awaited concurrently
+# by build_dynamic_system_prompt so prompt latency is bounded by the slowest provider, not the sum.
+
+async def _run_context_provider(cog: 'GurtCog', name: str, coro: Awaitable[Any], default: Any, timeout: float = PROMPT_PROVIDER_TIMEOUT) -> Any:
+    """
+    Awaits a single prompt context provider with a timeout, recording its latency in cog.prompt_provider_stats.
+    Returns `default` if the provider times out or raises, so one slow/broken source never blocks the prompt.
+    """
+    stats = cog.prompt_provider_stats[name]
+    start_time = time.monotonic()
+    try:
+        result = await asyncio.wait_for(coro, timeout=timeout)
+        stats["success"] += 1
+        return result
+    except asyncio.TimeoutError:
+        stats["timeout"] += 1
+        print(f"Prompt context provider '{name}' timed out after {timeout:.1f}s. Skipping.")
+        return default
+    except Exception as e:
+        stats["failure"] += 1
+        print(f"Prompt context provider '{name}' failed: {type(e).__name__}: {e}")
+        return default
+    finally:
+        elapsed = time.monotonic() - start_time
+        stats["total_time"] += elapsed
+        stats["last_time"] = elapsed
+        stats["count"] += 1
+
+async def _fetch_channel_topic(cog: 'GurtCog', channel_id: int) -> Optional[str]:
+    """Returns the channel topic, using cog.channel_topics_cache when fresh."""
+    cached_topic = cog.channel_topics_cache.get(channel_id)
+    if cached_topic and time.time() - cached_topic["timestamp"] < CHANNEL_TOPIC_CACHE_TTL:
+        return cached_topic["topic"]
+
+    if not hasattr(cog, 'get_channel_info'):
+        print("Warning: GurtCog instance does not have get_channel_info method for prompt building.")
+        return None
+
+    # Ensure channel_id is passed as string if required by the tool/method
+    channel_info_result = await cog.get_channel_info(channel_id_str=str(channel_id))
+    if channel_info_result.get("error"):
+        print(f"Error in channel_info result for {channel_id}: {channel_info_result.get('error')}")
+        return None
+    channel_topic = channel_info_result.get("topic")
+    cog.channel_topics_cache[channel_id] = {"topic": channel_topic, "timestamp": time.time()}
+    return channel_topic
+
+async def _retrieve_fact_texts(memory, query: str, scope: str, k: int) -> List[str]:
+    """Facts relevant to the query via MemoryManager.retrieve() (hybrid vector + keyword), as plain strings."""
+    return [entry["fact"] for entry in await memory.retrieve(query, scope=scope, k=k)]
+
+def _merge_facts(primary: List[str], secondary: List[str], limit: int) -> List[str]:
+    """Combines two fact lists, keeping order (primary first), de-duplicating and capping at limit."""
+    combined = []
+    seen_facts = set()
+    for fact in list(primary) + list(secondary):
+        if fact not in seen_facts:
+            combined.append(fact)
+            seen_facts.add(fact)
+    return combined[:limit]
+
+# Personality block appended to PROMPT_STATIC_PART; formatted from the persistent traits
+PERSONALITY_PROMPT_TEMPLATE = """
+**Your Current Personality Configuration (Influences Style Subtly):**
+- Chattiness: {chattiness:.2f} (Higher = more likely to talk)
+- Slang Level: {slang_level:.2f} (Higher = more slang, but keep it varied)
+- Randomness: {randomness:.2f} (Higher = more unpredictable/tangential)
+- Verbosity: {verbosity:.2f} (Higher = longer messages)
+- Optimism: {optimism:.2f} (0=Pessimistic, 1=Optimistic)
+- Curiosity: {curiosity:.2f} (Higher = asks more questions)
+- Sarcasm Level: {sarcasm_level:.2f} (Higher = more sarcastic/dry wit)
+- Patience: {patience:.2f} (Lower = more easily annoyed/impatient)
+- Mischief: {mischief:.2f} (Higher = more playful teasing/rule-bending)
+
+Let these traits gently shape *how* you communicate, but don't mention them explicitly.
+"""
+
+# Dynamic sections in the order they are dropped when over PROMPT_DYNAMIC_TOKEN_BUDGET (first = dropped first).
+# Sections not listed here are never dropped.
+PROMPT_SECTION_DROP_ORDER = ["interests", "sentiment", "general_facts", "summary", "conversation_topics", "channel_topic", "relationship", "user_facts"]
+
+def get_static_prompt_prefix(cog: 'GurtCog', persistent_traits: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Returns the static part of the system prompt as {"text", "hash", "tokens"}: the base prompt plus the
+    personality block. Cached on the cog and only rebuilt when the prompt mode or a formatted trait value
+    changes, so consecutive requests share an identical prefix (and hash) for provider-side prefix caching.
+    """
+    minimal = bool(getattr(cog.bot, 'minimal_prompt', False))
+    if minimal:
+        cache_key = ("minimal",)
+    else:
+        # Keyed on the personality block itself, so trait changes below display precision don't invalidate it
+        personality_block = PERSONALITY_PROMPT_TEMPLATE.format(**persistent_traits)
+        cache_key = ("full", personality_block)
+
+    cached_prefix = cog.static_prompt_cache
+    if cached_prefix and cached_prefix["key"] == cache_key:
+        return cached_prefix
+
+    if minimal:
+        # Note: Minimal prompt doesn't include dynamic personality traits section
+        text = MINIMAL_PROMPT_STATIC_PART
+    else:
+        text = PROMPT_STATIC_PART + personality_block
+    prefix = {
+        "key": cache_key,
+        "text": text,
+        "hash": hashlib.sha256(text.encode("utf-8")).hexdigest()[:16],
+        "tokens": estimate_tokens(text),
+    }
+    cog.static_prompt_cache = prefix
+    print(f"Rebuilt static system prompt prefix ({'minimal' if minimal else 'full'}, ~{prefix['tokens']} tokens, hash {prefix['hash']}).")
+    return prefix
+
+def _apply_prompt_token_budget(cog: 'GurtCog', sections: List[Tuple[str, str]], budget: int, prefix: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """
+    Drops dynamic sections in PROMPT_SECTION_DROP_ORDER until their estimated tokens fit the budget.
+    Logs per-section token counts and records them in cog.prompt_section_stats.
+    """
+    section_tokens = {name: estimate_tokens(text) for name, text in sections}
+    total_tokens = sum(section_tokens.values())
+    dropped = set()
+    for name in PROMPT_SECTION_DROP_ORDER:
+        if total_tokens <= budget:
+            break
+        if name in section_tokens and name not in dropped:
+            dropped.add(name)
+            total_tokens -= section_tokens[name]
+
+    for name, tokens in section_tokens.items():
+        section_stats = cog.prompt_section_stats[name]
+        if name in dropped:
+            section_stats["dropped"] += 1
+        else:
+            section_stats["included"] += 1
+            section_stats["total_tokens"] += tokens
+
+    breakdown = ", ".join(f"{name}={tokens}{' (dropped)' if name in dropped else ''}" for name, tokens in section_tokens.items())
+    if dropped:
+        print(f"System prompt over budget, dropped {', '.join(sorted(dropped))}: static={prefix['tokens']} (hash {prefix['hash']}), dynamic={total_tokens}/{budget} [{breakdown}]")
+    else:
+        logger.debug(f"System prompt tokens: static={prefix['tokens']} (hash {prefix['hash']}), dynamic={total_tokens}/{budget} [{breakdown}]")
+    return [(name, text) for name, text in sections if name not in dropped]
+
 async def build_dynamic_system_prompt(cog: 'GurtCog', message: discord.Message) -> str:
     """Builds the system prompt string with dynamic context, including persistent personality."""
     channel_id = message.channel.id
     user_id = message.author.id
+    user_id_str = str(user_id)
+    memory = cog.memory_manager
+
+    # --- Gather Context Providers Concurrently ---
+    # (name, coroutine, default on timeout/failure)
+    providers = [
+        ("personality_traits", memory.get_all_personality_traits(), {}),
+        ("channel_topic", _fetch_channel_topic(cog, channel_id), None),
+        ("semantic_user_facts", _retrieve_fact_texts(memory, message.content, user_id_str, 5), []),
+        ("recent_user_facts", memory.get_user_facts(user_id_str, limit=memory.max_user_facts), []),
+        ("semantic_general_facts", _retrieve_fact_texts(memory, message.content, "general", 5), []),
+        ("recent_general_facts", memory.get_general_facts(limit=5), []),
+    ]
+    if INTEREST_MAX_FOR_PROMPT > 0:
+        providers.append(("interests", memory.get_interests(limit=INTEREST_MAX_FOR_PROMPT, min_level=INTEREST_MIN_LEVEL_FOR_PROMPT), []))
+
+    gather_start = time.monotonic()
+    results = await asyncio.gather(*[
+        _run_context_provider(cog, name, coro, default) for name, coro, default in providers
+    ])
+    context = {name: result for (name, _, _), result in zip(providers, results)}
+    logger.debug(f"Gathered {len(providers)} prompt context providers in {time.monotonic() - gather_start:.3f}s.")
 
     # --- Fetch Persistent Personality Traits ---
-    persistent_traits = await cog.memory_manager.get_all_personality_traits()
+    persistent_traits = context["personality_traits"]
     # Use baseline as default if DB fetch fails or is empty
     if not persistent_traits:
         print("Warning: Failed to fetch persistent traits, using baseline defaults for prompt.")
@@ -179,81 +352,35 @@ async def build_dynamic_system_prompt(cog: 'GurtCog', message: discord.Message)
         # Ensure defaults are present if missing from DB
         for key, value in BASELINE_PERSONALITY.items():
             persistent_traits.setdefault(key, value)
-        print(f"Fetched persistent traits for prompt: {persistent_traits}")
 
-    # --- Choose Base Prompt ---
-    if hasattr(cog.bot, 'minimal_prompt') and cog.bot.minimal_prompt:
-        # Use the minimal prompt if the flag is set
-        print("Using MINIMAL system prompt.")
-        base_prompt = MINIMAL_PROMPT_STATIC_PART
-        # Note: Minimal prompt doesn't include dynamic personality traits section
-        prompt_dynamic_part = "" # No dynamic personality for minimal prompt
-    else:
-        # Otherwise, build the full prompt with dynamic traits
-        print("Using FULL system prompt with dynamic traits.")
-        # --- Rebuild the dynamic part of the base prompt with current persistent traits ---
-        # This section adds the *variable* personality traits to the *static* base prompt
-        prompt_dynamic_part = f"""
-**Your Current Personality Configuration (Influences Style Subtly):**
-- Chattiness: {persistent_traits.get('chattiness'):.2f} (Higher = more likely to talk)
-- Slang Level: {persistent_traits.get('slang_level'):.2f} (Higher = more slang, but keep it varied)
-- Randomness: {persistent_traits.get('randomness'):.2f} (Higher = more unpredictable/tangential)
-- Verbosity: {persistent_traits.get('verbosity'):.2f} (Higher = longer messages)
-- Optimism: {persistent_traits.get('optimism'):.2f} (0=Pessimistic, 1=Optimistic)
-- Curiosity: {persistent_traits.get('curiosity'):.2f} (Higher = asks more questions)
-- Sarcasm Level: {persistent_traits.get('sarcasm_level'):.2f} (Higher = more sarcastic/dry wit)
-- Patience: {persistent_traits.get('patience'):.2f} (Lower = more easily annoyed/impatient)
-- Mischief: {persistent_traits.get('mischief'):.2f} (Higher = more playful teasing/rule-bending)
+    # --- Static Prefix (cached, only rebuilt when traits change) ---
+    prefix = get_static_prompt_prefix(cog, persistent_traits)
 
-Let these traits gently shape *how* you communicate, but don't mention them explicitly.
-"""
-        # Combine dynamic traits part with the full static part
-        base_prompt = PROMPT_STATIC_PART + prompt_dynamic_part # Append personality config
-
-    # --- Append Dynamic Context ---
-    system_context_parts = [base_prompt] # Start with the chosen base prompt
+    # --- Dynamic Sections ---
+    # (name, text); each is subject to the dynamic token budget
+    sections: List[Tuple[str, str]] = []
 
     # Add current time
     now = datetime.datetime.now(datetime.timezone.utc)
     time_str = now.strftime("%Y-%m-%d %H:%M:%S %Z")
     day_str = now.strftime("%A")
-    system_context_parts.append(f"\nCurrent time: {time_str} ({day_str}).")
+    sections.append(("time", f"\nCurrent time: {time_str} ({day_str})."))
 
-    # Add channel topic (with caching)
-    channel_topic = None
-    cached_topic = cog.channel_topics_cache.get(channel_id)
-    if cached_topic and time.time() - cached_topic["timestamp"] < CHANNEL_TOPIC_CACHE_TTL:
-        channel_topic = cached_topic["topic"]
-        if channel_topic: print(f"Using cached channel topic for {channel_id}: {channel_topic}")
-    else:
-        try:
-            if hasattr(cog, 'get_channel_info'):
-                # Ensure channel_id is passed as string if required by the tool/method
-                channel_info_result = await cog.get_channel_info(channel_id_str=str(channel_id))
-                if not channel_info_result.get("error"):
-                    channel_topic = channel_info_result.get("topic")
-                    cog.channel_topics_cache[channel_id] = {"topic": channel_topic, "timestamp": time.time()}
-                    if channel_topic: print(f"Fetched and cached channel topic for {channel_id}: {channel_topic}")
-                    else: print(f"Fetched and cached null topic for {channel_id}")
-                else:
-                    print(f"Error in channel_info result for {channel_id}: {channel_info_result.get('error')}")
-            else:
-                print("Warning: GurtCog instance does not have get_channel_info method for prompt building.")
-        except Exception as e:
-            print(f"Error fetching channel topic for {channel_id}: {e}")
+    # Add channel topic (fetched/cached by its provider)
+    channel_topic = context["channel_topic"]
     if channel_topic:
-        system_context_parts.append(f"Current channel topic: {channel_topic}")
+        sections.append(("channel_topic", f"Current channel topic: {channel_topic}"))
 
     # Add active conversation topics (if available)
     channel_topics_data = cog.active_topics.get(channel_id)
     if channel_topics_data and channel_topics_data.get("topics"):
         top_topics = sorted(channel_topics_data["topics"], key=lambda t: t.get("score", 0), reverse=True)[:3]
+        topic_lines = []
         if top_topics:
             topics_str = ", ".join([f"{t['topic']}" for t in top_topics if 'topic' in t])
-            system_context_parts.append(f"Current conversation topics seem to be around: {topics_str}.")
+            topic_lines.append(f"Current conversation topics seem to be around: {topics_str}.")
 
         # Add user-specific interest in these topics
-        user_id_str = str(user_id)
         user_interests = channel_topics_data.get("user_topic_interests", {}).get(user_id_str, [])
         if user_interests:
             user_topic_names = {interest["topic"] for interest in user_interests if "topic" in interest}
@@ -261,127 +388,75 @@ Let these traits gently shape *how* you communicate, but don't mention them expl
             common_topics = user_topic_names.intersection(active_topic_names)
             if common_topics:
                 topics_list_str = ", ".join(common_topics)
-                system_context_parts.append(f"{message.author.display_name} seems interested in: {topics_list_str}.")
+                topic_lines.append(f"{message.author.display_name} seems interested in: {topics_list_str}.")
+        if topic_lines:
+            sections.append(("conversation_topics", "\n".join(topic_lines)))
 
     # Add conversation sentiment context (if available)
-    if channel_id in cog.conversation_sentiment:
-        channel_sentiment = cog.conversation_sentiment[channel_id]
-        sentiment_str = f"The conversation vibe feels generally {channel_sentiment.get('overall', 'neutral')}"
-        intensity = channel_sentiment.get('intensity', 0.5)
+    channel_sentiment = cog.conversation_sentiment.get(channel_id)
+    if channel_sentiment:
+        sentiment_str = f"The conversation vibe feels generally {channel_sentiment.overall}"
+        intensity = channel_sentiment.intensity
         if intensity > 0.7: sentiment_str += " (strongly so)"
         elif intensity < 0.4: sentiment_str += " (mildly so)"
-        trend = channel_sentiment.get('recent_trend', 'stable')
+        trend = channel_sentiment.recent_trend
         if trend != "stable": sentiment_str += f", and seems to be {trend}"
-        system_context_parts.append(sentiment_str + ".")
+        sentiment_lines = [sentiment_str + "."]
 
-        user_id_str = str(user_id)
-        user_sentiment = channel_sentiment.get("user_sentiments", {}).get(user_id_str)
+        user_sentiment = channel_sentiment.user_sentiments.get(user_id)
         if user_sentiment:
-            user_sentiment_str = f"{message.author.display_name}'s recent messages seem {user_sentiment.get('sentiment', 'neutral')}"
-            user_intensity = user_sentiment.get('intensity', 0.5)
-            if user_intensity > 0.7: user_sentiment_str += " (strongly so)"
-            system_context_parts.append(user_sentiment_str + ".")
-            if user_sentiment.get("emotions"):
-                emotions_str = ", ".join(user_sentiment["emotions"])
-                system_context_parts.append(f"Detected emotions from them might include: {emotions_str}.")
+            user_sentiment_str = f"{message.author.display_name}'s recent messages seem {user_sentiment.sentiment}"
+            if user_sentiment.intensity > 0.7: user_sentiment_str += " (strongly so)"
+            sentiment_lines.append(user_sentiment_str + ".")
+            if user_sentiment.emotions:
+                emotions_str = ", ".join(user_sentiment.emotions)
+                sentiment_lines.append(f"Detected emotions from them might include: {emotions_str}.")
 
         # Briefly mention overall atmosphere if not neutral
-        if channel_sentiment.get('overall') != "neutral":
-            atmosphere_hint = f"Overall emotional atmosphere: {channel_sentiment['overall']}."
-            system_context_parts.append(atmosphere_hint)
+        if channel_sentiment.overall != "neutral":
+            sentiment_lines.append(f"Overall emotional atmosphere: {channel_sentiment.overall}.")
+        sections.append(("sentiment", "\n".join(sentiment_lines)))
 
     # Add conversation summary (if available and valid)
     cached_summary_data = cog.conversation_summaries.get(channel_id)
     if isinstance(cached_summary_data, dict):
         summary_text = cached_summary_data.get("summary")
         if summary_text and not summary_text.startswith("Error"):
-            system_context_parts.append(f"Quick summary of recent chat: {summary_text}")
+            sections.append(("summary", f"Quick summary of recent chat: {summary_text}"))
 
     # Add relationship score hint
     try:
-        user_id_str = str(user_id)
-        bot_id_str = str(cog.bot.user.id)
-        # Ensure consistent key order
-        key_1, key_2 = tuple(sorted((user_id_str, bot_id_str)))
-        relationship_score = cog.user_relationships.get(key_1, {}).get(key_2, 0.0)
+        relationship_score = cog.user_relationships.get_score(user_id, cog.bot.user.id)
 
         if relationship_score is not None: # Check if score exists
              score_val = float(relationship_score) # Ensure it's a float
              if score_val <= 20: relationship_level = "kinda new/acquaintance"
              elif score_val <= 60: relationship_level = "familiar/friends"
              else: relationship_level = "close/besties"
-             system_context_parts.append(f"Your relationship with {message.author.display_name} is: {relationship_level} (Score: {score_val:.1f}/100). Adjust your tone.")
+             sections.append(("relationship", f"Your relationship with {message.author.display_name} is: {relationship_level} (Score: {score_val:.1f}/100). Adjust your tone."))
     except Exception as e:
         print(f"Error retrieving relationship score for prompt injection: {e}")
 
+    # Add user facts (Combine semantic and recent, prioritizing recent, limit total)
+    final_user_facts = _merge_facts(context["recent_user_facts"], context["semantic_user_facts"], cog.memory_manager.max_user_facts)
+    if final_user_facts:
+        facts_str = "; ".join(final_user_facts)
+        sections.append(("user_facts", f"Stuff you remember about {message.author.display_name}: {facts_str}"))
 
-    # Add user facts (Combine semantic and recent, limit total)
-    try:
-        user_id_str = str(user_id)
-        semantic_user_facts = await cog.memory_manager.get_user_facts(user_id_str, context=message.content, limit=5) # Limit semantic fetch
-        recent_user_facts = await cog.memory_manager.get_user_facts(user_id_str, limit=cog.memory_manager.max_user_facts) # Use manager's limit for recent
-
-        # Combine, prioritizing recent, then semantic, de-duplicating
-        combined_user_facts = []
-        seen_facts = set()
-        for fact in recent_user_facts:
-            if fact not in seen_facts:
-                combined_user_facts.append(fact)
-                seen_facts.add(fact)
-        for fact in semantic_user_facts:
-            if fact not in seen_facts:
-                combined_user_facts.append(fact)
-                seen_facts.add(fact)
-
-        # Apply final limit from MemoryManager config
-        final_user_facts = combined_user_facts[:cog.memory_manager.max_user_facts]
-
-        if final_user_facts:
-            facts_str = "; ".join(final_user_facts)
-            system_context_parts.append(f"Stuff you remember about {message.author.display_name}: {facts_str}")
-    except Exception as e:
-        print(f"Error retrieving combined user facts for prompt injection: {e}")
-
-    # Add relevant general facts (Combine semantic and recent, limit total)
-    try:
-        semantic_general_facts = await cog.memory_manager.get_general_facts(context=message.content, limit=5)
-        recent_general_facts = await cog.memory_manager.get_general_facts(limit=5) # Limit recent fetch too
-
-        # Combine and deduplicate, prioritizing recent
-        combined_general_facts = []
-        seen_facts = set()
-        for fact in recent_general_facts:
-             if fact not in seen_facts:
-                 combined_general_facts.append(fact)
-                 seen_facts.add(fact)
-        for fact in semantic_general_facts:
-             if fact not in seen_facts:
-                 combined_general_facts.append(fact)
-                 seen_facts.add(fact)
-
-        # Apply a final combined limit (e.g., 7 total)
-        final_general_facts = combined_general_facts[:7]
-
-        if final_general_facts:
-            facts_str = "; ".join(final_general_facts)
-            system_context_parts.append(f"Relevant general knowledge/context: {facts_str}")
-    except Exception as e:
-         print(f"Error retrieving combined general facts for prompt injection: {e}")
+    # Add relevant general facts (Combine semantic and recent, prioritizing recent, 7 total)
+    final_general_facts = _merge_facts(context["recent_general_facts"], context["semantic_general_facts"], 7)
+    if final_general_facts:
+        facts_str = "; ".join(final_general_facts)
+        sections.append(("general_facts", f"Relevant general knowledge/context: {facts_str}"))
 
     # Add Gurt's current interests (if enabled and available)
-    if INTEREST_MAX_FOR_PROMPT > 0:
-        try:
-            interests = await cog.memory_manager.get_interests(
-                limit=INTEREST_MAX_FOR_PROMPT,
-                min_level=INTEREST_MIN_LEVEL_FOR_PROMPT
-            )
-            if interests:
-                interests_str = ", ".join([f"{topic} ({level:.1f})" for topic, level in interests])
-                system_context_parts.append(f"Topics you're currently interested in (higher score = more): {interests_str}. Maybe weave these in?")
-        except Exception as e:
-            print(f"Error retrieving interests for prompt injection: {e}")
+    interests = context.get("interests")
+    if interests:
+        interests_str = ", ".join([f"{topic} ({level:.1f})" for topic, level in interests])
+        sections.append(("interests", f"Topics you're currently interested in (higher score = more): {interests_str}. Maybe weave these in?"))
 
     # --- Final Assembly ---
-    final_prompt = "\n".join(system_context_parts)
+    kept_sections = _apply_prompt_token_budget(cog, sections, PROMPT_DYNAMIC_TOKEN_BUDGET, prefix)
+    final_prompt = "\n".join([prefix["text"]] + [text for _, text in kept_sections])
     # print(f"Generated final system prompt:\n------\n{final_prompt}\n------") # Optional: Log the full prompt for debugging
     return final_prompt
@@ -1 +1,286 @@
-# Management of dynamic state variables might go here.
+import asyncio
+import itertools
+import json
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from .config import SENTIMENT_MAX_USERS_PER_CHANNEL
+
+if TYPE_CHECKING:
+    from .cog import GurtCog # For type hinting
+
+# Compact in-memory representations of Gurt's per-user/per-channel runtime state.
+# Everything is keyed by int Discord IDs, records use __slots__ instead of per-instance dicts,
+# and every container is bounded with LRU eviction so inactive users/channels eventually fall out.
+# The to_snapshot()/from_snapshot() helpers convert to plain JSON-able structures for the
+# periodic snapshot to the memory DB (see snapshot_runtime_state/restore_runtime_state).
+
+class LRUDict(dict):
+    """
+    A dict bounded to max_size entries that evicts the least recently used entries when full.
+    Reads through [] and writes count as uses; get() and `in` don't. With a default_factory it
+    behaves like a defaultdict. on_evict(key, value) is called for every evicted entry.
+
+    Recency is kept in the dict's own insertion order (a used key is moved to the end), which costs
+    about a third less per entry than an OrderedDict. Once full, the oldest 1% of entries are
+    evicted in one pass, so eviction doesn't rescan the front of the dict on every insert.
+    """
+
+    def __init__(self, max_size: int, default_factory: Optional[Callable[[], Any]] = None,
+                 on_evict: Optional[Callable[[Any, Any], None]] = None):
+        super().__init__()
+        self.max_size = max(1, max_size)
+        self.default_factory = default_factory
+        self.on_evict = on_evict
+        self.evictions = 0
+        self._evict_batch = max(1, self.max_size // 100)
+
+    def __getitem__(self, key):
+        try:
+            value = dict.pop(self, key)
+        except KeyError:
+            return self.__missing__(key)
+        dict.__setitem__(self, key, value) # Move to the end (most recently used)
+        return value
+
+    def __missing__(self, key):
+        if self.default_factory is None:
+            raise KeyError(key)
+        value = self.default_factory()
+        self[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        dict.pop(self, key, None)
+        dict.__setitem__(self, key, value)
+        if len(self) > self.max_size:
+            self._evict(len(self) - self.max_size + self._evict_batch)
+
+    def _evict(self, count: int):
+        for key in list(itertools.islice(iter(self), count)):
+            value = dict.pop(self, key)
+            self.evictions += 1
+            if self.on_evict:
+                self.on_evict(key, value)
+
+    def __repr__(self):
+        return f"LRUDict(max_size={self.max_size}, size={len(self)})"
+
+
+class RelationshipStore:
+    """
+    Relationship scores (0-100) between unordered pairs of users.
+
+    Each pair is stored under a single int (the two 64-bit snowflakes packed into one), which is
+    far smaller than the old nested {str: {str: float}} layout. Pairs changed since the last
+    snapshot are tracked so snapshots only write what changed, including pairs evicted in between.
+    """
+
+    def __init__(self, max_pairs: int):
+        self.max_pairs = max_pairs
+        self._scores = LRUDict(max_pairs, on_evict=self._on_evict)
+        self._dirty = set() # Packed keys changed since the last pop_dirty()
+        self._evicted_dirty: Dict[int, float] = {} # Changed pairs evicted before they were snapshotted
+
+    @staticmethod
+    def pair_key(user_id_1: Union[int, str], user_id_2: Union[int, str]) -> int:
+        user_id_1, user_id_2 = int(user_id_1), int(user_id_2)
+        if user_id_1 > user_id_2:
+            user_id_1, user_id_2 = user_id_2, user_id_1
+        return (user_id_1 << 64) | user_id_2
+
+    @staticmethod
+    def unpack_key(key: int) -> Tuple[int, int]:
+        return key >> 64, key & 0xFFFFFFFFFFFFFFFF
+
+    def _on_evict(self, key: int, score: float):
+        if key in self._dirty:
+            self._dirty.discard(key)
+            self._evicted_dirty[key] = score
+
+    def get_score(self, user_id_1: Union[int, str], user_id_2: Union[int, str]) -> float:
+        return self._scores.get(self.pair_key(user_id_1, user_id_2), 0.0)
+
+    def update(self, user_id_1: Union[int, str], user_id_2: Union[int, str], change: float) -> float:
+        """Adds change to the pair's score, clamped to 0-100, and returns the new score."""
+        key = self.pair_key(user_id_1, user_id_2)
+        new_score = max(0.0, min(self._scores.get(key, 0.0) + change, 100.0))
+        self._scores[key] = new_score
+        self._dirty.add(key)
+        self._evicted_dirty.pop(key, None)
+        return new_score
+
+    def load(self, rows: List[Tuple[int, int, float]]):
+        """Loads (user_id_1, user_id_2, score) rows, oldest first, without marking them dirty."""
+        for user_id_1, user_id_2, score in rows:
+            self._scores[self.pair_key(user_id_1, user_id_2)] = float(score)
+
+    def pop_dirty(self) -> List[Tuple[int, int, float]]:
+        """Returns (user_id_1, user_id_2, score) for every pair changed since the last call."""
+        rows = [(*self.unpack_key(key), self._scores[key]) for key in self._dirty if key in self._scores]
+        rows.extend((*self.unpack_key(key), score) for key, score in self._evicted_dirty.items())
+        self._dirty.clear()
+        self._evicted_dirty.clear()
+        return rows
+
+    def restore_dirty(self, rows: List[Tuple[int, int, float]]):
+        """Marks rows from a failed snapshot as dirty again so the next snapshot retries them."""
+        for user_id_1, user_id_2, score in rows:
+            key = self.pair_key(user_id_1, user_id_2)
+            if key in self._scores:
+                self._dirty.add(key)
+            else:
+                self._evicted_dirty[key] = score
+
+    def items(self) -> Iterator[Tuple[int, int, float]]:
+        for key, score in self._scores.items():
+            yield (*self.unpack_key(key), score)
+
+    @property
+    def evictions(self) -> int:
+        return self._scores.evictions
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+
+class UserSentiment:
+    """A user's recent sentiment in one channel."""
+    __slots__ = ("sentiment", "intensity", "emotions")
+
+    def __init__(self, sentiment: str = "neutral", intensity: float = 0.5, emotions: Tuple[str, ...] = ()):
+        self.sentiment = sentiment
+        self.intensity = intensity
+        self.emotions = emotions
+
+    def to_snapshot(self) -> list:
+        return [self.sentiment, self.intensity, list(self.emotions)]
+
+    @classmethod
+    def from_snapshot(cls, data: list) -> 'UserSentiment':
+        return cls(data[0], float(data[1]), tuple(data[2]))
+
+
+class ChannelSentiment:
+    """Overall sentiment of a channel plus per-user sentiments (keyed by int user ID)."""
+    __slots__ = ("overall", "intensity", "recent_trend", "user_sentiments", "last_update")
+
+    def __init__(self, max_users: int = 200):
+        self.overall = "neutral"
+        self.intensity = 0.5
+        self.recent_trend = "stable"
+        self.user_sentiments: LRUDict = LRUDict(max_users)
+        self.last_update = time.time()
+
+    def to_snapshot(self) -> Dict[str, Any]:
+        return {
+            "overall": self.overall, "intensity": self.intensity, "recent_trend": self.recent_trend,
+            "last_update": self.last_update,
+            "users": {str(user_id): sentiment.to_snapshot() for user_id, sentiment in self.user_sentiments.items()},
+        }
+
+    @classmethod
+    def from_snapshot(cls, data: Dict[str, Any], max_users: int = 200) -> 'ChannelSentiment':
+        channel_sentiment = cls(max_users)
+        channel_sentiment.overall = data.get("overall", "neutral")
+        channel_sentiment.intensity = float(data.get("intensity", 0.5))
+        channel_sentiment.recent_trend = data.get("recent_trend", "stable")
+        channel_sentiment.last_update = float(data.get("last_update", time.time()))
+        for user_id, user_data in data.get("users", {}).items():
+            channel_sentiment.user_sentiments[int(user_id)] = UserSentiment.from_snapshot(user_data)
+        return channel_sentiment
+
+
+class ActiveConversation:
+    """Participants and activity times of a channel's current conversation."""
+    __slots__ = ("participants", "start_time", "last_activity", "topic")
+
+    def __init__(self, start_time: Optional[float] = None):
+        now = time.time()
+        self.participants: set = set() # int user IDs
+        self.start_time = start_time if start_time is not None else now
+        self.last_activity = now
+        self.topic: Optional[str] = None
+
+    def to_snapshot(self) -> Dict[str, Any]:
+        return {"participants": list(self.participants), "start_time": self.start_time,
+                "last_activity": self.last_activity, "topic": self.topic}
+
+    @classmethod
+    def from_snapshot(cls, data: Dict[str, Any]) -> 'ActiveConversation':
+        conversation = cls(float(data.get("start_time", time.time())))
+        conversation.participants = set(int(user_id) for user_id in data.get("participants", []))
+        conversation.last_activity = float(data.get("last_activity", conversation.start_time))
+        conversation.topic = data.get("topic")
+        return conversation
+
+
+class ReactionRecord:
+    """Reaction counts on one of Gurt's own messages."""
+    __slots__ = ("positive", "negative", "topic", "timestamp")
+
+    def __init__(self, positive: int = 0, negative: int = 0, topic: Optional[str] = None, timestamp: float = 0.0):
+        self.positive = positive
+        self.negative = negative
+        self.topic = topic
+        self.timestamp = timestamp
+
+    def to_snapshot(self) -> list:
+        return [self.positive, self.negative, self.topic, self.timestamp]
+
+    @classmethod
+    def from_snapshot(cls, data: list) -> 'ReactionRecord':
+        return cls(int(data[0]), int(data[1]), data[2], float(data[3]))
+
+
+# --- Snapshots ---
+
+async def snapshot_runtime_state(cog: 'GurtCog') -> Dict[str, int]:
+    """
+    Writes changed relationship scores, and JSON snapshots of the sentiment, active conversation,
+    reaction and user->channel tracking, to the memory DB. Returns the number of entries written per structure.
+    """
+    relationship_rows = cog.user_relationships.pop_dirty()
+    try:
+        await cog.memory_manager.save_relationship_scores(relationship_rows)
+    except Exception:
+        cog.user_relationships.restore_dirty(relationship_rows)
+        raise
+
+    # Built on the event loop so each structure is captured consistently; serialized in a thread
+    snapshots = {
+        "conversation_sentiment": {str(channel_id): sentiment.to_snapshot() for channel_id, sentiment in cog.conversation_sentiment.items()},
+        "active_conversations": {str(channel_id): conversation.to_snapshot() for channel_id, conversation in cog.active_conversations.items()},
+        "gurt_message_reactions": {str(message_id): record.to_snapshot() for message_id, record in cog.gurt_message_reactions.items()},
+        "user_conversation_mapping": {str(user_id): list(channel_ids) for user_id, channel_ids in cog.user_conversation_mapping.items()},
+    }
+    counts = {"relationships": len(relationship_rows)}
+    for key, data in snapshots.items():
+        await cog.memory_manager.set_runtime_state(key, await asyncio.to_thread(json.dumps, data))
+        counts[key] = len(data)
+    return counts
+
+async def restore_runtime_state(cog: 'GurtCog') -> Dict[str, int]:
+    """Loads the last snapshot written by snapshot_runtime_state into the cog's (empty) state structures."""
+    rows = await cog.memory_manager.get_relationship_scores(cog.user_relationships.max_pairs)
+    cog.user_relationships.load(rows)
+    counts = {"relationships": len(rows)}
+
+    loaders = {
+        "conversation_sentiment": (cog.conversation_sentiment, lambda data: ChannelSentiment.from_snapshot(data, SENTIMENT_MAX_USERS_PER_CHANNEL)),
+        "active_conversations": (cog.active_conversations, ActiveConversation.from_snapshot),
+        "gurt_message_reactions": (cog.gurt_message_reactions, ReactionRecord.from_snapshot),
+        "user_conversation_mapping": (cog.user_conversation_mapping, lambda data: tuple(int(channel_id) for channel_id in data)),
+    }
+    for key, (container, load_entry) in loaders.items():
+        state_json = await cog.memory_manager.get_runtime_state(key)
+        counts[key] = 0
+        if not state_json:
+            continue
+        try:
+            for entry_id, data in json.loads(state_json).items():
+                container[int(entry_id)] = load_entry(data)
+                counts[key] += 1
+        except Exception as e:
+            print(f"Error restoring runtime state '{key}': {e}")
+    return counts
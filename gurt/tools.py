@@ -27,7 +27,8 @@ from .config import (
     DOCKER_EXEC_IMAGE, DOCKER_COMMAND_TIMEOUT, DOCKER_CPU_LIMIT, DOCKER_MEM_LIMIT,
     SUMMARY_CACHE_TTL, SUMMARY_API_TIMEOUT, DEFAULT_MODEL,
     # Add these:
-    TAVILY_DEFAULT_SEARCH_DEPTH, TAVILY_DEFAULT_MAX_RESULTS, TAVILY_DISABLE_ADVANCED
+    TAVILY_DEFAULT_SEARCH_DEPTH, TAVILY_DEFAULT_MAX_RESULTS, TAVILY_DISABLE_ADVANCED,
+    TOOL_DEFAULT_TIMEOUT, TOOL_CACHE_MAX_ENTRIES, MESSAGE_INDEX_ENABLED
 )
 # Assume these helpers will be moved or are accessible via cog
 # We might need to pass 'cog' to these tool functions if they rely on cog state heavily
@@ -63,6 +64,16 @@ async def get_recent_messages(cog: commands.Cog, limit: int, channel_id: str = N
     except Exception as e:
         return {"error": f"Error retrieving messages: {str(e)}", "timestamp": datetime.datetime.now().isoformat()}
 
+def _unindexed_history(cog: commands.Cog, channel, limit: int = 500):
+    """
+    Iterates channel history (newest first) that the local message index may not cover,
+    i.e. everything before Gurt started indexing this channel in the current session.
+    """
+    covered_since = cog.message_index_coverage.get(channel.id) if MESSAGE_INDEX_ENABLED else None
+    if covered_since:
+        return channel.history(limit=limit, before=datetime.datetime.fromtimestamp(covered_since, tz=datetime.timezone.utc))
+    return channel.history(limit=limit)
+
 async def search_user_messages(cog: commands.Cog, user_id: str, limit: int, channel_id: str = None) -> Dict[str, Any]:
     """Search for messages from a specific user"""
     from .utils import format_message # Import here
@@ -80,12 +91,18 @@ async def search_user_messages(cog: commands.Cog, user_id: str, limit: int, chan
 
         messages = []
         user_name = " "
-        async for message in channel.history(limit=500):
-            if message.author.id == user_id_int:
-                formatted_msg = format_message(cog, message) # Use formatter
-                messages.append(formatted_msg)
-                user_name = formatted_msg["author"]["name"] # Get name from formatted msg
-                if len(messages) >= limit: break
+        # Local index first, then REST history only for the range it doesn't cover
+        if MESSAGE_INDEX_ENABLED:
+            messages = await cog.memory_manager.get_indexed_user_messages(user_id, channel_id=str(channel.id), limit=limit)
+            if messages: user_name = messages[0]["author"]["name"]
+        if len(messages) < limit:
+            seen_ids = {m["id"] for m in messages}
+            async for message in _unindexed_history(cog, channel):
+                if message.author.id == user_id_int and str(message.id) not in seen_ids:
+                    formatted_msg = format_message(cog, message) # Use formatter
+                    messages.append(formatted_msg)
+                    user_name = formatted_msg["author"]["name"] # Get name from formatted msg
+                    if len(messages) >= limit: break
 
         return {
             "channel": {"id": str(channel.id), "name": getattr(channel, 'name', 'DM Channel')},
@@ -110,10 +127,15 @@ async def search_messages_by_content(cog: commands.Cog, search_term: str, limit:
 
         messages = []
         search_term_lower = search_term.lower()
-        async for message in channel.history(limit=500):
-            if search_term_lower in message.content.lower():
-                messages.append(format_message(cog, message)) # Use formatter
-                if len(messages) >= limit: break
+        # Local full-text index first (ranked), then REST history only for the range it doesn't cover
+        if MESSAGE_INDEX_ENABLED:
+            messages = await cog.memory_manager.search_indexed_messages(search_term, channel_id=str(channel.id), limit=limit)
+        if len(messages) < limit:
+            seen_ids = {m["id"] for m in messages}
+            async for message in _unindexed_history(cog, channel):
+                if search_term_lower in message.content.lower() and str(message.id) not in seen_ids:
+                    messages.append(format_message(cog, message)) # Use formatter
+                    if len(messages) >= limit: break
 
         return {
             "channel": {"id": str(channel.id), "name": getattr(channel, 'name', 'DM Channel')},
@@ -216,8 +238,13 @@ async def get_user_interaction_history(cog: commands.Cog, user_id_1: str, limit:
         user_id_2_int = int(user_id_2) if user_id_2 else cog.bot.user.id
 
         interactions = []
-        # Simplified: Search global cache
+        # Local message index first, then the in-memory global cache
+        if MESSAGE_INDEX_ENABLED:
+            interactions = await cog.memory_manager.get_indexed_interactions(str(user_id_1_int), str(user_id_2_int), limit=limit)
+        seen_ids = {m["id"] for m in interactions}
         for msg_data in list(cog.message_cache['global_recent']):
+            if len(interactions) >= limit: break
+            if msg_data.get('id') in seen_ids: continue
             author_id = int(msg_data['author']['id'])
             mentioned_ids = [int(m['id']) for m in msg_data.get('mentions', [])]
             replied_to_author_id = int(msg_data.get('replied_to_author_id')) if msg_data.get('replied_to_author_id') else None
@@ -2860,3 +2887,136 @@ TOOL_MAPPING = {
     "get_user_profile_info": get_user_profile_info,
     # --- End User Profile Tools ---
 }
+
+# --- Tool Execution Metadata ---
+# Used by api.execute_tool_calls. Tools listed with "side_effects": False are read-only and may run
+# concurrently with each other within one model turn. Anything not listed here (including tools added
+# by create_new_tool) is treated as side-effecting and runs serially, in the order the model requested it.
+# "timeout" is in seconds; None means the tool enforces its own timeout.
+TOOL_METADATA: Dict[str, Dict[str, Any]] = {
+    "get_recent_messages": {"side_effects": False},
+    "search_user_messages": {"side_effects": False},
+    "search_messages_by_content": {"side_effects": False},
+    "get_channel_info": {"side_effects": False, "cache": {"ttl": 60, "scope": "channel"}},
+    "get_conversation_context": {"side_effects": False},
+    "get_thread_context": {"side_effects": False},
+    "get_user_interaction_history": {"side_effects": False},
+    "get_conversation_summary": {"side_effects": False, "timeout": 60}, # May make an LLM call
+    "get_message_context": {"side_effects": False},
+    "web_search": {"side_effects": False, "cache": {"ttl": 600, "scope": "global"}},
+    "extract_web_content": {"side_effects": False, "timeout": 45},
+    "get_user_facts": {"side_effects": False, "cache": {"ttl": 30, "scope": "global", "key_args": ["user_id"]}},
+    "get_general_facts": {"side_effects": False, "cache": {"ttl": 30, "scope": "global"}},
+    "calculate": {"side_effects": False},
+    "get_user_id": {"side_effects": False},
+    "get_channel_id": {"side_effects": False},
+    "no_operation": {"side_effects": False},
+    "get_guild_info": {"side_effects": False, "cache": {"ttl": 120, "scope": "guild"}},
+    "list_guild_members": {"side_effects": False},
+    "get_user_avatar": {"side_effects": False},
+    "get_bot_uptime": {"side_effects": False},
+    "get_voice_channel_info": {"side_effects": False},
+    "get_guild_roles": {"side_effects": False, "cache": {"ttl": 120, "scope": "guild"}},
+    "fetch_emoji_list": {"side_effects": False, "cache": {"ttl": 300, "scope": "guild"}},
+    "get_guild_invites": {"side_effects": False},
+    "get_bot_stats": {"side_effects": False},
+    "get_weather": {"side_effects": False, "cache": {"ttl": 600, "scope": "global"}},
+    "translate_text": {"side_effects": False, "cache": {"ttl": 3600, "scope": "global"}},
+    "fetch_random_image": {"side_effects": False},
+    "read_temps": {"side_effects": False},
+    "check_disk_space": {"side_effects": False},
+    "fetch_random_joke": {"side_effects": False},
+    "list_bot_guilds": {"side_effects": False},
+    "list_guild_channels": {"side_effects": False, "cache": {"ttl": 120, "scope": "guild"}},
+    "list_tools": {"side_effects": False},
+    "get_user_username": {"side_effects": False},
+    "get_user_display_name": {"side_effects": False},
+    "get_user_avatar_url": {"side_effects": False, "cache": {"ttl": 300, "scope": "global"}},
+    "get_user_status": {"side_effects": False},
+    "get_user_activity": {"side_effects": False},
+    "get_user_roles": {"side_effects": False, "cache": {"ttl": 60, "scope": "guild"}},
+    "get_user_profile_info": {"side_effects": False},
+    # Writes that make cached read results stale
+    "remember_user_fact": {"side_effects": True, "invalidates": ["get_user_facts"]},
+    "remember_general_fact": {"side_effects": True, "invalidates": ["get_general_facts"]},
+    "assign_role_to_user": {"side_effects": True, "invalidates": ["get_user_roles", "get_guild_roles"]},
+    "remove_role_from_user": {"side_effects": True, "invalidates": ["get_user_roles", "get_guild_roles"]},
+    # Side-effecting tools that manage their own (possibly longer) timeouts
+    "run_terminal_command": {"side_effects": True, "timeout": None},
+    "execute_internal_command": {"side_effects": True, "timeout": None},
+    "execute_python_unsafe": {"side_effects": True, "timeout": None},
+    "run_git_pull": {"side_effects": True, "timeout": None},
+    "restart_gurt_bot": {"side_effects": True, "timeout": None},
+    # Its only await is the code generation LLM call (max_tokens=5000), before any file is written,
+    # so a timeout can't leave a half-registered tool
+    "create_new_tool": {"side_effects": True, "timeout": 180},
+    "run_python_code": {"side_effects": True, "timeout": 30}, # Piston request has its own 20s timeout
+}
+
+# Cache policies ("cache" above):
+#   ttl      - seconds a successful result stays valid
+#   scope    - "global", "guild" or "channel"; guild/channel scoped results are keyed by the current context
+#   key_args - argument names that make up the key (default: all arguments)
+
+def get_tool_metadata(tool_name: str) -> Dict[str, Any]:
+    """
+    Returns execution metadata for a tool, defaulting to serialized, uncached execution. Read-only tools
+    default to TOOL_DEFAULT_TIMEOUT; side-effecting ones to no timeout, since cancelling them midway
+    (a purge, a sent or scheduled message) would leave partial effects behind.
+    """
+    metadata = {"side_effects": True, "cache": None, "invalidates": []}
+    metadata.update(TOOL_METADATA.get(tool_name, {}))
+    if "timeout" not in metadata:
+        metadata["timeout"] = None if metadata["side_effects"] else TOOL_DEFAULT_TIMEOUT
+    return metadata
+
+def get_tool_cache_key(cog: commands.Cog, tool_name: str, function_args: Dict[str, Any], policy: Dict[str, Any]) -> Optional[Tuple]:
+    """Builds the cache key for a tool call under its cache policy. Returns None if the call shouldn't be cached."""
+    scope = policy.get("scope", "global")
+    scope_id = None
+    if scope == "channel":
+        if not cog.current_channel: return None
+        scope_id = cog.current_channel.id
+    elif scope == "guild":
+        guild = getattr(cog.current_channel, 'guild', None)
+        if not guild: return None
+        scope_id = guild.id
+
+    key_args = policy.get("key_args")
+    if key_args is not None:
+        function_args = {name: function_args.get(name) for name in key_args}
+    try:
+        args_key = json.dumps(function_args, sort_keys=True, default=str)
+    except (TypeError, ValueError):
+        return None
+    return (tool_name, scope, scope_id, args_key)
+
+def get_cached_tool_result(cog: commands.Cog, cache_key: Tuple) -> Optional[Dict[str, Any]]:
+    """Returns a cached tool result if present and not expired."""
+    entry = cog.tool_result_cache.get(cache_key)
+    if not entry:
+        return None
+    expires_at, result = entry
+    if time.monotonic() >= expires_at:
+        del cog.tool_result_cache[cache_key]
+        return None
+    return result
+
+def store_tool_result(cog: commands.Cog, cache_key: Tuple, result: Dict[str, Any], ttl: float):
+    """Caches a tool result, evicting expired and then oldest entries beyond TOOL_CACHE_MAX_ENTRIES."""
+    cache = cog.tool_result_cache
+    cache.pop(cache_key, None) # Re-insert so dict order stays oldest-first
+    cache[cache_key] = (time.monotonic() + ttl, result)
+    if len(cache) > TOOL_CACHE_MAX_ENTRIES:
+        now = time.monotonic()
+        for key in [k for k, (expires_at, _) in cache.items() if expires_at <= now]:
+            del cache[key]
+        while len(cache) > TOOL_CACHE_MAX_ENTRIES:
+            del cache[next(iter(cache))]
+
+def invalidate_tool_results(cog: commands.Cog, tool_names: List[str]) -> int:
+    """Drops all cached results for the given tools. Returns the number of entries removed."""
+    stale_keys = [key for key in cog.tool_result_cache if key[0] in tool_names]
+    for key in stale_keys:
+        del cog.tool_result_cache[key]
+    return len(stale_keys)
@@ -8,6 +8,8 @@ import json
 import os
 from typing import TYPE_CHECKING, Optional, Tuple, Dict, Any
 
+from .config import STREAM_FIRST_CHUNK_CHARS, STREAM_EDIT_INTERVAL
+
 if TYPE_CHECKING:
     from .cog import GurtCog # For type hinting
 
@@ -132,16 +134,8 @@ def format_message(cog: 'GurtCog', message: discord.Message) -> Dict[str, Any]:
     return formatted_msg
 
 def update_relationship(cog: 'GurtCog', user_id_1: str, user_id_2: str, change: float):
-    """Updates the relationship score between two users."""
-    # Ensure consistent key order
-    if user_id_1 > user_id_2: user_id_1, user_id_2 = user_id_2, user_id_1
-    # Initialize user_id_1's dict if not present
-    if user_id_1 not in cog.user_relationships: cog.user_relationships[user_id_1] = {}
-
-    current_score = cog.user_relationships[user_id_1].get(user_id_2, 0.0)
-    new_score = max(0.0, min(current_score + change, 100.0)) # Clamp 0-100
-    cog.user_relationships[user_id_1][user_id_2] = new_score
-    # print(f"Updated relationship {user_id_1}-{user_id_2}: {current_score:.1f} -> {new_score:.1f} ({change:+.1f})") # Debug log
+    """Updates the relationship score between two users (clamped 0-100)."""
+    cog.user_relationships.update(user_id_1, user_id_2, change)
 
 async def simulate_human_typing(cog: 'GurtCog', channel, text: str):
     """Shows typing indicator without significant delay."""
@@ -160,6 +154,132 @@ async def simulate_human_typing(cog: 'GurtCog', channel, text: str):
             print(f"Warning: Error during typing simulation in {channel.id}: {e}")
     # else: print(f"Skipping typing simulation in {channel.id} due to missing permissions.") # Optional debug
 
+async def resolve_ping_placeholders(cog: 'GurtCog', text: str, resolved: Optional[Dict[str, str]] = None) -> str:
+    """
+    Replaces [PING: name] placeholders with user mentions, falling back to the plain name if the user can't be found.
+    Pass a dict as `resolved` to reuse lookups across repeated calls on the same response.
+    """
+    ping_matches = re.findall(r'\[PING:\s*([^\]]+)\s*\]', text)
+    if not ping_matches:
+        return text
+    from .tools import get_user_id # Imported here to avoid a circular import
+    for user_name_to_ping in ping_matches:
+        if resolved is None or user_name_to_ping not in resolved:
+            user_id_result = await get_user_id(cog, user_name_to_ping.strip())
+            user_id_to_ping = user_id_result.get("user_id") if user_id_result and user_id_result.get("status") == "success" else None
+            if user_id_to_ping:
+                replacement = f'<@{user_id_to_ping}>'
+                print(f"Replaced ping placeholder for '{user_name_to_ping}' with {replacement}")
+            else:
+                replacement = user_name_to_ping # Replace with name as fallback
+                print(f"Warning: Could not find user ID for ping placeholder '{user_name_to_ping}'. Error: {(user_id_result or {}).get('error')}")
+            if resolved is None:
+                text = text.replace(f'[PING: {user_name_to_ping}]', replacement, 1)
+                continue
+            resolved[user_name_to_ping] = replacement
+        text = text.replace(f'[PING: {user_name_to_ping}]', resolved[user_name_to_ping], 1)
+    return text
+
+class StreamingMessageSender:
+    """
+    Delivers a streamed response progressively: sends a message once the first sentence
+    (or STREAM_FIRST_CHUNK_CHARS characters) of content is available, then edits it as more
+    arrives, at most once per STREAM_EDIT_INTERVAL. Pass update() as the stream_handler of
+    get_ai_response and call finalize() with the validated final content.
+    """
+    MAX_MESSAGE_LENGTH = 1900 # Longer responses are sent as a file by the listener instead
+
+    def __init__(self, cog: 'GurtCog', original_message: discord.Message):
+        self.cog = cog
+        self.original_message = original_message
+        self.sent_message: Optional[discord.Message] = None
+        self.first_sent_at: Optional[float] = None # time.monotonic() of the first send
+        self._shown_text = ""
+        self._last_edit_time = 0.0
+        self._resolved_pings: Dict[str, str] = {}
+        self._lock = asyncio.Lock()
+        self._stopped = False
+
+    def _displayable(self, content: str, complete: bool) -> str:
+        """Trims partial content to what is safe to show: no half-received ping placeholder or word."""
+        if complete:
+            return content
+        open_bracket = content.rfind('[')
+        if open_bracket != -1 and ']' not in content[open_bracket:]:
+            content = content[:open_bracket]
+        last_space = max(content.rfind(' '), content.rfind('\n'))
+        return content[:last_space + 1].rstrip() if last_space != -1 else ""
+
+    async def update(self, fields: Dict[str, Any]):
+        """Stream handler; receives the fields parsed from the response so far."""
+        if self._stopped or fields.get("should_respond") is not True or not fields.get("content"):
+            return
+        async with self._lock:
+            display_text = self._displayable(fields["content"], fields.get("content_complete", False))
+            if not display_text or display_text == self._shown_text:
+                return
+            if len(display_text) > self.MAX_MESSAGE_LENGTH:
+                self._stopped = True # Leave the rest to finalize()
+                return
+            try:
+                if self.sent_message is None:
+                    has_sentence = re.search(r'[.!?](\s|$)', display_text) is not None
+                    if not (has_sentence or len(display_text) >= STREAM_FIRST_CHUNK_CHARS or fields.get("content_complete")):
+                        return
+                    message_reference = None
+                    reply_to_id = fields.get("reply_to_message_id")
+                    if reply_to_id and reply_to_id.isdigit():
+                        message_reference = discord.MessageReference(
+                            message_id=int(reply_to_id), channel_id=self.original_message.channel.id, fail_if_not_exists=False
+                        )
+                    text = await resolve_ping_placeholders(self.cog, display_text, self._resolved_pings)
+                    self.sent_message = await self.original_message.channel.send(text, reference=message_reference, mention_author=True)
+                    self.first_sent_at = time.monotonic()
+                    self._last_edit_time = self.first_sent_at
+                    print(f"Sent first streamed chunk ({len(text)} chars) for message {self.original_message.id}.")
+                elif time.monotonic() - self._last_edit_time >= STREAM_EDIT_INTERVAL:
+                    text = await resolve_ping_placeholders(self.cog, display_text, self._resolved_pings)
+                    await self.sent_message.edit(content=text)
+                    self._last_edit_time = time.monotonic()
+                else:
+                    return
+                self._shown_text = display_text
+            except Exception as e:
+                print(f"Error delivering streamed response chunk: {e}")
+                self._stopped = True
+
+    async def finalize(self, final_text: str) -> Optional[discord.Message]:
+        """
+        Edits the streamed message to the final content, resolving any ping placeholders.
+        Returns the message, or None if it couldn't be finalized (it is deleted in that case, so the caller can send normally).
+        """
+        async with self._lock:
+            self._stopped = True
+            if self.sent_message is None:
+                return None
+            final_text = await resolve_ping_placeholders(self.cog, final_text, self._resolved_pings)
+            if len(final_text) > self.MAX_MESSAGE_LENGTH:
+                await self.abort()
+                return None
+            try:
+                if final_text != self.sent_message.content:
+                    self.sent_message = await self.sent_message.edit(content=final_text)
+                return self.sent_message
+            except Exception as e:
+                print(f"Error finalizing streamed message: {e}")
+                await self.abort()
+                return None
+
+    async def abort(self):
+        """Deletes a partially streamed message, e.g. when the final response turned out invalid."""
+        self._stopped = True
+        if self.sent_message is not None:
+            try:
+                await self.sent_message.delete()
+            except Exception as e:
+                print(f"Error deleting partial streamed message: {e}")
+            self.sent_message = None
+
 async def log_internal_api_call(cog: 'GurtCog', task_description: str, payload: Dict[str, Any], response_data: Optional[Dict[str, Any]], error: Optional[Exception] = None):
     """Helper function to log internal API calls to a file."""
     log_dir = "data"
@@ -4,6 +4,7 @@ import os
 import asyncio
 import sys
 from dotenv import load_dotenv
+import metrics # Process-wide metrics registry, scraped from GURT_METRICS_PORT
 
 # Load environment variables from .env file
 load_dotenv()
@@ -55,8 +56,13 @@ async def main(minimal_prompt: bool = False):
     # Note: Vertex AI authentication is handled by the library using ADC or GOOGLE_APPLICATION_CREDENTIALS.
     # No explicit API key check is needed here. Ensure GCP_PROJECT_ID and GCP_LOCATION are set in .env
 
+    metrics_server = None
     try:
         async with bot:
+            # Gurt's LLM/tool metrics plus command latency and gateway events, if GURT_METRICS_PORT is set
+            metrics.instrument_bot(bot)
+            metrics_server = await metrics.start_metrics_server_from_env("GURT_METRICS_PORT")
+
             # List of cogs to load
             # Updated path for the refactored GurtCog
             cogs = ["gurt.cog"]#, "cogs.profile_updater_cog"]
@@ -73,6 +79,9 @@ async def main(minimal_prompt: bool = False):
             await bot.start(TOKEN)
     except Exception as e:
         print(f"Error starting Gurt Bot: {e}")
+    finally:
+        if metrics_server:
+            await metrics_server.stop()
 
 # Run the main async function
 if __name__ == '__main__':
@@ -131,7 +131,10 @@ function renderStats(stats) {
         toolStatsContainer.appendChild(createStatItem('No tool calls recorded yet.', ''));
     } else {
         for (const [tool, data] of Object.entries(toolStats)) {
-            const value = `Success: ${data.success || 0}, Failure: ${data.failure || 0}, Avg Time: ${data.average_time_ms || 0} ms, Count: ${data.count || 0}`;
+            let value = `Success: ${data.success || 0}, Failure: ${data.failure || 0}, Avg Time: ${data.average_time_ms || 0} ms, Count: ${data.count || 0}`;
+            if (data.cache_hits || data.cache_misses) {
+                value += `, Cache Hits: ${data.cache_hits || 0} (${Math.round((data.cache_hit_rate || 0) * 100)}%)`;
+            }
             toolStatsContainer.appendChild(createStatItem(tool, value, true));
         }
     }
@@ -1,4 +1,3 @@
-import aiosqlite
 import asyncio
 import os
 import time
@@ -7,10 +6,11 @@ import re
 import hashlib # Added for chroma_id generation
 import json # Added for personality trait serialization/deserialization
 from typing import Dict, List, Any, Optional, Tuple, Union # Added Union
-import chromadb
-from chromadb.utils import embedding_functions
-from sentence_transformers import SentenceTransformer
 import logging
+from collections import deque
+import numpy as np
+from db.sqlite_pool import SQLitePool
+from embedding_models import get_embedding_model # Process-wide model (or embedding worker) shared with the other bots
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -23,7 +23,15 @@ INTEREST_MIN_LEVEL = 0.0
 INTEREST_DECAY_RATE = 0.02 # Default decay rate per cycle
 INTEREST_DECAY_INTERVAL_HOURS = 24 # Default interval for decay check
 
+# Hybrid fact retrieval (retrieve())
+RRF_K = 60 # Reciprocal rank fusion constant; higher flattens the difference between ranks
+FACT_RECENCY_WEIGHT = 0.2 # Max relative boost for a brand new fact
+FACT_RECENCY_HALF_LIFE_DAYS = 30 # Age at which the recency boost has halved
+DEFERRED_FACT_WRITES_MAX = 1000 # Fact embedding writes buffered while semantic memory is still loading
+
 # --- Helper Function for Keyword Scoring ---
+KEYWORD_STOPWORDS = {"the", "a", "is", "in", "it", "of", "and", "to", "for", "on", "with", "that", "this", "i", "you", "me", "my", "your"}
+
 def calculate_keyword_score(text: str, context: str) -> int:
     """Calculates a simple keyword overlap score."""
     if not context or not text:
@@ -31,9 +39,8 @@ def calculate_keyword_score(text: str, context: str) -> int:
     context_words = set(re.findall(r'\b\w+\b', context.lower()))
     text_words = set(re.findall(r'\b\w+\b', text.lower()))
     # Ignore very common words (basic stopword list)
-    stopwords = {"the", "a", "is", "in", "it", "of", "and", "to", "for", "on", "with", "that", "this", "i", "you", "me", "my", "your"}
-    context_words -= stopwords
-    text_words -= stopwords
+    context_words -= KEYWORD_STOPWORDS
+    text_words -= KEYWORD_STOPWORDS
     if not context_words: # Avoid division by zero if context is only stopwords
         return 0
     overlap = len(context_words.intersection(text_words))
@@ -42,14 +49,29 @@ def calculate_keyword_score(text: str, context: str) -> int:
     score = overlap # Simpler score for now
     return score
 
+# --- Helper Function for Message Importance (used by semantic memory compaction) ---
+def estimate_message_importance(text: str, metadata: Dict[str, Any]) -> float:
+    """Scores how worth keeping a message embedding is, from 0 to 1. An explicit 'importance' in the metadata wins."""
+    if metadata.get("importance") is not None:
+        return float(metadata["importance"])
+    word_count = metadata["word_count"] if metadata.get("word_count") is not None else len(text.split())
+    score = min(word_count / 40, 0.6) # Longer messages tend to carry more content than "lol"
+    if metadata.get("mentions_bot"):
+        score += 0.4 # Directed at the bot
+    if metadata.get("has_attachments"):
+        score += 0.2
+    return min(score, 1.0)
+
 class MemoryManager:
     """Handles database interactions for Gurt's memory (facts and semantic)."""
 
-    def __init__(self, db_path: str, max_user_facts: int = 20, max_general_facts: int = 100, semantic_model_name: str = 'all-MiniLM-L6-v2', chroma_path: str = "data/chroma_db"):
+    def __init__(self, db_path: str, max_user_facts: int = 20, max_general_facts: int = 100, semantic_model_name: str = 'all-MiniLM-L6-v2', chroma_path: str = "data/chroma_db", use_embedding_service: bool = False):
         self.db_path = db_path
         self.max_user_facts = max_user_facts
         self.max_general_facts = max_general_facts
-        self.db_lock = asyncio.Lock() # Lock for SQLite operations
+        self.db_pool = SQLitePool(self.db_path) # Persistent WAL connections (1 writer + readers), opened lazily
+        self.message_fts_available = False # Set once the FTS5 message index has been created
+        self.fact_fts_available = False # Set once the FTS5 fact indexes have been created
 
         # Ensure data directories exist
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
@@ -59,23 +81,37 @@ class MemoryManager:
         # --- Semantic Memory Setup ---
         self.chroma_path = chroma_path
         self.semantic_model_name = semantic_model_name
+        self.use_embedding_service = use_embedding_service # Encode in the shared out-of-process worker (embedding_models.EmbeddingService)
         self.chroma_client = None
         self.embedding_function = None
         self.semantic_collection = None # For messages
         self.fact_collection = None # For facts
         self.transformer_model = None
-        self._initialize_semantic_memory_sync() # Initialize semantic components synchronously for simplicity during init
+        # Loaded later by initialize_semantic_memory() so constructing the manager stays cheap.
+        # Until then the semantic collections are None and lookups fall back to SQLite.
+        self.semantic_state = "pending" # pending -> loading -> ready | failed
+        self.semantic_init_timings: Dict[str, float] = {} # Phase -> seconds
+        self._semantic_init_task: Optional[asyncio.Task] = None
+        self._deferred_fact_writes = deque() # (method, kwargs) replayed once ready, up to DEFERRED_FACT_WRITES_MAX
+        self._deferred_fact_resync = False # Set when the buffer overflowed; the fact collection is rebuilt from SQLite instead
 
     def _initialize_semantic_memory_sync(self):
-        """Synchronously initializes ChromaDB client, model, and collection."""
+        """Synchronously initializes ChromaDB client, model, and collections. Blocking; runs in a worker thread."""
+        timings = {}
         try:
+            phase_start = time.monotonic()
+            import chromadb # Deferred so importing this module doesn't pay for chromadb at startup
+            from chromadb.utils import embedding_functions
             logger.info("Initializing ChromaDB client...")
             # Use PersistentClient for saving data to disk
-            self.chroma_client = chromadb.PersistentClient(path=self.chroma_path)
+            chroma_client = chromadb.PersistentClient(path=self.chroma_path)
+            timings["chroma_client"] = time.monotonic() - phase_start
 
+            phase_start = time.monotonic()
             logger.info(f"Loading Sentence Transformer model: {self.semantic_model_name}...")
-            # Load the model directly
-            self.transformer_model = SentenceTransformer(self.semantic_model_name)
+            # Shared with any other MemoryManager in this process that uses the same model
+            transformer_model = get_embedding_model(self.semantic_model_name, use_service=self.use_embedding_service)
+            timings["model_load"] = time.monotonic() - phase_start
 
             # Create a custom embedding function using the loaded model
             class CustomEmbeddingFunction(embedding_functions.EmbeddingFunction):
@@ -93,40 +129,121 @@ class MemoryManager:
                     logger.debug(f"Generated {len(embeddings)} embeddings.")
                     return embeddings
 
-            self.embedding_function = CustomEmbeddingFunction(self.transformer_model)
+            embedding_function = CustomEmbeddingFunction(transformer_model)
 
+            phase_start = time.monotonic()
             logger.info("Getting/Creating ChromaDB collection 'gurt_semantic_memory'...")
             # Get or create the collection with the custom embedding function
-            self.semantic_collection = self.chroma_client.get_or_create_collection(
+            semantic_collection = chroma_client.get_or_create_collection(
                 name="gurt_semantic_memory",
-                embedding_function=self.embedding_function,
+                embedding_function=embedding_function,
                 metadata={"hnsw:space": "cosine"} # Use cosine distance for similarity
-            ) # Added missing closing parenthesis
+            )
             logger.info("ChromaDB message collection initialized successfully.")
 
             logger.info("Getting/Creating ChromaDB collection 'gurt_fact_memory'...")
             # Get or create the collection for facts
-            self.fact_collection = self.chroma_client.get_or_create_collection(
+            fact_collection = chroma_client.get_or_create_collection(
                 name="gurt_fact_memory",
-                embedding_function=self.embedding_function,
+                embedding_function=embedding_function,
                 metadata={"hnsw:space": "cosine"} # Use cosine distance for similarity
             )
             logger.info("ChromaDB fact collection initialized successfully.")
+            timings["collections"] = time.monotonic() - phase_start
+
+            # Publish everything at once so callers never see a half-initialized set of components
+            self.chroma_client = chroma_client
+            self.transformer_model = transformer_model
+            self.embedding_function = embedding_function
+            self.semantic_collection = semantic_collection
+            self.fact_collection = fact_collection
+            self.semantic_state = "ready"
 
         except Exception as e:
             logger.error(f"Failed to initialize semantic memory (ChromaDB): {e}", exc_info=True)
-            # Set components to None to indicate failure
-            self.chroma_client = None
-            self.transformer_model = None
-            self.embedding_function = None
-            self.semantic_collection = None
-            self.fact_collection = None # Also set fact_collection to None on error
+            # Leave components as None to indicate failure
+            self.semantic_state = "failed"
+        return timings
+
+    async def initialize_semantic_memory(self) -> Dict[str, float]:
+        """
+        Loads ChromaDB and the embedding model in a worker thread (once; concurrent callers share
+        the same load) and replays fact writes made while loading. Returns the per-phase timings.
+        """
+        if self._semantic_init_task is None:
+            self._semantic_init_task = asyncio.create_task(self._run_semantic_init())
+        await asyncio.shield(self._semantic_init_task)
+        return self.semantic_init_timings
+
+    async def _run_semantic_init(self):
+        self.semantic_state = "loading"
+        start_time = time.monotonic()
+        timings = await asyncio.to_thread(self._initialize_semantic_memory_sync)
+        timings["total"] = time.monotonic() - start_time
+        self.semantic_init_timings = timings
+        logger.info(f"Semantic memory {self.semantic_state} after {timings['total']:.2f}s ({', '.join(f'{k}={v:.2f}s' for k, v in timings.items() if k != 'total')})")
+
+        if self.semantic_state != "ready":
+            self._deferred_fact_writes.clear()
+            self._deferred_fact_resync = False
+            return
+        if self._deferred_fact_resync:
+            self._deferred_fact_resync = False
+            try:
+                added, deleted = await self._resync_fact_collection()
+                logger.info(f"Resynced fact embeddings from SQLite after deferred write overflow: added {added}, deleted {deleted}.")
+            except Exception as e:
+                logger.error(f"Error resyncing fact embeddings from SQLite: {e}", exc_info=True)
+            return
+        if self._deferred_fact_writes:
+            logger.info(f"Replaying {len(self._deferred_fact_writes)} fact embedding writes made while semantic memory was loading.")
+        while self._deferred_fact_writes:
+            method, kwargs = self._deferred_fact_writes.popleft()
+            try:
+                await asyncio.to_thread(getattr(self.fact_collection, method), **kwargs)
+            except Exception as e:
+                logger.error(f"ChromaDB error replaying deferred fact {method}: {e}", exc_info=True)
+
+    def _defer_fact_collection_write(self, method: str, **kwargs) -> bool:
+        """Buffers a fact_collection write while semantic memory is loading. Returns False if it will never load."""
+        if self.semantic_state not in ("pending", "loading"):
+            return False
+        if self._deferred_fact_resync:
+            return True # The resync once loaded picks this write up from SQLite
+        if len(self._deferred_fact_writes) >= DEFERRED_FACT_WRITES_MAX:
+            # Dropping buffered writes could lose deletes or reorder add/delete pairs, so
+            # discard the buffer and rebuild the collection from SQLite once loaded instead
+            logger.warning(f"More than {DEFERRED_FACT_WRITES_MAX} fact embedding writes buffered while semantic memory is loading; a full fact resync will run once it is ready.")
+            self._deferred_fact_writes.clear()
+            self._deferred_fact_resync = True
+            return True
+        self._deferred_fact_writes.append((method, kwargs))
+        return True
+
+    async def _resync_fact_collection(self, batch_size: int = 100) -> Tuple[int, int]:
+        """Makes fact_collection match the facts in SQLite: embeds missing facts and deletes orphaned ones. Returns (added, deleted)."""
+        user_rows = await self._db_fetchall("SELECT user_id, fact, chroma_id, timestamp FROM user_facts WHERE chroma_id IS NOT NULL")
+        general_rows = await self._db_fetchall("SELECT fact, chroma_id, timestamp FROM general_facts WHERE chroma_id IS NOT NULL")
+        deleted = await self._delete_orphaned_fact_embeddings()
+        existing_ids = set((await asyncio.to_thread(self.fact_collection.get, include=[])).get("ids") or [])
+
+        missing = [(chroma_id, fact, {"user_id": user_id, "type": "user", "timestamp": timestamp or time.time()})
+                   for user_id, fact, chroma_id, timestamp in user_rows if chroma_id not in existing_ids]
+        missing += [(chroma_id, fact, {"type": "general", "timestamp": timestamp or time.time()})
+                    for fact, chroma_id, timestamp in general_rows if chroma_id not in existing_ids]
+        for i in range(0, len(missing), batch_size):
+            batch = missing[i:i + batch_size]
+            await asyncio.to_thread(
+                self.fact_collection.add,
+                ids=[chroma_id for chroma_id, _, _ in batch],
+                documents=[fact for _, fact, _ in batch],
+                metadatas=[metadata for _, _, metadata in batch]
+            )
+        return len(missing), deleted
 
     async def initialize_sqlite_database(self):
         """Initializes the SQLite database and creates tables if they don't exist."""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("PRAGMA journal_mode=WAL;")
-
+        async with self.db_pool.transaction() as db:
             # Create user_facts table if it doesn't exist
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS user_facts (
@@ -182,6 +299,44 @@ class MemoryManager:
             # Create index for general_facts
             await db.execute("CREATE INDEX IF NOT EXISTS idx_general_facts_chroma_id ON general_facts (chroma_id);") # Index for chroma_id
 
+            # --- Full-text indexes over facts (keyword half of retrieve()) ---
+            # Standalone FTS5 tables keyed by the fact tables' rowids and kept in sync by triggers
+            try:
+                await db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS user_facts_fts USING fts5(fact, user_id UNINDEXED, timestamp UNINDEXED, tokenize='porter unicode61 remove_diacritics 2');")
+                await db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS general_facts_fts USING fts5(fact, timestamp UNINDEXED, tokenize='porter unicode61 remove_diacritics 2');")
+                await db.execute("""
+                    CREATE TRIGGER IF NOT EXISTS user_facts_fts_ai AFTER INSERT ON user_facts BEGIN
+                        INSERT INTO user_facts_fts (rowid, fact, user_id, timestamp) VALUES (new.rowid, new.fact, new.user_id, new.timestamp);
+                    END;
+                """)
+                await db.execute("""
+                    CREATE TRIGGER IF NOT EXISTS user_facts_fts_ad AFTER DELETE ON user_facts BEGIN
+                        DELETE FROM user_facts_fts WHERE rowid = old.rowid;
+                    END;
+                """)
+                await db.execute("""
+                    CREATE TRIGGER IF NOT EXISTS general_facts_fts_ai AFTER INSERT ON general_facts BEGIN
+                        INSERT INTO general_facts_fts (rowid, fact, timestamp) VALUES (new.rowid, new.fact, new.timestamp);
+                    END;
+                """)
+                await db.execute("""
+                    CREATE TRIGGER IF NOT EXISTS general_facts_fts_ad AFTER DELETE ON general_facts BEGIN
+                        DELETE FROM general_facts_fts WHERE rowid = old.rowid;
+                    END;
+                """)
+                # Backfill facts stored before the indexes existed
+                for table, columns in (("user_facts", "fact, user_id, timestamp"), ("general_facts", "fact, timestamp")):
+                    cursor = await db.execute(f"SELECT (SELECT COUNT(*) FROM {table}), (SELECT COUNT(*) FROM {table}_fts)")
+                    fact_count, indexed_count = await cursor.fetchone()
+                    if fact_count != indexed_count:
+                        logger.info(f"Rebuilding {table}_fts ({indexed_count} indexed, {fact_count} facts)")
+                        await db.execute(f"DELETE FROM {table}_fts")
+                        await db.execute(f"INSERT INTO {table}_fts (rowid, {columns}) SELECT rowid, {columns} FROM {table}")
+                self.fact_fts_available = True
+            except Exception as e:
+                # SQLite built without FTS5; retrieve() falls back to keyword overlap scoring
+                logger.warning(f"FTS5 unavailable, fact retrieval will use keyword overlap scoring: {e}")
+
             # --- Add Personality Table ---
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS gurt_personality (
@@ -273,25 +428,89 @@ class MemoryManager:
             logger.info("Internal Actions Log table created/verified.")
             # --- End Internal Actions Log Table ---
 
-            await db.commit()
+            # --- Message Index Table (local full-text search over observed messages) ---
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS message_index (
+                    message_id INTEGER PRIMARY KEY, -- Discord message ID, also the FTS rowid
+                    channel_id TEXT NOT NULL,
+                    guild_id TEXT,
+                    author_id TEXT NOT NULL,
+                    reply_to_author_id TEXT,
+                    mention_ids TEXT, -- Space separated, padded with spaces for LIKE matching
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    message_json TEXT NOT NULL -- format_message() output, returned by the search tools
+                );
+            """)
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_message_index_channel_time ON message_index (channel_id, created_at);")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_message_index_author_time ON message_index (author_id, created_at);")
+            try:
+                await db.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS message_index_fts USING fts5(
+                        content, content='message_index', content_rowid='message_id', tokenize='unicode61 remove_diacritics 2'
+                    );
+                """)
+                # Keep the external-content FTS table in sync with message_index
+                await db.execute("""
+                    CREATE TRIGGER IF NOT EXISTS message_index_ai AFTER INSERT ON message_index BEGIN
+                        INSERT INTO message_index_fts (rowid, content) VALUES (new.message_id, new.content);
+                    END;
+                """)
+                await db.execute("""
+                    CREATE TRIGGER IF NOT EXISTS message_index_ad AFTER DELETE ON message_index BEGIN
+                        INSERT INTO message_index_fts (message_index_fts, rowid, content) VALUES ('delete', old.message_id, old.content);
+                    END;
+                """)
+                await db.execute("""
+                    CREATE TRIGGER IF NOT EXISTS message_index_au AFTER UPDATE OF content ON message_index BEGIN
+                        INSERT INTO message_index_fts (message_index_fts, rowid, content) VALUES ('delete', old.message_id, old.content);
+                        INSERT INTO message_index_fts (rowid, content) VALUES (new.message_id, new.content);
+                    END;
+                """)
+                self.message_fts_available = True
+            except Exception as e:
+                # SQLite built without FTS5; searches fall back to LIKE over message_index
+                logger.warning(f"FTS5 unavailable, message search will use LIKE matching: {e}")
+            logger.info("Message index table created/verified.")
+            # --- End Message Index Table ---
+
+            # --- Runtime State Snapshot Tables (relationships, sentiment, etc. survive restarts) ---
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS gurt_relationships (
+                    user_id_1 INTEGER NOT NULL, -- Smaller of the two user IDs
+                    user_id_2 INTEGER NOT NULL,
+                    score REAL NOT NULL,
+                    last_updated REAL DEFAULT (unixepoch('now')),
+                    PRIMARY KEY (user_id_1, user_id_2)
+                ) WITHOUT ROWID;
+            """)
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_relationships_last_updated ON gurt_relationships (last_updated);")
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS gurt_runtime_state (
+                    state_key TEXT PRIMARY KEY NOT NULL,
+                    state_json TEXT NOT NULL,
+                    last_updated REAL DEFAULT (unixepoch('now'))
+                );
+            """)
+            logger.info("Runtime state tables created/verified.")
+            # --- End Runtime State Snapshot Tables ---
+
             logger.info(f"SQLite database initialized/verified at {self.db_path}")
 
     # --- SQLite Helper Methods ---
     async def _db_execute(self, sql: str, params: tuple = ()):
-        async with self.db_lock:
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute(sql, params)
-                await db.commit()
+        # Queued on the pool's writer and committed in a batch with other small writes
+        await self.db_pool.execute(sql, params)
 
     async def _db_fetchone(self, sql: str, params: tuple = ()) -> Optional[tuple]:
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute(sql, params) as cursor:
-                return await cursor.fetchone()
+        return await self.db_pool.fetchone(sql, params)
 
     async def _db_fetchall(self, sql: str, params: tuple = ()) -> List[tuple]:
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute(sql, params) as cursor:
-                return await cursor.fetchall()
+        return await self.db_pool.fetchall(sql, params)
+
+    async def close(self):
+        """Flushes pending writes and closes the SQLite connections."""
+        await self.db_pool.close()
 
     # --- User Fact Memory Methods (SQLite + Relevance) ---
 
@@ -351,6 +570,10 @@ class MemoryManager:
                 except Exception as chroma_e:
                     logger.error(f"ChromaDB error adding/deleting user fact for {user_id} (ID: {chroma_id}): {chroma_e}", exc_info=True)
                     # Note: Fact is still in SQLite, but ChromaDB might be inconsistent. Consider rollback? For now, just log.
+            elif self._defer_fact_collection_write("add", documents=[fact], metadatas=[{"user_id": user_id, "type": "user", "timestamp": time.time()}], ids=[chroma_id]):
+                if deleted_chroma_id:
+                    self._defer_fact_collection_write("delete", ids=[deleted_chroma_id])
+                logger.info(f"Semantic memory still loading. Queued embedding for user fact (ID: {chroma_id}).")
             else:
                  logger.warning(f"ChromaDB fact collection not available. Skipping embedding for user fact {user_id}.")
 
@@ -361,13 +584,13 @@ class MemoryManager:
             logger.error(f"Error adding user fact for {user_id}: {e}", exc_info=True)
             return {"error": f"Database error adding user fact: {str(e)}"}
 
-    async def get_user_facts(self, user_id: str, context: Optional[str] = None) -> List[str]:
+    async def get_user_facts(self, user_id: str, context: Optional[str] = None, limit: Optional[int] = None) -> List[str]:
         """Retrieves stored facts about a user, optionally scored by relevance to context."""
         if not user_id:
             logger.warning("get_user_facts called without user_id.")
             return []
         logger.info(f"Retrieving facts for user {user_id} (context provided: {bool(context)})")
-        limit = self.max_user_facts # Use the class attribute for limit
+        limit = min(max(1, limit or self.max_user_facts), self.max_user_facts) # Never return more than the per-user cap
 
         try:
             if context and self.fact_collection and self.embedding_function:
@@ -475,6 +698,10 @@ class MemoryManager:
                 except Exception as chroma_e:
                     logger.error(f"ChromaDB error adding/deleting general fact (ID: {chroma_id}): {chroma_e}", exc_info=True)
                     # Note: Fact is still in SQLite.
+            elif self._defer_fact_collection_write("add", documents=[fact], metadatas=[{"type": "general", "timestamp": time.time()}], ids=[chroma_id]):
+                if deleted_chroma_id:
+                    self._defer_fact_collection_write("delete", ids=[deleted_chroma_id])
+                logger.info(f"Semantic memory still loading. Queued embedding for general fact (ID: {chroma_id}).")
             else:
                  logger.warning(f"ChromaDB fact collection not available. Skipping embedding for general fact.")
 
@@ -626,21 +853,19 @@ class MemoryManager:
 
             if current_count == 0:
                 logger.info("Interests table is empty. Loading baseline interests...")
-                async with self.db_lock:
-                    async with aiosqlite.connect(self.db_path) as db:
-                        for topic, level in baseline_interests.items():
-                            topic_normalized = topic.lower().strip()
-                            if not topic_normalized: continue # Skip empty topics
-                            # Clamp initial level just in case
-                            level_clamped = max(INTEREST_MIN_LEVEL, min(INTEREST_MAX_LEVEL, level))
-                            await db.execute(
-                                """
-                                INSERT INTO gurt_interests (interest_topic, interest_level, last_updated)
-                                VALUES (?, ?, unixepoch('now'))
-                                """,
-                                (topic_normalized, level_clamped)
-                            )
-                        await db.commit()
+                async with self.db_pool.transaction() as db:
+                    for topic, level in baseline_interests.items():
+                        topic_normalized = topic.lower().strip()
+                        if not topic_normalized: continue # Skip empty topics
+                        # Clamp initial level just in case
+                        level_clamped = max(INTEREST_MIN_LEVEL, min(INTEREST_MAX_LEVEL, level))
+                        await db.execute(
+                            """
+                            INSERT INTO gurt_interests (interest_topic, interest_level, last_updated)
+                            VALUES (?, ?, unixepoch('now'))
+                            """,
+                            (topic_normalized, level_clamped)
+                        )
                 logger.info(f"Loaded {len(baseline_interests)} baseline interests.")
             else:
                 logger.info(f"Interests table already contains {current_count} interests. Skipping baseline load.")
@@ -668,37 +893,35 @@ class MemoryManager:
             return
 
         try:
-            async with self.db_lock:
-                async with aiosqlite.connect(self.db_path) as db:
-                    # Check if topic exists
-                    cursor = await db.execute("SELECT interest_level FROM gurt_interests WHERE interest_topic = ?", (topic,))
-                    row = await cursor.fetchone()
-
-                    if row:
-                        current_level = row[0]
-                        new_level = current_level + change
-                    else:
-                        # Topic doesn't exist, create it with initial level + change
-                        current_level = INTEREST_INITIAL_LEVEL # Use constant for initial level
-                        new_level = current_level + change
-                        logger.info(f"Creating new interest: '{topic}' with initial level {current_level:.3f} + change {change:.3f}")
-
-                    # Clamp the new level
-                    new_level_clamped = max(INTEREST_MIN_LEVEL, min(INTEREST_MAX_LEVEL, new_level))
-
-                    # Insert or update the topic
-                    await db.execute(
-                        """
-                        INSERT INTO gurt_interests (interest_topic, interest_level, last_updated)
-                        VALUES (?, ?, unixepoch('now'))
-                        ON CONFLICT(interest_topic) DO UPDATE SET
-                            interest_level = excluded.interest_level,
-                            last_updated = excluded.last_updated;
-                        """,
-                        (topic, new_level_clamped)
-                    )
-                    await db.commit()
-                    logger.info(f"Interest '{topic}' updated: {current_level:.3f} -> {new_level_clamped:.3f} (Change: {change:.3f})")
+            async with self.db_pool.transaction() as db:
+                # Check if topic exists
+                cursor = await db.execute("SELECT interest_level FROM gurt_interests WHERE interest_topic = ?", (topic,))
+                row = await cursor.fetchone()
+
+                if row:
+                    current_level = row[0]
+                    new_level = current_level + change
+                else:
+                    # Topic doesn't exist, create it with initial level + change
+                    current_level = INTEREST_INITIAL_LEVEL # Use constant for initial level
+                    new_level = current_level + change
+                    logger.info(f"Creating new interest: '{topic}' with initial level {current_level:.3f} + change {change:.3f}")
+
+                # Clamp the new level
+                new_level_clamped = max(INTEREST_MIN_LEVEL, min(INTEREST_MAX_LEVEL, new_level))
+
+                # Insert or update the topic
+                await db.execute(
+                    """
+                    INSERT INTO gurt_interests (interest_topic, interest_level, last_updated)
+                    VALUES (?, ?, unixepoch('now'))
+                    ON CONFLICT(interest_topic) DO UPDATE SET
+                        interest_level = excluded.interest_level,
+                        last_updated = excluded.last_updated;
+                    """,
+                    (topic, new_level_clamped)
+                )
+                logger.info(f"Interest '{topic}' updated: {current_level:.3f} -> {new_level_clamped:.3f} (Change: {change:.3f})")
 
         except Exception as e:
             logger.error(f"Error updating interest '{topic}': {e}", exc_info=True)
@@ -746,39 +969,37 @@ class MemoryManager:
             cutoff_timestamp = time.time() - (decay_interval_hours * 3600)
             logger.info(f"Applying interest decay (Rate: {decay_rate}) for interests not updated since {datetime.datetime.fromtimestamp(cutoff_timestamp).isoformat()}...")
 
-            async with self.db_lock:
-                async with aiosqlite.connect(self.db_path) as db:
-                    # Select topics eligible for decay
-                    cursor = await db.execute(
-                        "SELECT interest_topic, interest_level FROM gurt_interests WHERE last_updated < ?",
-                        (cutoff_timestamp,)
-                    )
-                    topics_to_decay = await cursor.fetchall()
-
-                    if not topics_to_decay:
-                        logger.info("No interests found eligible for decay.")
-                        return
-
-                    updated_count = 0
-                    # Apply decay and update
-                    for topic, current_level in topics_to_decay:
-                        # Calculate decay amount (ensure it doesn't go below min level instantly)
-                        decay_amount = current_level * decay_rate
-                        new_level = current_level - decay_amount
-                        # Ensure level doesn't drop below the minimum threshold due to decay
-                        new_level_clamped = max(INTEREST_MIN_LEVEL, new_level)
-
-                        # Only update if the level actually changes significantly
-                        if abs(new_level_clamped - current_level) > 0.001:
-                            await db.execute(
-                                "UPDATE gurt_interests SET interest_level = ? WHERE interest_topic = ?",
-                                (new_level_clamped, topic)
-                            )
-                            logger.debug(f"Decayed interest '{topic}': {current_level:.3f} -> {new_level_clamped:.3f}")
-                            updated_count += 1
-
-                    await db.commit()
-                    logger.info(f"Interest decay cycle complete. Updated {updated_count}/{len(topics_to_decay)} eligible interests.")
+            async with self.db_pool.transaction() as db:
+                # Select topics eligible for decay
+                cursor = await db.execute(
+                    "SELECT interest_topic, interest_level FROM gurt_interests WHERE last_updated < ?",
+                    (cutoff_timestamp,)
+                )
+                topics_to_decay = await cursor.fetchall()
+
+                if not topics_to_decay:
+                    logger.info("No interests found eligible for decay.")
+                    return
+
+                updated_count = 0
+                # Apply decay and update
+                for topic, current_level in topics_to_decay:
+                    # Calculate decay amount (ensure it doesn't go below min level instantly)
+                    decay_amount = current_level * decay_rate
+                    new_level = current_level - decay_amount
+                    # Ensure level doesn't drop below the minimum threshold due to decay
+                    new_level_clamped = max(INTEREST_MIN_LEVEL, new_level)
+
+                    # Only update if the level actually changes significantly
+                    if abs(new_level_clamped - current_level) > 0.001:
+                        await db.execute(
+                            "UPDATE gurt_interests SET interest_level = ? WHERE interest_topic = ?",
+                            (new_level_clamped, topic)
+                        )
+                        logger.debug(f"Decayed interest '{topic}': {current_level:.3f} -> {new_level_clamped:.3f}")
+                        updated_count += 1
+
+                logger.info(f"Interest decay cycle complete. Updated {updated_count}/{len(topics_to_decay)} eligible interests.")
 
         except Exception as e:
             logger.error(f"Error during interest decay: {e}", exc_info=True)
@@ -821,7 +1042,7 @@ class MemoryManager:
             await asyncio.to_thread(
                 self.semantic_collection.add,
                 documents=[text_to_embed], # Embed the combined text
-                metadatas=[metadata],
+                metadatas=[{**metadata, "word_count": len(text_to_embed.split())}], # Lets compaction score it without loading the text
                 ids=[message_id]
             )
             logger.info(f"Successfully added message {message_id} to ChromaDB.")
@@ -896,6 +1117,8 @@ class MemoryManager:
                 except Exception as chroma_e:
                     logger.error(f"ChromaDB error deleting user fact ID {deleted_chroma_id}: {chroma_e}", exc_info=True)
                     # Log error but consider SQLite deletion successful
+            elif deleted_chroma_id:
+                self._defer_fact_collection_write("delete", ids=[deleted_chroma_id])
 
             return {"status": "deleted", "user_id": user_id, "fact_deleted": fact_to_delete}
 
@@ -931,6 +1154,8 @@ class MemoryManager:
                 except Exception as chroma_e:
                     logger.error(f"ChromaDB error deleting general fact ID {deleted_chroma_id}: {chroma_e}", exc_info=True)
                     # Log error but consider SQLite deletion successful
+            elif deleted_chroma_id:
+                self._defer_fact_collection_write("delete", ids=[deleted_chroma_id])
 
             return {"status": "deleted", "fact_deleted": fact_to_delete}
 
@@ -938,6 +1163,283 @@ class MemoryManager:
             logger.error(f"Error deleting general fact: {e}", exc_info=True)
             return {"error": f"Database error deleting general fact: {str(e)}"}
 
+    # --- Hybrid Fact Retrieval ---
+
+    @staticmethod
+    def _build_fts_any_query(text: str) -> Optional[str]:
+        """Turns free text into an FTS5 query matching any of its (non-stopword) words."""
+        words = [word for word in re.findall(r'\w+', text.lower()) if word not in KEYWORD_STOPWORDS]
+        if not words:
+            return None
+        return " OR ".join(f'"{word}"' for word in dict.fromkeys(words))
+
+    async def _vector_fact_candidates(self, query: str, scope: str, n: int) -> List[Tuple[str, float]]:
+        """Top-n (fact, timestamp) pairs for the scope from the ChromaDB fact collection, best first."""
+        if not self.fact_collection:
+            return []
+        if scope == "general":
+            where = {"type": "general"}
+        else:
+            where = {"$and": [{"user_id": scope}, {"type": "user"}]}
+        try:
+            results = await asyncio.to_thread(
+                self.fact_collection.query, query_texts=[query], n_results=n, where=where, include=["documents", "metadatas"]
+            )
+        except Exception as e:
+            logger.error(f"ChromaDB error retrieving facts for scope {scope}: {e}", exc_info=True)
+            return []
+        documents = (results.get("documents") or [[]])[0]
+        metadatas = (results.get("metadatas") or [[]])[0]
+        return [(document, float((metadata or {}).get("timestamp", 0))) for document, metadata in zip(documents, metadatas)]
+
+    async def _keyword_fact_candidates(self, query: str, scope: str, n: int) -> List[Tuple[str, float]]:
+        """Top-n (fact, timestamp) pairs for the scope by BM25 (or keyword overlap without FTS5), best first."""
+        try:
+            fts_query = self._build_fts_any_query(query) if self.fact_fts_available else None
+            if self.fact_fts_available and not fts_query:
+                return [] # Only stopwords
+            if fts_query:
+                if scope == "general":
+                    rows = await self._db_fetchall(
+                        "SELECT fact, timestamp FROM general_facts_fts WHERE general_facts_fts MATCH ? ORDER BY bm25(general_facts_fts) LIMIT ?",
+                        (fts_query, n)
+                    )
+                else:
+                    rows = await self._db_fetchall(
+                        "SELECT fact, timestamp FROM user_facts_fts WHERE user_facts_fts MATCH ? AND user_id = ? ORDER BY bm25(user_facts_fts) LIMIT ?",
+                        (fts_query, scope, n)
+                    )
+                return [(row[0], float(row[1] or 0)) for row in rows]
+
+            # No FTS5: score the scope's facts by keyword overlap
+            if scope == "general":
+                rows = await self._db_fetchall("SELECT fact, timestamp FROM general_facts", ())
+            else:
+                rows = await self._db_fetchall("SELECT fact, timestamp FROM user_facts WHERE user_id = ?", (scope,))
+            scored = [(calculate_keyword_score(row[0], query), row[0], float(row[1] or 0)) for row in rows]
+            scored = sorted((item for item in scored if item[0] > 0), key=lambda item: item[0], reverse=True)
+            return [(fact, timestamp) for _, fact, timestamp in scored[:n]]
+        except Exception as e:
+            logger.error(f"Error retrieving keyword fact candidates for scope {scope}: {e}", exc_info=True)
+            return []
+
+    async def retrieve(self, query: str, scope: str = "general", k: int = 5, candidates: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Hybrid fact retrieval. Fetches candidates from the vector index and the keyword (BM25) index in
+        parallel, fuses the two rankings with reciprocal rank fusion and applies a small recency boost.
+
+        scope is "general" for general facts, or a user ID for that user's facts. Returns up to k dicts
+        (fact, score, vector_rank, keyword_rank, timestamp), best first. Works with either index alone,
+        e.g. while semantic memory is still loading.
+        """
+        if not query or k <= 0:
+            return []
+        n = candidates or max(k * 4, 20)
+        vector_results, keyword_results = await asyncio.gather(
+            self._vector_fact_candidates(query, scope, n),
+            self._keyword_fact_candidates(query, scope, n)
+        )
+
+        fused: Dict[str, Dict[str, Any]] = {}
+        for source, results in (("vector_rank", vector_results), ("keyword_rank", keyword_results)):
+            for rank, (fact, timestamp) in enumerate(results, start=1):
+                entry = fused.setdefault(fact, {"fact": fact, "score": 0.0, "vector_rank": None, "keyword_rank": None, "timestamp": timestamp})
+                entry[source] = rank
+                entry["score"] += 1.0 / (RRF_K + rank)
+                entry["timestamp"] = max(entry["timestamp"], timestamp)
+
+        now = time.time()
+        for entry in fused.values():
+            age_days = max(0.0, now - entry["timestamp"]) / 86400 if entry["timestamp"] else None
+            if age_days is not None:
+                entry["score"] *= 1 + FACT_RECENCY_WEIGHT * 0.5 ** (age_days / FACT_RECENCY_HALF_LIFE_DAYS)
+
+        ranked = sorted(fused.values(), key=lambda entry: entry["score"], reverse=True)
+        return ranked[:k]
+
+    # --- Semantic Memory Compaction ---
+
+    def _measure_semantic_memory_sync(self, probe_query: str = "what did we talk about") -> Dict[str, Any]:
+        """Collection sizes, on-disk size and the latency of one probe query per collection. Blocking."""
+        disk_bytes = 0
+        for root, _, files in os.walk(self.chroma_path):
+            for name in files:
+                try:
+                    disk_bytes += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        measurement = {"disk_mb": round(disk_bytes / (1024 * 1024), 2)}
+        for label, collection in (("messages", self.semantic_collection), ("facts", self.fact_collection)):
+            count = collection.count()
+            measurement[f"{label}_count"] = count
+            if count:
+                start_time = time.monotonic()
+                collection.query(query_texts=[probe_query], n_results=min(5, count))
+                measurement[f"{label}_query_ms"] = round((time.monotonic() - start_time) * 1000, 2)
+        return measurement
+
+    def _prune_message_embeddings_sync(self, retention_days: float, important_retention_days: float, keep_importance: float, page_size: int = 1000) -> int:
+        """Deletes message embeddings past their retention. Important messages are kept longer. Blocking."""
+        now = time.time()
+        to_delete = []
+        offset = 0
+        # Everything younger than retention_days is kept regardless of importance, so only page through older entries
+        where = {"timestamp": {"$lt": now - retention_days * 86400}}
+        while True:
+            page = self.semantic_collection.get(where=where, include=["metadatas"], limit=page_size, offset=offset)
+            ids = page.get("ids") or []
+            if not ids:
+                break
+            unscored = {} # Stored before word_count was recorded; their text is needed to score them
+            for doc_id, metadata in zip(ids, page.get("metadatas") or []):
+                metadata = metadata or {}
+                age_days = (now - float(metadata.get("timestamp", 0))) / 86400
+                if age_days > important_retention_days:
+                    to_delete.append(doc_id)
+                elif metadata.get("word_count") is None and metadata.get("importance") is None:
+                    unscored[doc_id] = metadata
+                elif estimate_message_importance("", metadata) < keep_importance:
+                    to_delete.append(doc_id)
+            if unscored:
+                documents = self.semantic_collection.get(ids=list(unscored), include=["documents"])
+                for doc_id, document in zip(documents.get("ids") or [], documents.get("documents") or []):
+                    if estimate_message_importance(document or "", unscored[doc_id]) < keep_importance:
+                        to_delete.append(doc_id)
+            offset += len(ids)
+        for i in range(0, len(to_delete), page_size):
+            self.semantic_collection.delete(ids=to_delete[i:i + page_size])
+        return len(to_delete)
+
+    def _get_all_facts_sync(self) -> Dict[str, list]:
+        return self.fact_collection.get(include=["embeddings", "metadatas", "documents"])
+
+    async def _delete_orphaned_fact_embeddings(self) -> int:
+        """Deletes fact embeddings whose chroma_id no longer exists in SQLite."""
+        # Read ChromaDB first: facts are written to SQLite before ChromaDB, so any fact embedded
+        # by now is already in SQLite when it is read next, and isn't mistaken for an orphan
+        chroma_ids = (await asyncio.to_thread(self.fact_collection.get, include=[])).get("ids") or []
+        rows = await self._db_fetchall("SELECT chroma_id FROM user_facts WHERE chroma_id IS NOT NULL UNION SELECT chroma_id FROM general_facts WHERE chroma_id IS NOT NULL")
+        known_ids = {row[0] for row in rows}
+        orphaned = [chroma_id for chroma_id in chroma_ids if chroma_id not in known_ids]
+        if orphaned:
+            await asyncio.to_thread(self.fact_collection.delete, ids=orphaned)
+        return len(orphaned)
+
+    async def _merge_duplicate_facts(self, similarity_threshold: float) -> int:
+        """
+        Finds facts within the same scope (one user, or general) whose embeddings are at least
+        similarity_threshold cosine-similar, keeps the most recent one and deletes the rest from
+        SQLite and ChromaDB.
+        """
+        facts = await asyncio.to_thread(self._get_all_facts_sync)
+        ids = facts.get("ids") or []
+        if not ids:
+            return 0
+        scopes: Dict[str, List[int]] = {}
+        for index, metadata in enumerate(facts.get("metadatas") or []):
+            metadata = metadata or {}
+            scope = f"user-{metadata['user_id']}" if metadata.get("type") == "user" else "general"
+            scopes.setdefault(scope, []).append(index)
+
+        embeddings = np.asarray(facts["embeddings"], dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.maximum(norms, 1e-12)
+        metadatas = facts["metadatas"]
+
+        duplicate_ids = set()
+        for indices in scopes.values():
+            if len(indices) < 2:
+                continue
+            # Newest first, so the fact that survives a merge is the most recent phrasing
+            indices = sorted(indices, key=lambda i: float((metadatas[i] or {}).get("timestamp", 0)), reverse=True)
+            similarities = embeddings[indices] @ embeddings[indices].T
+            for a in range(len(indices)):
+                if ids[indices[a]] in duplicate_ids:
+                    continue
+                for b in range(a + 1, len(indices)):
+                    if similarities[a, b] >= similarity_threshold:
+                        duplicate_ids.add(ids[indices[b]])
+
+        if duplicate_ids:
+            for chroma_id in duplicate_ids:
+                await self._db_execute("DELETE FROM user_facts WHERE chroma_id = ?", (chroma_id,))
+                await self._db_execute("DELETE FROM general_facts WHERE chroma_id = ?", (chroma_id,))
+            await asyncio.to_thread(self.fact_collection.delete, ids=list(duplicate_ids))
+        return len(duplicate_ids)
+
+    async def compact_semantic_memory(self, message_retention_days: float = 90, important_message_retention_days: float = 365,
+                                      keep_importance: float = 0.6, fact_similarity_threshold: float = 0.92) -> Dict[str, Any]:
+        """
+        Compacts the ChromaDB collections: prunes old message embeddings (important ones are kept
+        for important_message_retention_days), deletes fact embeddings missing from SQLite and merges
+        near-duplicate facts. Returns a report with sizes and probe query latency before and after.
+        """
+        if self.semantic_state != "ready":
+            return {"error": f"Semantic memory is not ready ({self.semantic_state})."}
+        start_time = time.monotonic()
+        report: Dict[str, Any] = {"before": await asyncio.to_thread(self._measure_semantic_memory_sync)}
+        try:
+            report["messages_pruned"] = await asyncio.to_thread(
+                self._prune_message_embeddings_sync, message_retention_days, important_message_retention_days, keep_importance
+            )
+            report["orphaned_facts_deleted"] = await self._delete_orphaned_fact_embeddings()
+            report["duplicate_facts_merged"] = await self._merge_duplicate_facts(fact_similarity_threshold)
+        except Exception as e:
+            logger.error(f"Error compacting semantic memory: {e}", exc_info=True)
+            report["error"] = str(e)
+        report["after"] = await asyncio.to_thread(self._measure_semantic_memory_sync)
+        report["duration_s"] = round(time.monotonic() - start_time, 2)
+        report["timestamp"] = time.time()
+        logger.info(f"Semantic memory compaction: {report}")
+        return report
+
+    # --- Runtime State Snapshot Methods (SQLite) ---
+
+    async def save_relationship_scores(self, rows: List[Tuple[int, int, float]]):
+        """Upserts (user_id_1, user_id_2, score) rows in a single transaction."""
+        if not rows:
+            return
+        async with self.db_pool.transaction() as db:
+            await db.executemany(
+                """
+                INSERT INTO gurt_relationships (user_id_1, user_id_2, score, last_updated) VALUES (?, ?, ?, unixepoch('now'))
+                ON CONFLICT(user_id_1, user_id_2) DO UPDATE SET score = excluded.score, last_updated = excluded.last_updated
+                """,
+                rows
+            )
+        logger.debug(f"Saved {len(rows)} relationship scores.")
+
+    async def get_relationship_scores(self, limit: int) -> List[Tuple[int, int, float]]:
+        """Returns the `limit` most recently updated (user_id_1, user_id_2, score) rows, oldest first."""
+        try:
+            return await self._db_fetchall(
+                """
+                SELECT user_id_1, user_id_2, score FROM (
+                    SELECT user_id_1, user_id_2, score, last_updated FROM gurt_relationships ORDER BY last_updated DESC LIMIT ?
+                ) ORDER BY last_updated ASC
+                """,
+                (limit,)
+            )
+        except Exception as e:
+            logger.error(f"Error loading relationship scores: {e}", exc_info=True)
+            return []
+
+    async def set_runtime_state(self, key: str, state_json: str):
+        """Stores a JSON snapshot of a runtime state structure under key."""
+        await self._db_execute(
+            "INSERT OR REPLACE INTO gurt_runtime_state (state_key, state_json, last_updated) VALUES (?, ?, unixepoch('now'))",
+            (key, state_json)
+        )
+
+    async def get_runtime_state(self, key: str) -> Optional[str]:
+        """Returns the JSON snapshot stored under key, or None."""
+        try:
+            row = await self._db_fetchone("SELECT state_json FROM gurt_runtime_state WHERE state_key = ?", (key,))
+            return row[0] if row else None
+        except Exception as e:
+            logger.error(f"Error loading runtime state '{key}': {e}", exc_info=True)
+            return None
+
     # --- Goal Management Methods (SQLite) ---
 
     async def add_goal(self, description: str, priority: int = 5, details: Optional[Dict[str, Any]] = None, guild_id: Optional[str] = None, channel_id: Optional[str] = None, user_id: Optional[str] = None) -> Dict[str, Any]:
@@ -953,17 +1455,15 @@ class MemoryManager:
                 logger.warning(f"Goal already exists: '{description}' (ID: {existing[0]})")
                 return {"status": "duplicate", "goal_id": existing[0], "description": description}
 
-            async with self.db_lock:
-                async with aiosqlite.connect(self.db_path) as db:
-                    cursor = await db.execute(
-                        """
-                        INSERT INTO gurt_goals (description, priority, details, status, last_updated, guild_id, channel_id, user_id)
-                        VALUES (?, ?, ?, 'pending', unixepoch('now'), ?, ?, ?)
-                        """,
-                        (description, priority, details_json, guild_id, channel_id, user_id)
-                    )
-                    await db.commit()
-                    goal_id = cursor.lastrowid
+            async with self.db_pool.transaction() as db:
+                cursor = await db.execute(
+                    """
+                    INSERT INTO gurt_goals (description, priority, details, status, last_updated, guild_id, channel_id, user_id)
+                    VALUES (?, ?, ?, 'pending', unixepoch('now'), ?, ?, ?)
+                    """,
+                    (description, priority, details_json, guild_id, channel_id, user_id)
+                )
+                goal_id = cursor.lastrowid
             logger.info(f"Goal added successfully (ID: {goal_id}): '{description}'")
             return {"status": "added", "goal_id": goal_id, "description": description}
         except Exception as e:
@@ -1028,13 +1528,11 @@ class MemoryManager:
         sql = f"UPDATE gurt_goals SET {', '.join(updates)} WHERE goal_id = ?"
 
         try:
-            async with self.db_lock:
-                async with aiosqlite.connect(self.db_path) as db:
-                    cursor = await db.execute(sql, tuple(params))
-                    await db.commit()
-                    if cursor.rowcount == 0:
-                        logger.warning(f"Goal ID {goal_id} not found for update.")
-                        return {"status": "not_found", "goal_id": goal_id}
+            async with self.db_pool.transaction() as db:
+                cursor = await db.execute(sql, tuple(params))
+                if cursor.rowcount == 0:
+                    logger.warning(f"Goal ID {goal_id} not found for update.")
+                    return {"status": "not_found", "goal_id": goal_id}
             logger.info(f"Goal ID {goal_id} updated successfully.")
             return {"status": "updated", "goal_id": goal_id}
         except Exception as e:
@@ -1045,13 +1543,11 @@ class MemoryManager:
         """Deletes a goal from the database."""
         logger.info(f"Attempting to delete goal ID {goal_id}")
         try:
-            async with self.db_lock:
-                async with aiosqlite.connect(self.db_path) as db:
-                    cursor = await db.execute("DELETE FROM gurt_goals WHERE goal_id = ?", (goal_id,))
-                    await db.commit()
-                    if cursor.rowcount == 0:
-                        logger.warning(f"Goal ID {goal_id} not found for deletion.")
-                        return {"status": "not_found", "goal_id": goal_id}
+            async with self.db_pool.transaction() as db:
+                cursor = await db.execute("DELETE FROM gurt_goals WHERE goal_id = ?", (goal_id,))
+                if cursor.rowcount == 0:
+                    logger.warning(f"Goal ID {goal_id} not found for deletion.")
+                    return {"status": "not_found", "goal_id": goal_id}
             logger.info(f"Goal ID {goal_id} deleted successfully.")
             return {"status": "deleted", "goal_id": goal_id}
         except Exception as e:
@@ -1072,17 +1568,15 @@ class MemoryManager:
         truncated_reasoning = reasoning[:max_len] + ('...' if reasoning and len(reasoning) > max_len else '') if reasoning else None
 
         try:
-            async with self.db_lock:
-                async with aiosqlite.connect(self.db_path) as db:
-                    cursor = await db.execute(
-                        """
-                        INSERT INTO internal_actions (tool_name, arguments_json, reasoning, result_summary, timestamp)
-                        VALUES (?, ?, ?, ?, unixepoch('now'))
-                        """,
-                        (tool_name, args_json, truncated_reasoning, truncated_summary)
-                    )
-                    await db.commit()
-                    action_id = cursor.lastrowid
+            async with self.db_pool.transaction() as db:
+                cursor = await db.execute(
+                    """
+                    INSERT INTO internal_actions (tool_name, arguments_json, reasoning, result_summary, timestamp)
+                    VALUES (?, ?, ?, ?, unixepoch('now'))
+                    """,
+                    (tool_name, args_json, truncated_reasoning, truncated_summary)
+                )
+                action_id = cursor.lastrowid
             logger.info(f"Internal action logged successfully (ID: {action_id}): Tool='{tool_name}'")
             return {"status": "logged", "action_id": action_id}
         except Exception as e:
@@ -1119,6 +1613,157 @@ class MemoryManager:
             logger.error(f"Error retrieving internal action logs: {e}", exc_info=True)
             return []
 
+    # --- Message Index Methods ---
+
+    async def index_message(self, message_data: Dict[str, Any], channel_id: str, guild_id: Optional[str] = None) -> bool:
+        """Adds or replaces a message (format_message() output) in the local full-text message index."""
+        try:
+            message_id = int(message_data['id'])
+            created_at = datetime.datetime.fromisoformat(message_data['created_at']).timestamp()
+        except (KeyError, TypeError, ValueError):
+            return False # Synthetic cache entries (tool turns etc.) aren't indexed
+        mention_ids = [str(m.get('id')) for m in message_data.get('mentions', []) if m.get('id')]
+        try:
+            await self._db_execute(
+                """
+                INSERT INTO message_index (message_id, channel_id, guild_id, author_id, reply_to_author_id, mention_ids, content, created_at, message_json)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(message_id) DO UPDATE SET content = excluded.content, message_json = excluded.message_json
+                """,
+                (
+                    message_id, str(channel_id), str(guild_id) if guild_id else None,
+                    str(message_data['author']['id']), message_data.get('replied_to_author_id'),
+                    f" {' '.join(mention_ids)} " if mention_ids else None,
+                    message_data.get('content') or "", created_at,
+                    json.dumps(message_data, default=str)
+                )
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Error indexing message {message_data.get('id')}: {e}", exc_info=True)
+            return False
+
+    async def update_indexed_message_content(self, message_id: str, content: str):
+        """Applies an edit to an indexed message (no-op if the message isn't indexed)."""
+        try:
+            await self._db_execute(
+                "UPDATE message_index SET content = ?, message_json = json_set(message_json, '$.content', ?) WHERE message_id = ?",
+                (content, content, int(message_id))
+            )
+        except Exception as e:
+            logger.error(f"Error updating indexed message {message_id}: {e}", exc_info=True)
+
+    async def remove_indexed_message(self, message_id: str):
+        """Removes a deleted message from the index."""
+        try:
+            await self._db_execute("DELETE FROM message_index WHERE message_id = ?", (int(message_id),))
+        except Exception as e:
+            logger.error(f"Error removing indexed message {message_id}: {e}", exc_info=True)
+
+    async def remove_indexed_messages(self, message_ids: List[str], chunk_size: int = 500):
+        """Removes bulk-deleted messages from the index, in chunks of chunk_size IDs per statement."""
+        ids = [int(message_id) for message_id in message_ids]
+        try:
+            for start in range(0, len(ids), chunk_size):
+                chunk = ids[start:start + chunk_size]
+                await self._db_execute(f"DELETE FROM message_index WHERE message_id IN ({','.join('?' * len(chunk))})", tuple(chunk))
+        except Exception as e:
+            logger.error(f"Error removing {len(ids)} indexed messages: {e}", exc_info=True)
+
+    async def prune_message_index(self, retention_days: float, max_rows: int) -> Tuple[int, Optional[float]]:
+        """
+        Deletes indexed messages older than retention_days, then the oldest beyond max_rows.
+        Returns (rows deleted, timestamp before which the index no longer has messages, or None).
+        """
+        cutoff = time.time() - retention_days * 86400
+        deleted = await self.db_pool.execute("DELETE FROM message_index WHERE created_at < ?", (cutoff,))
+        row = await self._db_fetchone("SELECT created_at FROM message_index ORDER BY created_at DESC LIMIT 1 OFFSET ?", (max(0, max_rows - 1),))
+        if row is not None:
+            # The max_rows-th newest message; everything older goes
+            cutoff = max(cutoff, row[0])
+            deleted += await self.db_pool.execute("DELETE FROM message_index WHERE created_at < ?", (cutoff,))
+        return deleted, cutoff if deleted else None
+
+    @staticmethod
+    def _build_fts_query(search_term: str) -> Optional[str]:
+        """Turns free text into a safe FTS5 query: all words must match, the last one as a prefix."""
+        words = re.findall(r'\w+', search_term.lower())
+        if not words:
+            return None
+        quoted = [f'"{word}"' for word in words]
+        quoted[-1] += '*'
+        return " ".join(quoted)
+
+    async def search_indexed_messages(self, search_term: str, channel_id: Optional[str] = None, author_id: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Full-text search over indexed messages, best matches first (BM25, ties broken by recency).
+        Returns format_message()-style dicts.
+        """
+        filters, params = [], []
+        if channel_id:
+            filters.append("m.channel_id = ?"); params.append(str(channel_id))
+        if author_id:
+            filters.append("m.author_id = ?"); params.append(str(author_id))
+        try:
+            fts_query = self._build_fts_query(search_term) if self.message_fts_available else None
+            if fts_query:
+                where = " AND ".join(["message_index_fts MATCH ?"] + filters)
+                rows = await self._db_fetchall(
+                    f"""
+                    SELECT m.message_json FROM message_index_fts
+                    JOIN message_index m ON m.message_id = message_index_fts.rowid
+                    WHERE {where}
+                    ORDER BY bm25(message_index_fts), m.created_at DESC
+                    LIMIT ?
+                    """,
+                    tuple([fts_query] + params + [limit])
+                )
+            else:
+                where = " AND ".join(["m.content LIKE ?"] + filters)
+                rows = await self._db_fetchall(
+                    f"SELECT m.message_json FROM message_index m WHERE {where} ORDER BY m.created_at DESC LIMIT ?",
+                    tuple([f"%{search_term}%"] + params + [limit])
+                )
+            return [json.loads(row[0]) for row in rows]
+        except Exception as e:
+            logger.error(f"Error searching message index for '{search_term}': {e}", exc_info=True)
+            return []
+
+    async def get_indexed_user_messages(self, author_id: str, channel_id: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Returns a user's most recent indexed messages, newest first."""
+        sql = "SELECT message_json FROM message_index WHERE author_id = ?"
+        params: List[Any] = [str(author_id)]
+        if channel_id:
+            sql += " AND channel_id = ?"
+            params.append(str(channel_id))
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        try:
+            rows = await self._db_fetchall(sql, tuple(params))
+            return [json.loads(row[0]) for row in rows]
+        except Exception as e:
+            logger.error(f"Error getting indexed messages for user {author_id}: {e}", exc_info=True)
+            return []
+
+    async def get_indexed_interactions(self, user_id_1: str, user_id_2: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Returns indexed messages where one user replied to or mentioned the other, newest first."""
+        try:
+            rows = await self._db_fetchall(
+                """
+                SELECT message_json FROM message_index
+                WHERE (author_id = ? AND (reply_to_author_id = ? OR mention_ids LIKE ?))
+                   OR (author_id = ? AND (reply_to_author_id = ? OR mention_ids LIKE ?))
+                ORDER BY created_at DESC
+                LIMIT ?
+                """,
+                (str(user_id_1), str(user_id_2), f"% {user_id_2} %",
+                 str(user_id_2), str(user_id_1), f"% {user_id_1} %", limit)
+            )
+            return [json.loads(row[0]) for row in rows]
+        except Exception as e:
+            logger.error(f"Error getting indexed interactions for {user_id_1}/{user_id_2}: {e}", exc_info=True)
+            return []
+
     # --- Add the new method below ---
     async def clear_internal_action_logs(self) -> Dict[str, Any]:
         """Deletes all records from the internal_actions table."""
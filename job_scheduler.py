@@ -0,0 +1,250 @@
+import asyncio
+import heapq
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+class ScheduledJob:
+    """A periodic coroutine registered with a JobScheduler, plus its run metrics."""
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        interval: float,
+        jitter: float = 0.1,
+        max_concurrency: int = 1,
+        timeout: Optional[float] = None,
+        first_run_delay: Optional[float] = None,
+    ):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter # Fraction of the interval, e.g. 0.1 spreads runs +/-10%
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout # Runs taking longer than this are cancelled (None = no limit)
+        self.first_run_delay = interval if first_run_delay is None else first_run_delay
+
+        self.running = 0
+        self.schedule_sequence = 0 # Heap sequence of the job's current regular deadline; other regular entries are stale
+        self.stats = {
+            "runs": 0, "failures": 0, "timeouts": 0,
+            "overruns": 0, # Deadlines skipped because earlier runs were still in progress
+            "total_time": 0.0, "max_time": 0.0, "last_duration": 0.0,
+            "last_run": None, "last_error": None,
+        }
+
+    def next_delay(self) -> float:
+        """Returns the interval with jitter applied."""
+        if self.jitter <= 0:
+            return self.interval
+        return max(0.0, self.interval * (1 + random.uniform(-self.jitter, self.jitter)))
+
+
+class JobScheduler:
+    """
+    Runs periodic async jobs from a single task using a heap of next-run deadlines.
+
+    Each job runs in its own task, so a slow job doesn't delay the others. A job whose previous
+    run is still in progress when its deadline comes up (beyond max_concurrency) is skipped and
+    counted as an overrun instead of piling up. Durations, failures and timeouts are tracked per
+    job and exposed through get_stats().
+    """
+
+    def __init__(self, name: str = "scheduler"):
+        self.name = name
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self._heap: List[Tuple[float, int, ScheduledJob, bool]] = [] # (deadline, sequence, job, regular deadline?)
+        self._sequence = 0
+        self._wakeup = asyncio.Event()
+        self._job_tasks: set = set()
+        self._runner_task: Optional[asyncio.Task] = None
+
+    def add_job(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        interval: float,
+        *,
+        jitter: float = 0.1,
+        max_concurrency: int = 1,
+        timeout: Optional[float] = None,
+        first_run_delay: Optional[float] = None,
+    ) -> ScheduledJob:
+        """Registers a job. The first run happens after first_run_delay (default: one interval)."""
+        if name in self.jobs:
+            raise ValueError(f"Job '{name}' is already registered with {self.name}")
+        job = ScheduledJob(name, func, interval, jitter, max_concurrency, timeout, first_run_delay)
+        self.jobs[name] = job
+        self._push(job, time.monotonic() + job.first_run_delay)
+        return job
+
+    def remove_job(self, name: str):
+        """Unregisters a job; its pending deadlines are dropped when they come up (even if the name is re-added)."""
+        self.jobs.pop(name, None)
+
+    def trigger(self, name: str):
+        """Runs a job as soon as possible, outside its regular schedule (which stays as it is)."""
+        job = self.jobs.get(name)
+        if job:
+            self._push(job, time.monotonic(), regular=False)
+
+    def _push(self, job: ScheduledJob, deadline: float, regular: bool = True):
+        self._sequence += 1
+        if regular:
+            job.schedule_sequence = self._sequence
+        heapq.heappush(self._heap, (deadline, self._sequence, job, regular))
+        self._wakeup.set()
+
+    async def run(self):
+        """Runs the scheduler until cancelled, then cancels any jobs still running."""
+        log.info(f"{self.name}: starting with {len(self.jobs)} jobs")
+        try:
+            while True:
+                self._wakeup.clear()
+                timeout = None
+                if self._heap:
+                    timeout = max(0.0, self._heap[0][0] - time.monotonic())
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                    continue # A job was added or triggered; recompute the next deadline
+                except asyncio.TimeoutError:
+                    pass
+
+                now = time.monotonic()
+                while self._heap and self._heap[0][0] <= now:
+                    deadline, sequence, job, regular = heapq.heappop(self._heap)
+                    if self.jobs.get(job.name) is not job:
+                        continue # Removed (or replaced by a new job of the same name)
+                    if regular and sequence != job.schedule_sequence:
+                        continue # Superseded deadline
+                    if job.running >= job.max_concurrency:
+                        job.stats["overruns"] += 1
+                        log.warning(f"{self.name}: job '{job.name}' still running at its next deadline, skipping this run")
+                    else:
+                        task = asyncio.create_task(self._run_job(job))
+                        self._job_tasks.add(task)
+                        task.add_done_callback(self._job_tasks.discard)
+                    if regular:
+                        # Schedule from the missed deadline when we're close, but never in the past
+                        self._push(job, max(now, deadline + job.next_delay()))
+        except asyncio.CancelledError:
+            log.info(f"{self.name}: stopping, cancelling {len(self._job_tasks)} running jobs")
+            for task in list(self._job_tasks):
+                task.cancel()
+            if self._job_tasks:
+                await asyncio.gather(*self._job_tasks, return_exceptions=True)
+            raise
+
+    def start(self) -> asyncio.Task:
+        """Starts run() in a background task (if not already running) and returns it."""
+        if self._runner_task is None or self._runner_task.done():
+            self._runner_task = asyncio.create_task(self.run())
+        return self._runner_task
+
+    async def stop(self):
+        """Cancels the task started by start() and waits for running jobs to be cancelled."""
+        if self._runner_task and not self._runner_task.done():
+            self._runner_task.cancel()
+            try:
+                await self._runner_task
+            except asyncio.CancelledError:
+                pass
+        self._runner_task = None
+
+    async def _run_job(self, job: ScheduledJob):
+        job.running += 1
+        start_time = time.monotonic()
+        job.stats["last_run"] = time.time()
+        cancelled = False
+        try:
+            if job.timeout:
+                await asyncio.wait_for(job.func(), timeout=job.timeout)
+            else:
+                await job.func()
+        except asyncio.TimeoutError:
+            job.stats["failures"] += 1
+            job.stats["timeouts"] += 1
+            job.stats["last_error"] = f"Timed out after {job.timeout}s"
+            log.error(f"{self.name}: job '{job.name}' timed out after {job.timeout}s")
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        except Exception as e:
+            job.stats["failures"] += 1
+            job.stats["last_error"] = f"{type(e).__name__}: {e}"
+            log.error(f"{self.name}: job '{job.name}' failed: {e}", exc_info=True)
+        finally:
+            duration = time.monotonic() - start_time
+            job.running -= 1
+            job.stats["runs"] += 1
+            job.stats["total_time"] += duration
+            job.stats["last_duration"] = duration
+            job.stats["max_time"] = max(job.stats["max_time"], duration)
+            if duration > job.interval and not cancelled:
+                log.warning(f"{self.name}: job '{job.name}' took {duration:.1f}s, longer than its {job.interval}s interval")
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Returns per-job metrics, including average run time in ms."""
+        stats = {}
+        for name, job in self.jobs.items():
+            data = dict(job.stats)
+            data["interval"] = job.interval
+            data["running"] = job.running
+            data["average_time_ms"] = round((data["total_time"] / data["runs"]) * 1000, 2) if data["runs"] > 0 else 0
+            stats[name] = data
+        return stats
+
+
+class EventLoopLagMonitor:
+    """
+    Measures event loop lag by sleeping for a fixed interval and recording how late each wakeup is.
+    Sustained lag means something is blocking the loop (or holding the GIL), which is what delays
+    Discord heartbeats. Keeps the most recent `window` samples.
+    """
+
+    def __init__(self, interval: float = 0.5, window: int = 600):
+        self.interval = interval
+        self.samples: deque = deque(maxlen=window) # Lag in seconds
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def run(self):
+        while True:
+            start_time = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - start_time - self.interval)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def start(self) -> asyncio.Task:
+        """Starts sampling on the running loop (if not already running)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Returns lag percentiles over the sample window, in ms."""
+        if not self.samples:
+            return {"samples": 0}
+        ordered = sorted(self.samples)
+        def percentile(p: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 2)
+        return {
+            "samples": len(ordered),
+            "current_ms": round(self.samples[-1] * 1000, 2),
+            "average_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+            "p50_ms": percentile(0.50),
+            "p99_ms": percentile(0.99),
+            "window_max_ms": round(ordered[-1] * 1000, 2),
+            "max_ms": round(self.max_lag * 1000, 2), # Since start
+        }
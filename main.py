@@ -23,6 +23,7 @@ import settings_manager # Import the settings manager
 from db import mod_log_db # Import the new mod log db functions
 import command_customization # Import command customization utilities
 from global_bot_accessor import set_bot_instance # Import the new accessor
+import metrics # Process-wide metrics registry, scraped from METRICS_PORT
 
 # Import the unified API service runner and the sync API module
 import sys
@@ -72,6 +73,7 @@ class MyBot(commands.Bot):
         self.pg_pool = None # Will be initialized in setup_hook
         self.redis = None   # Will be initialized in setup_hook
         self.ai_cogs_to_skip = [] # For --disable-ai flag
+        self.metrics_server = None # Serves /metrics if METRICS_PORT is set
 
     async def setup_hook(self):
         log.info("Running setup_hook...")
@@ -81,7 +83,8 @@ class MyBot(commands.Bot):
             dsn=settings_manager.DATABASE_URL, # Use DATABASE_URL from settings_manager
             min_size=1,
             max_size=10,
-            loop=self.loop  # Explicitly use the bot's event loop
+            loop=self.loop,  # Explicitly use the bot's event loop
+            init=metrics.pg_query_logger_init("bot"), # Query latency metrics
         )
         log.info("Postgres pool initialized and attached to bot.pg_pool.")
 
@@ -91,8 +94,13 @@ class MyBot(commands.Bot):
             max_connections=10,
             decode_responses=True,
         )
+        metrics.instrument_redis(self.redis, "bot")
         log.info("Redis client initialized and attached to bot.redis.")
 
+        # Command latency, gateway event and pool metrics, served on METRICS_PORT (if set)
+        metrics.instrument_bot(self)
+        self.metrics_server = await metrics.start_metrics_server_from_env()
+
         # Make sure the bot instance is set in the global_bot_accessor
         # This ensures settings_manager can access the pools via get_bot_instance()
         set_bot_instance(self)
@@ -519,8 +527,11 @@ async def main(args): # Pass parsed args
     flask_process = subprocess.Popen([sys.executable, "flask_server.py"], cwd=os.path.dirname(__file__))
 
     # Start the unified API service in a separate thread if available
+    # (unless it is deployed on its own: python run_unified_api.py --standalone --workers N)
     api_thread = None
-    if API_AVAILABLE:
+    if API_AVAILABLE and os.getenv("API_STANDALONE", "").lower() in ("1", "true", "yes"):
+        print("API_STANDALONE is set; not starting the unified API service in the bot process.")
+    elif API_AVAILABLE:
         print("Starting unified API service...")
         try:
             # Start the API in a separate thread
@@ -571,6 +582,9 @@ async def main(args): # Pass parsed args
         else:
             log.info("Flask server process was not running or already terminated.")
 
+        if bot.metrics_server:
+            await bot.metrics_server.stop()
+
         # Close database/cache pools if they were initialized
         if bot.pg_pool:
             log.info("Closing Postgres pool in main finally block...")
@@ -0,0 +1,505 @@
+import logging
+import math
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+log = logging.getLogger(__name__)
+
+# Content type of the Prometheus text exposition format rendered by MetricsRegistry.render()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds (seconds) of the default histogram buckets; +Inf is implied
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# For slow calls such as LLM requests
+SLOW_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, int) or (isinstance(value, float) and value.is_integer() and abs(value) < 1e15):
+        return str(int(value))
+    return repr(float(value))
+
+def _escape_label_value(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in labels.items()) + "}"
+
+
+class MetricFamily:
+    """One metric (name, type, help) and its samples, as produced for a scrape."""
+
+    def __init__(self, name: str, metric_type: str, documentation: str):
+        self.name = name
+        self.type = metric_type # "counter", "gauge" or "histogram"
+        self.documentation = documentation
+        self.samples: List[Tuple[str, Dict[str, Any], float]] = [] # (sample name, labels, value)
+
+    def add_sample(self, labels: Dict[str, Any], value: float, suffix: str = ""):
+        self.samples.append((self.name + suffix, labels, value))
+
+    def add_histogram(self, labels: Dict[str, Any], buckets: Iterable[Tuple[float, int]], count: int, total: float):
+        """buckets: (upper bound, cumulative count) pairs, without +Inf."""
+        for bound, cumulative in buckets:
+            self.add_sample({**labels, "le": _format_value(bound)}, cumulative, "_bucket")
+        self.add_sample({**labels, "le": "+Inf"}, count, "_bucket")
+        self.add_sample(labels, count, "_count")
+        self.add_sample(labels, total, "_sum")
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation.replace(chr(92), chr(92) * 2).replace(chr(10), ' ')}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for name, labels, value in self.samples)
+        return "\n".join(lines)
+
+
+class _Metric:
+    """Base for metrics with optional labels; each combination of label values gets its own child."""
+
+    metric_type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: Any, **labels: Any):
+        if labels:
+            values = tuple(labels[name] for name in self.labelnames)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {values}")
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _default_child(self):
+        if self.labelnames:
+            raise ValueError(f"Metric {self.name} has labels {self.labelnames}; use .labels()")
+        return self.labels()
+
+    def collect(self) -> MetricFamily:
+        family = MetricFamily(self.name, self.metric_type, self.documentation)
+        for key, child in sorted(self._children.items()):
+            child._collect(family, dict(zip(self.labelnames, key)))
+        return family
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        self.value += amount
+
+    def _collect(self, family: MetricFamily, labels: Dict[str, str]):
+        family.add_sample(labels, self.value)
+
+
+class Counter(_Metric):
+    """A monotonically increasing count. By convention the name ends in _total."""
+
+    metric_type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default_child().inc(amount)
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = float(value)
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def _collect(self, family: MetricFamily, labels: Dict[str, str]):
+        family.add_sample(labels, self.value)
+
+
+class Gauge(_Metric):
+    """A value that can go up and down."""
+
+    metric_type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default_child().set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._default_child().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default_child().dec(amount)
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "bucket_counts", "count", "total")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.bucket_counts = [0] * len(bounds) # Non-cumulative; values above the last bound only count towards +Inf
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        for index, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.bucket_counts[index] += 1
+                break
+        self.count += 1
+        self.total += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def _collect(self, family: MetricFamily, labels: Dict[str, str]):
+        cumulative, buckets = 0, []
+        for bound, bucket_count in zip(self.bounds, self.bucket_counts):
+            cumulative += bucket_count
+            buckets.append((bound, cumulative))
+        family.add_histogram(labels, buckets, self.count, self.total)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (usually durations in seconds) in cumulative buckets."""
+
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default_child().observe(value)
+
+    def time(self):
+        return self._default_child().time()
+
+
+class MetricsRegistry:
+    """
+    Holds this process's metrics and renders them in the Prometheus text exposition format.
+
+    Metrics are created (or looked up, if already registered with the same type) through
+    counter()/gauge()/histogram(), so modules can declare them at import time and reloaded cogs
+    keep their series. Values that already live elsewhere (pool sizes, cache stats dicts) are
+    read at scrape time by collectors: callables returning MetricFamily objects.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: Dict[str, Callable[[], Iterable[MetricFamily]]] = {}
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+        elif type(metric) is not cls or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"Metric {name} is already registered as a {metric.metric_type} with labels {metric.labelnames}")
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def add_collector(self, key: str, collector: Callable[[], Iterable[MetricFamily]]):
+        """Registers (or replaces) the collector stored under key."""
+        self._collectors[key] = collector
+
+    def remove_collector(self, key: str):
+        self._collectors.pop(key, None)
+
+    def collect(self) -> List[MetricFamily]:
+        """
+        All families, with those of the same name merged into one (e.g. the bot's and the embedded
+        API's pool collectors both emit db_pool_connections), as the format allows one block per name.
+        """
+        families: Dict[str, MetricFamily] = {}
+
+        def add(family: MetricFamily):
+            existing = families.get(family.name)
+            if existing is None:
+                families[family.name] = family
+            elif existing.type != family.type:
+                log.warning(f"Metrics: Dropping {family.type} family {family.name}, already collected as a {existing.type}")
+            else:
+                existing.samples.extend(family.samples)
+
+        for _, metric in sorted(self._metrics.items()):
+            add(metric.collect())
+        for key, collector in list(self._collectors.items()):
+            try:
+                collected = list(collector())
+            except Exception as e:
+                log.warning(f"Metrics: Collector '{key}' failed: {e}")
+                continue
+            for family in collected:
+                add(family)
+        return list(families.values())
+
+    def render(self) -> str:
+        return "\n".join(family.render() for family in self.collect() if family.samples) + "\n"
+
+
+# Process-wide registry: the bot, its cogs (including Gurt) and the API each export the one of their process
+REGISTRY = MetricsRegistry()
+
+# ============= Stats Dict Helpers =============
+
+def stats_counters(name: str, documentation: str, label: str, stats_by_key: Dict[str, Dict[str, Any]],
+                   event_label: str = "event", keys: Optional[Sequence[str]] = None) -> MetricFamily:
+    """
+    Exposes existing counter dicts (e.g. {"token_cache": {"hits": 3, "misses": 1}}) as one counter
+    family labelled {label}=<outer key>, {event_label}=<inner key>. Non-numeric values are skipped.
+    """
+    family = MetricFamily(name, "counter", documentation)
+    for outer_key, stats in stats_by_key.items():
+        for event, value in stats.items():
+            if keys is not None and event not in keys:
+                continue
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                family.add_sample({label: outer_key, event_label: event}, value)
+    return family
+
+# ============= Pools =============
+
+def pg_pool_families(pools: Dict[str, Any]) -> List[MetricFamily]:
+    """Size, idle and max connections of asyncpg pools, keyed by a pool label."""
+    size = MetricFamily("db_pool_connections", "gauge", "Open connections in the Postgres pool")
+    idle = MetricFamily("db_pool_idle_connections", "gauge", "Idle connections in the Postgres pool")
+    maximum = MetricFamily("db_pool_max_connections", "gauge", "Maximum connections of the Postgres pool")
+    for pool_name, pool in pools.items():
+        if pool is None or not hasattr(pool, "get_size"):
+            continue
+        size.add_sample({"pool": pool_name}, pool.get_size())
+        idle.add_sample({"pool": pool_name}, pool.get_idle_size())
+        maximum.add_sample({"pool": pool_name}, pool.get_max_size())
+    return [size, idle, maximum]
+
+def redis_pool_families(clients: Dict[str, Any]) -> List[MetricFamily]:
+    """In-use and available connections of redis.asyncio clients' connection pools, keyed by a pool label."""
+    in_use = MetricFamily("redis_pool_in_use_connections", "gauge", "Connections of the Redis pool currently checked out")
+    available = MetricFamily("redis_pool_available_connections", "gauge", "Idle connections of the Redis pool")
+    maximum = MetricFamily("redis_pool_max_connections", "gauge", "Maximum connections of the Redis pool")
+    for pool_name, client in clients.items():
+        pool = getattr(client, "connection_pool", None)
+        if pool is None:
+            continue
+        # redis-py keeps these as private attributes; skip the pool if they change
+        in_use_connections = getattr(pool, "_in_use_connections", None)
+        available_connections = getattr(pool, "_available_connections", None)
+        if in_use_connections is None or available_connections is None:
+            continue
+        in_use.add_sample({"pool": pool_name}, len(in_use_connections))
+        available.add_sample({"pool": pool_name}, len(available_connections))
+        max_connections = getattr(pool, "max_connections", None)
+        if max_connections is not None and max_connections < 2 ** 31:
+            maximum.add_sample({"pool": pool_name}, max_connections)
+    return [in_use, available, maximum]
+
+# ============= Postgres / Redis Latency =============
+
+def pg_query_logger_init(pool_name: str, registry: MetricsRegistry = REGISTRY):
+    """
+    Returns an asyncpg.create_pool(init=...) callback that records the duration of every query on
+    the pool's connections in db_query_duration_seconds (needs asyncpg >= 0.29 for query loggers).
+    """
+    histogram = registry.histogram("db_query_duration_seconds", "Postgres query duration", ("pool", "outcome"))
+
+    def on_query(record):
+        outcome = "error" if getattr(record, "exception", None) is not None else "success"
+        histogram.labels(pool_name, outcome).observe(record.elapsed)
+
+    async def init(connection):
+        add_query_logger = getattr(connection, "add_query_logger", None)
+        if add_query_logger is not None:
+            add_query_logger(on_query)
+
+    return init
+
+def instrument_redis(client: Any, pool_name: str, registry: MetricsRegistry = REGISTRY) -> Any:
+    """
+    Records the duration of each command sent through client (not its pipelines) in
+    redis_command_duration_seconds, labelled by command name. Returns the client.
+    """
+    histogram = registry.histogram("redis_command_duration_seconds", "Redis command duration", ("pool", "command", "outcome"))
+    execute_command = client.execute_command
+
+    async def timed_execute_command(*args, **options):
+        start = time.perf_counter()
+        outcome = "success"
+        try:
+            return await execute_command(*args, **options)
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            command = str(args[0]).split(" ", 1)[0].upper() if args else "UNKNOWN"
+            histogram.labels(pool_name, command, outcome).observe(time.perf_counter() - start)
+
+    client.execute_command = timed_execute_command
+    return client
+
+# ============= Discord Bot =============
+
+def instrument_bot(bot, registry: MetricsRegistry = REGISTRY):
+    """
+    Records gateway events per type, prefix and application command latency by outcome, and
+    exposes the gateway latency, guild count and the bot's pg_pool/redis pools at scrape time.
+    Call it after the tree's error handler is set; the handler is wrapped to record failed app commands.
+    """
+    if getattr(bot, "metrics_instrumented", False):
+        return
+    bot.metrics_instrumented = True
+    gateway_events = registry.counter("discord_gateway_events_total", "Gateway events received, by type", ("event",))
+    command_seconds = registry.histogram("discord_command_duration_seconds", "Command duration, from invocation to completion",
+                                         ("command", "type", "outcome"))
+
+    async def on_socket_event_type(event_type):
+        gateway_events.labels(event_type).inc()
+
+    async def on_command(ctx):
+        ctx.metrics_started_at = time.perf_counter()
+
+    def observe_command(ctx, outcome: str):
+        started_at = getattr(ctx, "metrics_started_at", None)
+        if started_at is not None and ctx.command is not None:
+            command_seconds.labels(ctx.command.qualified_name, "prefix", outcome).observe(time.perf_counter() - started_at)
+
+    async def on_command_completion(ctx):
+        observe_command(ctx, "success")
+
+    async def on_command_error(ctx, error):
+        observe_command(ctx, "error")
+
+    def observe_app_command(interaction, command, outcome: str):
+        # Measured from the interaction's creation, so it includes the gateway delivery time
+        if command is not None:
+            elapsed = time.time() - interaction.created_at.timestamp()
+            command_seconds.labels(command.qualified_name, "app", outcome).observe(max(0.0, elapsed))
+
+    async def on_app_command_completion(interaction, command):
+        observe_app_command(interaction, command, "success")
+
+    # App command errors only reach the tree's error handler, so wrap whichever one is installed
+    tree_on_error = bot.tree.on_error
+
+    async def on_app_command_error(interaction, error):
+        observe_app_command(interaction, interaction.command, "error")
+        await tree_on_error(interaction, error)
+
+    bot.add_listener(on_socket_event_type)
+    bot.add_listener(on_command)
+    bot.add_listener(on_command_completion)
+    bot.add_listener(on_command_error)
+    bot.add_listener(on_app_command_completion)
+    bot.tree.on_error = on_app_command_error
+
+    def collect_bot():
+        latency = MetricFamily("discord_gateway_latency_seconds", "gauge", "Heartbeat latency of the gateway connection")
+        guilds = MetricFamily("discord_guilds", "gauge", "Guilds the bot is in")
+        if bot.is_ready():
+            if not math.isnan(bot.latency) and not math.isinf(bot.latency):
+                latency.add_sample({}, bot.latency)
+            guilds.add_sample({}, len(bot.guilds))
+        families = [latency, guilds]
+        families.extend(pg_pool_families({"bot": getattr(bot, "pg_pool", None)}))
+        families.extend(redis_pool_families({"bot": getattr(bot, "redis", None)}))
+        return families
+
+    registry.add_collector("bot", collect_bot)
+
+# ============= Pull Endpoint For Bot Processes =============
+
+class MetricsServer:
+    """
+    Serves registry.render() at GET /metrics on host:port with aiohttp, for processes without the
+    API (the bot, the Gurt bot). If secret is set, scrapers must send "Authorization: Bearer <secret>".
+    """
+
+    def __init__(self, host: str, port: int, registry: MetricsRegistry = REGISTRY, secret: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self.secret = secret
+        self._runner = None
+
+    async def _handle_metrics(self, request):
+        from aiohttp import web
+        if self.secret and request.headers.get("Authorization") != f"Bearer {self.secret}":
+            return web.Response(status=403, text="Forbidden")
+        return web.Response(body=self.registry.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+    async def start(self):
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        log.info(f"Metrics: Serving /metrics on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+async def start_metrics_server_from_env(port_env: str = "METRICS_PORT") -> Optional[MetricsServer]:
+    """
+    Starts a MetricsServer if the port_env environment variable is set (host: METRICS_HOST, default
+    127.0.0.1; secret: INTERNAL_METRICS_SECRET, shared with the API's /metrics). Returns None otherwise.
+    """
+    port = os.getenv(port_env)
+    if not port:
+        return None
+    server = MetricsServer(os.getenv("METRICS_HOST", "127.0.0.1"), int(port), secret=os.getenv("INTERNAL_METRICS_SECRET"))
+    try:
+        await server.start()
+    except OSError as e:
+        log.error(f"Metrics: Could not serve /metrics on port {port}: {e}")
+        return None
+    return server
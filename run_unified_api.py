@@ -1,5 +1,6 @@
 import os
 import sys
+import argparse
 import threading
 import uvicorn
 from dotenv import load_dotenv
@@ -19,16 +20,23 @@ load_dotenv()
 api_host = os.getenv("API_HOST", "0.0.0.0")
 api_port = int(os.getenv("API_PORT", "443"))
 
+# Worker processes per bind address in standalone mode (python run_unified_api.py --standalone)
+api_workers = int(os.getenv("API_WORKERS", "1"))
+
 # Set SSL certificate paths
 ssl_cert = os.getenv("SSL_CERT_FILE", "/etc/letsencrypt/live/slipstreamm.dev/fullchain.pem")
 ssl_key = os.getenv("SSL_KEY_FILE", "/etc/letsencrypt/live/slipstreamm.dev/privkey.pem")
 
-def run_unified_api():
-    """Run the unified API service (dual-stack IPv4+IPv6)"""
+def run_unified_api(workers: int = 1):
+    """
+    Run the unified API service (dual-stack IPv4+IPv6) with the given number of uvicorn worker
+    processes per address. More than one worker is only supported in standalone mode (API_STANDALONE),
+    where the workers keep no shared state in memory and reach the bot over RPC.
+    """
     import multiprocessing
 
     def run_uvicorn(bind_host):
-        print(f"Starting unified API service on {bind_host}:{api_port}")
+        print(f"Starting unified API service on {bind_host}:{api_port} ({workers} worker{'s' if workers != 1 else ''})")
         ssl_available = ssl_cert and ssl_key and os.path.exists(ssl_cert) and os.path.exists(ssl_key)
         if ssl_available:
             print(f"Using SSL with certificates at {ssl_cert} and {ssl_key}")
@@ -38,7 +46,8 @@ def run_unified_api():
                 port=api_port,
                 log_level="debug",
                 ssl_certfile=ssl_cert,
-                ssl_keyfile=ssl_key
+                ssl_keyfile=ssl_key,
+                workers=workers
             )
         else:
             print("SSL certificates not found or not configured. Starting without SSL (development mode)")
@@ -46,7 +55,8 @@ def run_unified_api():
                 "api_service.api_server:app",
                 host=bind_host,
                 port=api_port,
-                log_level="debug"
+                log_level="debug",
+                workers=workers
             )
 
     try:
@@ -70,4 +80,15 @@ def start_api_in_thread():
 
 if __name__ == "__main__":
     # Run the API directly if this script is executed
-    run_unified_api()
+    parser = argparse.ArgumentParser(description="Run the unified API service.")
+    parser.add_argument("--standalone", action="store_true",
+                        help="Run without the bot in this process: pools of its own, bot operations over Redis RPC (sets API_STANDALONE).")
+    parser.add_argument("--workers", type=int, default=api_workers,
+                        help="Worker processes per bind address (standalone mode only; default: API_WORKERS or 1).")
+    args = parser.parse_args()
+
+    if args.standalone:
+        os.environ["API_STANDALONE"] = "1" # Inherited by the worker processes
+    elif args.workers > 1 and os.getenv("API_STANDALONE", "").lower() not in ("1", "true", "yes"):
+        parser.error("--workers > 1 requires --standalone (or API_STANDALONE=1)")
+    run_unified_api(workers=args.workers)
@@ -1307,6 +1307,33 @@ async def get_all_enabled_cogs(guild_id: int) -> Dict[str, bool]:
         log.exception(f"Database error getting cog enabled statuses for guild {guild_id}: {e}")
         return {}
 
+async def get_guild_toggles(guild_id: int) -> Dict[str, Dict[str, bool]] | None:
+    """Gets all cog and command enabled statuses for a guild in one query.
+       Returns {"cogs": {cog_name: enabled}, "commands": {command_name: enabled}}, or None on error.
+       Cogs/commands without a row use their default (enabled)."""
+    bot = get_bot_instance()
+    if not bot or not bot.pg_pool:
+        log.error(f"Bot instance or PostgreSQL pool not available in settings_manager for get_guild_toggles (guild {guild_id}).")
+        return None
+
+    try:
+        async with bot.pg_pool.acquire() as conn:
+            records = await conn.fetch(
+                """
+                SELECT 'cog' AS kind, cog_name AS name, enabled FROM enabled_cogs WHERE guild_id = $1
+                UNION ALL
+                SELECT 'command' AS kind, command_name AS name, enabled FROM enabled_commands WHERE guild_id = $1
+                """,
+                guild_id
+            )
+        toggles = {"cogs": {}, "commands": {}}
+        for record in records:
+            toggles["cogs" if record['kind'] == 'cog' else "commands"][record['name']] = record['enabled']
+        return toggles
+    except Exception as e:
+        log.exception(f"Database error getting cog/command toggles for guild {guild_id}: {e}")
+        return None
+
 # --- Command Permission Functions ---
 
 async def add_command_permission(guild_id: int, command_name: str, role_id: int) -> bool:
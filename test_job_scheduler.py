@@ -0,0 +1,71 @@
+import asyncio
+
+from job_scheduler import JobScheduler
+
+INTERVAL = 0.1
+
+async def run_for(scheduler: JobScheduler, seconds: float):
+    scheduler.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        await scheduler.stop()
+
+def test_trigger_runs_once_without_doubling_the_schedule():
+    async def scenario():
+        runs = []
+
+        async def job():
+            runs.append(asyncio.get_running_loop().time())
+
+        scheduler = JobScheduler("test")
+        scheduler.add_job("job", job, INTERVAL, jitter=0, first_run_delay=INTERVAL)
+        scheduler.start()
+        await asyncio.sleep(INTERVAL / 2)
+        scheduler.trigger("job")
+        await asyncio.sleep(INTERVAL * 10)
+        await scheduler.stop()
+        return runs
+
+    runs = asyncio.run(scenario())
+    # One triggered run plus one per interval over ~10.5 intervals; a second deadline chain would double this
+    assert 10 <= len(runs) <= 13, len(runs)
+    gaps = [later - earlier for earlier, later in zip(runs[1:], runs[2:])]
+    assert min(gaps) > INTERVAL / 2, gaps
+
+def test_remove_and_re_add_keeps_a_single_schedule():
+    async def scenario():
+        old_runs, new_runs = [], []
+
+        async def old_job():
+            old_runs.append(1)
+
+        async def new_job():
+            new_runs.append(1)
+
+        scheduler = JobScheduler("test")
+        scheduler.add_job("job", old_job, INTERVAL, jitter=0)
+        scheduler.remove_job("job")
+        scheduler.add_job("job", new_job, INTERVAL, jitter=0)
+        await run_for(scheduler, INTERVAL * 10.5)
+        return old_runs, new_runs
+
+    old_runs, new_runs = asyncio.run(scenario())
+    assert not old_runs
+    assert 9 <= len(new_runs) <= 11, len(new_runs)
+
+def test_trigger_of_a_removed_job_does_nothing():
+    async def scenario():
+        runs = []
+
+        async def job():
+            runs.append(1)
+
+        scheduler = JobScheduler("test")
+        scheduler.add_job("job", job, 10.0)
+        scheduler.trigger("job")
+        scheduler.remove_job("job")
+        await run_for(scheduler, INTERVAL)
+        return runs
+
+    assert asyncio.run(scenario()) == []
@@ -0,0 +1,115 @@
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+from metrics import MetricsRegistry, MetricFamily, instrument_bot, pg_pool_families, redis_pool_families, stats_counters
+
+class FakePgPool:
+    def __init__(self, size, idle, maximum):
+        self.size, self.idle, self.maximum = size, idle, maximum
+
+    def get_size(self):
+        return self.size
+
+    def get_idle_size(self):
+        return self.idle
+
+    def get_max_size(self):
+        return self.maximum
+
+class FakeRedisPool:
+    def __init__(self, in_use, available, max_connections):
+        self._in_use_connections = set(range(in_use))
+        self._available_connections = list(range(available))
+        self.max_connections = max_connections
+
+class FakeRedis:
+    def __init__(self, *args):
+        self.connection_pool = FakeRedisPool(*args)
+
+def help_and_type_lines(text):
+    return [line for line in text.splitlines() if line.startswith("# ")]
+
+def test_bot_and_api_pool_collectors_render_one_block_per_name():
+    # The bot's and the embedded API's collectors share the process registry
+    registry = MetricsRegistry()
+    registry.add_collector("bot", lambda: pg_pool_families({"bot": FakePgPool(3, 1, 10)}) + redis_pool_families({"bot": FakeRedis(2, 5, 10)}))
+    registry.add_collector("api", lambda: pg_pool_families({"api": FakePgPool(2, 2, 10)}) + redis_pool_families({"api": FakeRedis(1, 0, 10)}))
+
+    text = registry.render()
+    header_lines = help_and_type_lines(text)
+    assert len(header_lines) == len(set(header_lines)), text
+    assert 'db_pool_connections{pool="bot"} 3' in text
+    assert 'db_pool_connections{pool="api"} 2' in text
+    assert 'redis_pool_in_use_connections{pool="api"} 1' in text
+
+    # Samples of a merged family follow its single header
+    lines = text.splitlines()
+    header = lines.index("# TYPE db_pool_connections gauge")
+    assert lines[header + 1:header + 3] == ['db_pool_connections{pool="bot"} 3', 'db_pool_connections{pool="api"} 2']
+
+def test_registered_metric_and_collector_with_same_name_merge():
+    registry = MetricsRegistry()
+    registry.counter("cache_events_total", "Cache events", ("cache", "event")).labels("local", "hits").inc(2)
+    registry.add_collector("other", lambda: [stats_counters("cache_events_total", "Cache events", "cache", {"remote": {"hits": 1}})])
+
+    text = registry.render()
+    assert text.count("# TYPE cache_events_total counter") == 1
+    assert 'cache_events_total{cache="local",event="hits"} 2' in text
+    assert 'cache_events_total{cache="remote",event="hits"} 1' in text
+
+def test_conflicting_types_keep_the_first_family():
+    registry = MetricsRegistry()
+    registry.gauge("things", "Things").set(1)
+    family = MetricFamily("things", "counter", "Things")
+    family.add_sample({}, 5)
+    registry.add_collector("conflict", lambda: [family])
+
+    text = registry.render()
+    assert text.count("# TYPE things") == 1
+    assert "things 1" in text and "things 5" not in text
+
+def test_failing_collector_is_skipped():
+    registry = MetricsRegistry()
+    registry.gauge("up", "Up").set(1)
+    registry.add_collector("broken", lambda: 1 / 0)
+    assert "up 1" in registry.render()
+
+class FakeTree:
+    def __init__(self):
+        self.handled = []
+
+    async def on_error(self, interaction, error):
+        self.handled.append(error)
+
+class FakeBot:
+    def __init__(self):
+        self.tree = FakeTree()
+        self.listeners = {}
+        self.guilds = []
+        self.latency = 0.05
+
+    def add_listener(self, func):
+        self.listeners[func.__name__] = func
+
+    def is_ready(self):
+        return True
+
+def test_app_command_errors_are_recorded_and_passed_to_the_tree_handler():
+    registry = MetricsRegistry()
+    bot = FakeBot()
+    instrument_bot(bot, registry)
+
+    command = SimpleNamespace(qualified_name="ping")
+    interaction = SimpleNamespace(command=command, created_at=datetime.datetime.now(datetime.timezone.utc))
+    error = RuntimeError("boom")
+
+    async def scenario():
+        await bot.listeners["on_app_command_completion"](interaction, command)
+        await bot.tree.on_error(interaction, error)
+
+    asyncio.run(scenario())
+    assert bot.tree.handled == [error]
+    text = registry.render()
+    assert 'discord_command_duration_seconds_count{command="ping",type="app",outcome="success"} 1' in text
+    assert 'discord_command_duration_seconds_count{command="ping",type="app",outcome="error"} 1' in text
@@ -0,0 +1,85 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+from db.sqlite_pool import SQLitePool
+
+def make_pool(**kwargs) -> SQLitePool:
+    return SQLitePool(os.path.join(tempfile.mkdtemp(), "test.db"), **kwargs)
+
+async def create_table(pool: SQLitePool):
+    async with pool.transaction() as db:
+        await db.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT UNIQUE)")
+
+def test_concurrent_writes_commit_in_batches():
+    async def scenario():
+        pool = make_pool(write_batch_size=50)
+        await create_table(pool)
+        rowcounts = await asyncio.gather(*[
+            pool.execute("INSERT INTO items (name) VALUES (?)", (f"item {i}",)) for i in range(20)
+        ])
+        count = await pool.fetchone("SELECT COUNT(*) FROM items")
+        stats = dict(pool.stats)
+        await pool.close()
+        return rowcounts, count, stats
+
+    rowcounts, count, stats = asyncio.run(scenario())
+    assert rowcounts == [1] * 20
+    assert count == (20,)
+    assert stats["writes"] == 20
+    assert stats["write_batches"] < 20 # Queued together rather than one commit each
+
+def test_failed_statement_does_not_abort_its_batch():
+    async def scenario():
+        pool = make_pool()
+        await create_table(pool)
+        results = await asyncio.gather(
+            pool.execute("INSERT INTO items (name) VALUES (?)", ("a",)),
+            pool.execute("INSERT INTO items (name) VALUES (?)", ("a",)), # Violates UNIQUE
+            pool.execute("INSERT INTO items (name) VALUES (?)", ("b",)),
+            return_exceptions=True,
+        )
+        names = await pool.fetchall("SELECT name FROM items ORDER BY name")
+        await pool.close()
+        return results, names
+
+    results, names = asyncio.run(scenario())
+    assert results[0] == 1 and results[2] == 1
+    assert isinstance(results[1], Exception)
+    assert names == [("a",), ("b",)]
+
+def test_transaction_rolls_back_when_the_block_raises():
+    async def scenario():
+        pool = make_pool()
+        await create_table(pool)
+        with pytest.raises(RuntimeError):
+            async with pool.transaction() as db:
+                await db.execute("INSERT INTO items (name) VALUES (?)", ("rolled back",))
+                raise RuntimeError("boom")
+        async with pool.transaction() as db:
+            await db.execute("INSERT INTO items (name) VALUES (?)", ("committed",))
+        names = await pool.fetchall("SELECT name FROM items")
+        await pool.close()
+        return names
+
+    assert asyncio.run(scenario()) == [("committed",)]
+
+def test_close_flushes_queued_writes():
+    async def scenario():
+        pool = make_pool(write_batch_size=1)
+        await create_table(pool)
+        writes = [asyncio.create_task(pool.execute("INSERT INTO items (name) VALUES (?)", (f"item {i}",))) for i in range(10)]
+        await asyncio.sleep(0) # Queued, not yet committed
+        await pool.close()
+        rowcounts = await asyncio.wait_for(asyncio.gather(*writes), timeout=5)
+
+        reopened = SQLitePool(pool.db_path)
+        count = await reopened.fetchone("SELECT COUNT(*) FROM items")
+        await reopened.close()
+        return rowcounts, count
+
+    rowcounts, count = asyncio.run(scenario())
+    assert rowcounts == [1] * 10
+    assert count == (10,)
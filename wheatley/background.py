@@ -1,5 +1,4 @@
 import asyncio
-import time
 import traceback
 import os
 import json
@@ -8,13 +7,17 @@ from typing import TYPE_CHECKING
 
 # Relative imports
 from .config import (
-    STATS_PUSH_INTERVAL # Only keep stats interval
+    STATS_PUSH_INTERVAL, # Only keep stats interval
+    SEMANTIC_COMPACTION_INTERVAL, MESSAGE_EMBEDDING_RETENTION_DAYS, IMPORTANT_MESSAGE_RETENTION_DAYS,
+    MESSAGE_EMBEDDING_KEEP_IMPORTANCE, FACT_DEDUP_SIMILARITY
 )
 # Removed analysis imports
 
 if TYPE_CHECKING:
     from .cog import WheatleyCog # Updated type hint
 
+from job_scheduler import JobScheduler # Shared deadline scheduler (top-level module)
+
 # --- Background Task ---
 
 async def background_processing_task(cog: 'WheatleyCog'): # Updated type hint
@@ -29,58 +32,72 @@ async def background_processing_task(cog: 'WheatleyCog'): # Updated type hint
     if not stats_push_secret:
         print("WARNING: WHEATLEY_STATS_PUSH_SECRET (or GURT_STATS_PUSH_SECRET) not set. Stats push endpoint is insecure and likely won't work.") # Updated text
 
-    try:
-        while True:
-            await asyncio.sleep(STATS_PUSH_INTERVAL) # Use the stats interval directly
-            now = time.time()
-
-            # --- Push Stats ---
-            if api_internal_url and stats_push_secret: # Removed check for last push time, rely on sleep interval
-                print("Pushing Wheatley stats to API server...") # Updated text
-                try:
-                    stats_data = await cog.get_wheatley_stats() # Updated method call
-                    headers = {
-                        "Authorization": f"Bearer {stats_push_secret}",
-                        "Content-Type": "application/json"
-                    }
-                    # Use the cog's session, ensure it's created
-                    if cog.session:
-                        # Set a reasonable timeout for the stats push
-                        push_timeout = aiohttp.ClientTimeout(total=10) # 10 seconds total timeout
-                        async with cog.session.post(api_internal_url, json=stats_data, headers=headers, timeout=push_timeout, ssl=True) as response: # Explicitly enable SSL verification
-                            if response.status == 200:
-                                print(f"Successfully pushed Wheatley stats (Status: {response.status})") # Updated text
-                            else:
-                                error_text = await response.text()
-                                print(f"Failed to push Wheatley stats (Status: {response.status}): {error_text[:200]}") # Updated text, Log only first 200 chars
-                    else:
-                        print("Error pushing stats: WheatleyCog session not initialized.") # Updated text
-                    # Removed updating cog.last_stats_push as we rely on sleep interval
-                except aiohttp.ClientConnectorSSLError as ssl_err:
-                     print(f"SSL Error pushing Wheatley stats: {ssl_err}. Ensure the API server's certificate is valid and trusted, or check network configuration.") # Updated text
-                     print("If using a self-signed certificate for development, the bot process might need to trust it.")
-                except aiohttp.ClientError as client_err:
-                    print(f"HTTP Client Error pushing Wheatley stats: {client_err}") # Updated text
-                except asyncio.TimeoutError:
-                    print("Timeout error pushing Wheatley stats.") # Updated text
-                except Exception as e:
-                    print(f"Unexpected error pushing Wheatley stats: {e}") # Updated text
-                    traceback.print_exc()
-
-            # --- Removed Learning Analysis ---
-            # --- Removed Evolve Personality ---
-            # --- Removed Update Interests ---
-            # --- Removed Memory Reflection ---
-            # --- Removed Goal Decomposition ---
-            # --- Removed Goal Execution ---
-            # --- Removed Automatic Mood Change ---
+    scheduler = JobScheduler("WheatleyBackground")
+    if api_internal_url and stats_push_secret:
+        scheduler.add_job("stats_push", lambda: push_stats(cog, api_internal_url, stats_push_secret), STATS_PUSH_INTERVAL, timeout=30)
+    scheduler.add_job("semantic_compaction", lambda: run_semantic_compaction(cog), SEMANTIC_COMPACTION_INTERVAL)
+    # --- Removed Learning Analysis ---
+    # --- Removed Evolve Personality ---
+    # --- Removed Update Interests ---
+    # --- Removed Memory Reflection ---
+    # --- Removed Goal Decomposition ---
+    # --- Removed Goal Execution ---
+    # --- Removed Automatic Mood Change ---
+    cog.background_scheduler = scheduler
 
+    try:
+        await scheduler.run()
     except asyncio.CancelledError:
         print("Wheatley background processing task cancelled") # Updated text
+
+async def push_stats(cog: 'WheatleyCog', api_internal_url: str, stats_push_secret: str):
+    """Pushes Wheatley's stats to the API server."""
+    print("Pushing Wheatley stats to API server...") # Updated text
+    try:
+        stats_data = await cog.get_wheatley_stats() # Updated method call
+        headers = {
+            "Authorization": f"Bearer {stats_push_secret}",
+            "Content-Type": "application/json"
+        }
+        # Use the cog's session, ensure it's created
+        if cog.session:
+            # Set a reasonable timeout for the stats push
+            push_timeout = aiohttp.ClientTimeout(total=10) # 10 seconds total timeout
+            async with cog.session.post(api_internal_url, json=stats_data, headers=headers, timeout=push_timeout, ssl=True) as response: # Explicitly enable SSL verification
+                if response.status == 200:
+                    print(f"Successfully pushed Wheatley stats (Status: {response.status})") # Updated text
+                else:
+                    error_text = await response.text()
+                    print(f"Failed to push Wheatley stats (Status: {response.status}): {error_text[:200]}") # Updated text, Log only first 200 chars
+        else:
+            print("Error pushing stats: WheatleyCog session not initialized.") # Updated text
+    except aiohttp.ClientConnectorSSLError as ssl_err:
+         print(f"SSL Error pushing Wheatley stats: {ssl_err}. Ensure the API server's certificate is valid and trusted, or check network configuration.") # Updated text
+         print("If using a self-signed certificate for development, the bot process might need to trust it.")
+    except aiohttp.ClientError as client_err:
+        print(f"HTTP Client Error pushing Wheatley stats: {client_err}") # Updated text
+    except asyncio.TimeoutError:
+        print("Timeout error pushing Wheatley stats.") # Updated text
     except Exception as e:
-        print(f"Error in Wheatley background processing task: {e}") # Updated text
+        print(f"Unexpected error pushing Wheatley stats: {e}") # Updated text
         traceback.print_exc()
-        await asyncio.sleep(300) # Wait 5 minutes before retrying after an error
+
+async def run_semantic_compaction(cog: 'WheatleyCog'):
+    """Prunes, dedupes and compacts the semantic memory collections."""
+    print("Running Wheatley semantic memory compaction...")
+    report = await cog.memory_manager.compact_semantic_memory(
+        message_retention_days=MESSAGE_EMBEDDING_RETENTION_DAYS,
+        important_message_retention_days=IMPORTANT_MESSAGE_RETENTION_DAYS,
+        keep_importance=MESSAGE_EMBEDDING_KEEP_IMPORTANCE,
+        fact_similarity_threshold=FACT_DEDUP_SIMILARITY
+    )
+    cog.last_compaction_report = report
+    if "before" in report:
+        print(f"Wheatley semantic memory compaction complete in {report['duration_s']}s: pruned {report.get('messages_pruned', 0)} messages, "
+              f"deleted {report.get('orphaned_facts_deleted', 0)} orphaned facts, merged {report.get('duplicate_facts_merged', 0)} duplicate facts. "
+              f"Before: {report['before']} After: {report['after']}")
+    else:
+        print(f"Skipping Wheatley semantic memory compaction: {report.get('error')}")
 
 # --- Removed Automatic Mood Change Logic ---
 # --- Removed Interest Update Logic ---
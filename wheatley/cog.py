@@ -16,7 +16,7 @@ from tavily import TavilyClient # Needed for tavily_client init
 # --- Relative Imports from Wheatley Package ---
 from .config import (
     PROJECT_ID, LOCATION, TAVILY_API_KEY, DEFAULT_MODEL, FALLBACK_MODEL, # Use GCP config
-    DB_PATH, CHROMA_PATH, SEMANTIC_MODEL_NAME, MAX_USER_FACTS, MAX_GENERAL_FACTS,
+    DB_PATH, CHROMA_PATH, SEMANTIC_MODEL_NAME, EMBEDDING_SERVICE_ENABLED, MAX_USER_FACTS, MAX_GENERAL_FACTS,
     # Removed Mood/Personality/Interest/Learning/Goal configs
     CHANNEL_TOPIC_CACHE_TTL, CONTEXT_WINDOW_SIZE,
     API_TIMEOUT, SUMMARY_API_TIMEOUT, API_RETRY_ATTEMPTS, API_RETRY_DELAY,
@@ -29,6 +29,8 @@ from .config import (
 # Import functions/classes from other modules
 from .memory import MemoryManager # Import from local memory.py
 from .background import background_processing_task # Keep background task for potential future use (e.g., cache cleanup)
+from job_scheduler import EventLoopLagMonitor
+from embedding_models import EmbeddingService
 from .commands import setup_commands # Import the setup helper
 from .listeners import on_ready_listener, on_message_listener, on_reaction_add_listener, on_reaction_remove_listener # Import listener functions
 from . import config as WheatleyConfig # Import config module for get_wheatley_stats
@@ -40,7 +42,9 @@ class WheatleyCog(commands.Cog, name="Wheatley"): # Renamed class and Cog name
     """A special cog for the Wheatley bot that uses Google Vertex AI API""" # Updated docstring
 
     def __init__(self, bot):
+        init_start = time.monotonic()
         self.bot = bot
+        self.startup_timings: Dict[str, float] = {} # Startup phase -> seconds, see report_startup_timings()
         # GCP Project/Location are used by vertexai.init() in api.py
         self.tavily_api_key = TAVILY_API_KEY # Use imported config
         self.session: Optional[aiohttp.ClientSession] = None # Keep for other potential HTTP requests (e.g., Piston)
@@ -56,7 +60,8 @@ class WheatleyCog(commands.Cog, name="Wheatley"): # Renamed class and Cog name
             max_user_facts=MAX_USER_FACTS,
             max_general_facts=MAX_GENERAL_FACTS,
             chroma_path=CHROMA_PATH,
-            semantic_model_name=SEMANTIC_MODEL_NAME
+            semantic_model_name=SEMANTIC_MODEL_NAME,
+            use_embedding_service=EMBEDDING_SERVICE_ENABLED
         )
 
         # --- State Variables (Simplified for Wheatley) ---
@@ -104,6 +109,10 @@ class WheatleyCog(commands.Cog, name="Wheatley"): # Renamed class and Cog name
 
         # Background task handle (Kept for potential future tasks like cache cleanup)
         self.background_task: Optional[asyncio.Task] = None
+        self.background_scheduler = None # JobScheduler created by background_processing_task
+        self.semantic_init_task: Optional[asyncio.Task] = None
+        self.last_compaction_report: Optional[Dict[str, Any]] = None # Set by the semantic_compaction background job
+        self.loop_lag_monitor = EventLoopLagMonitor() # Samples event loop lag for stats (e.g. to compare in-process vs. worker embeddings)
         self.last_stats_push = time.time() # Timestamp for last stats push
         # Removed evolution, reflection, goal timestamps
 
@@ -127,15 +136,20 @@ class WheatleyCog(commands.Cog, name="Wheatley"): # Renamed class and Cog name
             else:
                 self.registered_commands.append(str(func))
 
+        self.startup_timings["init"] = time.monotonic() - init_start
         print(f"WheatleyCog initialized with commands: {self.registered_commands}") # Updated print
 
     async def cog_load(self):
         """Create aiohttp session, initialize DB, start background task"""
+        phase_start = time.monotonic()
         self.session = aiohttp.ClientSession()
         print("WheatleyCog: aiohttp session created") # Updated print
+        self.startup_timings["session"] = time.monotonic() - phase_start
 
+        phase_start = time.monotonic()
         # Initialize DB via MemoryManager
         await self.memory_manager.initialize_sqlite_database()
+        self.startup_timings["sqlite_init"] = time.monotonic() - phase_start
         # Removed loading of baseline personality and interests
 
         # Vertex AI initialization happens in api.py using PROJECT_ID and LOCATION from config
@@ -183,6 +197,13 @@ class WheatleyCog(commands.Cog, name="Wheatley"): # Renamed class and Cog name
         else:
              print("WheatleyCog: Background processing task already running.") # Updated print
 
+        self.loop_lag_monitor.start()
+
+        # Semantic memory (ChromaDB + embedding model) loads in a worker thread once the bot is ready,
+        # so it doesn't hold up startup. Until then memory lookups use the SQLite paths.
+        if self.semantic_init_task is None or self.semantic_init_task.done():
+            self.semantic_init_task = asyncio.create_task(self._load_semantic_memory())
+
     async def cog_unload(self):
         """Close session and cancel background task"""
         if self.session and not self.session.closed:
@@ -191,6 +212,14 @@ class WheatleyCog(commands.Cog, name="Wheatley"): # Renamed class and Cog name
         if self.background_task and not self.background_task.done():
             self.background_task.cancel()
             print("WheatleyCog: Cancelled background processing task.") # Updated print
+        if self.semantic_init_task and not self.semantic_init_task.done():
+            self.semantic_init_task.cancel()
+        self.loop_lag_monitor.stop()
+        try:
+            await self.memory_manager.close()
+            print("WheatleyCog: Memory database connections closed.")
+        except Exception as e:
+            print(f"WheatleyCog: Error closing memory database connections: {e}")
         print("WheatleyCog: Listeners will be removed when bot is closed.") # Updated print
 
         print("WheatleyCog unloaded.") # Updated print
@@ -207,6 +236,24 @@ class WheatleyCog(commands.Cog, name="Wheatley"): # Renamed class and Cog name
         self.user_relationships[user_id_1][user_id_2] = new_score
         # print(f"Updated relationship {user_id_1}-{user_id_2}: {current_score:.1f} -> {new_score:.1f} ({change:+.1f})") # Debug log
 
+    async def _load_semantic_memory(self):
+        """Waits for the bot to be ready, then loads semantic memory in the background."""
+        phase_start = time.monotonic()
+        await self.bot.wait_until_ready()
+        self.startup_timings["wait_until_ready"] = time.monotonic() - phase_start
+        try:
+            timings = await self.memory_manager.initialize_semantic_memory()
+            for phase, duration in timings.items():
+                self.startup_timings[f"semantic_{phase}"] = duration
+        except Exception as e:
+            print(f"WheatleyCog: Error loading semantic memory: {e}")
+        self.report_startup_timings()
+
+    def report_startup_timings(self):
+        """Prints how long each startup phase took."""
+        phases = ", ".join(f"{phase}={duration * 1000:.0f}ms" for phase, duration in self.startup_timings.items())
+        print(f"WheatleyCog: Startup timings: {phases} (semantic memory: {self.memory_manager.semantic_state})")
+
     async def get_wheatley_stats(self) -> Dict[str, Any]: # Renamed method
         """Collects various internal stats for Wheatley.""" # Updated docstring
         stats = {"config": {}, "runtime": {}, "memory": {}, "api_stats": {}, "tool_stats": {}}
@@ -218,6 +265,7 @@ class WheatleyCog(commands.Cog, name="Wheatley"): # Renamed class and Cog name
         stats["config"]["db_path"] = WheatleyConfig.DB_PATH
         stats["config"]["chroma_path"] = WheatleyConfig.CHROMA_PATH
         stats["config"]["semantic_model_name"] = WheatleyConfig.SEMANTIC_MODEL_NAME
+        stats["config"]["embedding_service_enabled"] = WheatleyConfig.EMBEDDING_SERVICE_ENABLED
         stats["config"]["max_user_facts"] = WheatleyConfig.MAX_USER_FACTS
         stats["config"]["max_general_facts"] = WheatleyConfig.MAX_GENERAL_FACTS
         stats["config"]["context_window_size"] = WheatleyConfig.CONTEXT_WINDOW_SIZE
@@ -237,6 +285,12 @@ class WheatleyCog(commands.Cog, name="Wheatley"): # Renamed class and Cog name
         # Removed mood, evolution
         stats["runtime"]["needs_json_reminder"] = self.needs_json_reminder
         stats["runtime"]["background_task_running"] = bool(self.background_task and not self.background_task.done())
+        stats["runtime"]["background_jobs"] = self.background_scheduler.get_stats() if self.background_scheduler else {}
+        stats["runtime"]["semantic_memory_state"] = self.memory_manager.semantic_state
+        stats["runtime"]["event_loop_lag"] = self.loop_lag_monitor.get_stats()
+        transformer_model = self.memory_manager.transformer_model
+        stats["runtime"]["embedding_service"] = transformer_model.get_stats() if isinstance(transformer_model, EmbeddingService) else None
+        stats["runtime"]["startup_timings_ms"] = {phase: round(duration * 1000, 1) for phase, duration in self.startup_timings.items()}
         stats["runtime"]["active_topics_channels"] = len(self.active_topics)
         stats["runtime"]["conversation_history_channels"] = len(self.conversation_history)
         stats["runtime"]["thread_history_threads"] = len(self.thread_history)
@@ -266,6 +320,7 @@ class WheatleyCog(commands.Cog, name="Wheatley"): # Renamed class and Cog name
             # ChromaDB Stats
             stats["memory"]["chromadb_message_collection_count"] = await asyncio.to_thread(self.memory_manager.semantic_collection.count) if self.memory_manager.semantic_collection else "N/A"
             stats["memory"]["chromadb_fact_collection_count"] = await asyncio.to_thread(self.memory_manager.fact_collection.count) if self.memory_manager.fact_collection else "N/A"
+            stats["memory"]["last_compaction"] = self.last_compaction_report
 
         except Exception as e:
             stats["memory"]["error"] = f"Failed to retrieve memory stats: {e}"
@@ -41,6 +41,12 @@ SAFETY_CHECK_MODEL = os.getenv("WHEATLEY_SAFETY_CHECK_MODEL", "gemini-2.5-flash-
 DB_PATH = os.getenv("WHEATLEY_DB_PATH", "data/wheatley_memory.db") # Changed env var name and default
 CHROMA_PATH = os.getenv("WHEATLEY_CHROMA_PATH", "data/wheatley_chroma_db") # Changed env var name and default
 SEMANTIC_MODEL_NAME = os.getenv("WHEATLEY_SEMANTIC_MODEL", 'all-MiniLM-L6-v2') # Changed env var name
+EMBEDDING_SERVICE_ENABLED = os.getenv("WHEATLEY_EMBEDDING_SERVICE", "false").lower() == "true" # Encode embeddings in a separate worker process (shared by every bot in this process) instead of on the bot's own threads
+SEMANTIC_COMPACTION_INTERVAL = int(os.getenv("WHEATLEY_SEMANTIC_COMPACTION_INTERVAL", 86400)) # Daily pruning/dedup of the ChromaDB collections
+MESSAGE_EMBEDDING_RETENTION_DAYS = float(os.getenv("WHEATLEY_MESSAGE_EMBEDDING_RETENTION_DAYS", 90)) # Message embeddings older than this are pruned unless important
+IMPORTANT_MESSAGE_RETENTION_DAYS = float(os.getenv("WHEATLEY_IMPORTANT_MESSAGE_RETENTION_DAYS", 365)) # Hard age limit, even for important messages
+MESSAGE_EMBEDDING_KEEP_IMPORTANCE = float(os.getenv("WHEATLEY_MESSAGE_EMBEDDING_KEEP_IMPORTANCE", 0.6)) # Importance (0-1) needed to outlive the normal retention
+FACT_DEDUP_SIMILARITY = float(os.getenv("WHEATLEY_FACT_DEDUP_SIMILARITY", 0.92)) # Cosine similarity at which two facts count as duplicates
 
 # --- Memory Manager Config ---
 # These might be adjusted for Wheatley's simpler memory needs if memory.py is fully separated later
@@ -97,7 +97,9 @@ async def on_message_listener(cog: 'WheatleyCog', message: discord.Message): # U
                 "user_id": str(user_id), "user_name": message.author.name, "display_name": message.author.display_name,
                 "channel_id": str(channel_id), "channel_name": getattr(message.channel, 'name', 'DM'),
                 "guild_id": str(message.guild.id) if message.guild else None,
-                "timestamp": message.created_at.timestamp()
+                "timestamp": message.created_at.timestamp(),
+                # Retention signals for semantic memory compaction
+                "mentions_bot": cog.bot.user.mentioned_in(message), "has_attachments": bool(message.attachments)
             }
             asyncio.create_task(
                 cog.memory_manager.add_message_embedding(
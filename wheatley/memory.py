@@ -1,4 +1,3 @@
-import aiosqlite
 import asyncio
 import os
 import time
@@ -7,10 +6,11 @@ import re
 import hashlib # Added for chroma_id generation
 import json # Added for personality trait serialization/deserialization
 from typing import Dict, List, Any, Optional, Tuple, Union # Added Union
-import chromadb
-from chromadb.utils import embedding_functions
-from sentence_transformers import SentenceTransformer
 import logging
+from collections import deque
+import numpy as np
+from db.sqlite_pool import SQLitePool
+from embedding_models import get_embedding_model # Process-wide model (or embedding worker) shared with the other bots
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -19,6 +19,8 @@ logger = logging.getLogger('wheatley_memory')
 
 # Constants (Removed Interest constants)
 
+DEFERRED_FACT_WRITES_MAX = 1000 # Fact embedding writes buffered while semantic memory is still loading
+
 # --- Helper Function for Keyword Scoring (Kept for potential future use, but unused currently) ---
 def calculate_keyword_score(text: str, context: str) -> int:
     """Calculates a simple keyword overlap score."""
@@ -38,14 +40,27 @@ def calculate_keyword_score(text: str, context: str) -> int:
     score = overlap # Simpler score for now
     return score
 
+# --- Helper Function for Message Importance (used by semantic memory compaction) ---
+def estimate_message_importance(text: str, metadata: Dict[str, Any]) -> float:
+    """Scores how worth keeping a message embedding is, from 0 to 1. An explicit 'importance' in the metadata wins."""
+    if metadata.get("importance") is not None:
+        return float(metadata["importance"])
+    word_count = metadata["word_count"] if metadata.get("word_count") is not None else len(text.split())
+    score = min(word_count / 40, 0.6) # Longer messages tend to carry more content than "lol"
+    if metadata.get("mentions_bot"):
+        score += 0.4 # Directed at the bot
+    if metadata.get("has_attachments"):
+        score += 0.2
+    return min(score, 1.0)
+
 class MemoryManager:
     """Handles database interactions for Wheatley's memory (facts and semantic).""" # Updated docstring
 
-    def __init__(self, db_path: str, max_user_facts: int = 20, max_general_facts: int = 100, semantic_model_name: str = 'all-MiniLM-L6-v2', chroma_path: str = "data/chroma_db_wheatley"): # Changed default chroma_path
+    def __init__(self, db_path: str, max_user_facts: int = 20, max_general_facts: int = 100, semantic_model_name: str = 'all-MiniLM-L6-v2', chroma_path: str = "data/chroma_db_wheatley", use_embedding_service: bool = False): # Changed default chroma_path
         self.db_path = db_path
         self.max_user_facts = max_user_facts
         self.max_general_facts = max_general_facts
-        self.db_lock = asyncio.Lock() # Lock for SQLite operations
+        self.db_pool = SQLitePool(self.db_path) # Persistent WAL connections (1 writer + readers), opened lazily
 
         # Ensure data directories exist
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
@@ -55,23 +70,37 @@ class MemoryManager:
         # --- Semantic Memory Setup ---
         self.chroma_path = chroma_path
         self.semantic_model_name = semantic_model_name
+        self.use_embedding_service = use_embedding_service # Encode in the shared out-of-process worker (embedding_models.EmbeddingService)
         self.chroma_client = None
         self.embedding_function = None
         self.semantic_collection = None # For messages
         self.fact_collection = None # For facts
         self.transformer_model = None
-        self._initialize_semantic_memory_sync() # Initialize semantic components synchronously for simplicity during init
+        # Loaded later by initialize_semantic_memory() so constructing the manager stays cheap.
+        # Until then the semantic collections are None and lookups fall back to SQLite.
+        self.semantic_state = "pending" # pending -> loading -> ready | failed
+        self.semantic_init_timings: Dict[str, float] = {} # Phase -> seconds
+        self._semantic_init_task: Optional[asyncio.Task] = None
+        self._deferred_fact_writes = deque() # (method, kwargs) replayed once ready, up to DEFERRED_FACT_WRITES_MAX
+        self._deferred_fact_resync = False # Set when the buffer overflowed; the fact collection is rebuilt from SQLite instead
 
     def _initialize_semantic_memory_sync(self):
-        """Synchronously initializes ChromaDB client, model, and collection."""
+        """Synchronously initializes ChromaDB client, model, and collections. Blocking; runs in a worker thread."""
+        timings = {}
         try:
+            phase_start = time.monotonic()
+            import chromadb # Deferred so importing this module doesn't pay for chromadb at startup
+            from chromadb.utils import embedding_functions
             logger.info("Initializing ChromaDB client...")
             # Use PersistentClient for saving data to disk
-            self.chroma_client = chromadb.PersistentClient(path=self.chroma_path)
+            chroma_client = chromadb.PersistentClient(path=self.chroma_path)
+            timings["chroma_client"] = time.monotonic() - phase_start
 
+            phase_start = time.monotonic()
             logger.info(f"Loading Sentence Transformer model: {self.semantic_model_name}...")
-            # Load the model directly
-            self.transformer_model = SentenceTransformer(self.semantic_model_name)
+            # Shared with any other MemoryManager in this process that uses the same model
+            transformer_model = get_embedding_model(self.semantic_model_name, use_service=self.use_embedding_service)
+            timings["model_load"] = time.monotonic() - phase_start
 
             # Create a custom embedding function using the loaded model
             class CustomEmbeddingFunction(embedding_functions.EmbeddingFunction):
@@ -89,40 +118,121 @@ class MemoryManager:
                     logger.debug(f"Generated {len(embeddings)} embeddings.")
                     return embeddings
 
-            self.embedding_function = CustomEmbeddingFunction(self.transformer_model)
+            embedding_function = CustomEmbeddingFunction(transformer_model)
 
-            logger.info("Getting/Creating ChromaDB collection 'wheatley_semantic_memory'...") # Renamed collection
+            phase_start = time.monotonic()
+            logger.info("Getting/Creating ChromaDB collection 'wheatley_semantic_memory'...")
             # Get or create the collection with the custom embedding function
-            self.semantic_collection = self.chroma_client.get_or_create_collection(
-                name="wheatley_semantic_memory", # Renamed collection
-                embedding_function=self.embedding_function,
+            semantic_collection = chroma_client.get_or_create_collection(
+                name="wheatley_semantic_memory",
+                embedding_function=embedding_function,
                 metadata={"hnsw:space": "cosine"} # Use cosine distance for similarity
             )
             logger.info("ChromaDB message collection initialized successfully.")
 
-            logger.info("Getting/Creating ChromaDB collection 'wheatley_fact_memory'...") # Renamed collection
+            logger.info("Getting/Creating ChromaDB collection 'wheatley_fact_memory'...")
             # Get or create the collection for facts
-            self.fact_collection = self.chroma_client.get_or_create_collection(
-                name="wheatley_fact_memory", # Renamed collection
-                embedding_function=self.embedding_function,
+            fact_collection = chroma_client.get_or_create_collection(
+                name="wheatley_fact_memory",
+                embedding_function=embedding_function,
                 metadata={"hnsw:space": "cosine"} # Use cosine distance for similarity
             )
             logger.info("ChromaDB fact collection initialized successfully.")
+            timings["collections"] = time.monotonic() - phase_start
+
+            # Publish everything at once so callers never see a half-initialized set of components
+            self.chroma_client = chroma_client
+            self.transformer_model = transformer_model
+            self.embedding_function = embedding_function
+            self.semantic_collection = semantic_collection
+            self.fact_collection = fact_collection
+            self.semantic_state = "ready"
 
         except Exception as e:
             logger.error(f"Failed to initialize semantic memory (ChromaDB): {e}", exc_info=True)
-            # Set components to None to indicate failure
-            self.chroma_client = None
-            self.transformer_model = None
-            self.embedding_function = None
-            self.semantic_collection = None
-            self.fact_collection = None # Also set fact_collection to None on error
+            # Leave components as None to indicate failure
+            self.semantic_state = "failed"
+        return timings
+
+    async def initialize_semantic_memory(self) -> Dict[str, float]:
+        """
+        Loads ChromaDB and the embedding model in a worker thread (once; concurrent callers share
+        the same load) and replays fact writes made while loading. Returns the per-phase timings.
+        """
+        if self._semantic_init_task is None:
+            self._semantic_init_task = asyncio.create_task(self._run_semantic_init())
+        await asyncio.shield(self._semantic_init_task)
+        return self.semantic_init_timings
+
+    async def _run_semantic_init(self):
+        self.semantic_state = "loading"
+        start_time = time.monotonic()
+        timings = await asyncio.to_thread(self._initialize_semantic_memory_sync)
+        timings["total"] = time.monotonic() - start_time
+        self.semantic_init_timings = timings
+        logger.info(f"Semantic memory {self.semantic_state} after {timings['total']:.2f}s ({', '.join(f'{k}={v:.2f}s' for k, v in timings.items() if k != 'total')})")
+
+        if self.semantic_state != "ready":
+            self._deferred_fact_writes.clear()
+            self._deferred_fact_resync = False
+            return
+        if self._deferred_fact_resync:
+            self._deferred_fact_resync = False
+            try:
+                added, deleted = await self._resync_fact_collection()
+                logger.info(f"Resynced fact embeddings from SQLite after deferred write overflow: added {added}, deleted {deleted}.")
+            except Exception as e:
+                logger.error(f"Error resyncing fact embeddings from SQLite: {e}", exc_info=True)
+            return
+        if self._deferred_fact_writes:
+            logger.info(f"Replaying {len(self._deferred_fact_writes)} fact embedding writes made while semantic memory was loading.")
+        while self._deferred_fact_writes:
+            method, kwargs = self._deferred_fact_writes.popleft()
+            try:
+                await asyncio.to_thread(getattr(self.fact_collection, method), **kwargs)
+            except Exception as e:
+                logger.error(f"ChromaDB error replaying deferred fact {method}: {e}", exc_info=True)
+
+    def _defer_fact_collection_write(self, method: str, **kwargs) -> bool:
+        """Buffers a fact_collection write while semantic memory is loading. Returns False if it will never load."""
+        if self.semantic_state not in ("pending", "loading"):
+            return False
+        if self._deferred_fact_resync:
+            return True # The resync once loaded picks this write up from SQLite
+        if len(self._deferred_fact_writes) >= DEFERRED_FACT_WRITES_MAX:
+            # Dropping buffered writes could lose deletes or reorder add/delete pairs, so
+            # discard the buffer and rebuild the collection from SQLite once loaded instead
+            logger.warning(f"More than {DEFERRED_FACT_WRITES_MAX} fact embedding writes buffered while semantic memory is loading; a full fact resync will run once it is ready.")
+            self._deferred_fact_writes.clear()
+            self._deferred_fact_resync = True
+            return True
+        self._deferred_fact_writes.append((method, kwargs))
+        return True
+
+    async def _resync_fact_collection(self, batch_size: int = 100) -> Tuple[int, int]:
+        """Makes fact_collection match the facts in SQLite: embeds missing facts and deletes orphaned ones. Returns (added, deleted)."""
+        user_rows = await self._db_fetchall("SELECT user_id, fact, chroma_id, timestamp FROM user_facts WHERE chroma_id IS NOT NULL")
+        general_rows = await self._db_fetchall("SELECT fact, chroma_id, timestamp FROM general_facts WHERE chroma_id IS NOT NULL")
+        deleted = await self._delete_orphaned_fact_embeddings()
+        existing_ids = set((await asyncio.to_thread(self.fact_collection.get, include=[])).get("ids") or [])
+
+        missing = [(chroma_id, fact, {"user_id": user_id, "type": "user", "timestamp": timestamp or time.time()})
+                   for user_id, fact, chroma_id, timestamp in user_rows if chroma_id not in existing_ids]
+        missing += [(chroma_id, fact, {"type": "general", "timestamp": timestamp or time.time()})
+                    for fact, chroma_id, timestamp in general_rows if chroma_id not in existing_ids]
+        for i in range(0, len(missing), batch_size):
+            batch = missing[i:i + batch_size]
+            await asyncio.to_thread(
+                self.fact_collection.add,
+                ids=[chroma_id for chroma_id, _, _ in batch],
+                documents=[fact for _, fact, _ in batch],
+                metadatas=[metadata for _, _, metadata in batch]
+            )
+        return len(missing), deleted
 
     async def initialize_sqlite_database(self):
         """Initializes the SQLite database and creates tables if they don't exist."""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("PRAGMA journal_mode=WAL;")
-
+        async with self.db_pool.transaction() as db:
             # Create user_facts table if it doesn't exist
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS user_facts (
@@ -176,25 +286,22 @@ class MemoryManager:
             # --- Removed Interests Table ---
             # --- Removed Goals Table ---
 
-            await db.commit()
             logger.info(f"Wheatley SQLite database initialized/verified at {self.db_path}") # Updated text
 
     # --- SQLite Helper Methods ---
     async def _db_execute(self, sql: str, params: tuple = ()):
-        async with self.db_lock:
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute(sql, params)
-                await db.commit()
+        # Queued on the pool's writer and committed in a batch with other small writes
+        await self.db_pool.execute(sql, params)
 
     async def _db_fetchone(self, sql: str, params: tuple = ()) -> Optional[tuple]:
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute(sql, params) as cursor:
-                return await cursor.fetchone()
+        return await self.db_pool.fetchone(sql, params)
 
     async def _db_fetchall(self, sql: str, params: tuple = ()) -> List[tuple]:
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute(sql, params) as cursor:
-                return await cursor.fetchall()
+        return await self.db_pool.fetchall(sql, params)
+
+    async def close(self):
+        """Flushes pending writes and closes the SQLite connections."""
+        await self.db_pool.close()
 
     # --- User Fact Memory Methods (SQLite + Relevance) ---
 
@@ -254,6 +361,10 @@ class MemoryManager:
                 except Exception as chroma_e:
                     logger.error(f"ChromaDB error adding/deleting user fact for {user_id} (ID: {chroma_id}): {chroma_e}", exc_info=True)
                     # Note: Fact is still in SQLite, but ChromaDB might be inconsistent. Consider rollback? For now, just log.
+            elif self._defer_fact_collection_write("add", documents=[fact], metadatas=[{"user_id": user_id, "type": "user", "timestamp": time.time()}], ids=[chroma_id]):
+                if deleted_chroma_id:
+                    self._defer_fact_collection_write("delete", ids=[deleted_chroma_id])
+                logger.info(f"Semantic memory still loading. Queued embedding for user fact (ID: {chroma_id}).")
             else:
                  logger.warning(f"ChromaDB fact collection not available. Skipping embedding for user fact {user_id}.")
 
@@ -378,6 +489,10 @@ class MemoryManager:
                 except Exception as chroma_e:
                     logger.error(f"ChromaDB error adding/deleting general fact (ID: {chroma_id}): {chroma_e}", exc_info=True)
                     # Note: Fact is still in SQLite.
+            elif self._defer_fact_collection_write("add", documents=[fact], metadatas=[{"type": "general", "timestamp": time.time()}], ids=[chroma_id]):
+                if deleted_chroma_id:
+                    self._defer_fact_collection_write("delete", ids=[deleted_chroma_id])
+                logger.info(f"Semantic memory still loading. Queued embedding for general fact (ID: {chroma_id}).")
             else:
                  logger.warning(f"ChromaDB fact collection not available. Skipping embedding for general fact.")
 
@@ -461,7 +576,7 @@ class MemoryManager:
             await asyncio.to_thread(
                 self.semantic_collection.add,
                 documents=[text],
-                metadatas=[metadata],
+                metadatas=[{**metadata, "word_count": len(text.split())}], # Lets compaction score it without loading the text
                 ids=[message_id]
             )
             logger.info(f"Successfully added message {message_id} to ChromaDB.")
@@ -536,6 +651,8 @@ class MemoryManager:
                 except Exception as chroma_e:
                     logger.error(f"ChromaDB error deleting user fact ID {deleted_chroma_id}: {chroma_e}", exc_info=True)
                     # Log error but consider SQLite deletion successful
+            elif deleted_chroma_id:
+                self._defer_fact_collection_write("delete", ids=[deleted_chroma_id])
 
             return {"status": "deleted", "user_id": user_id, "fact_deleted": fact_to_delete}
 
@@ -571,9 +688,147 @@ class MemoryManager:
                 except Exception as chroma_e:
                     logger.error(f"ChromaDB error deleting general fact ID {deleted_chroma_id}: {chroma_e}", exc_info=True)
                     # Log error but consider SQLite deletion successful
+            elif deleted_chroma_id:
+                self._defer_fact_collection_write("delete", ids=[deleted_chroma_id])
 
             return {"status": "deleted", "fact_deleted": fact_to_delete}
 
         except Exception as e:
             logger.error(f"Error deleting general fact: {e}", exc_info=True)
             return {"error": f"Database error deleting general fact: {str(e)}"}
+
+    # --- Semantic Memory Compaction ---
+
+    def _measure_semantic_memory_sync(self, probe_query: str = "what did we talk about") -> Dict[str, Any]:
+        """Collection sizes, on-disk size and the latency of one probe query per collection. Blocking."""
+        disk_bytes = 0
+        for root, _, files in os.walk(self.chroma_path):
+            for name in files:
+                try:
+                    disk_bytes += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        measurement = {"disk_mb": round(disk_bytes / (1024 * 1024), 2)}
+        for label, collection in (("messages", self.semantic_collection), ("facts", self.fact_collection)):
+            count = collection.count()
+            measurement[f"{label}_count"] = count
+            if count:
+                start_time = time.monotonic()
+                collection.query(query_texts=[probe_query], n_results=min(5, count))
+                measurement[f"{label}_query_ms"] = round((time.monotonic() - start_time) * 1000, 2)
+        return measurement
+
+    def _prune_message_embeddings_sync(self, retention_days: float, important_retention_days: float, keep_importance: float, page_size: int = 1000) -> int:
+        """Deletes message embeddings past their retention. Important messages are kept longer. Blocking."""
+        now = time.time()
+        to_delete = []
+        offset = 0
+        # Everything younger than retention_days is kept regardless of importance, so only page through older entries
+        where = {"timestamp": {"$lt": now - retention_days * 86400}}
+        while True:
+            page = self.semantic_collection.get(where=where, include=["metadatas"], limit=page_size, offset=offset)
+            ids = page.get("ids") or []
+            if not ids:
+                break
+            unscored = {} # Stored before word_count was recorded; their text is needed to score them
+            for doc_id, metadata in zip(ids, page.get("metadatas") or []):
+                metadata = metadata or {}
+                age_days = (now - float(metadata.get("timestamp", 0))) / 86400
+                if age_days > important_retention_days:
+                    to_delete.append(doc_id)
+                elif metadata.get("word_count") is None and metadata.get("importance") is None:
+                    unscored[doc_id] = metadata
+                elif estimate_message_importance("", metadata) < keep_importance:
+                    to_delete.append(doc_id)
+            if unscored:
+                documents = self.semantic_collection.get(ids=list(unscored), include=["documents"])
+                for doc_id, document in zip(documents.get("ids") or [], documents.get("documents") or []):
+                    if estimate_message_importance(document or "", unscored[doc_id]) < keep_importance:
+                        to_delete.append(doc_id)
+            offset += len(ids)
+        for i in range(0, len(to_delete), page_size):
+            self.semantic_collection.delete(ids=to_delete[i:i + page_size])
+        return len(to_delete)
+
+    def _get_all_facts_sync(self) -> Dict[str, list]:
+        return self.fact_collection.get(include=["embeddings", "metadatas", "documents"])
+
+    async def _delete_orphaned_fact_embeddings(self) -> int:
+        """Deletes fact embeddings whose chroma_id no longer exists in SQLite."""
+        # Read ChromaDB first: facts are written to SQLite before ChromaDB, so any fact embedded
+        # by now is already in SQLite when it is read next, and isn't mistaken for an orphan
+        chroma_ids = (await asyncio.to_thread(self.fact_collection.get, include=[])).get("ids") or []
+        rows = await self._db_fetchall("SELECT chroma_id FROM user_facts WHERE chroma_id IS NOT NULL UNION SELECT chroma_id FROM general_facts WHERE chroma_id IS NOT NULL")
+        known_ids = {row[0] for row in rows}
+        orphaned = [chroma_id for chroma_id in chroma_ids if chroma_id not in known_ids]
+        if orphaned:
+            await asyncio.to_thread(self.fact_collection.delete, ids=orphaned)
+        return len(orphaned)
+
+    async def _merge_duplicate_facts(self, similarity_threshold: float) -> int:
+        """
+        Finds facts within the same scope (one user, or general) whose embeddings are at least
+        similarity_threshold cosine-similar, keeps the most recent one and deletes the rest from
+        SQLite and ChromaDB.
+        """
+        facts = await asyncio.to_thread(self._get_all_facts_sync)
+        ids = facts.get("ids") or []
+        if not ids:
+            return 0
+        scopes: Dict[str, List[int]] = {}
+        for index, metadata in enumerate(facts.get("metadatas") or []):
+            metadata = metadata or {}
+            scope = f"user-{metadata['user_id']}" if metadata.get("type") == "user" else "general"
+            scopes.setdefault(scope, []).append(index)
+
+        embeddings = np.asarray(facts["embeddings"], dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.maximum(norms, 1e-12)
+        metadatas = facts["metadatas"]
+
+        duplicate_ids = set()
+        for indices in scopes.values():
+            if len(indices) < 2:
+                continue
+            # Newest first, so the fact that survives a merge is the most recent phrasing
+            indices = sorted(indices, key=lambda i: float((metadatas[i] or {}).get("timestamp", 0)), reverse=True)
+            similarities = embeddings[indices] @ embeddings[indices].T
+            for a in range(len(indices)):
+                if ids[indices[a]] in duplicate_ids:
+                    continue
+                for b in range(a + 1, len(indices)):
+                    if similarities[a, b] >= similarity_threshold:
+                        duplicate_ids.add(ids[indices[b]])
+
+        if duplicate_ids:
+            for chroma_id in duplicate_ids:
+                await self._db_execute("DELETE FROM user_facts WHERE chroma_id = ?", (chroma_id,))
+                await self._db_execute("DELETE FROM general_facts WHERE chroma_id = ?", (chroma_id,))
+            await asyncio.to_thread(self.fact_collection.delete, ids=list(duplicate_ids))
+        return len(duplicate_ids)
+
+    async def compact_semantic_memory(self, message_retention_days: float = 90, important_message_retention_days: float = 365,
+                                      keep_importance: float = 0.6, fact_similarity_threshold: float = 0.92) -> Dict[str, Any]:
+        """
+        Compacts the ChromaDB collections: prunes old message embeddings (important ones are kept
+        for important_message_retention_days), deletes fact embeddings missing from SQLite and merges
+        near-duplicate facts. Returns a report with sizes and probe query latency before and after.
+        """
+        if self.semantic_state != "ready":
+            return {"error": f"Semantic memory is not ready ({self.semantic_state})."}
+        start_time = time.monotonic()
+        report: Dict[str, Any] = {"before": await asyncio.to_thread(self._measure_semantic_memory_sync)}
+        try:
+            report["messages_pruned"] = await asyncio.to_thread(
+                self._prune_message_embeddings_sync, message_retention_days, important_message_retention_days, keep_importance
+            )
+            report["orphaned_facts_deleted"] = await self._delete_orphaned_fact_embeddings()
+            report["duplicate_facts_merged"] = await self._merge_duplicate_facts(fact_similarity_threshold)
+        except Exception as e:
+            logger.error(f"Error compacting semantic memory: {e}", exc_info=True)
+            report["error"] = str(e)
+        report["after"] = await asyncio.to_thread(self._measure_semantic_memory_sync)
+        report["duration_s"] = round(time.monotonic() - start_time, 2)
+        report["timestamp"] = time.time()
+        logger.info(f"Semantic memory compaction: {report}")
+        return report